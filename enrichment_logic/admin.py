@@ -1,7 +1,8 @@
 from django.contrib import admin
-from .models import Category, Merchant, Keyword, Transaction
+from .models import Category, Merchant, Keyword, Transaction, EnrichmentJob
 
 admin.site.register(Category)
 admin.site.register(Merchant)
 admin.site.register(Keyword)
 admin.site.register(Transaction)
+admin.site.register(EnrichmentJob)
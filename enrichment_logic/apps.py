@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class EnrichmentLogicConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'enrichment_logic'
+
+    def ready(self):
+        # Registrar las senales que mantienen actualizados los datos pre-procesados del enriquecimiento.
+        from . import signals  # noqa: F401
+        # Registrar las verificaciones de la configuracion (python manage.py check --deploy).
+        from . import checks  # noqa: F401
@@ -0,0 +1,41 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+import threading
+import asyncio
+
+# Constantes
+# Valores por defecto del enriquecimiento async (se pueden configurar en settings).
+# ENRICHMENT_ASYNC_WORKERS: hilos del executor donde las vistas async realizan el trabajo de CPU (o de archivos) de las solicitudes.
+# ENRICHMENT_ASYNC_INLINE_MAX_BYTES: tamaño maximo del cuerpo de una solicitud que se enriquece directamente en el event loop.
+DEFAULT_ASYNC_WORKERS = 4
+DEFAULT_ASYNC_INLINE_MAX_BYTES = 16384
+
+
+# Executor acotado de las vistas async: un pool de ENRICHMENT_ASYNC_WORKERS hilos, creado al utilizarse por primera vez.
+# Mantiene libre el event loop mientras se valida, busca y renderiza una solicitud grande; las solicitudes que superan
+# la cantidad de hilos esperan su turno sin ocupar un hilo cada una.
+class AsyncEnrichmentExecutor:
+    def __init__(self):
+        self.executor = None
+        self.lock = threading.Lock()
+
+    # Esta funcion se encarga de obtener el executor, creandolo si no existe.
+    def get_executor(self):
+        with self.lock:
+            if self.executor is None:
+                workers = getattr(settings, 'ENRICHMENT_ASYNC_WORKERS', DEFAULT_ASYNC_WORKERS)
+                self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='enrichment-async')
+            return self.executor
+
+    # Esta funcion se encarga de ejecutar una funcion en el executor, esperando su resultado sin bloquear el event loop.
+    async def run(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.get_executor(), function, *args)
+
+    # Esta funcion se encarga de detener el executor actual.
+    def shutdown(self):
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=False)
+            self.executor = None
+
+async_enrichment_executor = AsyncEnrichmentExecutor()
@@ -0,0 +1,278 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.settings import api_settings
+from rest_framework.validators import UniqueValidator
+from .models import Category, Merchant, Keyword, CATEGORY_COLUMNS, fill_category_columns, propagate_category_columns
+from .snapshot import rebuild_processed_enrichment_data, bump_enrichment_data_version, CACHE_KEY
+from .reenrichment import get_instance_rule_values, reenrich_rule_changes
+from .signals import suppress_rule_signals
+import logging
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Constantes
+# Valores por defecto de las operaciones masivas de reglas (se pueden configurar en settings).
+# ENRICHMENT_BULK_MAX_ROWS: filas maximas por solicitud.
+# ENRICHMENT_BULK_BATCH_SIZE: filas por consulta (INSERT, UPDATE, DELETE y consultas de validacion).
+BULK_OPERATIONS = ('create', 'update', 'delete')
+DEFAULT_BULK_MAX_ROWS = 50000
+DEFAULT_BULK_BATCH_SIZE = 1000
+
+
+# Esta funcion se encarga de dividir una lista en bloques de batch_size elementos.
+def iterate_chunks(values, batch_size):
+    for start in range(0, len(values), batch_size):
+        yield values[start:start + batch_size]
+
+
+# Validador masivo de reglas (categorias, comercios o keywords) para las operaciones create, update (parcial) y delete.
+# Los campos se validan con el serializer de la regla, pero sin sus consultas por fila: la existencia de las llaves foraneas
+# y la unicidad de los campos unicos (contra la base de datos y dentro del mismo lote) se validan con una consulta por bloque.
+# Expone la misma interfaz que BulkInputTransactionValidator: is_valid(), errors (por indice y por campo) y validated_data,
+# que es una lista de diccionarios (create), de tuplas (regla, diccionario) (update) o de reglas (delete).
+class BulkRuleValidator:
+    def __init__(self, serializer_class, data, operation='create'):
+        self.initial_data = data
+        self.operation = operation
+        self.model = serializer_class.Meta.model
+        self.batch_size = getattr(settings, 'ENRICHMENT_BULK_BATCH_SIZE', DEFAULT_BULK_BATCH_SIZE)
+        self.child = serializer_class(partial=operation == 'update')
+        fields = self.child.fields
+        # Las llaves foraneas y los campos unicos se validan aparte, por lote.
+        self.related_fields = {}
+        self.unique_fields = {}
+        for name, field in list(fields.items()):
+            if isinstance(field, serializers.PrimaryKeyRelatedField):
+                self.related_fields[name] = field
+                del fields[name]
+                continue
+            unique_validators = [validator for validator in field.validators if isinstance(validator, UniqueValidator)]
+            if unique_validators:
+                self.unique_fields[name] = unique_validators[0].message
+                field.validators = [validator for validator in field.validators if not isinstance(validator, UniqueValidator)]
+
+    # Esta funcion se encarga de validar la lista de reglas. Retorna True si todas las reglas son validas.
+    def is_valid(self):
+        data = self.initial_data
+        self._validated_data = []
+        if type(data) is not list:
+            self._errors = {api_settings.NON_FIELD_ERRORS_KEY: [f'Expected a list of items but got type "{type(data).__name__}".']}
+            return False
+        max_rows = getattr(settings, 'ENRICHMENT_BULK_MAX_ROWS', DEFAULT_BULK_MAX_ROWS)
+        if len(data) > max_rows:
+            self._errors = {api_settings.NON_FIELD_ERRORS_KEY: [f"Too many items. Expected at most {max_rows}."]}
+            return False
+
+        errors = [{} for _ in data]
+        instances = self.validate_ids(data, errors) if self.operation in ('update', 'delete') else None
+        if self.operation == 'delete':
+            validated_data = instances
+        else:
+            validated_data = self.validate_fields(data, errors)
+            self.validate_related_fields(data, validated_data, errors)
+            self.validate_unique_fields(validated_data, instances, errors)
+            if instances is not None:
+                validated_data = list(zip(instances, validated_data))
+
+        if any(errors):
+            self._errors = errors
+            return False
+        self._validated_data = validated_data
+        self._errors = []
+        return True
+
+    # Esta funcion se encarga de agregar un error de un campo a los errores de una fila.
+    @staticmethod
+    def add_error(errors, index, field, message):
+        errors[index].setdefault(field, []).append(message)
+
+    # Esta funcion se encarga de validar los ids de las reglas a modificar o eliminar, obteniendo las reglas en una consulta por bloque.
+    # En delete cada fila puede ser el id o un diccionario con el id. Retorna la lista de reglas (None en las filas con errores).
+    def validate_ids(self, data, errors):
+        ids = [None] * len(data)
+        seen = set()
+        for index, item in enumerate(data):
+            # En update, las filas que no son diccionarios se informan al validar sus campos.
+            if not isinstance(item, dict) and self.operation == 'update':
+                continue
+            value = item.get('id') if isinstance(item, dict) else item
+            if value in (None, ''):
+                self.add_error(errors, index, 'id', 'This field is required.')
+                continue
+            try:
+                pk = uuid.UUID(str(value))
+            except ValueError:
+                self.add_error(errors, index, 'id', 'Must be a valid UUID.')
+                continue
+            if pk in seen:
+                self.add_error(errors, index, 'id', 'Duplicated id in the request.')
+                continue
+            seen.add(pk)
+            ids[index] = pk
+
+        existing = self.model.objects.in_bulk([pk for pk in ids if pk is not None])
+        instances = []
+        for index, pk in enumerate(ids):
+            instance = existing.get(pk) if pk is not None else None
+            if pk is not None and instance is None:
+                self.add_error(errors, index, 'id', f'Invalid pk "{pk}" - object does not exist.')
+            instances.append(instance)
+        return instances
+
+    # Esta funcion se encarga de validar los campos de cada regla con el serializer (sin llaves foraneas ni unicidad).
+    # Retorna la lista de datos validados (None en las filas con errores).
+    def validate_fields(self, data, errors):
+        validated_data = []
+        for index, item in enumerate(data):
+            try:
+                validated_data.append(self.child.run_validation(item))
+            except serializers.ValidationError as exc:
+                detail = exc.detail if isinstance(exc.detail, dict) else {api_settings.NON_FIELD_ERRORS_KEY: exc.detail}
+                for field, messages in detail.items():
+                    errors[index].setdefault(field, []).extend(messages)
+                validated_data.append(None)
+        return validated_data
+
+    # Esta funcion se encarga de validar las llaves foraneas (ej: la categoria de un comercio) con una consulta por bloque.
+    # Los valores validos se agregan a los datos validados como <campo>_id. Un texto vacio (ej: en un CSV) equivale a null.
+    def validate_related_fields(self, data, validated_data, errors):
+        for name, field in self.related_fields.items():
+            values = {}
+            for index, item in enumerate(data):
+                if validated_data[index] is None:
+                    continue
+                if name not in item:
+                    if self.operation == 'create' and field.required:
+                        self.add_error(errors, index, name, field.error_messages['required'])
+                    continue
+                value = item[name]
+                if value in (None, ''):
+                    if field.allow_null:
+                        validated_data[index][f'{name}_id'] = None
+                    else:
+                        self.add_error(errors, index, name, field.error_messages['null'])
+                    continue
+                try:
+                    values[index] = uuid.UUID(str(value))
+                except ValueError:
+                    self.add_error(errors, index, name, field.error_messages['does_not_exist'].format(pk_value=value))
+
+            existing = set()
+            related_ids = list(set(values.values()))
+            for chunk in iterate_chunks(related_ids, self.batch_size):
+                existing.update(field.queryset.model.objects.filter(pk__in=chunk).values_list('pk', flat=True))
+            for index, pk in values.items():
+                if pk in existing:
+                    validated_data[index][f'{name}_id'] = pk
+                else:
+                    self.add_error(errors, index, name, field.error_messages['does_not_exist'].format(pk_value=pk))
+
+    # Esta funcion se encarga de validar los campos unicos (ej: el keyword), dentro del lote y contra la base de datos.
+    # Un valor que ya tiene otra regla no se puede tomar en el mismo lote, aunque esa regla lo cambie (el UPDATE lo rechazaria).
+    def validate_unique_fields(self, validated_data, instances, errors):
+        for name, message in self.unique_fields.items():
+            values = {}
+            seen_values = set()
+            for index, item in enumerate(validated_data):
+                instance = instances[index] if instances is not None else None
+                if item is None or item.get(name) is None or (instances is not None and instance is None):
+                    continue
+                if instance is not None and item[name] == getattr(instance, name):
+                    continue
+                if item[name] in seen_values:
+                    self.add_error(errors, index, name, message)
+                    continue
+                seen_values.add(item[name])
+                values[index] = item[name]
+
+            taken = set()
+            for chunk in iterate_chunks(list(seen_values), self.batch_size):
+                taken.update(self.model.objects.filter(**{f'{name}__in': chunk}).values_list(name, flat=True))
+            for index, value in values.items():
+                if value in taken:
+                    self.add_error(errors, index, name, message)
+
+    @property
+    def validated_data(self):
+        return self._validated_data
+
+    @property
+    def errors(self):
+        return self._errors
+
+
+# Esta funcion se encarga de programar, una vez confirmada la transaccion, una sola reconstruccion de los datos pre-procesados
+# y un solo re-enriquecimiento de las transacciones afectadas por todos los cambios. La duracion de la reconstruccion
+# se registra en timings (si la transaccion se confirma dentro de la operacion).
+def schedule_bulk_enrichment_update(changes, timings):
+    def refresh():
+        start_time = time.perf_counter()
+        try:
+            rebuild_processed_enrichment_data()
+        except Exception:
+            logger.exception("Error al reconstruir los datos pre-procesados despues de una operacion masiva de reglas")
+            # Se descartan los datos en cache, para que se reconstruyan en la siguiente solicitud.
+            cache.delete(CACHE_KEY)
+            bump_enrichment_data_version()
+        timings['snapshot_refresh_ms'] = round((time.perf_counter() - start_time) * 1000, 3)
+
+    transaction.on_commit(refresh)
+    transaction.on_commit(lambda: reenrich_rule_changes(changes))
+
+# Esta funcion se encarga de aplicar una operacion masiva ya validada (create, update o delete) en una sola transaccion,
+# con bulk_create, bulk_update o DELETE por bloques, sin las senales de cada regla. Al confirmar, los datos pre-procesados
+# se reconstruyen una sola vez. Retorna una tupla (reglas, tiempos) con la duracion de la escritura y de la reconstruccion.
+def apply_bulk_rule_operation(model, operation, validated_data, batch_size=None):
+    batch_size = batch_size or getattr(settings, 'ENRICHMENT_BULK_BATCH_SIZE', DEFAULT_BULK_BATCH_SIZE)
+    timings = {'snapshot_refresh_ms': None}
+    start_time = time.perf_counter()
+    with transaction.atomic(), suppress_rule_signals():
+        if operation == 'create':
+            instances = [model(**item) for item in validated_data]
+            # bulk_create no llama a save, por lo que las columnas copiadas de la categoria se completan antes.
+            fill_category_columns(instances, batch_size)
+            model.objects.bulk_create(instances, batch_size=batch_size)
+            changes = [(instance, None, False) for instance in instances]
+
+        elif operation == 'update':
+            instances = []
+            changes = []
+            fields = set()
+            now = timezone.now()
+            for instance, item in validated_data:
+                previous_values = get_instance_rule_values(instance)
+                for field, value in item.items():
+                    setattr(instance, field, value)
+                fields.update(item)
+                # bulk_update no actualiza los campos auto_now.
+                instance.updated_at = now
+                instances.append(instance)
+                changes.append((instance, previous_values, False))
+            # Las columnas copiadas de la categoria se actualizan en los comercios o keywords modificados, y se propagan
+            # a los comercios y keywords que referencian las categorias (tipo) o comercios (categoria) modificados.
+            fill_category_columns(instances, batch_size)
+            columns = CATEGORY_COLUMNS.get(model, [])
+            model.objects.bulk_update(instances, sorted(fields) + columns + ['updated_at'], batch_size=batch_size)
+            if (model is Category and 'type' in fields) or (model is Merchant and 'category_id' in fields):
+                propagate_category_columns(instances, batch_size)
+
+        else:
+            instances = list(validated_data)
+            pks = [instance.pk for instance in instances]
+            deleted = list(instances)
+            # Los keywords de los comercios eliminados se eliminan en cascada, y tambien dejan de coincidir.
+            if model is Merchant:
+                for chunk in iterate_chunks(pks, batch_size):
+                    deleted.extend(Keyword.objects.filter(merchant_id__in=chunk))
+            changes = [(instance, None, True) for instance in deleted]
+            for chunk in iterate_chunks(pks, batch_size):
+                model.objects.filter(pk__in=chunk).delete()
+
+        schedule_bulk_enrichment_update(changes, timings)
+        timings['write_ms'] = round((time.perf_counter() - start_time) * 1000, 3)
+    return instances, timings
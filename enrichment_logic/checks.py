@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+# Constantes
+# Backends de cache locales a cada proceso, que no comparten los datos pre-procesados entre los workers.
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+# Esta funcion se encarga de advertir (en python manage.py check --deploy) si la cache por defecto es local a cada proceso.
+# Los datos pre-procesados del enriquecimiento, su version y los locks de actualizacion se comparten a traves de esa cache,
+# por lo que con una cache local los cambios de las reglas solo se ven en el proceso que los recibio.
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if backend not in LOCAL_CACHE_BACKENDS:
+        return []
+    return [Warning(
+        f"La cache por defecto ({backend}) es local a cada proceso: con varios workers, los cambios de las reglas "
+        "no se veran en los datos pre-procesados del resto de los procesos.",
+        hint="Configure en CACHES un backend compartido (ej: Redis o Memcached, o FileBasedCache en un solo servidor).",
+        id='enrichment_logic.W001',
+    )]
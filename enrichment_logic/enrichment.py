@@ -0,0 +1,117 @@
+from .serializer import OutputTransactionSerializer, get_enrichment_metrics
+from .snapshot import normalize_text
+from .result_cache import match_result_cache
+from .metrics import record_enrichment
+
+
+# Enriquecedor de transacciones ya validadas, a partir de los datos pre-procesados (EnrichmentSnapshot).
+# Mantiene los contadores para las metricas del enriquecimiento, por lo que se utiliza una instancia por solicitud (o lote).
+# Si se entrega un timer (StageTimer), se registra la duracion de cada etapa de las busquedas realizadas.
+class TransactionEnricher:
+    def __init__(self, snapshot, timer=None):
+        self.snapshot = snapshot
+        self.timer = timer
+        # Se utilizan directamente los campos del serializer de salida para formatear los datos de cada transaccion;
+        # la categoria y el comercio ya vienen formateados desde los datos pre-procesados.
+        output_fields = OutputTransactionSerializer().fields
+        self.description_field = output_fields['description']
+        self.amount_field = output_fields['amount']
+        self.date_field = output_fields['date']
+
+        self.total_transactions = 0
+        self.categorized_match_count = 0
+        self.merchant_match_count = 0
+        # Cantidad de transacciones por etapa de la busqueda en que se encontro el comercio o la categoria (None si no se encontro).
+        self.stage_counts = {}
+        # Las descripciones se repiten mucho dentro de un lote, por lo que la normalizacion y la busqueda se realizan
+        # una sola vez por descripcion (y por tipo de movimiento), reutilizando el resultado en las transacciones repetidas.
+        self.normalized_descriptions = {}
+        self.matches = {}
+
+    # Esta funcion se encarga de descartar los resultados reutilizables del lote actual (ej: entre bloques de un stream),
+    # para que la memoria utilizada no dependa de la cantidad total de transacciones.
+    def reset_batch(self):
+        self.normalized_descriptions.clear()
+        self.matches.clear()
+
+    # Esta funcion se encarga de buscar el comercio y la categoria de una descripcion, segun su tipo de movimiento.
+    # Retorna una tupla (indice comercio, indice categoria, etapa).
+    def match(self, description_original, category_type):
+        description_normalized = self.normalized_descriptions.get(description_original)
+        if description_normalized is None:
+            description_normalized = normalize_text(description_original)
+            self.normalized_descriptions[description_original] = description_normalized
+
+        match_key = (description_normalized, category_type)
+        match = self.matches.get(match_key)
+        if match is None:
+            # Las descripciones tambien se repiten entre solicitudes, por lo que se consulta la cache de resultados antes de buscar.
+            match = match_result_cache.get(self.snapshot.version, description_normalized, category_type)
+            if match is None:
+                match = self.snapshot.match_with_stage(description_normalized, category_type, self.timer)
+                match_result_cache.set(self.snapshot.version, description_normalized, category_type, match)
+            self.matches[match_key] = match
+        return match
+
+    # Esta funcion se encarga de obtener las busquedas pendientes de un lote de transacciones validadas, es decir,
+    # las descripciones normalizadas (por tipo de movimiento) que no estan en el lote ni en la cache de resultados.
+    def get_pending_matches(self, transactions):
+        pending = {}
+        for transaction in transactions:
+            description_original = transaction['description']
+            category_type = 'income' if transaction['amount'] >= 0 else 'expense'
+            description_normalized = self.normalized_descriptions.get(description_original)
+            if description_normalized is None:
+                description_normalized = normalize_text(description_original)
+                self.normalized_descriptions[description_original] = description_normalized
+            match_key = (description_normalized, category_type)
+            if match_key in self.matches or match_key in pending:
+                continue
+            match = match_result_cache.get(self.snapshot.version, description_normalized, category_type)
+            if match is not None:
+                self.matches[match_key] = match
+            else:
+                pending[match_key] = None
+        return list(pending)
+
+    # Esta funcion se encarga de registrar el resultado de una busqueda realizada fuera del enriquecedor (ej: en otro proceso).
+    def set_match(self, description_normalized, category_type, match):
+        self.matches[(description_normalized, category_type)] = match
+        match_result_cache.set(self.snapshot.version, description_normalized, category_type, match)
+
+    # Esta funcion se encarga de enriquecer una transaccion validada (description, amount y date),
+    # retornando el diccionario de salida con el comercio y la categoria encontrados.
+    def enrich(self, transaction):
+        # Se procesan los datos de la transaccion.
+        description_original = transaction['description']
+        amount = transaction['amount']
+        target_category_type = 'income' if amount >= 0 else 'expense'
+
+        # Se busca el comercio (por keyword o nombre) y la categoria, filtrando por el tipo de movimiento de la transaccion.
+        merchant_index, category_index, stage = self.match(description_original, target_category_type)
+        found_merchant = self.snapshot.get_merchant(merchant_index) if merchant_index is not None else None
+        found_category = self.snapshot.get_category(category_index) if category_index is not None else None
+
+        self.total_transactions += 1
+        self.stage_counts[stage] = self.stage_counts.get(stage, 0) + 1
+        if found_category: self.categorized_match_count += 1
+        if found_merchant: self.merchant_match_count += 1
+        # Se conforma el diccionario de salida con los datos encontrados para la trasanccion.
+        return {
+            'description': self.description_field.to_representation(description_original),
+            'amount': self.amount_field.to_representation(amount),
+            'date': self.date_field.to_representation(transaction['date']),
+            'enriched_category': found_category,
+            'enriched_merchant': found_merchant
+        }
+
+    # Esta funcion se encarga de registrar las transacciones enriquecidas en el registro de metricas del proceso (/metrics).
+    # La duracion solo se entrega cuando el enriquecedor corresponde a una solicitud completa, y con flush=False no se escribe
+    # el archivo de metricas (ver record_enrichment).
+    def record_metrics(self, duration=None, flush=True):
+        record_enrichment(self.total_transactions, self.stage_counts, duration, flush)
+
+    # Esta funcion se encarga de calcular las metricas de las transacciones enriquecidas.
+    def get_metrics(self):
+        return get_enrichment_metrics(self.total_transactions, self.categorized_match_count, self.merchant_match_count)
+
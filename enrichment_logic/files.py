@@ -0,0 +1,128 @@
+from rest_framework.settings import api_settings
+from .renderers import EnrichmentJSONRenderer
+import csv
+import json
+import os
+
+# Dependencia opcional para leer archivos Parquet.
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+# Constantes
+INPUT_FORMATS = ('csv', 'jsonl', 'parquet')
+OUTPUT_FORMATS = ('csv', 'jsonl')
+# Formato de cada extension de archivo.
+FILE_EXTENSIONS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl', '.parquet': 'parquet'}
+# Columnas de la salida en CSV: los datos de la transaccion, el comercio y la categoria encontrados, y los errores de validacion.
+CSV_OUTPUT_FIELDS = (
+    'row', 'description', 'amount', 'date', 'enriched_category_id', 'enriched_category_name',
+    'enriched_merchant_id', 'enriched_merchant_name', 'errors',
+)
+
+
+# Esta funcion se encarga de obtener el formato de un archivo a partir de su extension.
+def get_file_format(path):
+    return FILE_EXTENSIONS.get(os.path.splitext(path)[1].lower())
+
+# Esta funcion se encarga de leer las filas de un archivo de transacciones, sin cargar el archivo completo en memoria.
+# Entrega tuplas (numero de fila, transaccion, errores), donde los errores son None salvo que la fila no se pueda leer.
+# Las filas anteriores a offset se omiten, para continuar una ejecucion interrumpida.
+def read_rows(path, file_format, offset=0, batch_size=10000):
+    if file_format == 'csv':
+        with open(path, newline='', encoding='utf-8') as input_file:
+            for row_number, row in enumerate(csv.DictReader(input_file), start=1):
+                if row_number > offset:
+                    yield row_number, row, None
+
+    elif file_format == 'jsonl':
+        with open(path, encoding='utf-8') as input_file:
+            row_number = 0
+            for line in input_file:
+                line = line.strip()
+                if not line:
+                    continue
+                row_number += 1
+                if row_number <= offset:
+                    continue
+                try:
+                    yield row_number, json.loads(line), None
+                except ValueError as exc:
+                    yield row_number, None, {api_settings.NON_FIELD_ERRORS_KEY: [f'JSON parse error - {exc}']}
+
+    elif file_format == 'parquet':
+        if pq is None:
+            raise ImportError("Para leer archivos Parquet se debe instalar pyarrow (pip install pyarrow).")
+        row_number = 0
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size, columns=['description', 'amount', 'date']):
+            if row_number + batch.num_rows <= offset:
+                row_number += batch.num_rows
+                continue
+            for row in batch.to_pylist():
+                row_number += 1
+                if row_number > offset:
+                    # Se entregan los valores como texto, igual que en un CSV, para validarlos con las mismas reglas.
+                    yield row_number, {field: (None if value is None else str(value)) for field, value in row.items()}, None
+
+    else:
+        raise ValueError(f"Formato de entrada no soportado: {file_format}")
+
+
+# Interfaz de los escritores de las transacciones enriquecidas (RESULT_WRITERS). El encabezado solo se escribe al iniciar
+# un archivo nuevo (no al continuar una ejecucion con --resume), por lo que se escribe por separado de los registros.
+class ResultWriter:
+    def __init__(self, output_file):
+        self.output_file = output_file
+
+    # Esta funcion se encarga de escribir el encabezado del archivo. Por defecto el formato no tiene encabezado.
+    def write_header(self):
+        pass
+
+    # Esta funcion se encarga de escribir un bloque de registros (fila, transaccion enriquecida o errores).
+    def write(self, records):
+        raise NotImplementedError
+
+
+# Escritor de las transacciones enriquecidas en formato JSONL: una transaccion por linea, igual que el endpoint NDJSON.
+# Las filas invalidas se escriben como {"row": n, "errors": {...}}.
+class JSONLResultWriter(ResultWriter):
+    def __init__(self, output_file):
+        super().__init__(output_file)
+        self.renderer = EnrichmentJSONRenderer()
+
+    # Esta funcion se encarga de escribir un bloque de registros (fila, transaccion enriquecida o errores).
+    def write(self, records):
+        lines = []
+        for row_number, transaction, errors in records:
+            record = {'row': row_number, 'errors': errors} if errors is not None else transaction
+            lines.append(self.renderer.render_transaction(record) + '\n')
+        self.output_file.write(self.renderer.escape_line_separators(''.join(lines)))
+
+
+# Escritor de las transacciones enriquecidas en formato CSV, con el id y nombre del comercio y la categoria encontrados.
+class CSVResultWriter(ResultWriter):
+    def __init__(self, output_file):
+        super().__init__(output_file)
+        self.writer = csv.writer(output_file)
+
+    # Esta funcion se encarga de escribir la fila con los nombres de las columnas.
+    def write_header(self):
+        self.writer.writerow(CSV_OUTPUT_FIELDS)
+
+    # Esta funcion se encarga de escribir un bloque de registros (fila, transaccion enriquecida o errores).
+    def write(self, records):
+        rows = []
+        for row_number, transaction, errors in records:
+            if errors is not None:
+                rows.append((row_number, '', '', '', '', '', '', '', json.dumps(errors, ensure_ascii=False)))
+                continue
+            category = transaction['enriched_category'] or {}
+            merchant = transaction['enriched_merchant'] or {}
+            rows.append((
+                row_number, transaction['description'], transaction['amount'], transaction['date'],
+                category.get('id', ''), category.get('name', ''), merchant.get('id', ''), merchant.get('merchant_name', ''), '',
+            ))
+        self.writer.writerows(rows)
+
+RESULT_WRITERS = {'csv': CSVResultWriter, 'jsonl': JSONLResultWriter}
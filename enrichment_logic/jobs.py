@@ -0,0 +1,141 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import EnrichmentJob, EnrichmentJobChunk
+from .snapshot import get_processed_enrichment_data
+from .enrichment import TransactionEnricher
+import datetime
+import decimal
+import logging
+import os
+import socket
+import time
+
+logger = logging.getLogger(__name__)
+
+# Constantes
+# Valores por defecto de la cola de trabajos (se pueden configurar en settings).
+# ENRICHMENT_JOB_CHUNK_SIZE: transacciones por bloque (y por pagina de resultados).
+# ENRICHMENT_JOB_LOCK_TIMEOUT: segundos tras los que un bloque tomado por un worker que no termino vuelve a la cola.
+# ENRICHMENT_JOB_MAX_ATTEMPTS: intentos de cada bloque antes de marcar el trabajo como fallido.
+DEFAULT_JOB_CHUNK_SIZE = 1000
+DEFAULT_JOB_LOCK_TIMEOUT = 300
+DEFAULT_JOB_MAX_ATTEMPTS = 3
+# Cantidad de bloques pendientes que un worker revisa en cada intento de tomar un bloque.
+CLAIM_CANDIDATES = 10
+WORKER_POLL_INTERVAL = 1.0
+
+
+# Esta funcion se encarga de obtener el nombre de un worker, unico por proceso.
+def get_worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+# Esta funcion se encarga de crear un trabajo de enriquecimiento con las transacciones ya validadas,
+# dividiendolas en bloques que quedan pendientes en la cola.
+def create_enrichment_job(transactions):
+    chunk_size = getattr(settings, 'ENRICHMENT_JOB_CHUNK_SIZE', DEFAULT_JOB_CHUNK_SIZE)
+    rows = [[item['description'], str(item['amount']), item['date'].isoformat()] for item in transactions]
+    chunks_data = [rows[start:start + chunk_size] for start in range(0, len(rows), chunk_size)]
+
+    with transaction.atomic():
+        job = EnrichmentJob.objects.create(
+            total_transactions=len(rows),
+            total_chunks=len(chunks_data),
+            # Un trabajo sin transacciones queda completado inmediatamente.
+            status='pending' if chunks_data else 'completed',
+            finished_at=None if chunks_data else timezone.now(),
+        )
+        EnrichmentJobChunk.objects.bulk_create([
+            EnrichmentJobChunk(job=job, index=index, input_data=chunk_data)
+            for index, chunk_data in enumerate(chunks_data)
+        ])
+    return job
+
+# Esta funcion se encarga de devolver a la cola los bloques tomados por workers que no terminaron a tiempo (ej: el proceso murio).
+def requeue_stale_chunks():
+    lock_timeout = getattr(settings, 'ENRICHMENT_JOB_LOCK_TIMEOUT', DEFAULT_JOB_LOCK_TIMEOUT)
+    limit = timezone.now() - datetime.timedelta(seconds=lock_timeout)
+    return EnrichmentJobChunk.objects.filter(status='running', locked_at__lt=limit).update(status='pending', worker='', locked_at=None)
+
+# Esta funcion se encarga de tomar el siguiente bloque pendiente de la cola, o None si no hay bloques pendientes.
+# El bloque se toma con un UPDATE condicionado a que siga pendiente, por lo que dos workers no pueden tomar el mismo bloque
+# (funciona en cualquier base de datos, sin depender de SELECT ... FOR UPDATE SKIP LOCKED).
+def claim_next_chunk(worker_name):
+    while True:
+        candidates = list(
+            EnrichmentJobChunk.objects.filter(status='pending').exclude(job__status='failed').order_by('created_at', 'index').values_list('pk', flat=True)[:CLAIM_CANDIDATES]
+        )
+        if not candidates:
+            return None
+        for chunk_pk in candidates:
+            claimed = EnrichmentJobChunk.objects.filter(pk=chunk_pk, status='pending').update(
+                status='running', worker=worker_name, locked_at=timezone.now(), attempts=F('attempts') + 1,
+            )
+            if claimed:
+                return EnrichmentJobChunk.objects.select_related('job').get(pk=chunk_pk)
+
+# Esta funcion se encarga de enriquecer un bloque tomado por el worker y guardar sus resultados y el avance del trabajo.
+def process_chunk(chunk):
+    job = chunk.job
+    if job.status == 'pending':
+        EnrichmentJob.objects.filter(pk=job.pk, status='pending').update(status='running', started_at=timezone.now())
+
+    try:
+        enricher = TransactionEnricher(get_processed_enrichment_data())
+        results = [
+            enricher.enrich({'description': description, 'amount': decimal.Decimal(amount), 'date': datetime.date.fromisoformat(date)})
+            for description, amount, date in chunk.input_data
+        ]
+    except Exception as exc:
+        logger.exception("Error al procesar el bloque %s del trabajo de enriquecimiento %s", chunk.index, job.pk)
+        fail_chunk(chunk, exc)
+        return False
+
+    with transaction.atomic():
+        updated = EnrichmentJobChunk.objects.filter(pk=chunk.pk, status='running', worker=chunk.worker).update(
+            status='completed', results=results, locked_at=None,
+        )
+        # Si el bloque fue devuelto a la cola (el worker tardo mas que el timeout), sus resultados los guardara otro worker.
+        if not updated:
+            return False
+        EnrichmentJob.objects.filter(pk=job.pk).update(
+            processed_transactions=F('processed_transactions') + enricher.total_transactions,
+            categorized_count=F('categorized_count') + enricher.categorized_match_count,
+            merchant_count=F('merchant_count') + enricher.merchant_match_count,
+            updated_at=timezone.now(),
+        )
+        if not EnrichmentJobChunk.objects.filter(job_id=job.pk).exclude(status='completed').exists():
+            EnrichmentJob.objects.filter(pk=job.pk, status__in=('pending', 'running')).update(status='completed', finished_at=timezone.now())
+    # Solo se registran las transacciones de los bloques cuyos resultados se guardaron, para no contarlas dos veces.
+    enricher.record_metrics()
+    return True
+
+# Esta funcion se encarga de registrar el error de un bloque. El bloque vuelve a la cola hasta agotar sus intentos,
+# y luego el trabajo se marca como fallido.
+def fail_chunk(chunk, exc):
+    max_attempts = getattr(settings, 'ENRICHMENT_JOB_MAX_ATTEMPTS', DEFAULT_JOB_MAX_ATTEMPTS)
+    with transaction.atomic():
+        if chunk.attempts < max_attempts:
+            EnrichmentJobChunk.objects.filter(pk=chunk.pk, status='running').update(status='pending', worker='', locked_at=None)
+            return
+        EnrichmentJobChunk.objects.filter(pk=chunk.pk).update(status='failed', locked_at=None)
+        EnrichmentJob.objects.filter(pk=chunk.job_id).exclude(status='failed').update(
+            status='failed', error=f"Bloque {chunk.index}: {exc}", finished_at=timezone.now(),
+        )
+
+# Esta funcion se encarga de ejecutar un worker: toma y procesa bloques de la cola hasta que se detenga.
+# Con once=True termina cuando la cola queda vacia. Retorna la cantidad de bloques procesados.
+def run_worker(worker_name=None, once=False, poll_interval=WORKER_POLL_INTERVAL):
+    worker_name = worker_name or get_worker_name()
+    processed_chunks = 0
+    while True:
+        requeue_stale_chunks()
+        chunk = claim_next_chunk(worker_name)
+        if chunk is None:
+            if once:
+                return processed_chunks
+            time.sleep(poll_interval)
+            continue
+        if process_chunk(chunk):
+            processed_chunks += 1
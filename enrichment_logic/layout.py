@@ -0,0 +1,172 @@
+from array import array
+import marshal
+import struct
+import zlib
+
+# Constantes
+# Cada seccion de un formato plano comienza alineada a 8 bytes, y se describe en una tabla de (posicion, largo).
+SECTION_ALIGNMENT = 8
+SECTION_COUNT = struct.Struct('<I')
+SECTION_ENTRY = struct.Struct('<QQ')
+
+
+# Escritor de un formato plano de solo lectura: una secuencia de secciones (bytes o arreglos de enteros) que luego
+# se leen en el mismo orden con LayoutReader, directamente desde un bloque de memoria (ej: un archivo mapeado con mmap).
+class LayoutWriter:
+    def __init__(self):
+        self.sections = []
+
+    # Esta funcion se encarga de agregar una seccion de bytes.
+    def add_bytes(self, data):
+        self.sections.append(bytes(data))
+
+    # Esta funcion se encarga de agregar una seccion con un arreglo de enteros ('I' sin signo o 'i' con signo, de 4 bytes).
+    def add_array(self, typecode, values):
+        self.sections.append(array(typecode, values).tobytes())
+
+    # Esta funcion se encarga de agregar una tabla de textos o bloques binarios: las posiciones de cada elemento y sus datos.
+    def add_blob_table(self, items):
+        offsets = [0]
+        for item in items:
+            offsets.append(offsets[-1] + len(item))
+        self.add_array('I', offsets)
+        self.add_bytes(b''.join(items))
+
+    # Esta funcion se encarga de agregar un indice palabra -> lista de enteros, como una tabla hash con direccionamiento abierto.
+    # La posicion de cada palabra se calcula con crc32 (y no con hash, que cambia en cada proceso).
+    def add_word_index(self, postings):
+        words = list(postings)
+        encoded_words = [word.encode() for word in words]
+        slot_count = 8
+        while slot_count < len(words) * 2:
+            slot_count *= 2
+        mask = slot_count - 1
+        slots = [0] * slot_count
+        for word_id, encoded_word in enumerate(encoded_words):
+            slot = zlib.crc32(encoded_word) & mask
+            while slots[slot]:
+                slot = (slot + 1) & mask
+            slots[slot] = word_id + 1
+        self.add_array('I', slots)
+        self.add_blob_table(encoded_words)
+        offsets = [0]
+        for word in words:
+            offsets.append(offsets[-1] + len(postings[word]))
+        self.add_array('I', offsets)
+        self.add_array('i', [value for word in words for value in postings[word]])
+
+    # Esta funcion se encarga de obtener el formato completo: la tabla de secciones seguida de las secciones alineadas.
+    def to_bytes(self, header=b''):
+        table_size = SECTION_COUNT.size + SECTION_ENTRY.size * len(self.sections)
+        position = len(header) + table_size
+        entries = []
+        padded_sections = []
+        for section in self.sections:
+            padding = -position % SECTION_ALIGNMENT
+            position += padding
+            entries.append(SECTION_ENTRY.pack(position, len(section)))
+            padded_sections.append(b'\0' * padding + section)
+            position += len(section)
+        return b''.join([header, SECTION_COUNT.pack(len(self.sections))] + entries + padded_sections)
+
+
+# Lector de un formato plano escrito con LayoutWriter. Las secciones se entregan como memoryview del bloque original,
+# por lo que no se copian: los arreglos se leen con cast y los textos se comparan directamente sobre la memoria.
+class LayoutReader:
+    def __init__(self, view, offset=0):
+        self.view = view
+        (section_count,) = SECTION_COUNT.unpack_from(view, offset)
+        self.entries = [
+            SECTION_ENTRY.unpack_from(view, offset + SECTION_COUNT.size + SECTION_ENTRY.size * index)
+            for index in range(section_count)
+        ]
+        self.position = 0
+
+    # Esta funcion se encarga de obtener la siguiente seccion como bytes (memoryview).
+    def next_bytes(self):
+        if self.position >= len(self.entries):
+            raise ValueError('El formato no contiene mas secciones.')
+        start, size = self.entries[self.position]
+        if start + size > len(self.view):
+            raise ValueError('La seccion excede el tamaño del formato.')
+        self.position += 1
+        return self.view[start:start + size]
+
+    # Esta funcion se encarga de obtener la siguiente seccion como arreglo de enteros.
+    def next_array(self, typecode):
+        return self.next_bytes().cast(typecode)
+
+    # Esta funcion se encarga de obtener la siguiente seccion como tabla de bloques binarios, decodificados con table_class.
+    def next_table(self, table_class):
+        return table_class(self.next_array('I'), self.next_bytes())
+
+    # Esta funcion se encarga de obtener la siguiente seccion como tabla de textos o bloques binarios.
+    def next_blob_table(self):
+        return self.next_table(BlobTable)
+
+    # Esta funcion se encarga de obtener la siguiente seccion como indice palabra -> lista de enteros.
+    def next_word_index(self):
+        return WordIndex(self.next_array('I'), self.next_blob_table(), self.next_array('I'), self.next_array('i'))
+
+
+# Tabla de bloques binarios de un formato plano. Cada elemento se entrega como memoryview, sin copiarlo.
+class BlobTable:
+    __slots__ = ('offsets', 'data')
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self.data[self.offsets[index]:self.offsets[index + 1]]
+
+
+# Indice palabra -> lista de enteros de un formato plano (tabla hash con direccionamiento abierto sobre crc32).
+class WordIndex:
+    __slots__ = ('slots', 'mask', 'words', 'offsets', 'values')
+
+    def __init__(self, slots, words, offsets, values):
+        self.slots = slots
+        self.mask = len(slots) - 1
+        self.words = words
+        self.offsets = offsets
+        self.values = values
+
+    # Esta funcion se encarga de obtener la lista de enteros (memoryview) de una palabra, o None si la palabra no existe.
+    def get(self, word):
+        encoded_word = word.encode()
+        slots = self.slots
+        word_offsets = self.words.offsets
+        word_data = self.words.data
+        slot = zlib.crc32(encoded_word) & self.mask
+        while True:
+            word_id = slots[slot]
+            if not word_id:
+                return None
+            if word_data[word_offsets[word_id - 1]:word_offsets[word_id]] == encoded_word:
+                return self.values[self.offsets[word_id - 1]:self.offsets[word_id]]
+            slot = (slot + 1) & self.mask
+
+
+# Tabla de valores codificados con marshal (ej: filas de una tabla), que se decodifican al obtenerlos.
+class MarshalTable(BlobTable):
+    __slots__ = ()
+
+    def __getitem__(self, index):
+        return marshal.loads(super().__getitem__(index))
+
+
+# Tabla de textos UTF-8, que se decodifican al obtenerlos. Un texto vacio representa None.
+class TextTable(BlobTable):
+    __slots__ = ()
+
+    def __getitem__(self, index):
+        data = super().__getitem__(index)
+        return str(data, 'utf-8') if data else None
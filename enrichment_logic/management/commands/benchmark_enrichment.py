@@ -0,0 +1,210 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client, override_settings
+from django.core.cache import cache
+from rest_framework.renderers import JSONRenderer
+from enrichment_logic.snapshot import get_processed_enrichment_data, local_snapshot_cache, CACHE_KEY
+from enrichment_logic.result_cache import match_result_cache
+from enrichment_logic.synthetic import generate_catalog, save_catalog, get_catalog_patterns, generate_transactions
+from enrichment_logic.models import Merchant, Keyword
+import django
+import platform
+import datetime
+import tracemalloc
+import random
+import json
+import math
+import time
+
+# Cache utilizada durante el benchmark, para no reemplazar los datos pre-procesados de la cache compartida real.
+BENCHMARK_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'enrichment-benchmark'}}
+
+
+# Comando para medir el rendimiento del enriquecimiento con datos sinteticos: la carga de los datos pre-procesados
+# (get_processed_enrichment_data) y el endpoint de enriquecimiento, para distintos tamaños de catalogo y de lote.
+# Entrega el throughput, la latencia p50/p99 y el peak de memoria de cada medicion, y puede guardarlas en un archivo JSON
+# (--output) para compararlas con otra ejecucion (--compare).
+# El catalogo sintetico se crea (junto a las reglas ya existentes) dentro de una transaccion que se revierte al terminar,
+# y se utiliza una cache local, por lo que no modifica la base de datos ni la cache reales. Con --existing-data solo se
+# utilizan las reglas ya cargadas. Se deshabilita DEBUG para que Django no registre cada consulta durante las mediciones.
+class Command(BaseCommand):
+    help = 'Mide el rendimiento de la carga de datos pre-procesados y del endpoint de enriquecimiento con datos sinteticos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keywords', default='1000,10000', help='Cantidades de keywords del catalogo, separadas por coma.')
+        parser.add_argument('--merchants', type=int, help='Cantidad de comercios del catalogo (por defecto, la mitad de los keywords).')
+        parser.add_argument('--categories', type=int, default=50, help='Cantidad de categorias del catalogo.')
+        parser.add_argument('--sizes', default='1000,10000,100000', help='Tamaños de lote separados por coma.')
+        parser.add_argument('--match-ratio', type=float, default=0.7, help='Proporcion de descripciones que contienen un keyword o comercio (0 a 1).')
+        parser.add_argument('--unique-ratio', type=float, default=0.5, help='Proporcion de descripciones distintas dentro del lote (0 a 1).')
+        parser.add_argument('--repeat', type=int, default=5, help='Repeticiones de cada medicion.')
+        parser.add_argument('--seed', type=int, default=13, help='Semilla para generar los datos.')
+        parser.add_argument('--existing-data', action='store_true', help='Utiliza las reglas de la base de datos en lugar de un catalogo sintetico.')
+        parser.add_argument('--output', help='Archivo JSON donde se guardan los resultados.')
+        parser.add_argument('--compare', help='Archivo JSON de una ejecucion anterior con la que se comparan los resultados.')
+        parser.add_argument('--threshold', type=float, default=10.0, help='Porcentaje de aumento del p50 que se informa como regresion al comparar.')
+
+    def handle(self, *args, **options):
+        try:
+            catalog_sizes = [int(size) for size in options['keywords'].split(',')]
+            batch_sizes = [int(size) for size in options['sizes'].split(',')]
+        except ValueError:
+            raise CommandError('--keywords y --sizes deben ser enteros separados por coma.')
+        if options['existing_data']:
+            catalog_sizes = [None]
+
+        results = []
+        with override_settings(CACHES=BENCHMARK_CACHES, ALLOWED_HOSTS=['*'], DEBUG=False):
+            for keyword_count in catalog_sizes:
+                rng = random.Random(options['seed'])
+                with transaction.atomic():
+                    if keyword_count is not None:
+                        categories, merchants, keywords = generate_catalog(rng, keyword_count, options['merchants'], options['categories'])
+                        save_catalog(categories, merchants, keywords)
+                        self.stdout.write(f"Catalogo sintetico: {len(keywords)} keywords, {len(merchants)} comercios, {len(categories)} categorias.")
+                    else:
+                        merchants = list(Merchant.objects.select_related('category'))
+                        keywords = list(Keyword.objects.select_related('merchant__category'))
+                    patterns = get_catalog_patterns(merchants, keywords)
+
+                    # El catalogo medido incluye las reglas que ya existen en la base de datos.
+                    counts = get_processed_enrichment_data().get_counts()
+                    catalog = {'keywords': counts['keywords'], 'merchants': counts['merchants']}
+                    results.extend(self.benchmark_snapshot(catalog, options['repeat']))
+                    for size in batch_sizes:
+                        transactions = generate_transactions(rng, patterns, size, options['match_ratio'], options['unique_ratio'])
+                        results.append(self.benchmark_endpoint(catalog, transactions, options['repeat']))
+                    # El catalogo sintetico no se guarda.
+                    transaction.set_rollback(True)
+            cache.clear()
+        local_snapshot_cache.clear()
+        match_result_cache.clear()
+
+        report = {
+            'metadata': {
+                'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': settings.DATABASES['default']['ENGINE'],
+                'options': {key: options[key] for key in ('keywords', 'merchants', 'categories', 'sizes', 'match_ratio', 'unique_ratio', 'repeat', 'seed', 'existing_data')},
+            },
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output_file:
+                json.dump(report, output_file, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Resultados guardados en {options['output']}."))
+        if options['compare']:
+            self.compare_results(results, options['compare'], options['threshold'])
+
+    # Esta funcion se encarga de medir la carga de los datos pre-procesados: construccion desde la base de datos (sin cache),
+    # carga desde la cache compartida (sin capa local) y obtencion desde la capa local del proceso.
+    def benchmark_snapshot(self, catalog, repeat):
+        results = []
+        stages = (
+            ('snapshot_build', lambda: (cache.clear(), local_snapshot_cache.clear())),
+            ('snapshot_shared_cache', local_snapshot_cache.clear),
+            ('snapshot_local_cache', None),
+        )
+        for name, prepare in stages:
+            get_processed_enrichment_data()
+            durations = []
+            for _ in range(max(repeat, 1)):
+                if prepare: prepare()
+                start_time = time.perf_counter()
+                get_processed_enrichment_data()
+                durations.append(time.perf_counter() - start_time)
+            if prepare: prepare()
+            peak_memory = self.measure_peak_memory(get_processed_enrichment_data)
+            result = dict(name=name, **catalog, **self.get_latency_stats(durations), peak_memory_bytes=peak_memory)
+            result['snapshot_bytes'] = len(cache.get(CACHE_KEY) or b'')
+            self.write_result(result)
+            results.append(result)
+        return results
+
+    # Esta funcion se encarga de medir el endpoint de enriquecimiento con un lote de transacciones.
+    # Se mide la solicitud completa (validacion, enriquecimiento y renderizado), con los datos pre-procesados ya cargados.
+    def benchmark_endpoint(self, catalog, transactions, repeat):
+        client = Client()
+        body = JSONRenderer().render(transactions)
+        post = lambda: client.post('/api/v1/transactions/enrich/', body, content_type='application/json')
+        response = post()
+        if response.status_code != 200:
+            raise CommandError(f"El endpoint de enriquecimiento respondio {response.status_code}: {response.content[:500]}")
+        metrics = json.loads(response.content)['metrics']
+
+        durations = []
+        for _ in range(max(repeat, 1)):
+            # Cada repeticion parte sin resultados en la cache LRU, para medir la busqueda y no solo la cache.
+            match_result_cache.clear()
+            start_time = time.perf_counter()
+            post()
+            durations.append(time.perf_counter() - start_time)
+        match_result_cache.clear()
+        peak_memory = self.measure_peak_memory(post)
+
+        stats = self.get_latency_stats(durations)
+        result = dict(name='enrich_endpoint', **catalog, size=len(transactions), **stats)
+        result['throughput_tps'] = round(len(transactions) / (stats['p50_ms'] / 1000), 1) if stats['p50_ms'] else None
+        result['peak_memory_bytes'] = peak_memory
+        result['categorization_rate'] = metrics['categorization_rate']
+        result['merchant_identification_rate'] = metrics['merchant_identification_rate']
+        self.write_result(result)
+        return result
+
+    # Esta funcion se encarga de calcular las estadisticas de latencia (en milisegundos) de una lista de duraciones.
+    @staticmethod
+    def get_latency_stats(durations):
+        durations = sorted(durations)
+        percentile = lambda value: durations[max(0, math.ceil(value / 100 * len(durations)) - 1)] * 1000
+        return {
+            'repeat': len(durations),
+            'mean_ms': round(sum(durations) / len(durations) * 1000, 3),
+            'p50_ms': round(percentile(50), 3),
+            'p99_ms': round(percentile(99), 3),
+        }
+
+    # Esta funcion se encarga de medir el peak de memoria de una ejecucion, en una ejecucion aparte (tracemalloc agrega latencia).
+    @staticmethod
+    def measure_peak_memory(function):
+        tracemalloc.start()
+        try:
+            function()
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    # Esta funcion se encarga de mostrar una medicion por consola.
+    def write_result(self, result):
+        size = f" lote={result['size']}" if 'size' in result else ''
+        throughput = f" {result['throughput_tps']:.0f} tx/s" if result.get('throughput_tps') else ''
+        self.stdout.write(
+            f"{result['name']:<22} keywords={result['keywords']}{size} p50={result['p50_ms']:.2f}ms "
+            f"p99={result['p99_ms']:.2f}ms memoria={result['peak_memory_bytes'] / 1048576:.1f}MB{throughput}"
+        )
+
+    # Esta funcion se encarga de comparar los resultados con los de una ejecucion anterior (mismo nombre, catalogo y tamaño de lote).
+    def compare_results(self, results, baseline_path, threshold):
+        try:
+            with open(baseline_path, encoding='utf-8') as baseline_file:
+                baseline = json.load(baseline_file)['results']
+        except (OSError, ValueError, KeyError):
+            raise CommandError(f"No fue posible leer los resultados de {baseline_path}.")
+        get_key = lambda result: (result['name'], result['keywords'], result.get('size'))
+        baseline_results = {get_key(result): result for result in baseline}
+
+        regressions = 0
+        for result in results:
+            previous = baseline_results.get(get_key(result))
+            if previous is None or not previous['p50_ms']:
+                continue
+            change = (result['p50_ms'] - previous['p50_ms']) / previous['p50_ms'] * 100
+            line = f"{result['name']:<22} keywords={result['keywords']} lote={result.get('size', '-')}: p50 {previous['p50_ms']:.2f}ms -> {result['p50_ms']:.2f}ms ({change:+.1f}%)"
+            if change > threshold:
+                regressions += 1
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(line)
+        if regressions:
+            self.stdout.write(self.style.WARNING(f"{regressions} mediciones con un p50 mayor en mas de {threshold}%."))
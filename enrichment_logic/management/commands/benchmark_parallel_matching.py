@@ -0,0 +1,86 @@
+from django.core.management.base import BaseCommand, CommandError
+from enrichment_logic.snapshot import get_processed_enrichment_data
+from enrichment_logic.enrichment import TransactionEnricher
+from enrichment_logic.result_cache import match_result_cache
+from enrichment_logic.parallel import prefetch_matches_in_parallel, matching_process_pool
+from enrichment_logic.synthetic import FILLER_WORDS
+import datetime
+import decimal
+import random
+import time
+
+
+# Comando para comparar el enriquecimiento en el proceso actual con la busqueda en paralelo (pool de procesos),
+# para distintos tamaños de lote y cantidades de procesos, y asi definir ENRICHMENT_PARALLEL_THRESHOLD y ENRICHMENT_PARALLEL_WORKERS.
+# Las descripciones se generan a partir de los keywords y comercios actuales, por lo que se debe ejecutar con datos cargados.
+class Command(BaseCommand):
+    help = 'Compara el enriquecimiento secuencial con la busqueda en paralelo para distintos tamaños de lote.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,50000,100000', help='Tamaños de lote separados por coma.')
+        parser.add_argument('--workers', default='2,4', help='Cantidades de procesos separadas por coma.')
+        parser.add_argument('--unique-ratio', type=float, default=0.5, help='Proporcion de descripciones distintas dentro del lote (0 a 1).')
+        parser.add_argument('--repeat', type=int, default=3, help='Repeticiones de cada medicion (se informa la mejor).')
+        parser.add_argument('--seed', type=int, default=13, help='Semilla para generar las descripciones.')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',')]
+            workers_options = [int(workers) for workers in options['workers'].split(',')]
+        except ValueError:
+            raise CommandError('--sizes y --workers deben ser enteros separados por coma.')
+
+        snapshot = get_processed_enrichment_data()
+        rng = random.Random(options['seed'])
+        patterns = [row[1] for row in snapshot.keywords if row is not None] + [row[1] for row in snapshot.merchants if row is not None]
+        if not patterns:
+            self.stdout.write(self.style.WARNING('No hay keywords ni comercios cargados; las descripciones no tendran coincidencias.'))
+            patterns = ['sin datos']
+
+        self.stdout.write(f"{'lote':>10} {'procesos':>9} {'secuencial (s)':>15} {'paralelo (s)':>13} {'aceleracion':>12}")
+        try:
+            for size in sizes:
+                transactions = self.generate_transactions(rng, patterns, size, options['unique_ratio'])
+                serial_time = self.measure(options['repeat'], lambda: self.enrich(snapshot, transactions))
+                for workers in workers_options:
+                    # El pool se crea antes de medir, igual que en un servidor donde ya esta creado.
+                    matching_process_pool.start(snapshot, workers)
+                    parallel_time = self.measure(options['repeat'], lambda: self.enrich(snapshot, transactions, workers))
+                    self.stdout.write(f"{size:>10} {workers:>9} {serial_time:>15.3f} {parallel_time:>13.3f} {serial_time / parallel_time:>11.2f}x")
+        finally:
+            with matching_process_pool.lock:
+                matching_process_pool.shutdown()
+
+    # Esta funcion se encarga de generar transacciones sinteticas a partir de los keywords y comercios.
+    @staticmethod
+    def generate_transactions(rng, patterns, size, unique_ratio):
+        unique_count = max(1, int(size * unique_ratio))
+        descriptions = [
+            f"{rng.choice(FILLER_WORDS)} {rng.choice(patterns)} {rng.choice(FILLER_WORDS)} {number}"
+            for number in range(unique_count)
+        ]
+        date = datetime.date(2025, 1, 1)
+        return [
+            {'description': rng.choice(descriptions), 'amount': decimal.Decimal(rng.choice((-1, 1)) * rng.randint(1, 100000)), 'date': date}
+            for _ in range(size)
+        ]
+
+    # Esta funcion se encarga de enriquecer el lote, secuencialmente o buscando en paralelo con la cantidad de procesos indicada.
+    @staticmethod
+    def enrich(snapshot, transactions, workers=None):
+        match_result_cache.clear()
+        enricher = TransactionEnricher(snapshot)
+        if workers:
+            prefetch_matches_in_parallel(enricher, transactions)
+        return [enricher.enrich(transaction) for transaction in transactions]
+
+    # Esta funcion se encarga de medir el menor tiempo de varias repeticiones.
+    @staticmethod
+    def measure(repeat, function):
+        best_time = None
+        for _ in range(max(repeat, 1)):
+            start_time = time.perf_counter()
+            function()
+            duration = time.perf_counter() - start_time
+            best_time = duration if best_time is None else min(best_time, duration)
+        return best_time
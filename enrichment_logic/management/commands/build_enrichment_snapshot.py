@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+from enrichment_logic.snapshot import EnrichmentSnapshot, get_rules_fingerprint, get_snapshot_file_path, write_snapshot_file, read_snapshot_file
+import time
+
+
+# Comando para construir los datos pre-procesados del enriquecimiento (matchers y tablas de busqueda) y guardarlos en un archivo,
+# junto a la huella de las reglas con que se construyeron. Los workers cargan los datos desde el archivo (en lugar de construirlos
+# desde la base de datos) cuando no estan en cache y la huella coincide con las reglas actuales.
+# Se recomienda ejecutarlo al desplegar, antes de iniciar los workers.
+class Command(BaseCommand):
+    help = 'Construye los datos pre-procesados del enriquecimiento y los guarda en el archivo ENRICHMENT_SNAPSHOT_FILE.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Archivo donde se guardan los datos (por defecto, ENRICHMENT_SNAPSHOT_FILE).')
+        parser.add_argument('--check', action='store_true', help='Solo indica si el archivo existe y corresponde a las reglas actuales.')
+
+    def handle(self, *args, **options):
+        path = options['output'] or get_snapshot_file_path()
+        if not path:
+            raise CommandError('Se debe indicar --output o configurar ENRICHMENT_SNAPSHOT_FILE en settings.')
+
+        fingerprint = get_rules_fingerprint()
+        if options['check']:
+            if read_snapshot_file(path, fingerprint) is None:
+                raise CommandError(f"El archivo {path} no existe, no es valido o no corresponde a las reglas actuales.")
+            self.stdout.write(self.style.SUCCESS(f"El archivo {path} esta actualizado."))
+            return
+
+        start_time = time.perf_counter()
+        snapshot = EnrichmentSnapshot.build()
+        try:
+            size = write_snapshot_file(path, snapshot, fingerprint)
+        except OSError as error:
+            raise CommandError(f"No fue posible guardar el archivo {path}: {error}")
+        duration = time.perf_counter() - start_time
+        counts = snapshot.get_counts()
+        self.stdout.write(self.style.SUCCESS(
+            f"Datos de enriquecimiento guardados en {path} ({size / 1048576:.1f}MB, "
+            f"{counts['keywords']} keywords, {counts['merchants']} comercios, "
+            f"{counts['categories']} categorias) en {duration:.3f}s."
+        ))
@@ -0,0 +1,156 @@
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework import serializers
+from enrichment_logic.snapshot import get_processed_enrichment_data
+from enrichment_logic.enrichment import TransactionEnricher
+from enrichment_logic.validators import BulkInputTransactionValidator
+from enrichment_logic.parallel import prefetch_matches_in_parallel, matching_process_pool
+from enrichment_logic.files import INPUT_FORMATS, OUTPUT_FORMATS, RESULT_WRITERS, get_file_format, read_rows
+import json
+import os
+import time
+
+
+# Comando para enriquecer un archivo de transacciones (CSV, JSONL o Parquet) sin pasar por la api.
+# Utiliza la misma validacion y busqueda que el endpoint de enriquecimiento, leyendo y escribiendo por bloques,
+# por lo que la memoria utilizada no depende del tamaño del archivo.
+# Despues de cada bloque se guarda un checkpoint (<salida>.checkpoint), que permite continuar una ejecucion interrumpida con --resume.
+class Command(BaseCommand):
+    help = 'Enriquece un archivo de transacciones (CSV, JSONL o Parquet) y escribe el resultado en CSV o JSONL.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='Archivo de entrada, con las columnas description, amount y date.')
+        parser.add_argument('output', help='Archivo de salida.')
+        parser.add_argument('--input-format', choices=INPUT_FORMATS, help='Formato de entrada (por defecto, segun la extension).')
+        parser.add_argument('--output-format', choices=OUTPUT_FORMATS, help='Formato de salida (por defecto, segun la extension).')
+        parser.add_argument('--chunk-size', type=int, default=10000, help='Filas que se procesan por bloque.')
+        parser.add_argument('--workers', type=int, default=1, help='Procesos para la busqueda en paralelo (1 busca en el proceso actual).')
+        parser.add_argument('--offset', type=int, default=0, help='Cantidad de filas iniciales que se omiten.')
+        parser.add_argument('--resume', action='store_true', help='Continua una ejecucion interrumpida desde su checkpoint.')
+        parser.add_argument('--metrics-file', help='Archivo JSON donde se escriben las metricas finales.')
+
+    def handle(self, *args, **options):
+        input_path = options['input']
+        output_path = options['output']
+        input_format = options['input_format'] or get_file_format(input_path)
+        output_format = options['output_format'] or get_file_format(output_path)
+        if input_format not in INPUT_FORMATS:
+            raise CommandError(f"No se reconoce el formato de entrada de {input_path}; utilice --input-format.")
+        if output_format not in OUTPUT_FORMATS:
+            raise CommandError(f"No se reconoce el formato de salida de {output_path}; utilice --output-format.")
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size debe ser mayor a 0.')
+
+        checkpoint_path = f"{output_path}.checkpoint"
+        enricher = TransactionEnricher(get_processed_enrichment_data())
+        offset = options['offset']
+        invalid_rows = 0
+        output_size = None
+
+        # Al continuar, se recuperan la posicion y los contadores, y se descarta lo escrito despues del ultimo checkpoint.
+        if options['resume']:
+            checkpoint = self.read_checkpoint(checkpoint_path, input_path)
+            offset = checkpoint['offset']
+            output_size = checkpoint['output_size']
+            invalid_rows = checkpoint['invalid_rows']
+            enricher.total_transactions = checkpoint['total_transactions']
+            enricher.categorized_match_count = checkpoint['categorized_match_count']
+            enricher.merchant_match_count = checkpoint['merchant_match_count']
+
+        validator = BulkInputTransactionValidator(None)
+        # El pool de procesos se crea antes de leer el archivo, con los datos pre-procesados ya cargados.
+        if options['workers'] > 1:
+            matching_process_pool.start(enricher.snapshot, options['workers'])
+        start_time = time.perf_counter()
+        try:
+            with open(output_path, 'r+' if output_size is not None else 'w', newline='', encoding='utf-8') as output_file:
+                if output_size is not None:
+                    output_file.seek(output_size)
+                    output_file.truncate()
+                writer = RESULT_WRITERS[output_format](output_file)
+                if output_size is None:
+                    writer.write_header()
+
+                chunk = []
+                for row in read_rows(input_path, input_format, offset, options['chunk_size']):
+                    chunk.append(row)
+                    if len(chunk) >= options['chunk_size']:
+                        invalid_rows += self.process_chunk(chunk, enricher, validator, writer, options['workers'])
+                        offset = chunk[-1][0]
+                        self.write_checkpoint(checkpoint_path, input_path, output_file, offset, invalid_rows, enricher)
+                        self.stdout.write(f"{offset} filas procesadas ({time.perf_counter() - start_time:.1f}s).")
+                        chunk = []
+                if chunk:
+                    invalid_rows += self.process_chunk(chunk, enricher, validator, writer, options['workers'])
+        except ImportError as exc:
+            raise CommandError(str(exc))
+        finally:
+            if options['workers'] > 1:
+                with matching_process_pool.lock:
+                    matching_process_pool.shutdown()
+
+        # La ejecucion termino, por lo que el checkpoint ya no es necesario.
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
+        metrics = enricher.get_metrics()
+        metrics['invalid_rows'] = invalid_rows
+        if options['metrics_file']:
+            with open(options['metrics_file'], 'w', encoding='utf-8') as metrics_file:
+                json.dump(metrics, metrics_file, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Archivo enriquecido en {time.perf_counter() - start_time:.1f}s: {json.dumps(metrics)}"))
+
+    # Esta funcion se encarga de validar, enriquecer y escribir un bloque de filas. Retorna la cantidad de filas invalidas.
+    @staticmethod
+    def process_chunk(chunk, enricher, validator, writer, workers):
+        validated_rows = []
+        invalid_rows = 0
+        for row_number, item, errors in chunk:
+            if errors is None:
+                try:
+                    item = validator.run_item_validation(item)
+                except serializers.ValidationError as exc:
+                    errors = exc.detail
+            if errors is not None:
+                invalid_rows += 1
+            validated_rows.append((row_number, item, errors))
+
+        if workers > 1:
+            transactions = [item for _, item, errors in validated_rows if errors is None]
+            prefetch_matches_in_parallel(enricher, transactions)
+        writer.write([
+            (row_number, enricher.enrich(item) if errors is None else None, errors)
+            for row_number, item, errors in validated_rows
+        ])
+        enricher.reset_batch()
+        return invalid_rows
+
+    # Esta funcion se encarga de guardar el avance de la ejecucion, despues de escribir completamente un bloque.
+    @staticmethod
+    def write_checkpoint(checkpoint_path, input_path, output_file, offset, invalid_rows, enricher):
+        output_file.flush()
+        os.fsync(output_file.fileno())
+        checkpoint = {
+            'input': os.path.abspath(input_path),
+            'offset': offset,
+            'output_size': output_file.tell(),
+            'invalid_rows': invalid_rows,
+            'total_transactions': enricher.total_transactions,
+            'categorized_match_count': enricher.categorized_match_count,
+            'merchant_match_count': enricher.merchant_match_count,
+        }
+        temporary_path = f"{checkpoint_path}.tmp"
+        with open(temporary_path, 'w', encoding='utf-8') as checkpoint_file:
+            json.dump(checkpoint, checkpoint_file)
+        os.replace(temporary_path, checkpoint_path)
+
+    # Esta funcion se encarga de leer el checkpoint de una ejecucion interrumpida.
+    @staticmethod
+    def read_checkpoint(checkpoint_path, input_path):
+        try:
+            with open(checkpoint_path, encoding='utf-8') as checkpoint_file:
+                checkpoint = json.load(checkpoint_file)
+        except (OSError, ValueError):
+            raise CommandError(f"No existe un checkpoint valido en {checkpoint_path} para continuar.")
+        if checkpoint.get('input') != os.path.abspath(input_path):
+            raise CommandError(f"El checkpoint {checkpoint_path} corresponde a otro archivo de entrada ({checkpoint.get('input')}).")
+        return checkpoint
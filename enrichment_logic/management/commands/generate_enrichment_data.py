@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from enrichment_logic.models import Merchant, Keyword
+from enrichment_logic.snapshot import warm_up_enrichment_data
+from enrichment_logic.synthetic import generate_catalog, save_catalog, get_catalog_patterns, generate_transactions
+from enrichment_logic.files import get_file_format
+import random
+import json
+import csv
+
+
+# Comando para generar datos sinteticos: un catalogo de categorias, comercios y keywords que se guarda en la base de datos,
+# y/o un archivo de transacciones (CSV o JSONL) para el comando enrich_file o para enviar al endpoint de enriquecimiento.
+class Command(BaseCommand):
+    help = 'Genera un catalogo sintetico de reglas y/o un archivo de transacciones sinteticas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keywords', type=int, default=0, help='Cantidad de keywords del catalogo que se guarda (0 no crea catalogo).')
+        parser.add_argument('--merchants', type=int, help='Cantidad de comercios del catalogo (por defecto, la mitad de los keywords).')
+        parser.add_argument('--categories', type=int, default=50, help='Cantidad de categorias del catalogo.')
+        parser.add_argument('--transactions-file', help='Archivo de transacciones (CSV o JSONL) que se genera con las reglas de la base de datos.')
+        parser.add_argument('--rows', type=int, default=10000, help='Cantidad de transacciones del archivo.')
+        parser.add_argument('--match-ratio', type=float, default=0.7, help='Proporcion de descripciones que contienen un keyword o comercio (0 a 1).')
+        parser.add_argument('--unique-ratio', type=float, default=0.5, help='Proporcion de descripciones distintas (0 a 1).')
+        parser.add_argument('--seed', type=int, default=13, help='Semilla para generar los datos.')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        if options['keywords']:
+            categories, merchants, keywords = generate_catalog(rng, options['keywords'], options['merchants'], options['categories'])
+            with transaction.atomic():
+                save_catalog(categories, merchants, keywords)
+            # bulk_create no envia las senales de actualizacion incremental, por lo que se reconstruyen los datos pre-procesados.
+            warm_up_enrichment_data(force=True)
+            self.stdout.write(f"Catalogo guardado: {len(categories)} categorias, {len(merchants)} comercios, {len(keywords)} keywords.")
+
+        transactions_file = options['transactions_file']
+        if transactions_file:
+            file_format = get_file_format(transactions_file)
+            if file_format not in ('csv', 'jsonl'):
+                raise CommandError('--transactions-file debe tener extension .csv o .jsonl.')
+            patterns = get_catalog_patterns(
+                Merchant.objects.select_related('category'), Keyword.objects.select_related('merchant__category')
+            )
+            transactions = generate_transactions(rng, patterns, options['rows'], options['match_ratio'], options['unique_ratio'])
+            with open(transactions_file, 'w', newline='', encoding='utf-8') as output_file:
+                if file_format == 'csv':
+                    writer = csv.writer(output_file)
+                    writer.writerow(('description', 'amount', 'date'))
+                    writer.writerows((item['description'], item['amount'], item['date'].isoformat()) for item in transactions)
+                else:
+                    output_file.writelines(
+                        json.dumps({'description': item['description'], 'amount': str(item['amount']), 'date': item['date'].isoformat()}) + '\n'
+                        for item in transactions
+                    )
+            self.stdout.write(f"Archivo de transacciones generado: {transactions_file} ({len(transactions)} filas).")
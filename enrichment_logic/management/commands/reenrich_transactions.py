@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from enrichment_logic.reenrichment import reindex_transactions, reenrich_transactions
+import time
+
+# Comando para re-enriquecer todas las transacciones guardadas con las reglas actuales, y reconstruir su indice de palabras.
+# Los cambios de reglas re-enriquecen automaticamente solo las transacciones afectadas; este comando es para la carga inicial
+# del indice (ej: transacciones guardadas antes de existir) o para revisar toda la tabla.
+class Command(BaseCommand):
+    help = 'Re-enriquece las transacciones guardadas y/o reconstruye su indice de palabras.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reindex', action='store_true', help='Reconstruye el indice de palabras antes de re-enriquecer.')
+        parser.add_argument('--index-only', action='store_true', help='Solo reconstruye el indice de palabras.')
+        parser.add_argument('--batch-size', type=int, help='Transacciones que se leen y actualizan por lote.')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] is not None and options['batch_size'] < 1:
+            raise CommandError('--batch-size debe ser mayor a 0.')
+
+        start_time = time.perf_counter()
+        if options['reindex'] or options['index_only']:
+            indexed = reindex_transactions(batch_size=options['batch_size'])
+            self.stdout.write(f"Indice de palabras reconstruido para {indexed} transacciones ({time.perf_counter() - start_time:.1f}s).")
+            if options['index_only']:
+                return
+
+        result = reenrich_transactions(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{result['candidates']} transacciones revisadas, {result['updated']} actualizadas en {time.perf_counter() - start_time:.1f}s."
+        ))
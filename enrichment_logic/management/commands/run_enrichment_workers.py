@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from django.db import connections
+from enrichment_logic.jobs import run_worker, WORKER_POLL_INTERVAL
+import multiprocessing
+import os
+
+# Esta funcion se encarga de ejecutar un worker dentro de un proceso hijo.
+# Cada proceso debe abrir sus propias conexiones a la base de datos, por lo que se cierran las heredadas del proceso padre.
+def run_worker_process(once, poll_interval):
+    connections.close_all()
+    try:
+        run_worker(once=once, poll_interval=poll_interval)
+    finally:
+        connections.close_all()
+
+
+# Comando para ejecutar los workers de los trabajos de enriquecimiento asincronos.
+# Cada worker es un proceso independiente que toma bloques pendientes desde la tabla de la cola,
+# por lo que el procesamiento escala con la cantidad de procesos (y nucleos) disponibles.
+class Command(BaseCommand):
+    help = 'Ejecuta los workers que procesan los trabajos de enriquecimiento asincronos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 1, help='Cantidad de procesos worker (por defecto, la cantidad de nucleos).')
+        parser.add_argument('--once', action='store_true', help='Termina cuando no quedan bloques pendientes en la cola.')
+        parser.add_argument('--poll-interval', type=float, default=WORKER_POLL_INTERVAL, help='Segundos de espera cuando la cola esta vacia.')
+
+    def handle(self, *args, **options):
+        processes = max(options['processes'], 1)
+        once = options['once']
+        poll_interval = options['poll_interval']
+
+        # Con un solo proceso, el worker se ejecuta en el proceso actual.
+        if processes == 1:
+            processed_chunks = run_worker(once=once, poll_interval=poll_interval)
+            self.stdout.write(self.style.SUCCESS(f"Worker finalizado ({processed_chunks} bloques procesados)."))
+            return
+
+        # Se cierran las conexiones antes de crear los procesos, para que ningun proceso hijo comparta una conexion abierta.
+        connections.close_all()
+        workers = [
+            multiprocessing.Process(target=run_worker_process, args=(once, poll_interval), name=f"enrichment-worker-{number}")
+            for number in range(processes)
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f"{processes} workers de enriquecimiento iniciados.")
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            for worker in workers:
+                worker.terminate()
+            for worker in workers:
+                worker.join()
+        self.stdout.write(self.style.SUCCESS("Workers finalizados."))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from enrichment_logic.snapshot import warm_up_enrichment_data
+import time
+
+# Comando para precargar en cache los datos pre-procesados del enriquecimiento.
+# Se recomienda ejecutarlo al desplegar, antes de que los workers reciban solicitudes.
+class Command(BaseCommand):
+    help = 'Precarga en cache los datos pre-procesados utilizados por el enriquecimiento de transacciones.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Reconstruye los datos aunque ya existan en cache.')
+
+    def handle(self, *args, **options):
+        start_time = time.perf_counter()
+        snapshot = warm_up_enrichment_data(force=options['force'])
+        duration = time.perf_counter() - start_time
+        counts = snapshot.get_counts()
+        self.stdout.write(self.style.SUCCESS(
+            f"Datos de enriquecimiento listos (version {snapshot.version}, "
+            f"{counts['keywords']} keywords, {counts['merchants']} comercios, "
+            f"{counts['categories']} categorias) en {duration:.3f}s."
+        ))
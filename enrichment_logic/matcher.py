@@ -0,0 +1,348 @@
+from bisect import bisect_right, insort
+import marshal
+import re
+
+# Expresion para separar un texto normalizado en palabras. Una palabra es una secuencia maxima de caracteres \w,
+# por lo que "\bpalabra\b" en un patron Regex equivale a que la palabra exista como token en esta separacion.
+WORD_REGEX = re.compile(r'\w+')
+
+# Esta funcion se encarga de obtener las posiciones de cada palabra dentro de una descripcion normalizada.
+# El resultado se calcula una sola vez por descripcion y se comparte entre todos los matchers.
+def get_word_positions(text_normalized):
+    word_positions = {}
+    for position, word in enumerate(WORD_REGEX.findall(text_normalized)):
+        positions = word_positions.get(word)
+        if positions is None:
+            word_positions[word] = [position]
+        else:
+            positions.append(position)
+    return word_positions
+
+
+# Matcher de multiples patrones (keywords o nombres de comercio) construido una sola vez junto a los datos pre-procesados.
+# Mantiene la semantica de get_pattern: todas las palabras del patron deben aparecer en orden (no necesariamente contiguas)
+# y, si varios patrones coinciden, gana el de mayor largo original (en empate, el que se agrego primero).
+# En lugar de evaluar cada patron contra la descripcion, se indexan los patrones por su primera palabra,
+# de modo que solo se verifican los patrones cuya primera palabra existe en la descripcion.
+class PatternMatcher:
+    def __init__(self):
+        # Clave -> (prioridad, palabras, valor).
+        self.entries = {}
+        # Primera palabra -> lista ordenada de (prioridad, clave).
+        self.first_word_index = {}
+        # Lista ordenada de (prioridad, clave, patron) para los patrones que no se pueden separar en tokens \w.
+        self.regex_entries = []
+        self.next_position = 0
+        # Palabras cuya lista de candidatos pertenece al matcher, en una copia (copy); None si todas le pertenecen.
+        self.owned_words = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    # Esta funcion se encarga de obtener una copia del matcher que se puede modificar sin afectar al original.
+    # Los indices se copian superficialmente, y la lista de candidatos de cada palabra se copia solo al modificarla.
+    def copy(self):
+        matcher = type(self)()
+        matcher.entries = dict(self.entries)
+        matcher.first_word_index = dict(self.first_word_index)
+        matcher.regex_entries = list(self.regex_entries)
+        matcher.next_position = self.next_position
+        matcher.owned_words = set()
+        return matcher
+
+    # Esta funcion se encarga de obtener la lista de candidatos de una palabra para modificarla (creandola si se indica).
+    # En una copia, la lista se comparte con el matcher original hasta que se modifica por primera vez.
+    def _get_candidates_for_update(self, word, create=False):
+        candidates = self.first_word_index.get(word)
+        if self.owned_words is not None and word not in self.owned_words:
+            self.owned_words.add(word)
+            if candidates is not None:
+                candidates = self.first_word_index[word] = list(candidates)
+        if candidates is None and create:
+            candidates = self.first_word_index[word] = []
+        return candidates
+
+    # Esta funcion se encarga de exportar el estado del matcher usando solo tipos primitivos (sin objetos Regex compilados).
+    def to_state(self):
+        regex_entries = [(rank, key, pattern.pattern, pattern.flags) for rank, key, pattern in self.regex_entries]
+        return (self.entries, self.first_word_index, regex_entries, self.next_position)
+
+    # Esta funcion se encarga de reconstruir un matcher desde su estado exportado, sin volver a indexar los patrones.
+    @classmethod
+    def from_state(cls, state):
+        matcher = cls()
+        matcher.entries, matcher.first_word_index, regex_entries, matcher.next_position = state
+        matcher.regex_entries = [(rank, key, re.compile(source, flags)) for rank, key, source, flags in regex_entries]
+        return matcher
+
+    # Esta funcion se encarga de agregar el matcher a un formato plano (LayoutWriter), que se lee con MappedPatternMatcher.
+    # Los patrones se numeran por prioridad, por lo que comparar prioridades equivale a comparar sus numeros.
+    def to_layout(self, writer):
+        keys = sorted(self.entries, key=lambda key: self.entries[key][0])
+        entry_ids = {key: entry_id for entry_id, key in enumerate(keys)}
+        writer.add_word_index({word: [entry_ids[key] for _, key in candidates] for word, candidates in self.first_word_index.items()})
+        # Palabras de cada patron, separadas por espacio.
+        writer.add_blob_table([' '.join(self.entries[key][1]).encode() for key in keys])
+        writer.add_array('i', [self.entries[key][2] for key in keys])
+        writer.add_bytes(marshal.dumps([(entry_ids[key], pattern.pattern, pattern.flags) for _, key, pattern in self.regex_entries]))
+
+    # Esta funcion se encarga de agregar un patron al matcher. La prioridad se calcula con el largo original del texto,
+    # y con la posicion de insercion para desempatar igual que el ordenamiento estable de la implementacion original.
+    def add(self, key, words, length, value, pattern=None, position=None):
+        if key in self.entries:
+            self.remove(key)
+        if position is None:
+            position = self.next_position
+        self.next_position = max(self.next_position, position + 1)
+        rank = (-length, position)
+        words = tuple(words)
+        self.entries[key] = (rank, words, value)
+
+        # Los patrones con palabras que contienen simbolos (ej: "h&m") no se pueden resolver por tokens,
+        # por lo que se mantienen como Regex para conservar exactamente la semantica de los limites \b.
+        if all(WORD_REGEX.fullmatch(word) for word in words):
+            insort(self._get_candidates_for_update(words[0], create=True), (rank, key))
+        elif pattern is not None:
+            insort(self.regex_entries, (rank, key, pattern), key=lambda entry: entry[:2])
+        else:
+            del self.entries[key]
+
+    # Esta funcion se encarga de eliminar un patron del matcher.
+    def remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        rank, words, _ = entry
+        candidates = self._get_candidates_for_update(words[0])
+        if candidates and (rank, key) in candidates:
+            candidates.remove((rank, key))
+            if not candidates:
+                del self.first_word_index[words[0]]
+        else:
+            self.regex_entries = [regex_entry for regex_entry in self.regex_entries if regex_entry[1] != key]
+
+    # Esta funcion se encarga de buscar el patron de mayor prioridad que coincide con la descripcion.
+    # Retorna el valor asociado al patron, o None si ningun patron coincide.
+    def search(self, description_normalized, word_positions):
+        best_rank = None
+        best_key = None
+
+        for word, positions in word_positions.items():
+            candidates = self.first_word_index.get(word)
+            if not candidates:
+                continue
+            for rank, key in candidates:
+                # Los candidatos estan ordenados por prioridad, por lo que no es necesario seguir revisando.
+                if best_rank is not None and rank >= best_rank:
+                    break
+                if self._words_in_order(self.entries[key][1], positions[0], word_positions):
+                    best_rank = rank
+                    best_key = key
+                    break
+
+        for rank, key, pattern in self.regex_entries:
+            if best_rank is not None and rank >= best_rank:
+                break
+            if pattern.search(description_normalized):
+                best_rank = rank
+                best_key = key
+                break
+
+        if best_key is None:
+            return None
+        return self.entries[best_key][2]
+
+    # Esta funcion se encarga de verificar que las palabras restantes del patron aparezcan en orden despues de la primera.
+    # Se utiliza la primera aparicion de cada palabra posible, lo que equivale a la busqueda no codiciosa ".*?" del Regex.
+    @staticmethod
+    def _words_in_order(words, start_position, word_positions):
+        current_position = start_position
+        for word in words[1:]:
+            positions = word_positions.get(word)
+            if not positions:
+                return False
+            index = bisect_right(positions, current_position)
+            if index == len(positions):
+                return False
+            current_position = positions[index]
+        return True
+
+
+# Version de solo lectura de PatternMatcher, que busca directamente sobre su formato plano (ej: un archivo mapeado en memoria
+# compartido por varios procesos), sin copiar los patrones. Solo los patrones Regex (con simbolos) se compilan en cada proceso.
+# Los valores deben ser enteros (ej: el indice del comercio).
+class MappedPatternMatcher:
+    __slots__ = ('first_word_index', 'entry_words', 'values', 'regex_entries')
+
+    def __init__(self, reader):
+        self.first_word_index = reader.next_word_index()
+        self.entry_words = reader.next_blob_table()
+        self.values = reader.next_array('i')
+        self.regex_entries = [(entry_id, re.compile(source, flags)) for entry_id, source, flags in marshal.loads(reader.next_bytes())]
+
+    def __len__(self):
+        return len(self.values)
+
+    # Esta funcion se encarga de buscar el patron de mayor prioridad que coincide con la descripcion, igual que PatternMatcher.
+    def search(self, description_normalized, word_positions):
+        best_id = None
+        word_offsets = self.entry_words.offsets
+        word_data = self.entry_words.data
+
+        for word, positions in word_positions.items():
+            candidates = self.first_word_index.get(word)
+            if candidates is None:
+                continue
+            for entry_id in candidates:
+                if best_id is not None and entry_id >= best_id:
+                    break
+                words = str(word_data[word_offsets[entry_id]:word_offsets[entry_id + 1]], 'utf-8').split(' ')
+                if PatternMatcher._words_in_order(words, positions[0], word_positions):
+                    best_id = entry_id
+                    break
+
+        for entry_id, pattern in self.regex_entries:
+            if best_id is not None and entry_id >= best_id:
+                break
+            if pattern.search(description_normalized):
+                best_id = entry_id
+                break
+
+        if best_id is None:
+            return None
+        return self.values[best_id]
+
+
+# Indice invertido palabra -> categorias, utilizado para la busqueda por nombre de categoria.
+# Solo se puntuan las categorias que comparten al menos una palabra con la descripcion, y se mantiene el criterio original:
+# gana la categoria con mas palabras en comun y, en empate, la que se agrego primero.
+class CategoryIndex:
+    def __init__(self):
+        # Clave -> (posicion, set de palabras, valor).
+        self.entries = {}
+        # Palabra -> lista de claves de categorias que contienen la palabra.
+        self.word_index = {}
+        self.next_position = 0
+        # Palabras cuya lista de claves pertenece al indice, en una copia (copy); None si todas le pertenecen.
+        self.owned_words = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    # Esta funcion se encarga de obtener una copia del indice que se puede modificar sin afectar al original.
+    # Los indices se copian superficialmente, y la lista de claves de cada palabra se copia solo al modificarla.
+    def copy(self):
+        index = type(self)()
+        index.entries = dict(self.entries)
+        index.word_index = dict(self.word_index)
+        index.next_position = self.next_position
+        index.owned_words = set()
+        return index
+
+    # Esta funcion se encarga de obtener la lista de claves de una palabra para modificarla (creandola si se indica).
+    # En una copia, la lista se comparte con el indice original hasta que se modifica por primera vez.
+    def _get_keys_for_update(self, word, create=False):
+        keys = self.word_index.get(word)
+        if self.owned_words is not None and word not in self.owned_words:
+            self.owned_words.add(word)
+            if keys is not None:
+                keys = self.word_index[word] = list(keys)
+        if keys is None and create:
+            keys = self.word_index[word] = []
+        return keys
+
+    # Esta funcion se encarga de exportar el estado del indice usando solo tipos primitivos.
+    def to_state(self):
+        return (self.entries, self.word_index, self.next_position)
+
+    # Esta funcion se encarga de reconstruir un indice desde su estado exportado.
+    @classmethod
+    def from_state(cls, state):
+        index = cls()
+        index.entries, index.word_index, index.next_position = state
+        return index
+
+    # Esta funcion se encarga de agregar el indice a un formato plano (LayoutWriter), que se lee con MappedCategoryIndex.
+    # Las categorias se numeran por su posicion, por lo que en un empate gana la de menor numero.
+    def to_layout(self, writer):
+        keys = sorted(self.entries, key=lambda key: self.entries[key][0])
+        entry_ids = {key: entry_id for entry_id, key in enumerate(keys)}
+        writer.add_word_index({word: [entry_ids[key] for key in keys_with_word] for word, keys_with_word in self.word_index.items()})
+        writer.add_array('i', [self.entries[key][2] for key in keys])
+
+    # Esta funcion se encarga de agregar una categoria al indice.
+    def add(self, key, words_set, value, position=None):
+        if key in self.entries:
+            self.remove(key)
+        if position is None:
+            position = self.next_position
+        self.next_position = max(self.next_position, position + 1)
+        words_set = frozenset(words_set)
+        self.entries[key] = (position, words_set, value)
+        for word in words_set:
+            self._get_keys_for_update(word, create=True).append(key)
+
+    # Esta funcion se encarga de eliminar una categoria del indice.
+    def remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        for word in entry[1]:
+            keys = self._get_keys_for_update(word)
+            if keys and key in keys:
+                keys.remove(key)
+                if not keys:
+                    del self.word_index[word]
+
+    # Esta funcion se encarga de buscar la categoria con mas palabras en comun con la descripcion.
+    # Retorna el valor asociado a la categoria, o None si ninguna comparte palabras con la descripcion.
+    def search(self, description_words_set):
+        scores = {}
+        for word in description_words_set:
+            for key in self.word_index.get(word, ()):
+                scores[key] = scores.get(key, 0) + 1
+        if not scores:
+            return None
+
+        best_key = None
+        best_score = 0
+        best_position = None
+        for key, score in scores.items():
+            position = self.entries[key][0]
+            if score > best_score or (score == best_score and position < best_position):
+                best_key = key
+                best_score = score
+                best_position = position
+        return self.entries[best_key][2]
+
+
+# Version de solo lectura de CategoryIndex, que busca directamente sobre su formato plano. Los valores deben ser enteros.
+class MappedCategoryIndex:
+    __slots__ = ('word_index', 'values')
+
+    def __init__(self, reader):
+        self.word_index = reader.next_word_index()
+        self.values = reader.next_array('i')
+
+    def __len__(self):
+        return len(self.values)
+
+    # Esta funcion se encarga de buscar la categoria con mas palabras en comun con la descripcion, igual que CategoryIndex.
+    def search(self, description_words_set):
+        scores = {}
+        for word in description_words_set:
+            entry_ids = self.word_index.get(word)
+            if entry_ids is None:
+                continue
+            for entry_id in entry_ids:
+                scores[entry_id] = scores.get(entry_id, 0) + 1
+        if not scores:
+            return None
+
+        best_id = None
+        best_score = 0
+        for entry_id, score in scores.items():
+            if score > best_score or (score == best_score and entry_id < best_id):
+                best_id = entry_id
+                best_score = score
+        return self.values[best_id]
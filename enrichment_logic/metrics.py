@@ -0,0 +1,244 @@
+from django.conf import settings
+import threading
+import bisect
+import atexit
+import json
+import glob
+import time
+import os
+
+# Constantes
+# Valores por defecto del registro de metricas (se pueden configurar en settings).
+# ENRICHMENT_METRICS_DIR: directorio compartido donde cada proceso guarda sus metricas (None solo utiliza las del proceso actual).
+# ENRICHMENT_METRICS_FLUSH_INTERVAL: segundos minimos entre escrituras del archivo de metricas de un proceso.
+DEFAULT_METRICS_DIR = None
+DEFAULT_METRICS_FLUSH_INTERVAL = 1.0
+METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# Limites de los histogramas de cantidad de transacciones y de duraciones (en segundos).
+TRANSACTION_BUCKETS = (1, 10, 100, 1000, 10000, 100000, 1000000)
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Definicion de cada metrica: (tipo, descripcion, limites del histograma o forma de agregar el gauge entre procesos).
+METRIC_DEFINITIONS = {
+    'enrichment_transactions_total': ('counter', 'Transactions enriched.', None),
+    'enrichment_matches_total': ('counter', 'Transactions enriched by the search stage that found the match (keyword, merchant, category or none).', None),
+    'enrichment_request_transactions': ('histogram', 'Transactions per enrichment request.', TRANSACTION_BUCKETS),
+    'enrichment_request_duration_seconds': ('histogram', 'Duration of enrichment requests, without response rendering.', DURATION_BUCKETS),
+    'enrichment_snapshot_builds_total': ('counter', 'Builds of the pre-processed enrichment data from the database.', None),
+    'enrichment_snapshot_build_duration_seconds': ('histogram', 'Duration of the builds of the pre-processed enrichment data.', DURATION_BUCKETS),
+    'enrichment_snapshot_file_loads_total': ('counter', 'Loads of the pre-processed enrichment data from the snapshot file, by result (miss when missing or out of date).', None),
+    'enrichment_snapshot_cache_requests_total': ('counter', 'Lookups of the pre-processed enrichment data in the shared cache, by result.', None),
+    'enrichment_snapshot_size_bytes': ('gauge', 'Size of the serialized pre-processed enrichment data.', 'max'),
+    'enrichment_local_snapshot_requests_total': ('counter', 'Lookups of the pre-processed enrichment data in the process local layer, by result.', None),
+    'enrichment_local_snapshot_reloads_total': ('counter', 'Reloads of the process local pre-processed enrichment data after a version change.', None),
+    'enrichment_shared_snapshot_loads_total': ('counter', 'Loads of the pre-processed enrichment data from the shared memory-mapped file, by result (miss when the version was not published yet).', None),
+    'enrichment_result_cache_requests_total': ('counter', 'Lookups in the match result LRU cache, by result.', None),
+    'enrichment_result_cache_evictions_total': ('counter', 'Evictions from the match result LRU cache.', None),
+    'enrichment_result_cache_size': ('gauge', 'Entries in the match result LRU cache.', 'sum'),
+    'enrichment_write_buffer_pending_rows': ('gauge', 'Rows waiting in the write-behind buffer.', 'sum'),
+    'enrichment_write_buffer_rows_total': ('counter', 'Rows processed by the write-behind buffer, by result.', None),
+    'enrichment_write_buffer_sync_fallbacks_total': ('counter', 'Writes done in the request because the write-behind buffer was full.', None),
+}
+
+
+# Esta funcion se encarga de eliminar el archivo de metricas de un proceso terminado (o de un proceso anterior con el mismo pid).
+def mark_process_dead(pid):
+    directory = getattr(settings, 'ENRICHMENT_METRICS_DIR', DEFAULT_METRICS_DIR)
+    if not directory:
+        return
+    try:
+        os.remove(os.path.join(directory, f"{pid}.json"))
+    except OSError:
+        pass
+
+
+# Registro de metricas del proceso (contadores, gauges e histogramas), actualizado por el codigo del enriquecimiento.
+# Cada proceso guarda periodicamente sus metricas en un archivo propio (<ENRICHMENT_METRICS_DIR>/<pid>.json), y el endpoint
+# /metrics suma los archivos de los procesos vivos, por lo que funciona con varios workers sin un servicio externo.
+# Los archivos de los procesos terminados se eliminan (ver mark_process_dead), por lo que al reiniciar los workers sus
+# metricas vuelven a comenzar, igual que las de un proceso de Prometheus.
+# Los colectores son funciones que entregan valores ya calculados por otros componentes (ej: contadores de las caches).
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.collectors = []
+        self.reset()
+
+    # Esta funcion se encarga de reiniciar las metricas (ej: en un proceso hijo creado con fork, que no debe repetir las del padre).
+    # Si existe un archivo de metricas de un proceso anterior con el mismo pid, se elimina.
+    def reset(self):
+        self.pid = os.getpid()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.last_flush = 0.0
+        mark_process_dead(self.pid)
+
+    # Esta funcion se encarga de incrementar un contador. Las etiquetas son una tupla de pares (nombre, valor).
+    def inc(self, name, value=1, labels=()):
+        key = (name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    # Esta funcion se encarga de asignar el valor de un gauge.
+    def set_gauge(self, name, value, labels=()):
+        with self.lock:
+            self.gauges[(name, labels)] = value
+
+    # Esta funcion se encarga de registrar un valor en un histograma.
+    def observe(self, name, value, labels=()):
+        buckets = METRIC_DEFINITIONS[name][2]
+        key = (name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * (len(buckets) + 1), 0.0, 0]
+            histogram[0][bisect.bisect_left(buckets, value)] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    # Esta funcion se encarga de registrar un colector, que retorna una lista de (tipo, nombre, etiquetas, valor).
+    def register_collector(self, collector):
+        self.collectors.append(collector)
+
+    # Esta funcion se encarga de obtener las metricas del proceso, en un formato serializable a JSON.
+    def get_state(self):
+        with self.lock:
+            counters = dict(self.counters)
+            gauges = dict(self.gauges)
+            histograms = [[name, list(labels), list(histogram[0]), histogram[1], histogram[2]] for (name, labels), histogram in self.histograms.items()]
+        for collector in self.collectors:
+            for metric_type, name, labels, value in collector():
+                (counters if metric_type == 'counter' else gauges)[(name, labels)] = value
+        return {
+            'pid': self.pid,
+            'counters': [[name, list(labels), value] for (name, labels), value in counters.items()],
+            'gauges': [[name, list(labels), value] for (name, labels), value in gauges.items()],
+            'histograms': histograms,
+        }
+
+    # Esta funcion se encarga de indicar si corresponde guardar las metricas del proceso en su archivo (hay un directorio
+    # configurado y paso el intervalo desde la ultima escritura), sin escribirlo (ej: para escribirlo fuera del event loop).
+    def flush_due(self):
+        if not getattr(settings, 'ENRICHMENT_METRICS_DIR', DEFAULT_METRICS_DIR):
+            return False
+        return time.monotonic() - self.last_flush >= getattr(settings, 'ENRICHMENT_METRICS_FLUSH_INTERVAL', DEFAULT_METRICS_FLUSH_INTERVAL)
+
+    # Esta funcion se encarga de guardar las metricas del proceso en su archivo, si paso el intervalo desde la ultima escritura.
+    # Retorna True si se guardaron.
+    def flush(self, force=False):
+        directory = getattr(settings, 'ENRICHMENT_METRICS_DIR', DEFAULT_METRICS_DIR)
+        if not directory or not (force or self.flush_due()):
+            return False
+        self.last_flush = time.monotonic()
+
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.pid}.json")
+        temporary_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temporary_path, 'w', encoding='utf-8') as metrics_file:
+            json.dump(self.get_state(), metrics_file)
+        os.replace(temporary_path, path)
+        return True
+
+metrics_registry = MetricsRegistry()
+os.register_at_fork(after_in_child=metrics_registry.reset)
+atexit.register(metrics_registry.flush, True)
+
+# Esta funcion se encarga de registrar las metricas de un lote de transacciones enriquecidas. Si se entrega la duracion,
+# el lote corresponde a una solicitud y se registra ademas en los histogramas de tamaño y duracion de las solicitudes.
+# Con flush=False solo se actualizan las metricas en memoria, y quien llama guarda el archivo (ej: la vista async, en un hilo).
+def record_enrichment(total_transactions, stage_counts, duration=None, flush=True):
+    metrics_registry.inc('enrichment_transactions_total', total_transactions)
+    for stage, count in stage_counts.items():
+        if count:
+            metrics_registry.inc('enrichment_matches_total', count, (('stage', stage or 'none'),))
+    if duration is not None:
+        metrics_registry.observe('enrichment_request_transactions', total_transactions)
+        metrics_registry.observe('enrichment_request_duration_seconds', duration)
+    if flush:
+        metrics_registry.flush()
+
+# Esta funcion se encarga de indicar si un proceso sigue en ejecucion.
+def is_process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+# Esta funcion se encarga de obtener las metricas de los procesos vivos (o solo del actual, si no hay directorio configurado).
+# Los archivos de los procesos terminados se eliminan al encontrarlos.
+def get_process_states():
+    directory = getattr(settings, 'ENRICHMENT_METRICS_DIR', DEFAULT_METRICS_DIR)
+    if not directory or not metrics_registry.flush(force=True):
+        return [metrics_registry.get_state()]
+    states = []
+    for path in glob.glob(os.path.join(directory, '*.json')):
+        pid = os.path.basename(path)[:-len('.json')]
+        if pid.isdigit() and int(pid) != os.getpid() and not is_process_alive(int(pid)):
+            mark_process_dead(int(pid))
+            continue
+        try:
+            with open(path, encoding='utf-8') as metrics_file:
+                states.append(json.load(metrics_file))
+        except (OSError, ValueError):
+            continue
+    return states
+
+# Esta funcion se encarga de sumar las metricas de varios procesos. Los contadores e histogramas se suman, y los gauges
+# se agregan segun la forma de agregar de cada uno.
+def aggregate_states(states):
+    aggregated = {}
+    for state in states:
+        for name, labels, value in state['counters']:
+            samples = aggregated.setdefault(name, {})
+            key = tuple(map(tuple, labels))
+            samples[key] = samples.get(key, 0) + value
+        for name, labels, value in state['gauges']:
+            samples = aggregated.setdefault(name, {})
+            key = tuple(map(tuple, labels))
+            previous = samples.get(key)
+            samples[key] = value if previous is None else (max(previous, value) if METRIC_DEFINITIONS[name][2] == 'max' else previous + value)
+        for name, labels, bucket_counts, total, count in state['histograms']:
+            samples = aggregated.setdefault(name, {})
+            key = tuple(map(tuple, labels))
+            previous = samples.get(key)
+            if previous is None:
+                samples[key] = [list(bucket_counts), total, count]
+            else:
+                previous[0] = [left + right for left, right in zip(previous[0], bucket_counts)]
+                previous[1] += total
+                previous[2] += count
+    return aggregated
+
+# Esta funcion se encarga de formatear las etiquetas de una muestra en el formato de texto de Prometheus.
+def format_labels(labels):
+    if not labels:
+        return ''
+    escape = lambda value: str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels) + '}'
+
+# Esta funcion se encarga de formatear un valor en el formato de texto de Prometheus.
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+# Esta funcion se encarga de generar el texto de las metricas de todos los procesos, en el formato de texto de Prometheus (0.0.4).
+def render_metrics():
+    aggregated = aggregate_states(get_process_states())
+    lines = []
+    for name, (metric_type, description, buckets) in METRIC_DEFINITIONS.items():
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for labels, value in sorted(aggregated.get(name, {}).items()):
+            if metric_type != 'histogram':
+                lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+                continue
+            bucket_counts, total, count = value
+            cumulative = 0
+            for bucket, bucket_count in zip(buckets + ('+Inf',), bucket_counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{format_labels(labels + (('le', bucket),))} {cumulative}")
+            lines.append(f"{name}_sum{format_labels(labels)} {format_value(float(total))}")
+            lines.append(f"{name}_count{format_labels(labels)} {count}")
+    return '\n'.join(lines) + '\n'
@@ -1,8 +1,39 @@
 from django.db import models
+from django.db.models import DEFERRED
 import uuid
 
+# Clase base de los modelos que recuerdan los valores de algunos campos (tracked_fields) al cargarse desde la base de datos
+# o al guardarse, para saber al guardar si cambiaron sin volver a consultarlos.
+class TrackedFieldsMixin:
+    tracked_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_tracked_fields()
+        return instance
+
+    # Esta funcion se encarga de guardar los valores actuales de los campos seguidos (DEFERRED si no se cargaron).
+    def remember_tracked_fields(self):
+        self._tracked_values = {field: self.__dict__.get(field, DEFERRED) for field in self.tracked_fields}
+
+    # Esta funcion se encarga de indicar si un campo seguido cambio desde que se cargo o guardo el objeto.
+    # Un objeto nuevo, o un campo que no se cargo, se consideran cambiados.
+    def field_changed(self, field):
+        loaded_value = getattr(self, '_tracked_values', {}).get(field, DEFERRED)
+        return self._state.adding or loaded_value is DEFERRED or loaded_value != getattr(self, field)
+
+    # Esta funcion se encarga de guardar el objeto sin escribir las columnas entregadas (ej: las copiadas de la categoria
+    # cuando no cambio la referencia, para no pisar una copia actualizada por otro proceso con el valor en memoria).
+    def save_without_columns(self, columns, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields if not field.primary_key and field.name not in columns
+            ]
+        super().save(*args, **kwargs)
+
 # Modelo de la Categoria
-class Category(models.Model):
+class Category(TrackedFieldsMixin, models.Model):
     # Tipos de movimiento (ingreso o gasto).
     MOVEMENT_TYPES = [
         ('expense', 'Expense'),
@@ -15,16 +46,31 @@ class Category(models.Model):
     # Campos de auditoria.
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Created At")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Updated At")
+    # Campos seguidos para saber si cambio el tipo al guardar.
+    tracked_fields = ('type',)
 
     def __str__(self):
         return f"{self.name} - {self.type}"
 
+    # Al cambiar el tipo de una categoria, se copia a los comercios y keywords que la referencian.
+    def save(self, *args, **kwargs):
+        type_changed = not self._state.adding and self.field_changed('type')
+        super().save(*args, **kwargs)
+        if type_changed:
+            propagate_category_columns([self])
+        self.remember_tracked_fields()
+
     class Meta:
         verbose_name = "Category"
         verbose_name_plural = "Categories"
+        # Indices del listado paginado por (created_at, id), sin filtro y filtrado por tipo.
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='category_created_idx'),
+            models.Index(fields=['type', 'created_at', 'id'], name='category_type_created_idx'),
+        ]
 
 # Modelo del Comercio
-class Merchant(models.Model):
+class Merchant(TrackedFieldsMixin, models.Model):
     # Campos principales del modelo.
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     merchant_name = models.CharField(max_length=100, unique=True, verbose_name="Merchant Name")
@@ -38,19 +84,42 @@ class Merchant(models.Model):
         related_name="merchants",
         verbose_name="Category"
     )
+    # Copia del tipo de la categoria, para filtrar el listado por tipo con un indice (sin JOIN).
+    category_type = models.CharField(max_length=10, null=True, blank=True, editable=False, verbose_name="Category Type")
     # Campos de auditoria.
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Created At")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Updated At")
+    # Campos seguidos para saber si cambio la categoria al guardar.
+    tracked_fields = ('category_id',)
 
     def __str__(self):
         return self.merchant_name
 
+    # Al crear un comercio o cambiar su categoria se copia el tipo de la categoria, y al cambiarla en un comercio existente,
+    # se copia tambien a sus keywords. Si la categoria no cambio, no se consulta ni se escribe la copia.
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        if self.field_changed('category_id'):
+            fill_category_columns([self])
+            super().save(*args, **kwargs)
+            if not adding:
+                propagate_category_columns([self])
+        else:
+            self.save_without_columns(CATEGORY_COLUMNS[Merchant], *args, **kwargs)
+        self.remember_tracked_fields()
+
     class Meta:
         verbose_name = "Merchant"
         verbose_name_plural = "Merchants"
+        # Indices del listado paginado por (created_at, id), sin filtro y filtrado por categoria o por tipo.
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='merchant_created_idx'),
+            models.Index(fields=['category', 'created_at', 'id'], name='merchant_category_created_idx'),
+            models.Index(fields=['category_type', 'created_at', 'id'], name='merchant_type_created_idx'),
+        ]
 
 # Modelo del Keyword
-class Keyword(models.Model):
+class Keyword(TrackedFieldsMixin, models.Model):
     # Campos principales del modelo.
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     keyword = models.CharField(max_length=100, unique=True, verbose_name="Keyword")
@@ -63,16 +132,103 @@ class Keyword(models.Model):
         related_name="keywords",
         verbose_name="Merchant"
     )
+    # Copias de la categoria del comercio y de su tipo, para filtrar el listado por categoria o tipo con un indice (sin JOIN).
+    category = models.ForeignKey(
+        Category,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="+",
+        editable=False,
+        db_index=False,
+        verbose_name="Category"
+    )
+    category_type = models.CharField(max_length=10, null=True, blank=True, editable=False, verbose_name="Category Type")
     # Campos de auditoria.
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Created At")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Updated At")
+    # Campos seguidos para saber si cambio el comercio al guardar.
+    tracked_fields = ('merchant_id',)
 
     def __str__(self):
         return f"{self.keyword} - {self.merchant}"
 
+    # Al crear un keyword o cambiar su comercio se copian la categoria del comercio y su tipo. Si el comercio no cambio,
+    # no se consulta ni se escribe la copia.
+    def save(self, *args, **kwargs):
+        if self.field_changed('merchant_id'):
+            fill_category_columns([self])
+            super().save(*args, **kwargs)
+        else:
+            self.save_without_columns(CATEGORY_COLUMNS[Keyword], *args, **kwargs)
+        self.remember_tracked_fields()
+
     class Meta:
         verbose_name = "Keyword"
         verbose_name_plural = "Keywords"
+        # Indices del listado paginado por (created_at, id), sin filtro y filtrado por comercio, categoria o tipo.
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='keyword_created_idx'),
+            models.Index(fields=['merchant', 'created_at', 'id'], name='keyword_merchant_created_idx'),
+            models.Index(fields=['category', 'created_at', 'id'], name='keyword_category_created_idx'),
+            models.Index(fields=['category_type', 'created_at', 'id'], name='keyword_type_created_idx'),
+        ]
+
+# Columnas copiadas de la categoria en comercios y keywords (se actualizan con fill_category_columns y
+# propagate_category_columns, tambien en las operaciones masivas que no llaman a save).
+CATEGORY_COLUMNS = {Merchant: ['category_type'], Keyword: ['category', 'category_type']}
+
+# Esta funcion se encarga de completar las columnas copiadas de la categoria en comercios o keywords sin guardar
+# (ej: antes de bulk_create o bulk_update), consultando las categorias o comercios referenciados en bloques de batch_size.
+# Los objetos que ya tienen cargada su categoria o comercio se completan desde ese objeto, sin consultar.
+def fill_category_columns(instances, batch_size=1000):
+    merchants, keywords = [], []
+    for instance in instances:
+        if isinstance(instance, Merchant):
+            if Merchant.category.is_cached(instance):
+                instance.category_type = instance.category.type if instance.category is not None else None
+            else:
+                merchants.append(instance)
+        elif isinstance(instance, Keyword):
+            if Keyword.merchant.is_cached(instance):
+                merchant = instance.merchant
+                instance.category_id, instance.category_type = (merchant.category_id, merchant.category_type) if merchant is not None else (None, None)
+            else:
+                keywords.append(instance)
+    if merchants:
+        category_ids = list({merchant.category_id for merchant in merchants} - {None})
+        types = {}
+        for start in range(0, len(category_ids), batch_size):
+            types.update(Category.objects.filter(pk__in=category_ids[start:start + batch_size]).values_list('id', 'type'))
+        for merchant in merchants:
+            merchant.category_type = types.get(merchant.category_id)
+    if keywords:
+        merchant_ids = list({keyword.merchant_id for keyword in keywords} - {None})
+        categories = {}
+        for start in range(0, len(merchant_ids), batch_size):
+            rows = Merchant.objects.filter(pk__in=merchant_ids[start:start + batch_size]).values_list('id', 'category_id', 'category_type')
+            categories.update((merchant_id, (category_id, category_type)) for merchant_id, category_id, category_type in rows)
+        for keyword in keywords:
+            keyword.category_id, keyword.category_type = categories.get(keyword.merchant_id, (None, None))
+
+# Esta funcion se encarga de copiar a los comercios y keywords existentes la categoria de los comercios o el tipo de las
+# categorias entregadas (ej: al cambiar el tipo de una categoria o la categoria de un comercio). Se agrupan por valor,
+# en un UPDATE por tipo o por categoria distinta (en bloques de batch_size).
+def propagate_category_columns(instances, batch_size=1000):
+    groups = {}
+    for instance in instances:
+        if isinstance(instance, Category):
+            groups.setdefault((Category, instance.type), []).append(instance.pk)
+        elif isinstance(instance, Merchant):
+            groups.setdefault((Merchant, instance.category_id, instance.category_type), []).append(instance.pk)
+    for key, pks in groups.items():
+        for start in range(0, len(pks), batch_size):
+            chunk = pks[start:start + batch_size]
+            if key[0] is Category:
+                Merchant.objects.filter(category_id__in=chunk).update(category_type=key[1])
+                Keyword.objects.filter(category_id__in=chunk).update(category_type=key[1])
+            else:
+                Keyword.objects.filter(merchant_id__in=chunk).update(category_id=key[1], category_type=key[2])
 
 
 # Modelo de la Transacción
@@ -106,4 +262,100 @@ class Transaction(models.Model):
 
     class Meta:
         verbose_name = "Transaction"
-        verbose_name_plural = "Transactions"
\ No newline at end of file
+        verbose_name_plural = "Transactions"
+
+# Modelo del Indice de palabras de las transacciones guardadas (palabra -> transaccion).
+# Permite encontrar las transacciones que contienen las palabras de un keyword, comercio o categoria sin recorrer toda la tabla.
+class TransactionToken(models.Model):
+    # Palabra de la descripcion normalizada.
+    token = models.CharField(max_length=100, verbose_name="Token")
+    # Llave foranea a la Transaccion.
+    transaction = models.ForeignKey(
+        Transaction,
+        on_delete=models.CASCADE,
+        related_name="tokens",
+        verbose_name="Transaction"
+    )
+
+    def __str__(self):
+        return f"{self.token} - {self.transaction_id}"
+
+    class Meta:
+        verbose_name = "Transaction Token"
+        verbose_name_plural = "Transaction Tokens"
+        constraints = [
+            models.UniqueConstraint(fields=['token', 'transaction'], name='unique_transaction_token'),
+        ]
+
+
+# Modelo del Trabajo de enriquecimiento (asincrono).
+# Las transacciones del trabajo se dividen en bloques (EnrichmentJobChunk), que se procesan por los workers.
+class EnrichmentJob(models.Model):
+    # Estados del trabajo.
+    STATUSES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    # Campos principales del modelo.
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    status = models.CharField(max_length=10, choices=STATUSES, default='pending', verbose_name="Status")
+    total_transactions = models.PositiveIntegerField(default=0, verbose_name="Total Transactions")
+    total_chunks = models.PositiveIntegerField(default=0, verbose_name="Total Chunks")
+    # Campos de avance y metricas, actualizados por los workers al terminar cada bloque.
+    processed_transactions = models.PositiveIntegerField(default=0, verbose_name="Processed Transactions")
+    categorized_count = models.PositiveIntegerField(default=0, verbose_name="Categorized Count")
+    merchant_count = models.PositiveIntegerField(default=0, verbose_name="Merchant Count")
+    error = models.TextField(blank=True, default='', verbose_name="Error")
+    # Campos de auditoria.
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Created At")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Updated At")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="Started At")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Finished At")
+
+    def __str__(self):
+        return f"{self.id} - {self.status}"
+
+    class Meta:
+        verbose_name = "Enrichment Job"
+        verbose_name_plural = "Enrichment Jobs"
+
+# Modelo del Bloque de un trabajo de enriquecimiento. Esta tabla es la cola de los workers:
+# cada worker toma un bloque pendiente, lo enriquece y guarda sus resultados (una pagina de resultados del trabajo).
+class EnrichmentJobChunk(models.Model):
+    # Campos principales del modelo.
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    # Llave foranea al Trabajo.
+    job = models.ForeignKey(
+        EnrichmentJob,
+        on_delete=models.CASCADE,
+        related_name="chunks",
+        verbose_name="Job"
+    )
+    index = models.PositiveIntegerField(verbose_name="Index")
+    status = models.CharField(max_length=10, choices=EnrichmentJob.STATUSES, default='pending', verbose_name="Status")
+    # Transacciones de entrada ya validadas, como listas [description, amount, date].
+    input_data = models.JSONField(verbose_name="Input Data")
+    # Transacciones enriquecidas del bloque.
+    results = models.JSONField(null=True, blank=True, verbose_name="Results")
+    # Campos de control de la cola.
+    worker = models.CharField(max_length=100, blank=True, default='', verbose_name="Worker")
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="Attempts")
+    locked_at = models.DateTimeField(null=True, blank=True, verbose_name="Locked At")
+    # Campos de auditoria.
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Created At")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Updated At")
+
+    def __str__(self):
+        return f"{self.job_id} - {self.index} - {self.status}"
+
+    class Meta:
+        verbose_name = "Enrichment Job Chunk"
+        verbose_name_plural = "Enrichment Job Chunks"
+        constraints = [
+            models.UniqueConstraint(fields=['job', 'index'], name='unique_enrichment_job_chunk_index'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='enrichment_chunk_queue_idx'),
+        ]
@@ -0,0 +1,90 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+
+# Constantes
+# Tamaño de pagina por defecto y maximo de los listados de reglas (se pueden configurar con ENRICHMENT_RULES_PAGE_SIZE
+# y ENRICHMENT_RULES_MAX_PAGE_SIZE). El tamaño se puede indicar en cada solicitud con ?page_size=.
+DEFAULT_RULES_PAGE_SIZE = 100
+DEFAULT_RULES_MAX_PAGE_SIZE = 1000
+# Separador de la fecha de creacion y el id en la posicion del cursor.
+CURSOR_POSITION_SEPARATOR = '|'
+
+
+# Paginacion por cursor (keyset) de los listados de categorias, comercios y keywords, ordenados por fecha de creacion e id.
+# La posicion del cursor es el par (created_at, id) del ultimo elemento, y cada pagina se obtiene con un
+# WHERE (created_at, id) > cursor sobre los indices (created_at, id), por lo que el costo de una pagina no depende de su
+# posicion en el listado (a diferencia de OFFSET), y los elementos con la misma fecha de creacion no necesitan offset.
+class RuleCursorPagination(CursorPagination):
+    ordering = ('created_at', 'id')
+    page_size_query_param = 'page_size'
+
+    # Esta funcion se encarga de obtener el tamaño de pagina, desde la solicitud (limitado al maximo) o desde settings.
+    def get_page_size(self, request):
+        self.page_size = getattr(settings, 'ENRICHMENT_RULES_PAGE_SIZE', DEFAULT_RULES_PAGE_SIZE)
+        self.max_page_size = getattr(settings, 'ENRICHMENT_RULES_MAX_PAGE_SIZE', DEFAULT_RULES_MAX_PAGE_SIZE)
+        return super().get_page_size(request)
+
+    # Esta funcion se encarga de obtener la posicion de un elemento como el par (created_at, id), unico por elemento.
+    def _get_position_from_instance(self, instance, ordering):
+        created_at, pk = (instance['created_at'], instance['id']) if isinstance(instance, dict) else (instance.created_at, instance.pk)
+        return f"{created_at.isoformat()}{CURSOR_POSITION_SEPARATOR}{pk}"
+
+    # Esta funcion se encarga de filtrar los elementos posteriores (o anteriores, en un cursor reverso) a la posicion del
+    # cursor. El filtro created_at >= fecha permite recorrer el indice desde la posicion, y el resto desempata por id.
+    def filter_position(self, queryset, position, reverse):
+        created_at, _, pk = position.partition(CURSOR_POSITION_SEPARATOR)
+        try:
+            created_at = parse_datetime(created_at)
+            if created_at is None or not pk:
+                raise ValueError
+            if reverse:
+                position_filter = Q(created_at__lte=created_at) & (Q(created_at__lt=created_at) | Q(id__lt=pk))
+            else:
+                position_filter = Q(created_at__gte=created_at) & (Q(created_at__gt=created_at) | Q(id__gt=pk))
+            return queryset.filter(position_filter)
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    # Esta funcion se encarga de obtener una pagina del listado. Sigue a CursorPagination.paginate_queryset, pero filtra
+    # por la posicion compuesta (created_at, id) en lugar de solo por created_at.
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        offset, reverse, current_position = self.cursor if self.cursor is not None else (0, False, None)
+
+        queryset = queryset.order_by(*(('-created_at', '-id') if reverse else self.ordering))
+        if current_position is not None:
+            queryset = self.filter_position(queryset, current_position, reverse)
+
+        # Se obtiene un elemento extra para saber si hay una pagina siguiente.
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_following_position = len(results) > len(self.page)
+        following_position = self._get_position_from_instance(results[-1], self.ordering) if has_following_position else None
+
+        if reverse:
+            # Un cursor reverso obtiene la pagina en orden inverso, por lo que se vuelve a invertir.
+            self.page = list(reversed(self.page))
+            self.has_next = current_position is not None or offset > 0
+            self.has_previous = has_following_position
+            self.next_position = current_position
+            self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = current_position is not None or offset > 0
+            self.next_position = following_position
+            self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
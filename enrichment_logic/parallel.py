@@ -0,0 +1,137 @@
+from concurrent.futures import ProcessPoolExecutor, CancelledError
+from concurrent.futures.process import BrokenProcessPool
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from .snapshot import get_cached_snapshot, get_shared_snapshot_dir, open_shared_snapshot, local_snapshot_cache, UNSTORED_VERSION
+import multiprocessing
+import threading
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Constantes
+# Valores por defecto del modo de busqueda en paralelo (se pueden configurar en settings).
+# ENRICHMENT_PARALLEL_THRESHOLD: cantidad minima de transacciones de una solicitud para buscar en paralelo (0 lo deshabilita).
+# ENRICHMENT_PARALLEL_WORKERS: cantidad de procesos del pool (por defecto, la cantidad de nucleos).
+# ENRICHMENT_PARALLEL_CHUNK_SIZE: cantidad de descripciones que se envian a un proceso en cada tarea.
+DEFAULT_PARALLEL_THRESHOLD = 0
+DEFAULT_PARALLEL_CHUNK_SIZE = 2000
+
+
+# Pool de procesos para la busqueda en paralelo. Se crea (con fork) una sola vez al iniciar el proceso del servidor (ver
+# start_matching_pool_on_startup), antes de que existan otros hilos, por lo que las solicitudes nunca crean procesos.
+# Los procesos heredan los datos pre-procesados cargados al crearse, y cada tarea envia la version con la que se debe buscar:
+# si cambia, cada proceso carga la nueva version por su cuenta (desde el directorio compartido o la cache, ver load_worker_snapshot).
+class MatchingProcessPool:
+    def __init__(self):
+        self.executor = None
+        self.workers = None
+        self.lock = threading.Lock()
+
+    # Esta funcion se encarga de crear el pool con la cantidad de procesos indicada (o la de settings), si aun no existe.
+    # Los procesos heredan los datos pre-procesados entregados. Se debe llamar antes de iniciar otros hilos en el proceso.
+    # Antes de crear los procesos se cierran las conexiones a la base de datos y a la cache (ej: las abiertas al precargar
+    # los datos), para que el proceso actual y los del pool nunca compartan un socket; cada uno abre las suyas al usarlas.
+    def start(self, snapshot=None, workers=None):
+        workers = workers or getattr(settings, 'ENRICHMENT_PARALLEL_WORKERS', None) or os.cpu_count() or 1
+        with self.lock:
+            if self.executor is not None and self.workers == workers:
+                return self.executor
+            self.shutdown()
+            global pool_snapshot
+            pool_snapshot = snapshot
+            connections.close_all()
+            caches.close_all()
+            self.executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'))
+            self.workers = workers
+            # Se crean los procesos inmediatamente, mientras pool_snapshot corresponde a los datos entregados.
+            # Luego el proceso actual ya no necesita mantenerlos.
+            list(self.executor.map(get_worker_version, range(workers)))
+            pool_snapshot = None
+            return self.executor
+
+    # Esta funcion se encarga de detener el pool actual.
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+        self.executor = None
+        self.workers = None
+
+matching_process_pool = MatchingProcessPool()
+# Datos pre-procesados de los procesos del pool (heredados al crearse, y luego los de la ultima version cargada).
+pool_snapshot = None
+
+# Esta funcion se encarga de obtener la version de los datos pre-procesados de un proceso del pool.
+def get_worker_version(_=None):
+    return pool_snapshot.version if pool_snapshot is not None else None
+
+# Esta funcion se encarga de cargar, dentro de un proceso del pool, una version de los datos pre-procesados: se mapea su archivo
+# del directorio compartido (si esta configurado) o se decodifican desde la cache. Si la cache ya tiene una version mas nueva,
+# se mantiene para las siguientes tareas, pero la tarea falla (el proceso que la envio busca en su lugar).
+def load_worker_snapshot(version):
+    global pool_snapshot
+    snapshot = open_shared_snapshot(version) if get_shared_snapshot_dir() else None
+    if snapshot is None:
+        snapshot = get_cached_snapshot()
+    if snapshot is not None and (pool_snapshot is None or snapshot.version > pool_snapshot.version):
+        pool_snapshot = snapshot
+    if pool_snapshot is None or pool_snapshot.version != version:
+        raise RuntimeError(f"El proceso no tiene la version {version} de los datos pre-procesados.")
+    return pool_snapshot
+
+# Esta funcion se encarga de buscar, dentro de un proceso del pool, el comercio y la categoria de un bloque de descripciones normalizadas.
+def match_chunk(version, match_keys):
+    snapshot = pool_snapshot
+    if snapshot is None or snapshot.version != version:
+        snapshot = load_worker_snapshot(version)
+    return [snapshot.match_with_stage(description_normalized, category_type) for description_normalized, category_type in match_keys]
+
+# Esta funcion se encarga de crear el pool de procesos al iniciar un worker (wsgi/asgi), si el modo en paralelo esta habilitado.
+# Se debe llamar luego de precargar los datos pre-procesados (que heredan los procesos) y antes de recibir solicitudes.
+def start_matching_pool_on_startup():
+    if not should_match_in_parallel(getattr(settings, 'ENRICHMENT_PARALLEL_THRESHOLD', DEFAULT_PARALLEL_THRESHOLD)):
+        return None
+    return matching_process_pool.start(local_snapshot_cache.snapshot)
+
+# Esta funcion se encarga de indicar si el modo de busqueda en paralelo esta disponible y aplica a la cantidad de transacciones.
+def should_match_in_parallel(total_transactions):
+    threshold = getattr(settings, 'ENRICHMENT_PARALLEL_THRESHOLD', DEFAULT_PARALLEL_THRESHOLD)
+    if not threshold or total_transactions < threshold:
+        return False
+    # Los procesos del pool heredan los datos con fork, que no esta disponible en todas las plataformas.
+    return 'fork' in multiprocessing.get_all_start_methods()
+
+# Esta funcion se encarga de realizar en el pool de procesos las busquedas pendientes de un lote de transacciones,
+# registrando los resultados en el enriquecedor. Luego, el enriquecedor arma la salida en el orden original.
+# Si el pool no fue creado o falla, las busquedas quedan pendientes y el enriquecedor las realiza en el proceso actual.
+def prefetch_matches_in_parallel(enricher, transactions, chunk_size=None):
+    executor = matching_process_pool.executor
+    # Los datos sin version (no guardados en cache) no se pueden cargar en los procesos del pool.
+    if executor is None or enricher.snapshot.version == UNSTORED_VERSION:
+        return 0
+    match_keys = enricher.get_pending_matches(transactions)
+    if not match_keys:
+        return 0
+    chunk_size = chunk_size or getattr(settings, 'ENRICHMENT_PARALLEL_CHUNK_SIZE', DEFAULT_PARALLEL_CHUNK_SIZE)
+    chunks = [match_keys[start:start + chunk_size] for start in range(0, len(match_keys), chunk_size)]
+    version = enricher.snapshot.version
+
+    try:
+        chunk_results = list(executor.map(match_chunk, [version] * len(chunks), chunks))
+    except BrokenProcessPool:
+        # No se crea otro pool desde la solicitud: las busquedas se realizan en el proceso actual hasta reiniciar el worker.
+        logger.exception("El pool de procesos del enriquecimiento fallo; se realizan las busquedas en el proceso actual")
+        with matching_process_pool.lock:
+            matching_process_pool.shutdown()
+        return 0
+    except (CancelledError, RuntimeError, OSError):
+        # Un proceso del pool no pudo cargar la version de los datos (ej: la cache ya tiene una mas nueva), o el pool se detuvo.
+        logger.warning("No fue posible buscar en el pool de procesos del enriquecimiento; se realizan las busquedas en el proceso actual", exc_info=True)
+        return 0
+
+    for chunk, results in zip(chunks, chunk_results):
+        for (description_normalized, category_type), match in zip(chunk, results):
+            enricher.set_match(description_normalized, category_type, match)
+    return len(match_keys)
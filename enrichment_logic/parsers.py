@@ -0,0 +1,35 @@
+from django.conf import settings
+from rest_framework.parsers import BaseParser
+from rest_framework.exceptions import ParseError
+import csv
+import io
+
+
+# Esta funcion se encarga de leer un texto CSV (con encabezado) como una lista de diccionarios, uno por fila.
+def parse_csv_rows(text):
+    try:
+        return list(csv.DictReader(io.StringIO(text)))
+    except csv.Error as exc:
+        raise ParseError(f'CSV parse error - {exc}')
+
+# Esta funcion se encarga de leer un archivo CSV subido (ej: multipart) como una lista de diccionarios, uno por fila.
+def parse_csv_file(upload):
+    try:
+        return parse_csv_rows(upload.read().decode('utf-8-sig'))
+    except UnicodeDecodeError as exc:
+        raise ParseError(f'CSV parse error - {exc}')
+
+
+# Parser para cuerpos CSV (text/csv), que entrega la misma lista de diccionarios que un arreglo JSON.
+# Se utiliza en las operaciones masivas de reglas, junto a la carga del archivo CSV como multipart (campo file).
+class CSVParser(BaseParser):
+    media_type = 'text/csv'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        try:
+            text = stream.read().decode(encoding)
+        except UnicodeDecodeError as exc:
+            raise ParseError(f'CSV parse error - {exc}')
+        # Se omite el BOM que agregan algunas planillas al exportar.
+        return parse_csv_rows(text.lstrip('\ufeff'))
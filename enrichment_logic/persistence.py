@@ -0,0 +1,155 @@
+from django.conf import settings
+from django.db import transaction, connections
+from .models import Transaction
+from .reenrichment import index_transactions
+from .metrics import metrics_registry
+import threading
+import atexit
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Constantes
+# Valores por defecto de la persistencia de transacciones enriquecidas (se pueden configurar en settings).
+# ENRICHMENT_PERSIST_BATCH_SIZE: filas por INSERT de bulk_create.
+# ENRICHMENT_WRITE_BEHIND_MAX_ROWS: filas maximas pendientes en el buffer asincrono; sobre ese limite se escribe en la solicitud.
+# ENRICHMENT_WRITE_BEHIND_FLUSH_INTERVAL: segundos que el buffer espera para juntar un lote completo antes de escribir.
+PERSIST_MODES = ('sync', 'async')
+DEFAULT_PERSIST_BATCH_SIZE = 1000
+DEFAULT_WRITE_BEHIND_MAX_ROWS = 100000
+DEFAULT_WRITE_BEHIND_FLUSH_INTERVAL = 1.0
+
+
+# Esta funcion se encarga de crear las filas (sin guardar) del modelo Transaction, a partir de las transacciones validadas
+# y de su resultado enriquecido (en el mismo orden).
+def build_transaction_rows(transactions, results):
+    rows = []
+    for transaction_data, result in zip(transactions, results):
+        category = result['enriched_category']
+        merchant = result['enriched_merchant']
+        rows.append(Transaction(
+            description=transaction_data['description'],
+            amount=transaction_data['amount'],
+            date=transaction_data['date'],
+            enriched_category_id=category['id'] if category else None,
+            enriched_merchant_id=merchant['id'] if merchant else None,
+        ))
+    return rows
+
+# Esta funcion se encarga de guardar las transacciones con bulk_create, en lotes de ENRICHMENT_PERSIST_BATCH_SIZE filas
+# y dentro de una sola transaccion de base de datos, junto con su indice de palabras (para el re-enriquecimiento).
+def persist_transactions(rows, batch_size=None):
+    if not rows:
+        return 0
+    batch_size = batch_size or getattr(settings, 'ENRICHMENT_PERSIST_BATCH_SIZE', DEFAULT_PERSIST_BATCH_SIZE)
+    with transaction.atomic():
+        Transaction.objects.bulk_create(rows, batch_size=batch_size)
+        index_transactions(rows, batch_size)
+    return len(rows)
+
+
+# Buffer de escritura asincrona (write-behind) de las transacciones enriquecidas, local a cada proceso.
+# Las solicitudes solo agregan las filas al buffer, y un hilo en segundo plano las guarda por lotes con persist_transactions.
+# Si el buffer esta lleno, la solicitud guarda sus filas directamente, para no acumular memoria sin limite.
+class TransactionWriteBehindBuffer:
+    def __init__(self):
+        self.rows = []
+        self.in_flight = 0
+        # Cantidad de llamadas a flush esperando; mientras sea mayor a 0 se escribe sin esperar a juntar un lote.
+        self.flushing = 0
+        self.condition = threading.Condition()
+        self.thread = None
+        self.written_rows = 0
+        self.failed_rows = 0
+        self.sync_fallbacks = 0
+
+    # Esta funcion se encarga de agregar filas al buffer. Retorna False si el buffer esta lleno y las filas se guardaron en la solicitud.
+    def add(self, rows):
+        max_rows = getattr(settings, 'ENRICHMENT_WRITE_BEHIND_MAX_ROWS', DEFAULT_WRITE_BEHIND_MAX_ROWS)
+        with self.condition:
+            if len(self.rows) + self.in_flight + len(rows) <= max_rows:
+                self.rows.extend(rows)
+                self.start()
+                self.condition.notify_all()
+                return True
+            self.sync_fallbacks += 1
+        persist_transactions(rows)
+        return False
+
+    # Esta funcion se encarga de iniciar el hilo de escritura, si no esta iniciado. Se debe llamar con el lock tomado.
+    def start(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self.run, name='enrichment-write-behind', daemon=True)
+            self.thread.start()
+
+    # Esta funcion se encarga de guardar las filas del buffer, esperando hasta juntar un lote o hasta el intervalo de escritura.
+    def run(self):
+        while True:
+            batch_size = getattr(settings, 'ENRICHMENT_PERSIST_BATCH_SIZE', DEFAULT_PERSIST_BATCH_SIZE)
+            flush_interval = getattr(settings, 'ENRICHMENT_WRITE_BEHIND_FLUSH_INTERVAL', DEFAULT_WRITE_BEHIND_FLUSH_INTERVAL)
+            with self.condition:
+                while not self.rows:
+                    self.condition.wait()
+                deadline = time.monotonic() + flush_interval
+                while self.rows and len(self.rows) < batch_size and not self.flushing and time.monotonic() < deadline:
+                    self.condition.wait(timeout=deadline - time.monotonic())
+                rows, self.rows = self.rows, []
+                self.in_flight = len(rows)
+
+            try:
+                persist_transactions(rows, batch_size)
+                written_rows, failed_rows = len(rows), 0
+            except Exception:
+                logger.exception("Error al guardar %s transacciones enriquecidas del buffer de escritura", len(rows))
+                written_rows, failed_rows = 0, len(rows)
+            finally:
+                connections.close_all()
+
+            with self.condition:
+                self.written_rows += written_rows
+                self.failed_rows += failed_rows
+                self.in_flight = 0
+                self.condition.notify_all()
+
+    # Esta funcion se encarga de esperar a que se guarden todas las filas del buffer. Retorna False si se alcanzo el timeout.
+    def flush(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            self.flushing += 1
+            self.condition.notify_all()
+            try:
+                while self.rows or self.in_flight:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self.condition.wait(timeout=remaining)
+            finally:
+                self.flushing -= 1
+        return True
+
+    # Esta funcion se encarga de obtener los contadores del buffer.
+    def get_stats(self):
+        with self.condition:
+            return {
+                'pending_rows': len(self.rows) + self.in_flight,
+                'written_rows': self.written_rows,
+                'failed_rows': self.failed_rows,
+                'sync_fallbacks': self.sync_fallbacks,
+            }
+
+transaction_write_buffer = TransactionWriteBehindBuffer()
+# Al terminar el proceso se intentan guardar las filas pendientes del buffer.
+atexit.register(transaction_write_buffer.flush, 10)
+
+# Esta funcion se encarga de entregar los contadores del buffer de escritura al registro de metricas (/metrics).
+def collect_write_buffer_metrics():
+    stats = transaction_write_buffer.get_stats()
+    return [
+        ('gauge', 'enrichment_write_buffer_pending_rows', (), stats['pending_rows']),
+        ('counter', 'enrichment_write_buffer_rows_total', (('result', 'written'),), stats['written_rows']),
+        ('counter', 'enrichment_write_buffer_rows_total', (('result', 'failed'),), stats['failed_rows']),
+        ('counter', 'enrichment_write_buffer_sync_fallbacks_total', (), stats['sync_fallbacks']),
+    ]
+
+metrics_registry.register_collector(collect_write_buffer_metrics)
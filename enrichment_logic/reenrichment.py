@@ -0,0 +1,451 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Count, Q
+from .models import Category, Merchant, Keyword, Transaction, TransactionToken
+from .matcher import WORD_REGEX
+from .snapshot import normalize_text, format_pk, get_processed_enrichment_data, STOP_WORDS
+from .enrichment import TransactionEnricher
+from functools import reduce
+import logging
+import operator
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Constantes
+# Valores por defecto del re-enriquecimiento de las transacciones guardadas (se pueden configurar en settings).
+# ENRICHMENT_REENRICH_ON_RULE_CHANGE: 'async' (en segundo plano), 'sync' (al confirmar el cambio) u 'off' (deshabilitado).
+# ENRICHMENT_REENRICH_BATCH_SIZE: transacciones que se leen y actualizan por lote.
+REENRICH_MODES = ('async', 'sync', 'off')
+DEFAULT_REENRICH_MODE = 'async'
+DEFAULT_REENRICH_BATCH_SIZE = 1000
+# ENRICHMENT_REENRICH_WORKERS: hilos que re-enriquecen en segundo plano; los cambios que superan esa cantidad esperan su turno.
+DEFAULT_REENRICH_WORKERS = 1
+# Cantidad de transacciones afectadas que se entregan como muestra en la evaluacion de una regla propuesta (por defecto y maxima).
+DEFAULT_DRY_RUN_SAMPLE_SIZE = 20
+MAX_DRY_RUN_SAMPLE_SIZE = 100
+# Cantidad maxima de candidatas que se vuelven a buscar en la evaluacion de una regla propuesta (se puede configurar con
+# ENRICHMENT_DRY_RUN_MAX_CANDIDATES). Las candidatas se cuentan en la base de datos, y solo las primeras se buscan.
+DEFAULT_DRY_RUN_MAX_CANDIDATES = 10000
+# Largo maximo de una palabra en el indice (las palabras mas largas se truncan).
+TOKEN_MAX_LENGTH = 100
+# Cantidad de grupos de palabras (keywords y comercios) sobre la que las candidatas se buscan con una lectura del indice
+# por bloque de palabras, en lugar de una consulta por grupo (ej: en operaciones masivas), y palabras por bloque.
+TOKEN_GROUP_QUERY_LIMIT = 20
+TOKEN_QUERY_BATCH_SIZE = 500
+# Campos de cada regla que afectan el enriquecimiento.
+RULE_FIELDS = {
+    Category: ('name', 'type'),
+    Merchant: ('merchant_name', 'category_id'),
+    Keyword: ('keyword', 'merchant_id'),
+}
+
+
+# Esta funcion se encarga de obtener las palabras de un texto, tal como se guardan en el indice de transacciones.
+def get_text_tokens(text):
+    return {token[:TOKEN_MAX_LENGTH] for token in WORD_REGEX.findall(normalize_text(text))}
+
+# Esta funcion se encarga de crear las filas (sin guardar) del indice de palabras de las transacciones entregadas.
+def build_transaction_tokens(transactions):
+    return [
+        TransactionToken(token=token, transaction_id=transaction_row.pk)
+        for transaction_row in transactions
+        for token in get_text_tokens(transaction_row.description)
+    ]
+
+# Esta funcion se encarga de agregar al indice las palabras de transacciones nuevas. Retorna la cantidad de filas creadas.
+def index_transactions(transactions, batch_size=None):
+    tokens = build_transaction_tokens(transactions)
+    TransactionToken.objects.bulk_create(tokens, batch_size=batch_size or getattr(settings, 'ENRICHMENT_REENRICH_BATCH_SIZE', DEFAULT_REENRICH_BATCH_SIZE))
+    return len(tokens)
+
+# Esta funcion se encarga de obtener por lotes las transacciones entregadas (por id), o todas si no se entregan ids.
+def iterate_transaction_batches(transaction_ids=None, batch_size=None, fields=('id', 'description')):
+    batch_size = batch_size or getattr(settings, 'ENRICHMENT_REENRICH_BATCH_SIZE', DEFAULT_REENRICH_BATCH_SIZE)
+    queryset = Transaction.objects.only(*fields).order_by('pk')
+    if transaction_ids is not None:
+        transaction_ids = sorted(transaction_ids)
+        for start in range(0, len(transaction_ids), batch_size):
+            yield list(queryset.filter(pk__in=transaction_ids[start:start + batch_size]))
+        return
+
+    # Se pagina por id, para que cada lote sea una consulta indexada sin OFFSET.
+    last_pk = None
+    while True:
+        batch = list((queryset if last_pk is None else queryset.filter(pk__gt=last_pk))[:batch_size])
+        if not batch:
+            return
+        yield batch
+        last_pk = batch[-1].pk
+
+# Esta funcion se encarga de reconstruir el indice de palabras de las transacciones entregadas (o de todas).
+# Retorna la cantidad de transacciones indexadas.
+def reindex_transactions(transaction_ids=None, batch_size=None):
+    indexed = 0
+    for batch in iterate_transaction_batches(transaction_ids, batch_size):
+        with transaction.atomic():
+            TransactionToken.objects.filter(transaction_id__in=[transaction_row.pk for transaction_row in batch]).delete()
+            index_transactions(batch, batch_size)
+        indexed += len(batch)
+    return indexed
+
+
+# Conjunto de transacciones que pueden verse afectadas por cambios en las reglas (keywords, comercios y categorias).
+# Se describe por palabras del indice, para no recorrer toda la tabla de transacciones:
+# - token_groups: grupos de palabras que deben estar todas en la descripcion (keywords y nombres de comercios).
+# - any_tokens: palabras de las que basta una (nombres de categorias, que coinciden por cualquier palabra).
+# - merchant_ids y category_ids: comercios y categorias cuyas transacciones ya enriquecidas se deben revisar.
+# - full: el cambio no se puede describir con palabras (ej: un keyword sin letras ni numeros), por lo que se revisan todas.
+class ReenrichmentScope:
+    def __init__(self):
+        self.token_groups = set()
+        self.any_tokens = set()
+        self.merchant_ids = set()
+        self.category_ids = set()
+        self.full = False
+        self.related_patterns_added = False
+
+    # Esta funcion se encarga de agregar un keyword o nombre de comercio, que coincide si estan todas sus palabras.
+    def add_pattern(self, text):
+        tokens = get_text_tokens(text)
+        if tokens:
+            self.token_groups.add(frozenset(tokens))
+        elif normalize_text(text):
+            self.full = True
+
+    # Esta funcion se encarga de agregar el nombre de una categoria, que coincide si esta cualquiera de sus palabras (sin stop words).
+    def add_category_name(self, name):
+        for word in normalize_text(name).split():
+            if word in STOP_WORDS:
+                continue
+            tokens = get_text_tokens(word)
+            if not tokens:
+                self.full = True
+            self.any_tokens.update(tokens)
+
+    # Esta funcion se encarga de agregar los nombres y keywords de los comercios entregados.
+    def add_merchants(self, merchant_filter):
+        for merchant_name in Merchant.objects.filter(**merchant_filter).values_list('merchant_name', flat=True):
+            self.add_pattern(merchant_name)
+        for keyword in Keyword.objects.filter(**{f'merchant__{field}': value for field, value in merchant_filter.items()}).values_list('keyword', flat=True):
+            self.add_pattern(keyword)
+
+    # Esta funcion se encarga de indicar si el conjunto esta vacio.
+    def is_empty(self):
+        return not (self.full or self.token_groups or self.any_tokens or self.merchant_ids or self.category_ids)
+
+    # Esta funcion se encarga de agregar los patrones de los comercios y keywords de los comercios y categorias con cambios de
+    # categoria o tipo, en una consulta (una sola vez).
+    def add_related_patterns(self):
+        if self.related_patterns_added:
+            return
+        self.related_patterns_added = True
+        if self.merchant_ids:
+            self.add_merchants({'pk__in': self.merchant_ids})
+        if self.category_ids:
+            self.add_merchants({'category_id__in': self.category_ids})
+
+    # Esta funcion se encarga de obtener las transacciones candidatas como una consulta sobre el indice de palabras, sin leer
+    # sus ids (ej: para contarlas o leer solo las primeras). Retorna None si hay demasiados grupos de palabras para una sola
+    # consulta, en cuyo caso se deben obtener con get_candidate_ids.
+    def get_candidate_queryset(self):
+        self.add_related_patterns()
+        if self.full:
+            return Transaction.objects.all()
+        if len(self.token_groups) > TOKEN_GROUP_QUERY_LIMIT:
+            return None
+        conditions = [
+            Q(pk__in=TransactionToken.objects.filter(token__in=token_group)
+              .values('transaction_id').annotate(token_count=Count('id')).filter(token_count=len(token_group))
+              .values('transaction_id'))
+            for token_group in self.token_groups
+        ]
+        if self.any_tokens:
+            conditions.append(Q(pk__in=TransactionToken.objects.filter(token__in=self.any_tokens).values('transaction_id')))
+        if self.merchant_ids:
+            conditions.append(Q(enriched_merchant_id__in=self.merchant_ids))
+        if self.category_ids:
+            conditions.append(Q(enriched_category_id__in=self.category_ids))
+        if not conditions:
+            return Transaction.objects.none()
+        return Transaction.objects.filter(reduce(operator.or_, conditions))
+
+    # Esta funcion se encarga de obtener los ids de las transacciones candidatas, consultando el indice de palabras.
+    # Retorna None si se deben revisar todas las transacciones.
+    def get_candidate_ids(self):
+        self.add_related_patterns()
+        if self.full:
+            return None
+        candidate_ids = set()
+        if len(self.token_groups) > TOKEN_GROUP_QUERY_LIMIT:
+            candidate_ids.update(self.get_token_group_matches())
+        else:
+            for token_group in self.token_groups:
+                # Transacciones que tienen todas las palabras del grupo (cada par palabra-transaccion es unico).
+                candidate_ids.update(
+                    TransactionToken.objects.filter(token__in=token_group)
+                    .values('transaction_id').annotate(token_count=Count('id')).filter(token_count=len(token_group))
+                    .values_list('transaction_id', flat=True)
+                )
+        if self.any_tokens:
+            candidate_ids.update(TransactionToken.objects.filter(token__in=self.any_tokens).values_list('transaction_id', flat=True).distinct())
+        if self.merchant_ids:
+            candidate_ids.update(Transaction.objects.filter(enriched_merchant_id__in=self.merchant_ids).values_list('pk', flat=True))
+        if self.category_ids:
+            candidate_ids.update(Transaction.objects.filter(enriched_category_id__in=self.category_ids).values_list('pk', flat=True))
+        return candidate_ids
+
+    # Esta funcion se encarga de obtener las transacciones que tienen todas las palabras de alguno de los grupos, leyendo
+    # del indice las palabras de todos los grupos por bloques. Cada grupo se revisa solo en las transacciones que tienen
+    # su menor palabra, por lo que el costo no depende de la cantidad de grupos.
+    def get_token_group_matches(self):
+        groups_by_token = {}
+        for token_group in self.token_groups:
+            groups_by_token.setdefault(min(token_group), []).append(token_group)
+        tokens = sorted(set().union(*self.token_groups))
+        transaction_tokens = {}
+        for start in range(0, len(tokens), TOKEN_QUERY_BATCH_SIZE):
+            rows = TransactionToken.objects.filter(token__in=tokens[start:start + TOKEN_QUERY_BATCH_SIZE]).values_list('token', 'transaction_id')
+            for token, transaction_id in rows.iterator():
+                transaction_tokens.setdefault(transaction_id, set()).add(token)
+        return {
+            transaction_id for transaction_id, found_tokens in transaction_tokens.items()
+            if any(token_group <= found_tokens for token in found_tokens for token_group in groups_by_token.get(token, ()))
+        }
+
+# Esta funcion se encarga de obtener los campos de una regla que afectan el enriquecimiento.
+def get_instance_rule_values(instance):
+    return {field: getattr(instance, field) for field in RULE_FIELDS[type(instance)]}
+
+# Esta funcion se encarga de obtener los campos de una regla que afectan el enriquecimiento, tal como estan en la base de datos.
+# Retorna None si la regla es nueva.
+def get_rule_values(instance):
+    if instance._state.adding or instance.pk is None:
+        return None
+    return type(instance).objects.filter(pk=instance.pk).values(*RULE_FIELDS[type(instance)]).first()
+
+# Esta funcion se encarga de armar el conjunto de transacciones afectadas por el cambio de una regla,
+# a partir de sus valores anteriores (None si es nueva) y actuales. Se llama con el cambio ya confirmado en la base de datos.
+# Si se entrega un conjunto (scope), el cambio se agrega a ese conjunto (ej: para varios cambios de una operacion masiva).
+def get_rule_change_scope(instance, previous_values=None, deleted=False, scope=None):
+    scope = scope if scope is not None else ReenrichmentScope()
+    model = type(instance)
+    current_values = get_instance_rule_values(instance)
+    if current_values == previous_values and not deleted:
+        return scope
+    changed = lambda field: previous_values is not None and previous_values[field] != current_values[field]
+
+    if model is Keyword:
+        scope.add_pattern(current_values['keyword'])
+        if previous_values is not None:
+            scope.add_pattern(previous_values['keyword'])
+
+    elif model is Merchant:
+        scope.add_pattern(current_values['merchant_name'])
+        if previous_values is not None:
+            scope.add_pattern(previous_values['merchant_name'])
+        # Al cambiar la categoria cambia el tipo de movimiento de sus keywords y la categoria de sus transacciones.
+        if changed('category_id'):
+            scope.merchant_ids.add(instance.pk)
+
+    elif model is Category:
+        scope.add_category_name(current_values['name'])
+        if previous_values is not None:
+            scope.add_category_name(previous_values['name'])
+        # Al cambiar el tipo, sus comercios (y keywords) pasan a coincidir con el otro tipo de movimiento.
+        if changed('type'):
+            scope.category_ids.add(instance.pk)
+    return scope
+
+# Esta funcion se encarga de obtener los ids del comercio y la categoria de un resultado de la busqueda.
+def get_match_ids(snapshot, merchant_index, category_index):
+    return (
+        snapshot.merchants[merchant_index][0] if merchant_index is not None else None,
+        snapshot.categories[category_index][0] if category_index is not None else None,
+    )
+
+# Esta funcion se encarga de volver a buscar el comercio y la categoria de las transacciones guardadas entregadas (o de todas),
+# con los datos pre-procesados actuales, actualizando con bulk_update solo las que cambiaron.
+# Retorna un diccionario con la cantidad de transacciones revisadas y actualizadas.
+def reenrich_transactions(transaction_ids=None, batch_size=None):
+    snapshot = get_processed_enrichment_data()
+    enricher = TransactionEnricher(snapshot)
+    candidates = 0
+    updated = 0
+    fields = ('id', 'description', 'amount', 'enriched_category', 'enriched_merchant')
+    for batch in iterate_transaction_batches(transaction_ids, batch_size, fields):
+        changed_rows = []
+        for transaction_row in batch:
+            candidates += 1
+            # Sin monto no se conoce el tipo de movimiento, por lo que no se puede enriquecer.
+            if transaction_row.amount is None:
+                continue
+            category_type = 'income' if transaction_row.amount >= 0 else 'expense'
+            merchant_index, category_index, _ = enricher.match(transaction_row.description, category_type)
+            merchant_id, category_id = get_match_ids(snapshot, merchant_index, category_index)
+            if merchant_id != format_pk(transaction_row.enriched_merchant_id) or category_id != format_pk(transaction_row.enriched_category_id):
+                transaction_row.enriched_merchant_id = merchant_id
+                transaction_row.enriched_category_id = category_id
+                changed_rows.append(transaction_row)
+        if changed_rows:
+            Transaction.objects.bulk_update(changed_rows, ['enriched_category', 'enriched_merchant'])
+            updated += len(changed_rows)
+        enricher.reset_batch()
+    return {'candidates': candidates, 'updated': updated}
+
+# Executor acotado del re-enriquecimiento en segundo plano: un pool de ENRICHMENT_REENRICH_WORKERS hilos, creado al utilizarse
+# por primera vez. Los cambios de reglas se encolan en el pool, por lo que una rafaga de cambios no crea un hilo por cambio;
+# con un solo hilo (por defecto) ademas se procesan en orden, y cada uno con los datos pre-procesados vigentes al ejecutarse.
+class ReenrichmentExecutor:
+    def __init__(self):
+        self.executor = None
+        self.lock = threading.Lock()
+
+    # Esta funcion se encarga de encolar una funcion en el executor, creandolo si no existe. Las conexiones a la base de datos
+    # del hilo se cierran al terminar cada funcion.
+    def submit(self, function):
+        def run():
+            try:
+                return function()
+            finally:
+                connections.close_all()
+
+        with self.lock:
+            if self.executor is None:
+                workers = getattr(settings, 'ENRICHMENT_REENRICH_WORKERS', DEFAULT_REENRICH_WORKERS)
+                self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='enrichment-reenrich')
+            return self.executor.submit(run)
+
+    # Esta funcion se encarga de detener el executor actual, esperando (opcionalmente) los cambios encolados.
+    def shutdown(self, wait=False):
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=wait)
+            self.executor = None
+
+reenrichment_executor = ReenrichmentExecutor()
+
+# Esta funcion se encarga de re-enriquecer las transacciones afectadas por el cambio de una regla, ya confirmado.
+def reenrich_rule_change(instance, previous_values=None, deleted=False):
+    return reenrich_rule_changes([(instance, previous_values, deleted)])
+
+# Esta funcion se encarga de re-enriquecer las transacciones afectadas por uno o varios cambios de reglas, ya confirmados.
+# Cada cambio es una tupla (regla, valores anteriores, eliminada). El conjunto de transacciones afectadas se arma en el momento
+# (sin consultas), y las candidatas de todos los cambios se obtienen juntas del indice de palabras junto a la busqueda y
+# actualizacion: en el executor del re-enriquecimiento o en el momento, segun ENRICHMENT_REENRICH_ON_RULE_CHANGE.
+# En modo 'async' retorna el Future del re-enriquecimiento encolado.
+def reenrich_rule_changes(changes):
+    mode = getattr(settings, 'ENRICHMENT_REENRICH_ON_RULE_CHANGE', DEFAULT_REENRICH_MODE)
+    if mode == 'off' or not changes:
+        return None
+    scope = ReenrichmentScope()
+    for instance, previous_values, deleted in changes:
+        get_rule_change_scope(instance, previous_values, deleted, scope)
+    if scope.is_empty():
+        return None
+    if len(changes) == 1:
+        description = f"{type(changes[0][0]).__name__} {changes[0][0].pk}"
+    else:
+        description = f"{len(changes)} reglas"
+
+    def run():
+        try:
+            transaction_ids = scope.get_candidate_ids()
+            if transaction_ids is not None and not transaction_ids:
+                return {'candidates': 0, 'updated': 0}
+            result = reenrich_transactions(transaction_ids)
+            logger.info("Re-enriquecimiento por cambio en %s: %s transacciones revisadas, %s actualizadas",
+                description, result['candidates'], result['updated'])
+            return result
+        except Exception:
+            logger.exception("Error al re-enriquecer las transacciones afectadas por el cambio en %s", description)
+
+    if mode == 'sync':
+        return run()
+    return reenrichment_executor.submit(run)
+
+# Esta funcion se encarga de obtener el comercio y la categoria (id y nombre) de un resultado de la busqueda.
+def get_match_summary(snapshot, merchant_index, category_index):
+    merchant = snapshot.merchants[merchant_index] if merchant_index is not None else None
+    category = snapshot.categories[category_index] if category_index is not None else None
+    return {
+        'merchant': {'id': merchant[0], 'merchant_name': merchant[1]} if merchant is not None else None,
+        'category': {'id': category[0], 'name': category[1]} if category is not None else None,
+    }
+
+# Esta funcion se encarga de evaluar una regla propuesta (keyword, comercio o categoria, nueva o modificada y sin guardar)
+# sobre las transacciones guardadas, sin modificarlas. Las candidatas se cuentan en la base de datos con el indice de palabras,
+# y solo las primeras max_candidates (por id) se buscan con los datos pre-procesados actuales y con una copia a la que se le
+# aplica la regla propuesta, por lo que el costo de la busqueda no depende de la cantidad de transacciones guardadas.
+# Retorna la cantidad de candidatas y de candidatas revisadas (complete indica si se revisaron todas), y de las revisadas:
+# cuantas cambian, cuantas captura la regla (sin comercio o categoria antes), cuantas le quita a otro comercio o categoria,
+# cuantas deja de tener, y una muestra de las transacciones afectadas.
+def evaluate_rule_change(instance, previous_values=None, sample_size=DEFAULT_DRY_RUN_SAMPLE_SIZE, max_candidates=None):
+    start_time = time.perf_counter()
+    max_candidates = max_candidates if max_candidates is not None else getattr(settings, 'ENRICHMENT_DRY_RUN_MAX_CANDIDATES', DEFAULT_DRY_RUN_MAX_CANDIDATES)
+    current_snapshot = get_processed_enrichment_data()
+    scope = get_rule_change_scope(instance, previous_values)
+    queryset = Transaction.objects.none() if scope.is_empty() else scope.get_candidate_queryset()
+    if queryset is not None:
+        candidates = queryset.count()
+        transaction_ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:max_candidates]) if candidates else []
+    else:
+        candidate_ids = scope.get_candidate_ids()
+        candidates = len(candidate_ids)
+        transaction_ids = sorted(candidate_ids)[:max_candidates]
+
+    # Los datos pre-procesados se comparten entre solicitudes, por lo que la regla se aplica sobre una copia de las partes que modifica.
+    proposed_snapshot = current_snapshot.copy_for_change(instance)
+    proposed_snapshot.apply_instance_change(instance)
+    enricher = TransactionEnricher(current_snapshot)
+    proposed_matches = {}
+
+    # Se compara el comercio o la categoria, segun el tipo de regla, contra el id de la regla evaluada.
+    if isinstance(instance, Category):
+        target_id, target_position = format_pk(instance.pk), 1
+    else:
+        target_id, target_position = format_pk(instance.merchant_id if isinstance(instance, Keyword) else instance.pk), 0
+
+    result = {
+        'candidates': candidates, 'evaluated': len(transaction_ids), 'complete': len(transaction_ids) == candidates,
+        'affected': 0, 'captured': 0, 'stolen': 0, 'released': 0, 'sample': [],
+    }
+    fields = ('id', 'description', 'amount', 'date')
+    for batch in iterate_transaction_batches(transaction_ids, fields=fields) if transaction_ids else []:
+        for transaction_row in batch:
+            if transaction_row.amount is None:
+                continue
+            category_type = 'income' if transaction_row.amount >= 0 else 'expense'
+            current_match = enricher.match(transaction_row.description, category_type)[:2]
+            match_key = (enricher.normalized_descriptions[transaction_row.description], category_type)
+            proposed_match = proposed_matches.get(match_key)
+            if proposed_match is None:
+                proposed_match = proposed_matches[match_key] = proposed_snapshot.match(*match_key)
+
+            current_ids = get_match_ids(current_snapshot, *current_match)
+            proposed_ids = get_match_ids(proposed_snapshot, *proposed_match)
+            if current_ids == proposed_ids:
+                continue
+            result['affected'] += 1
+            current_id, proposed_id = current_ids[target_position], proposed_ids[target_position]
+            if target_id is not None and proposed_id == target_id and current_id != target_id:
+                result['captured' if current_id is None else 'stolen'] += 1
+            elif target_id is not None and current_id == target_id and proposed_id != target_id:
+                result['released'] += 1
+
+            if len(result['sample']) < sample_size:
+                result['sample'].append({
+                    'id': str(transaction_row.pk),
+                    'description': transaction_row.description,
+                    'amount': str(transaction_row.amount),
+                    'date': transaction_row.date.isoformat() if transaction_row.date else None,
+                    'current': get_match_summary(current_snapshot, *current_match),
+                    'proposed': get_match_summary(proposed_snapshot, *proposed_match),
+                })
+        enricher.reset_batch()
+        proposed_matches.clear()
+
+    result['duration_ms'] = round((time.perf_counter() - start_time) * 1000, 3)
+    return result
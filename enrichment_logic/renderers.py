@@ -0,0 +1,72 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.json import dumps
+from rest_framework.compat import SHORT_SEPARATORS, LONG_SEPARATORS
+from json.encoder import encode_basestring, encode_basestring_ascii
+
+# Representacion (diccionario) de una categoria o comercio, junto a su JSON ya renderizado.
+# Al ser un diccionario, cualquier renderer la puede utilizar; EnrichmentJSONRenderer utiliza directamente el JSON renderizado.
+class RenderedPayload(dict):
+    __slots__ = ('fragment',)
+
+    def __init__(self, data, fragment):
+        super().__init__(data)
+        self.fragment = fragment
+
+# Esta funcion se encarga de renderizar un valor a JSON (texto), con las mismas opciones que JSONRenderer.
+def render_fragment(data):
+    return dumps(
+        data, cls=JSONRenderer.encoder_class, ensure_ascii=JSONRenderer.ensure_ascii,
+        allow_nan=not JSONRenderer.strict, separators=SHORT_SEPARATORS if JSONRenderer.compact else LONG_SEPARATORS,
+    )
+
+
+# Renderer JSON para la respuesta del enriquecimiento. Arma la lista de transacciones reutilizando el JSON ya renderizado
+# de cada categoria y comercio, en lugar de volver a codificarlos por cada transaccion.
+# El resultado es identico, byte a byte, al de JSONRenderer. Para respuestas con indentacion, o sin lista de transacciones,
+# se utiliza el renderizado de JSONRenderer.
+class EnrichmentJSONRenderer(JSONRenderer):
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not isinstance(data, dict) or not isinstance(data.get('transactions'), list):
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        item_separator, key_separator = SHORT_SEPARATORS if self.compact else LONG_SEPARATORS
+        encode_string = encode_basestring_ascii if self.ensure_ascii else encode_basestring
+        parts = []
+        for key, value in data.items():
+            if key == 'transactions':
+                rendered_value = '[' + item_separator.join(self.render_transaction(transaction) for transaction in value) + ']'
+            else:
+                rendered_value = self.render_value(value)
+            parts.append(encode_string(key) + key_separator + rendered_value)
+
+        ret = '{' + item_separator.join(parts) + '}'
+        # Igual que JSONRenderer, se escapan completamente \u2028 y \u2029.
+        return self.escape_line_separators(ret).encode()
+
+    # Esta funcion se encarga de renderizar una transaccion enriquecida (sin escapar \u2028 y \u2029).
+    def render_transaction(self, transaction):
+        item_separator, key_separator = SHORT_SEPARATORS if self.compact else LONG_SEPARATORS
+        encode_string = encode_basestring_ascii if self.ensure_ascii else encode_basestring
+        fields = item_separator.join(encode_string(field) + key_separator + self.render_value(value) for field, value in transaction.items())
+        return '{' + fields + '}'
+
+    # Esta funcion se encarga de renderizar un valor de la transaccion, utilizando el JSON ya renderizado si existe.
+    def render_value(self, value):
+        if isinstance(value, str):
+            return (encode_basestring_ascii if self.ensure_ascii else encode_basestring)(value)
+        if isinstance(value, RenderedPayload):
+            return value.fragment
+        if value is None:
+            return 'null'
+        return dumps(
+            value, cls=self.encoder_class, ensure_ascii=self.ensure_ascii, allow_nan=not self.strict,
+            separators=SHORT_SEPARATORS if self.compact else LONG_SEPARATORS,
+        )
+
+    # Esta funcion se encarga de escapar \u2028 y \u2029, que son validos en JSON pero no en Javascript.
+    @staticmethod
+    def escape_line_separators(text):
+        return text.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029')
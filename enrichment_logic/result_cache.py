@@ -0,0 +1,92 @@
+from collections import OrderedDict
+from django.conf import settings
+from .metrics import metrics_registry
+import threading
+
+# Constantes
+# Cantidad de resultados por defecto de la cache de resultados (se puede configurar con ENRICHMENT_RESULT_CACHE_SIZE).
+DEFAULT_RESULT_CACHE_SIZE = 10000
+
+
+# Cache LRU (local a cada proceso) de los resultados de la busqueda del enriquecimiento.
+# La clave es (version de los datos pre-procesados, descripcion normalizada, tipo de movimiento) y el valor es la tupla
+# (indice comercio, indice categoria, etapa) entregada por EnrichmentSnapshot.match_with_stage. Los indices de las filas solo son
+# validos para su version, por lo que la version es parte de la clave: un cambio de version no vacia la cache (las solicitudes
+# que aun usan la version anterior siguen encontrando sus resultados), y los resultados de versiones antiguas, que ya no se
+# consultan, salen de la cache por el LRU. Los resultados de datos sin version (no guardados en cache) no se guardan.
+class MatchResultCache:
+    def __init__(self, max_size=None):
+        self._max_size = max_size
+        self.results = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # Cantidad maxima de resultados; si no se indico al crear la cache, se obtiene desde settings.
+    @property
+    def max_size(self):
+        if self._max_size is not None:
+            return self._max_size
+        return getattr(settings, 'ENRICHMENT_RESULT_CACHE_SIZE', DEFAULT_RESULT_CACHE_SIZE)
+
+    # Esta funcion se encarga de obtener el resultado de una descripcion, o None si no esta en cache.
+    def get(self, version, description_normalized, category_type):
+        if version is None:
+            return None
+        key = (version, description_normalized, category_type)
+        with self.lock:
+            result = self.results.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self.results.move_to_end(key)
+            self.hits += 1
+            return result
+
+    # Esta funcion se encarga de guardar el resultado de una descripcion, eliminando los resultados usados hace mas tiempo
+    # si se supera el tamaño maximo.
+    def set(self, version, description_normalized, category_type, result):
+        max_size = self.max_size
+        if max_size <= 0 or version is None:
+            return
+        key = (version, description_normalized, category_type)
+        with self.lock:
+            self.results[key] = result
+            self.results.move_to_end(key)
+            while len(self.results) > max_size:
+                self.results.popitem(last=False)
+                self.evictions += 1
+
+    # Esta funcion se encarga de obtener los contadores de la cache, incluyendo la tasa de aciertos (hit ratio).
+    def get_stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self.results),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0,
+                'evictions': self.evictions,
+            }
+
+    # Esta funcion se encarga de vaciar la cache y reiniciar los contadores.
+    def clear(self):
+        with self.lock:
+            self.results.clear()
+            self.hits = self.misses = self.evictions = 0
+
+match_result_cache = MatchResultCache()
+
+# Esta funcion se encarga de entregar los contadores de la cache de resultados al registro de metricas (/metrics).
+def collect_result_cache_metrics():
+    stats = match_result_cache.get_stats()
+    return [
+        ('counter', 'enrichment_result_cache_requests_total', (('result', 'hit'),), stats['hits']),
+        ('counter', 'enrichment_result_cache_requests_total', (('result', 'miss'),), stats['misses']),
+        ('counter', 'enrichment_result_cache_evictions_total', (), stats['evictions']),
+        ('gauge', 'enrichment_result_cache_size', (), stats['size']),
+    ]
+
+metrics_registry.register_collector(collect_result_cache_metrics)
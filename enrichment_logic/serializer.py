@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Category, Merchant, Keyword
+from .models import Category, Merchant, Keyword, EnrichmentJob
 
 # Serializer para la categoria.
 class CategorySerializer(serializers.ModelSerializer):
@@ -28,15 +28,108 @@ class InputTransactionSerializer(serializers.Serializer):
     amount = serializers.DecimalField(required=True, max_digits=10, decimal_places=2)
     date = serializers.DateField(required=True)
 
+# Serializer para el comercio de la transaccion enriquecida. Entrega los mismos campos que MerchantSerializer,
+# pero a partir de la representacion del comercio almacenada en los datos pre-procesados del enriquecimiento.
+class EnrichedMerchantSerializer(serializers.Serializer):
+    id = serializers.UUIDField(read_only=True)
+    merchant_name = serializers.CharField(read_only=True)
+    merchant_logo = serializers.URLField(read_only=True, allow_null=True)
+    category = serializers.UUIDField(read_only=True, allow_null=True)
+    created_at = serializers.DateTimeField(read_only=True)
+    updated_at = serializers.DateTimeField(read_only=True)
+
 # Serializer para la transaccion enriquecida (salida).
 class OutputTransactionSerializer(serializers.Serializer):
     description = serializers.CharField(read_only=True)
     amount = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
     date = serializers.DateField(read_only=True)
     enriched_category = CategorySerializer(read_only=True, allow_null=True)
-    enriched_merchant = MerchantSerializer(read_only=True, allow_null=True)
+    enriched_merchant = EnrichedMerchantSerializer(read_only=True, allow_null=True)
+
+# Esta funcion se encarga de calcular las metricas de la respuesta del enriquecimiento a partir de los contadores de transacciones.
+def get_enrichment_metrics(total_transactions, categorized_match_count, merchant_match_count):
+    categorization_rate = (categorized_match_count / total_transactions * 100) if total_transactions > 0 else 0
+    merchant_identification_rate = (merchant_match_count / total_transactions * 100) if total_transactions > 0 else 0
+    return {
+        "total_transactions": total_transactions,
+        "categorization_rate": round(categorization_rate, 2),
+        "merchant_identification_rate": round(merchant_identification_rate, 2),
+    }
 
 # Serializer para conformar la respuesta de la api de enriquecimiento.
 class EnrichmentResponseSerializer(serializers.Serializer):
     transactions = OutputTransactionSerializer(many=True, read_only=True)
     metrics = serializers.DictField(read_only=True)
+
+# Serializer para el estado de un trabajo de enriquecimiento asincrono.
+# Las metricas se calculan con las transacciones procesadas hasta el momento.
+class EnrichmentJobSerializer(serializers.ModelSerializer):
+    progress = serializers.SerializerMethodField()
+    metrics = serializers.SerializerMethodField()
+
+    class Meta:
+        model = EnrichmentJob
+        fields = (
+            'id', 'status', 'total_transactions', 'processed_transactions', 'progress', 'total_chunks', 'metrics',
+            'error', 'created_at', 'updated_at', 'started_at', 'finished_at',
+        )
+        read_only_fields = fields
+
+    def get_progress(self, obj) -> float:
+        if obj.total_transactions == 0:
+            return 100.0
+        return round(obj.processed_transactions / obj.total_transactions * 100, 2)
+
+    def get_metrics(self, obj) -> dict:
+        return get_enrichment_metrics(obj.processed_transactions, obj.categorized_count, obj.merchant_count)
+
+# Serializer para una pagina de resultados de un trabajo de enriquecimiento asincrono.
+class EnrichmentJobResultsSerializer(serializers.Serializer):
+    job = serializers.UUIDField(read_only=True)
+    page = serializers.IntegerField(read_only=True)
+    total_pages = serializers.IntegerField(read_only=True)
+    next = serializers.CharField(read_only=True, allow_null=True)
+    transactions = OutputTransactionSerializer(many=True, read_only=True)
+
+# Serializer para el comercio y la categoria de una transaccion en la evaluacion de una regla propuesta.
+class RuleDryRunMatchSerializer(serializers.Serializer):
+    merchant = serializers.DictField(read_only=True, allow_null=True)
+    category = serializers.DictField(read_only=True, allow_null=True)
+
+# Serializer para una transaccion afectada por una regla propuesta, con su enriquecimiento actual y el propuesto.
+class RuleDryRunSampleSerializer(serializers.Serializer):
+    id = serializers.UUIDField(read_only=True)
+    description = serializers.CharField(read_only=True)
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    date = serializers.DateField(read_only=True, allow_null=True)
+    current = RuleDryRunMatchSerializer(read_only=True)
+    proposed = RuleDryRunMatchSerializer(read_only=True)
+
+# Serializer para la respuesta de la evaluacion (dry-run) de una regla propuesta sobre las transacciones guardadas.
+# Los conteos de transacciones afectadas corresponden a las candidatas revisadas (evaluated), que son todas si complete es true.
+class RuleDryRunSerializer(serializers.Serializer):
+    candidates = serializers.IntegerField(read_only=True)
+    evaluated = serializers.IntegerField(read_only=True)
+    complete = serializers.BooleanField(read_only=True)
+    affected = serializers.IntegerField(read_only=True)
+    captured = serializers.IntegerField(read_only=True)
+    stolen = serializers.IntegerField(read_only=True)
+    released = serializers.IntegerField(read_only=True)
+    sample = RuleDryRunSampleSerializer(many=True, read_only=True)
+    duration_ms = serializers.FloatField(read_only=True)
+
+# Serializer para los tiempos de una operacion masiva de reglas (en milisegundos) y su velocidad (filas por segundo).
+# snapshot_refresh_ms es null si la reconstruccion de los datos pre-procesados no se realizo durante la solicitud.
+class RuleBulkMetricsSerializer(serializers.Serializer):
+    validation_ms = serializers.FloatField(read_only=True)
+    write_ms = serializers.FloatField(read_only=True)
+    snapshot_refresh_ms = serializers.FloatField(read_only=True, allow_null=True)
+    duration_ms = serializers.FloatField(read_only=True)
+    rows_per_second = serializers.FloatField(read_only=True)
+
+# Serializer para la respuesta de una operacion masiva de reglas (create, update o delete).
+class RuleBulkSerializer(serializers.Serializer):
+    operation = serializers.ChoiceField(choices=('create', 'update', 'delete'), read_only=True)
+    total_rows = serializers.IntegerField(read_only=True)
+    ids = serializers.ListField(child=serializers.UUIDField(), read_only=True)
+    metrics = RuleBulkMetricsSerializer(read_only=True)
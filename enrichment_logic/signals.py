@@ -0,0 +1,106 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .models import Category, Merchant, Keyword, Transaction
+from .snapshot import detach_instance, update_processed_enrichment_data_changes
+from .reenrichment import get_rule_values, reenrich_rule_changes, reindex_transactions, DEFAULT_REENRICH_MODE
+from contextlib import contextmanager
+import threading
+
+# Estado de cada hilo, para omitir las senales de las reglas durante las operaciones masivas (ver bulk.py), que actualizan
+# los datos pre-procesados y re-enriquecen las transacciones una sola vez al terminar, en lugar de una vez por regla.
+# Tambien guarda los cambios pendientes de la transaccion actual (ver RuleChangeBatch).
+signal_state = threading.local()
+
+# Esta funcion se encarga de omitir las senales de Category, Merchant y Keyword del hilo actual dentro del bloque.
+@contextmanager
+def suppress_rule_signals():
+    previous = getattr(signal_state, 'suppressed', False)
+    signal_state.suppressed = True
+    try:
+        yield
+    finally:
+        signal_state.suppressed = previous
+
+# Esta funcion se encarga de indicar si las senales de las reglas estan omitidas en el hilo actual.
+def rule_signals_suppressed():
+    return getattr(signal_state, 'suppressed', False)
+
+# Cambios de reglas de una transaccion, que se aplican juntos al confirmarla: una sola actualizacion de los datos pre-procesados
+# en cache y un solo re-enriquecimiento (ej: al eliminar un comercio, con sus keywords en cascada). Se agrupan los cambios del
+# mismo nivel de savepoints, por lo que revertir un savepoint descarta sus cambios junto al callback que los aplica.
+class RuleChangeBatch:
+    def __init__(self, connection):
+        self.changes = []
+        self.savepoint_ids = set(connection.savepoint_ids)
+        transaction.on_commit(self.apply)
+
+    # Esta funcion se encarga de indicar si los cambios de la senal actual se pueden agregar a este grupo: el callback que aplica
+    # los cambios sigue registrado en la transaccion, con los mismos savepoints.
+    def accepts(self, connection):
+        if self.savepoint_ids != set(connection.savepoint_ids):
+            return False
+        return any(func == self.apply for _, func, _ in connection.run_on_commit)
+
+    # Esta funcion se encarga de aplicar los cambios confirmados sobre los datos pre-procesados y re-enriquecer las transacciones.
+    def apply(self):
+        if getattr(signal_state, 'batch', None) is self:
+            signal_state.batch = None
+        changes, self.changes = self.changes, []
+        apply_rule_changes(changes)
+
+# Esta funcion se encarga de aplicar cambios de reglas ya confirmados, como tuplas (regla, valores anteriores, eliminada).
+def apply_rule_changes(changes):
+    if not changes:
+        return
+    update_processed_enrichment_data_changes([(instance, deleted) for instance, _, deleted in changes])
+    reenrich_rule_changes(changes)
+
+# Esta funcion se encarga de programar la actualizacion incremental de los datos pre-procesados una vez confirmada la transaccion,
+# y luego el re-enriquecimiento de las transacciones guardadas que pueden verse afectadas por el cambio. Fuera de una transaccion
+# el cambio se aplica en el momento; dentro, se agrupa con los demas cambios de la transaccion (ver RuleChangeBatch).
+# Se guarda una copia del objeto en el momento de la senal, ya que al eliminar un objeto Django limpia su id despues de enviarla.
+def schedule_enrichment_data_update(instance, deleted=False):
+    change = (detach_instance(instance), getattr(instance, '_enrichment_previous_values', None), deleted)
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        apply_rule_changes([change])
+        return
+    batch = getattr(signal_state, 'batch', None)
+    if batch is None or not batch.accepts(connection):
+        batch = signal_state.batch = RuleChangeBatch(connection)
+    batch.changes.append(change)
+
+# Senales previas al guardado de Category, Merchant y Keyword.
+# Se guardan los valores anteriores de la regla, para saber que transacciones guardadas pueden cambiar.
+@receiver(pre_save, sender=Category)
+@receiver(pre_save, sender=Merchant)
+@receiver(pre_save, sender=Keyword)
+def enrichment_rule_saving(sender, instance, raw=False, **kwargs):
+    if raw or rule_signals_suppressed() or getattr(settings, 'ENRICHMENT_REENRICH_ON_RULE_CHANGE', DEFAULT_REENRICH_MODE) == 'off': return
+    instance._enrichment_previous_values = get_rule_values(instance)
+
+# Senales de guardado de Category, Merchant y Keyword.
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Merchant)
+@receiver(post_save, sender=Keyword)
+def enrichment_rule_saved(sender, instance, raw=False, **kwargs):
+    # Se omiten los objetos cargados desde fixtures y los de operaciones masivas.
+    if raw or rule_signals_suppressed(): return
+    schedule_enrichment_data_update(instance)
+
+# Senales de eliminacion de Category, Merchant y Keyword.
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Merchant)
+@receiver(post_delete, sender=Keyword)
+def enrichment_rule_deleted(sender, instance, **kwargs):
+    if rule_signals_suppressed(): return
+    schedule_enrichment_data_update(instance, deleted=True)
+
+# Senal de guardado de Transaction (ej: desde el admin), que mantiene actualizado su indice de palabras.
+# Las transacciones guardadas con bulk_create se indexan en persist_transactions.
+@receiver(post_save, sender=Transaction)
+def transaction_saved(sender, instance, raw=False, **kwargs):
+    if raw: return
+    reindex_transactions([instance.pk])
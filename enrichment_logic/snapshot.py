@@ -0,0 +1,1034 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, DatabaseError
+from django.db.models import Count, Max
+from rest_framework import serializers
+from asgiref.sync import sync_to_async
+from .models import Category, Merchant, Keyword
+from .matcher import PatternMatcher, CategoryIndex, MappedPatternMatcher, MappedCategoryIndex, get_word_positions
+from .layout import LayoutWriter, LayoutReader, MarshalTable, TextTable
+from .renderers import RenderedPayload, render_fragment
+from .metrics import metrics_registry
+import threading
+import asyncio
+import logging
+import glob
+import marshal
+import struct
+import mmap
+import os
+import time
+import re
+
+logger = logging.getLogger(__name__)
+
+# Constantes
+STOP_WORDS = frozenset({'y','and','the', 'e', 'o', 'u', 'de', 'del', 'la', 'lo', 'las', 'los', 'en', 'el', 'para', 'por', 'con', 'a', '&'})
+MOVEMENT_TYPES = ('income', 'expense')
+# Etapas de la busqueda en las que se puede encontrar el comercio o la categoria de una transaccion.
+MATCH_STAGE_KEYWORD = 'keyword'
+MATCH_STAGE_MERCHANT = 'merchant'
+MATCH_STAGE_CATEGORY = 'category'
+CACHE_KEY = 'enrichment_data_processed_v4'
+CACHE_VERSION_KEY = 'enrichment_data_version'
+CACHE_UPDATE_LOCK_KEY = 'enrichment_data_update_lock'
+CACHE_REBUILD_LOCK_KEY = 'enrichment_data_rebuild_lock'
+# Segundos en que los datos se consideran frescos, segundos extra en que se sirven mientras se reconstruyen,
+# y segundos antes de expirar en que se inicia la reconstruccion en segundo plano.
+CACHE_TIMEOUT = 3600
+CACHE_STALE_TIMEOUT = 600
+CACHE_REFRESH_AHEAD = 300
+UPDATE_LOCK_TIMEOUT = 10
+UPDATE_LOCK_WAIT = 2
+REBUILD_LOCK_TIMEOUT = 120
+REBUILD_WAIT = 10
+REBUILD_ATTEMPTS = 3
+LOCK_POLL_INTERVAL = 0.05
+# Version de los datos construidos que no se guardaron en cache: nunca es igual a una version publicada, por lo que la capa local
+# los vuelve a cargar en la siguiente solicitud, y no se comparten sus resultados ni se envian al pool de procesos.
+UNSTORED_VERSION = None
+
+# Esta funcion se encarga de normalizar el texto.
+def normalize_text(text):
+    if not text: return ""
+    text = str(text).lower()
+    # Reemplazar simbolos comunes con espacio.
+    text = re.sub(r'[*/\-.,\'#\[\]|()!?¿¡]', ' ', text)
+    # Quitar espacios adicionales.
+    text = re.sub(r'\s+', ' ', text).strip()
+    return text
+
+# Esta funcion se encarga de crear el patron de busqueda Regex para las keywords.
+def get_pattern(keyword_words, keyword_original):
+    pattern = None
+    try:
+        # Crear el patron de busqueda Regex, tanto para el caso de una sola palabra como para el caso que esta se componga por varias palabras.
+        if len(keyword_words) == 1:
+            pattern = re.compile(rf"\b{re.escape(keyword_words[0])}\b", re.IGNORECASE)
+        else:
+            pattern_parts = [rf"\b{re.escape(word)}\b" for word in keyword_words]
+            pattern = re.compile(r".*?".join(pattern_parts), re.IGNORECASE)
+
+    except re.error:
+        logger.warning("Error regex para el keyword: %s", keyword_original)
+    return pattern
+
+# Esta funcion se encarga de crear una copia del objeto sin relaciones cargadas.
+def detach_instance(instance):
+    model = type(instance)
+    return model(**{field.attname: getattr(instance, field.attname) for field in model._meta.concrete_fields})
+
+# Columnas de las filas de cada tabla de los datos pre-procesados. Las filas de categorias y comercios contienen los campos
+# en el mismo orden y formato que sus serializers, por lo que su representacion se obtiene sin acceder a la base de datos.
+CATEGORY_FIELDS = ('id', 'name', 'type', 'created_at', 'updated_at')
+MERCHANT_FIELDS = ('id', 'merchant_name', 'merchant_logo', 'category', 'created_at', 'updated_at')
+KEYWORD_FIELDS = ('id', 'keyword', 'merchant')
+# Campos de la representacion de cada tabla que tiene JSON pre-renderizado.
+PAYLOAD_FIELDS = {'categories': CATEGORY_FIELDS, 'merchants': MERCHANT_FIELDS}
+CATEGORY_TYPE = 2
+MERCHANT_CATEGORY = 3
+# Columna extra de los comercios con el indice de su categoria en la tabla de categorias (-1 si no tiene).
+MERCHANT_CATEGORY_INDEX = 6
+KEYWORD_MERCHANT = 2
+# Columna de cada tabla con el id de la fila que referencia (comercio -> categoria, keyword -> comercio).
+REFERENCE_COLUMNS = {'merchants': MERCHANT_CATEGORY, 'keywords': KEYWORD_MERCHANT}
+# Matchers e indices que puede modificar el cambio de cada tipo de regla (incluyendo la propagacion a sus comercios y keywords).
+CHANGED_MATCHERS = {
+    Keyword: ('keyword_matchers',),
+    Merchant: ('keyword_matchers', 'merchant_matchers'),
+    Category: ('keyword_matchers', 'merchant_matchers', 'category_indexes'),
+}
+
+# Formato binario de los datos pre-procesados: encabezado (firma, version del formato, version de marshal) + contenido marshal.
+SNAPSHOT_MAGIC = b'ENRS'
+SNAPSHOT_FORMAT_VERSION = 3
+SNAPSHOT_HEADER = struct.Struct('<4sHH')
+# Formato del archivo de datos pre-procesados (build_enrichment_snapshot): encabezado (firma, version del formato del archivo,
+# largo de la huella) + huella de las reglas (marshal) + datos pre-procesados en su formato binario.
+# ENRICHMENT_SNAPSHOT_FILE: ruta del archivo (None deshabilita el archivo).
+DEFAULT_SNAPSHOT_FILE = None
+SNAPSHOT_FILE_MAGIC = b'ENRF'
+SNAPSHOT_FILE_FORMAT_VERSION = 1
+SNAPSHOT_FILE_HEADER = struct.Struct('<4sHI')
+# Formato plano de solo lectura de los datos pre-procesados (SharedEnrichmentSnapshot): encabezado (firma, version del formato,
+# version de marshal, version y fecha de construccion de los datos) + secciones (LayoutWriter).
+# ENRICHMENT_SHARED_SNAPSHOT_DIR: directorio donde se publica un archivo por version, que los procesos mapean en memoria
+# (ej: /dev/shm/enrichment, en memoria compartida). None mantiene una copia de los datos en cada proceso.
+DEFAULT_SHARED_SNAPSHOT_DIR = None
+SHARED_SNAPSHOT_MAGIC = b'ENSM'
+SHARED_SNAPSHOT_FORMAT_VERSION = 1
+SHARED_SNAPSHOT_HEADER = struct.Struct('<4sHHqd')
+SHARED_SNAPSHOT_FILE_PREFIX = 'snapshot-'
+SHARED_SNAPSHOT_FILE_SUFFIX = '.bin'
+
+DATETIME_FIELD = serializers.DateTimeField()
+
+# Esta funcion se encarga de formatear una fecha igual que los serializers de la API.
+def format_datetime(value):
+    return DATETIME_FIELD.to_representation(value)
+
+# Esta funcion se encarga de formatear un id (UUID) como texto, o None si es nulo.
+def format_pk(value):
+    return None if value is None else str(value)
+
+# Esta funcion se encarga de crear la fila de una categoria a partir de sus campos.
+def get_category_row(pk, name, category_type, created_at, updated_at):
+    return (format_pk(pk), name, category_type, format_datetime(created_at), format_datetime(updated_at))
+
+# Esta funcion se encarga de crear la fila de un comercio a partir de sus campos. El indice de la categoria se resuelve al sincronizar.
+def get_merchant_row(pk, merchant_name, merchant_logo, category_pk, created_at, updated_at):
+    return (format_pk(pk), merchant_name, merchant_logo, format_pk(category_pk), format_datetime(created_at), format_datetime(updated_at), -1)
+
+# Esta funcion se encarga de crear la fila de un keyword a partir de sus campos.
+def get_keyword_row(pk, keyword, merchant_pk):
+    return (format_pk(pk), keyword, format_pk(merchant_pk))
+
+
+# Datos pre-procesados del enriquecimiento, sin objetos del ORM.
+# Las categorias, comercios y keywords se almacenan como tablas de filas (tuplas de textos y enteros), y los matchers
+# referencian a los comercios y categorias por su indice en esas tablas. Las filas eliminadas se reemplazan por None para
+# no mover los indices; el indice de cada fila ademas corresponde a su orden de carga, utilizado para desempatar.
+# Cada categoria y comercio tiene ademas su JSON pre-renderizado, que se reutiliza para armar la respuesta del enriquecimiento.
+# Se serializa a un bloque binario pequeño y versionado con marshal, que solo contiene tipos primitivos.
+class EnrichmentSnapshot:
+    __slots__ = (
+        'version', 'built_at', 'categories', 'merchants', 'keywords', 'payloads',
+        'keyword_matchers', 'merchant_matchers', 'category_indexes', '_row_indexes', '_reference_indexes',
+        '_payload_objects',
+    )
+
+    def __init__(self):
+        self.version = 0
+        self.built_at = 0.0
+        self.categories = []
+        self.merchants = []
+        self.keywords = []
+        # JSON pre-renderizado de cada fila de categorias y comercios (None para las filas eliminadas).
+        self.payloads = {table_name: [] for table_name in PAYLOAD_FIELDS}
+        # Los keywords y comercios se almacenan en un PatternMatcher, que resuelve la busqueda del patron de mayor largo en una sola pasada,
+        # y las categorias en un CategoryIndex, un indice invertido desde cada palabra hacia las categorias que la contienen.
+        # Las claves 'income' y 'expense' diferencian los tipos de movimiento asociados a cada dato.
+        self.keyword_matchers = {category_type: PatternMatcher() for category_type in MOVEMENT_TYPES}
+        self.merchant_matchers = {category_type: PatternMatcher() for category_type in MOVEMENT_TYPES}
+        self.category_indexes = {category_type: CategoryIndex() for category_type in MOVEMENT_TYPES}
+        # Indices id -> fila, calculados solo cuando se necesitan (actualizaciones incrementales).
+        self._row_indexes = None
+        # Indices inversos id referenciado -> filas que lo referencian (categoria -> comercios, comercio -> keywords), para que
+        # los cambios de una categoria o comercio solo sincronicen sus filas. Se construyen con los datos y se serializan con ellos.
+        self._reference_indexes = None
+        # Representaciones (RenderedPayload) ya creadas, reutilizadas entre transacciones y solicitudes.
+        self._payload_objects = {table_name: {} for table_name in PAYLOAD_FIELDS}
+
+    # Esta funcion se encarga de serializar los datos pre-procesados a un bloque binario versionado.
+    def serialize(self):
+        content = (
+            self.version,
+            self.built_at,
+            self.categories,
+            self.merchants,
+            self.keywords,
+            self.payloads,
+            {category_type: matcher.to_state() for category_type, matcher in self.keyword_matchers.items()},
+            {category_type: matcher.to_state() for category_type, matcher in self.merchant_matchers.items()},
+            {category_type: index.to_state() for category_type, index in self.category_indexes.items()},
+            self.get_reference_indexes(),
+        )
+        return SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_FORMAT_VERSION, marshal.version) + marshal.dumps(content)
+
+    # Esta funcion se encarga de generar el formato plano de solo lectura de los datos pre-procesados (SharedEnrichmentSnapshot).
+    # Incluye el bloque binario de serialize, para obtener una copia modificable de los datos cuando se necesite.
+    def to_shared_layout(self):
+        writer = LayoutWriter()
+        writer.add_bytes(self.serialize())
+        counts = self.get_counts()
+        writer.add_array('I', [counts['categories'], counts['merchants'], counts['keywords']])
+        for table_name in ('categories', 'merchants', 'keywords'):
+            writer.add_blob_table([marshal.dumps(row) for row in getattr(self, table_name)])
+        for table_name in PAYLOAD_FIELDS:
+            writer.add_blob_table([(payload or '').encode() for payload in self.payloads[table_name]])
+        for category_type in MOVEMENT_TYPES:
+            self.keyword_matchers[category_type].to_layout(writer)
+            self.merchant_matchers[category_type].to_layout(writer)
+            self.category_indexes[category_type].to_layout(writer)
+        header = SHARED_SNAPSHOT_HEADER.pack(SHARED_SNAPSHOT_MAGIC, SHARED_SNAPSHOT_FORMAT_VERSION, marshal.version, self.version, self.built_at)
+        return writer.to_bytes(header)
+
+    # Esta funcion se encarga de reconstruir los datos pre-procesados desde un bloque binario.
+    # Retorna None si el bloque no es valido o fue generado con otra version del formato.
+    @classmethod
+    def deserialize(cls, blob):
+        if not isinstance(blob, (bytes, bytearray, memoryview)) or len(blob) < SNAPSHOT_HEADER.size:
+            return None
+        magic, format_version, marshal_version = SNAPSHOT_HEADER.unpack_from(blob)
+        if magic != SNAPSHOT_MAGIC or format_version != SNAPSHOT_FORMAT_VERSION or marshal_version != marshal.version:
+            return None
+        try:
+            content = marshal.loads(memoryview(blob)[SNAPSHOT_HEADER.size:])
+        except (EOFError, ValueError, TypeError):
+            return None
+
+        snapshot = cls()
+        (snapshot.version, snapshot.built_at, snapshot.categories, snapshot.merchants, snapshot.keywords, snapshot.payloads,
+         keyword_states, merchant_states, category_states, snapshot._reference_indexes) = content
+        snapshot.keyword_matchers = {category_type: PatternMatcher.from_state(state) for category_type, state in keyword_states.items()}
+        snapshot.merchant_matchers = {category_type: PatternMatcher.from_state(state) for category_type, state in merchant_states.items()}
+        snapshot.category_indexes = {category_type: CategoryIndex.from_state(state) for category_type, state in category_states.items()}
+        return snapshot
+
+    # Esta funcion se encarga de obtener la cantidad de categorias, comercios y keywords vigentes.
+    def get_counts(self):
+        return {
+            'categories': sum(1 for row in self.categories if row is not None),
+            'merchants': sum(1 for row in self.merchants if row is not None),
+            'keywords': sum(1 for row in self.keywords if row is not None),
+        }
+
+    # Esta funcion se encarga de obtener la representacion de una fila, junto a su JSON pre-renderizado.
+    # La representacion se crea una sola vez por fila, por lo que no debe ser modificada.
+    def get_payload(self, table_name, row_index):
+        payload_objects = self._payload_objects[table_name]
+        payload = payload_objects.get(row_index)
+        if payload is None:
+            row = getattr(self, table_name)[row_index]
+            payload = RenderedPayload(zip(PAYLOAD_FIELDS[table_name], row), self.payloads[table_name][row_index])
+            payload_objects[row_index] = payload
+        return payload
+
+    # Esta funcion se encarga de obtener la representacion de una categoria, igual a la entregada por CategorySerializer.
+    def get_category(self, category_index):
+        return self.get_payload('categories', category_index)
+
+    # Esta funcion se encarga de obtener la representacion de un comercio, igual a la entregada por MerchantSerializer.
+    def get_merchant(self, merchant_index):
+        return self.get_payload('merchants', merchant_index)
+
+    # Esta funcion se encarga de actualizar el JSON pre-renderizado de una fila.
+    def render_payload(self, table_name, row_index):
+        row = getattr(self, table_name)[row_index]
+        payloads = self.payloads[table_name]
+        while len(payloads) <= row_index:
+            payloads.append(None)
+        payloads[row_index] = None if row is None else render_fragment(dict(zip(PAYLOAD_FIELDS[table_name], row)))
+        self._payload_objects[table_name].pop(row_index, None)
+
+    # Esta funcion se encarga de buscar el comercio y la categoria de una descripcion normalizada, segun su tipo de movimiento.
+    # Retorna una tupla (indice comercio, indice categoria), donde cada valor puede ser None si no se encontro.
+    def match(self, description_normalized, category_type):
+        merchant_index, category_index, _ = self.match_with_stage(description_normalized, category_type)
+        return merchant_index, category_index
+
+    # Esta funcion se encarga de buscar el comercio y la categoria de una descripcion, indicando ademas la etapa de la busqueda
+    # en la que se encontraron (keyword, nombre de comercio o nombre de categoria), o None si no se encontro nada.
+    # Si se entrega un timer (StageTimer), se registra la duracion de cada etapa de la busqueda.
+    def match_with_stage(self, description_normalized, category_type, timer=None):
+        if timer is not None: start_time = time.perf_counter()
+        # Las posiciones de las palabras de la descripcion se calculan una sola vez para los matchers de keywords y comercios.
+        word_positions = get_word_positions(description_normalized)
+
+        # Se busca el keyword de mayor largo cuyo patron exista en la descripcion de la transaccion.
+        merchant_index = self.keyword_matchers[category_type].search(description_normalized, word_positions)
+        stage = MATCH_STAGE_KEYWORD
+        if timer is not None: start_time = timer.lap('keyword_match', start_time)
+
+        # Se busca el nombre de comercio de mayor largo cuyo patron exista en la descripcion de la transaccion.
+        if merchant_index is None:
+            merchant_index = self.merchant_matchers[category_type].search(description_normalized, word_positions)
+            stage = MATCH_STAGE_MERCHANT
+            if timer is not None: start_time = timer.lap('merchant_match', start_time)
+
+        if merchant_index is not None:
+            return merchant_index, self.merchants[merchant_index][MERCHANT_CATEGORY_INDEX], stage
+
+        # Se comprueba si alguna de las palabras que forman el nombre de una categoria existen dentro de la descripcion de la transaccion.
+        # Se obtiene el set de palabras de la descripcion de la transaccion (excluyendo stop words)
+        description_words_set = {word for word in description_normalized.split() if word and word not in STOP_WORDS}
+        category_index = self.category_indexes[category_type].search(description_words_set) if description_words_set else None
+        if timer is not None: timer.lap('category_match', start_time)
+        return None, category_index, MATCH_STAGE_CATEGORY if category_index is not None else None
+
+    # Esta funcion se encarga de obtener los indices id -> fila de cada tabla.
+    def get_row_indexes(self):
+        if self._row_indexes is None:
+            self._row_indexes = {
+                table_name: {row[0]: position for position, row in enumerate(getattr(self, table_name)) if row is not None}
+                for table_name in ('categories', 'merchants', 'keywords')
+            }
+        return self._row_indexes
+
+    # Esta funcion se encarga de obtener los indices inversos id referenciado -> posiciones de las filas que lo referencian.
+    def get_reference_indexes(self):
+        if self._reference_indexes is None:
+            self._reference_indexes = {table_name: {} for table_name in REFERENCE_COLUMNS}
+            for table_name, column in REFERENCE_COLUMNS.items():
+                references = self._reference_indexes[table_name]
+                for position, row in enumerate(getattr(self, table_name)):
+                    if row is not None and row[column] is not None:
+                        references.setdefault(row[column], set()).add(position)
+        return self._reference_indexes
+
+    # Esta funcion se encarga de registrar la referencia de una fila en el indice inverso de su tabla.
+    # Los sets de posiciones se reemplazan en lugar de modificarse, ya que se comparten con las copias (copy_for_change).
+    def add_reference(self, table_name, row, position):
+        reference = row[REFERENCE_COLUMNS[table_name]]
+        if reference is not None:
+            references = self._reference_indexes[table_name]
+            references[reference] = references.get(reference, set()) | {position}
+
+    # Esta funcion se encarga de quitar la referencia de una fila del indice inverso de su tabla.
+    def remove_reference(self, table_name, row, position):
+        reference = row[REFERENCE_COLUMNS[table_name]]
+        references = self._reference_indexes[table_name]
+        positions = references.get(reference)
+        if positions is not None and position in positions:
+            if len(positions) == 1:
+                del references[reference]
+            else:
+                references[reference] = positions - {position}
+
+    # Esta funcion se encarga de obtener las posiciones (ordenadas) de las filas de una tabla que referencian a un id.
+    def get_referencing_rows(self, table_name, pk):
+        return sorted(self.get_reference_indexes()[table_name].get(pk, ()))
+
+    # Esta funcion se encarga de agregar o reemplazar una fila de una tabla, manteniendo su posicion si ya existia.
+    def set_row(self, table_name, row):
+        table = getattr(self, table_name)
+        row_index = self.get_row_indexes()[table_name]
+        position = row_index.get(row[0])
+        if table_name in REFERENCE_COLUMNS:
+            self.get_reference_indexes()
+        if position is None:
+            position = len(table)
+            table.append(row)
+            row_index[row[0]] = position
+        else:
+            if table_name in REFERENCE_COLUMNS:
+                self.remove_reference(table_name, table[position], position)
+            table[position] = row
+        if table_name in REFERENCE_COLUMNS:
+            self.add_reference(table_name, row, position)
+        if table_name in PAYLOAD_FIELDS:
+            self.render_payload(table_name, position)
+        return position
+
+    # Esta funcion se encarga de eliminar una fila de una tabla. Retorna la posicion que ocupaba, o None si no existia.
+    def delete_row(self, table_name, pk):
+        position = self.get_row_indexes()[table_name].pop(pk, None)
+        if position is not None:
+            table = getattr(self, table_name)
+            if table_name in REFERENCE_COLUMNS:
+                self.get_reference_indexes()
+                self.remove_reference(table_name, table[position], position)
+            table[position] = None
+            if table_name in PAYLOAD_FIELDS:
+                self.render_payload(table_name, position)
+        return position
+
+    # Esta funcion se encarga de obtener el tipo de movimiento de un comercio, o None si no tiene una categoria valida.
+    def get_merchant_category_type(self, merchant_index):
+        if merchant_index is None: return None
+        merchant = self.merchants[merchant_index]
+        if merchant is None or merchant[MERCHANT_CATEGORY_INDEX] < 0: return None
+        category = self.categories[merchant[MERCHANT_CATEGORY_INDEX]]
+        if category is None or category[CATEGORY_TYPE] not in MOVEMENT_TYPES: return None
+        return category[CATEGORY_TYPE]
+
+    # Esta funcion se encarga de sincronizar la entrada de un keyword en los matchers con su fila actual.
+    def sync_keyword(self, keyword_index):
+        for category_type in MOVEMENT_TYPES:
+            self.keyword_matchers[category_type].remove(keyword_index)
+
+        keyword = self.keywords[keyword_index]
+        if keyword is None: return
+        keyword_original = keyword[1]
+        # Se valida que el comercio y la categoria no sean nulos, y que la categoria tenga un tipo de movimiento valido.
+        merchant_index = self.get_row_indexes()['merchants'].get(keyword[KEYWORD_MERCHANT])
+        category_type = self.get_merchant_category_type(merchant_index)
+        if category_type is None: return
+        # Se valida que el keyword no sea nulo para luego normalizarlo.
+        keyword_words = normalize_text(keyword_original).split()
+        if not keyword_words: return
+
+        pattern = get_pattern(keyword_words, keyword_original)
+        if pattern:
+            self.keyword_matchers[category_type].add(keyword_index, keyword_words, len(keyword_original), merchant_index, pattern, keyword_index)
+
+    # Esta funcion se encarga de sincronizar la entrada de un comercio (y opcionalmente la de sus keywords) con su fila actual.
+    def sync_merchant(self, merchant_index, propagate=True):
+        for category_type in MOVEMENT_TYPES:
+            self.merchant_matchers[category_type].remove(merchant_index)
+
+        merchant = self.merchants[merchant_index]
+        if merchant is not None:
+            # Se resuelve el indice de la categoria del comercio.
+            category_position = self.get_row_indexes()['categories'].get(merchant[MERCHANT_CATEGORY], -1)
+            if category_position != merchant[MERCHANT_CATEGORY_INDEX]:
+                # Solo cambia la columna del indice de la categoria, por lo que el indice inverso no cambia.
+                merchant = merchant[:MERCHANT_CATEGORY_INDEX] + (category_position,)
+                self.merchants[merchant_index] = merchant
+
+            category_type = self.get_merchant_category_type(merchant_index)
+            # Se valida que el nombre del comercio no sea nulo para luego normalizarlo.
+            merchant_original = merchant[1]
+            merchant_words = normalize_text(merchant_original).split()
+            pattern = get_pattern(merchant_words, merchant_original) if category_type and merchant_words else None
+            if pattern:
+                self.merchant_matchers[category_type].add(merchant_index, merchant_words, len(merchant_original), merchant_index, pattern, merchant_index)
+
+        # El tipo de movimiento de los keywords depende de la categoria del comercio.
+        if not propagate or merchant is None: return
+        for keyword_index in self.get_referencing_rows('keywords', merchant[0]):
+            self.sync_keyword(keyword_index)
+
+    # Esta funcion se encarga de sincronizar la entrada de una categoria (y opcionalmente la de sus comercios) con su fila actual.
+    def sync_category(self, category_index, propagate=True):
+        for category_type in MOVEMENT_TYPES:
+            self.category_indexes[category_type].remove(category_index)
+
+        category = self.categories[category_index]
+        if category is not None and category[CATEGORY_TYPE] in MOVEMENT_TYPES:
+            # Crear el set de palabras de la categoria (excluyendo stop words)
+            category_words_set = {word for word in normalize_text(category[1]).split() if word and word not in STOP_WORDS}
+            if category_words_set:
+                self.category_indexes[category[CATEGORY_TYPE]].add(category_index, category_words_set, category_index, category_index)
+
+        if not propagate or category is None: return
+        for merchant_index in self.get_referencing_rows('merchants', category[0]):
+            self.sync_merchant(merchant_index)
+
+    # Esta funcion se encarga de aplicar el cambio de un objeto (guardado o eliminado) sobre los datos pre-procesados.
+    def apply_instance_change(self, instance, deleted=False):
+        pk = format_pk(instance.pk)
+        if isinstance(instance, Keyword):
+            if deleted:
+                position = self.delete_row('keywords', pk)
+            else:
+                position = self.set_row('keywords', get_keyword_row(instance.pk, instance.keyword, instance.merchant_id))
+            if position is not None:
+                self.sync_keyword(position)
+
+        elif isinstance(instance, Merchant):
+            if deleted:
+                position = self.delete_row('merchants', pk)
+                # Los keywords se eliminan en cascada junto al comercio.
+                for keyword_index in self.get_referencing_rows('keywords', pk):
+                    self.delete_row('keywords', self.keywords[keyword_index][0])
+                    self.sync_keyword(keyword_index)
+            else:
+                position = self.set_row('merchants', get_merchant_row(
+                    instance.pk, instance.merchant_name, instance.merchant_logo, instance.category_id, instance.created_at, instance.updated_at
+                ))
+            if position is not None:
+                self.sync_merchant(position)
+
+        elif isinstance(instance, Category):
+            if deleted:
+                position = self.delete_row('categories', pk)
+            else:
+                position = self.set_row('categories', get_category_row(
+                    instance.pk, instance.name, instance.type, instance.created_at, instance.updated_at
+                ))
+            if position is not None:
+                self.sync_category(position)
+                # Los comercios que referenciaban a la categoria eliminada dejan de estar asociados a ella.
+                if deleted:
+                    for merchant_index in self.get_referencing_rows('merchants', pk):
+                        self.sync_merchant(merchant_index)
+
+    # Esta funcion se encarga de obtener una copia de los datos pre-procesados sobre la que se puede aplicar el cambio de un objeto
+    # (apply_instance_change) sin modificar los originales, que se comparten entre solicitudes. Las tablas e indices de filas se copian
+    # superficialmente (las filas son tuplas que no se modifican), y solo se copian los matchers que el cambio puede modificar
+    # (ver CHANGED_MATCHERS), que ademas solo copian las listas de las palabras que modifican; el resto se comparte con los originales.
+    def copy_for_change(self, instance):
+        snapshot = EnrichmentSnapshot()
+        snapshot.version = self.version
+        snapshot.built_at = self.built_at
+        snapshot.categories = list(self.categories)
+        snapshot.merchants = list(self.merchants)
+        snapshot.keywords = list(self.keywords)
+        snapshot.payloads = {table_name: list(payloads) for table_name, payloads in self.payloads.items()}
+        snapshot._row_indexes = {table_name: dict(row_index) for table_name, row_index in self.get_row_indexes().items()}
+        snapshot._reference_indexes = {table_name: dict(references) for table_name, references in self.get_reference_indexes().items()}
+        changed_matchers = CHANGED_MATCHERS[type(instance)]
+        for attribute in ('keyword_matchers', 'merchant_matchers', 'category_indexes'):
+            setattr(snapshot, attribute, {
+                category_type: matcher.copy() if attribute in changed_matchers else matcher
+                for category_type, matcher in getattr(self, attribute).items()
+            })
+        return snapshot
+
+    # Esta funcion se encarga de construir los datos pre-procesados desde la base de datos.
+    @classmethod
+    def build(cls):
+        start_time = time.perf_counter()
+        snapshot = cls()
+
+        # Se cargan primero las filas de cada tabla, y luego se sincronizan los matchers una sola vez por fila.
+        # Las filas se ordenan por fecha de creacion e id (un orden total, que mantiene el desempate por antiguedad de la busqueda), para
+        # que los procesos que construyen los mismos datos obtengan los mismos indices de filas.
+        snapshot.categories = [get_category_row(*values) for values in Category.objects.order_by('created_at', 'id').values_list(*CATEGORY_FIELDS)]
+        snapshot.merchants = [
+            get_merchant_row(*values)
+            for values in Merchant.objects.order_by('created_at', 'id').values_list('id', 'merchant_name', 'merchant_logo', 'category_id', 'created_at', 'updated_at')
+        ]
+        snapshot.keywords = [get_keyword_row(*values) for values in Keyword.objects.order_by('created_at', 'id').values_list('id', 'keyword', 'merchant_id')]
+        for table_name, fields in PAYLOAD_FIELDS.items():
+            snapshot.payloads[table_name] = [render_fragment(dict(zip(fields, row))) for row in getattr(snapshot, table_name)]
+
+        # Pre-procesar Categories
+        for category_index in range(len(snapshot.categories)):
+            snapshot.sync_category(category_index, propagate=False)
+        # Pre-procesar Merchants
+        for merchant_index in range(len(snapshot.merchants)):
+            snapshot.sync_merchant(merchant_index, propagate=False)
+        # Pre-procesar Keywords
+        for keyword_index in range(len(snapshot.keywords)):
+            snapshot.sync_keyword(keyword_index)
+        snapshot.get_reference_indexes()
+
+        snapshot.version = get_enrichment_data_version()
+        snapshot.built_at = time.time()
+        metrics_registry.inc('enrichment_snapshot_builds_total')
+        metrics_registry.observe('enrichment_snapshot_build_duration_seconds', time.perf_counter() - start_time)
+        return snapshot
+
+
+# Datos pre-procesados de solo lectura, que se leen directamente desde su formato plano (to_shared_layout), normalmente un archivo
+# mapeado en memoria compartido por todos los procesos: las tablas, el JSON pre-renderizado y los matchers no se copian en cada proceso.
+# Solo se crean en cada proceso las filas y representaciones de los resultados encontrados, y los patrones Regex (con simbolos).
+# Entrega la misma interfaz de lectura que EnrichmentSnapshot (match, get_merchant, get_category, merchants, categories, etc.);
+# para modificarlos se debe obtener una copia con copy_for_change (o EnrichmentSnapshot.deserialize(snapshot.serialize())).
+class SharedEnrichmentSnapshot(EnrichmentSnapshot):
+    __slots__ = ('buffer', 'blob', 'counts')
+
+    def __init__(self, buffer):
+        view = memoryview(buffer)
+        magic, format_version, marshal_version, self.version, self.built_at = SHARED_SNAPSHOT_HEADER.unpack_from(view)
+        if magic != SHARED_SNAPSHOT_MAGIC or format_version != SHARED_SNAPSHOT_FORMAT_VERSION or marshal_version != marshal.version:
+            raise ValueError('El formato de los datos pre-procesados compartidos no es valido.')
+        self.buffer = buffer
+        reader = LayoutReader(view, SHARED_SNAPSHOT_HEADER.size)
+        self.blob = reader.next_bytes()
+        self.counts = reader.next_array('I')
+        self.categories = reader.next_table(MarshalTable)
+        self.merchants = reader.next_table(MarshalTable)
+        self.keywords = reader.next_table(MarshalTable)
+        self.payloads = {table_name: reader.next_table(TextTable) for table_name in PAYLOAD_FIELDS}
+        self.keyword_matchers = {}
+        self.merchant_matchers = {}
+        self.category_indexes = {}
+        for category_type in MOVEMENT_TYPES:
+            self.keyword_matchers[category_type] = MappedPatternMatcher(reader)
+            self.merchant_matchers[category_type] = MappedPatternMatcher(reader)
+            self.category_indexes[category_type] = MappedCategoryIndex(reader)
+        self._row_indexes = None
+        self._reference_indexes = None
+        self._payload_objects = {table_name: {} for table_name in PAYLOAD_FIELDS}
+
+    # Esta funcion se encarga de leer los datos pre-procesados desde un bloque con su formato plano.
+    # Retorna None si el bloque no es valido o fue generado con otra version del formato.
+    @classmethod
+    def from_buffer(cls, buffer):
+        try:
+            return cls(buffer)
+        except (ValueError, TypeError, EOFError, struct.error):
+            return None
+
+    def serialize(self):
+        return bytes(self.blob)
+
+    # Los matchers del formato plano no se pueden modificar, por lo que la copia se obtiene decodificando todos los datos.
+    def copy_for_change(self, instance):
+        return EnrichmentSnapshot.deserialize(self.blob)
+
+    def get_counts(self):
+        return {'categories': self.counts[0], 'merchants': self.counts[1], 'keywords': self.counts[2]}
+
+# Esta funcion se encarga de obtener la version actual de los datos pre-procesados desde la cache.
+def get_enrichment_data_version():
+    return cache.get(CACHE_VERSION_KEY, 0)
+
+# Esta funcion se encarga de incrementar la version de los datos pre-procesados, para que todos los workers detecten el cambio.
+# La version inicial se basa en la hora actual, para que al limpiar la cache no se repitan versiones que un proceso ya tenga cargadas.
+def bump_enrichment_data_version():
+    initial_version = time.time_ns() // 1000
+    cache.add(CACHE_VERSION_KEY, initial_version, timeout=None)
+    try:
+        return cache.incr(CACHE_VERSION_KEY)
+    except ValueError:
+        # La llave pudo haber sido eliminada entre add e incr.
+        cache.set(CACHE_VERSION_KEY, initial_version + 1, timeout=None)
+        return initial_version + 1
+
+# Esta funcion se encarga de obtener un lock en la cache, esperando como maximo 'wait' segundos. Retorna True si se obtuvo.
+def acquire_cache_lock(lock_key, timeout, wait=0):
+    deadline = time.monotonic() + wait
+    while not cache.add(lock_key, True, timeout=timeout):
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(LOCK_POLL_INTERVAL)
+    return True
+
+# Esta funcion se encarga de obtener los datos pre-procesados desde la cache, o None si no existen o tienen otro formato.
+def get_cached_snapshot():
+    blob = cache.get(CACHE_KEY)
+    snapshot = EnrichmentSnapshot.deserialize(blob)
+    metrics_registry.inc('enrichment_snapshot_cache_requests_total', labels=(('result', 'miss' if snapshot is None else 'hit'),))
+    if snapshot is not None:
+        metrics_registry.set_gauge('enrichment_snapshot_size_bytes', len(blob))
+    return snapshot
+
+# Esta funcion se encarga de guardar en cache los datos pre-procesados, serializados en su formato binario.
+def set_cached_snapshot(snapshot):
+    blob = snapshot.serialize()
+    cache.set(CACHE_KEY, blob, timeout=CACHE_TIMEOUT + CACHE_STALE_TIMEOUT)
+    metrics_registry.set_gauge('enrichment_snapshot_size_bytes', len(blob))
+
+# Esta funcion se encarga de obtener la ruta del archivo de datos pre-procesados, o None si no esta configurado.
+def get_snapshot_file_path():
+    return getattr(settings, 'ENRICHMENT_SNAPSHOT_FILE', DEFAULT_SNAPSHOT_FILE)
+
+# Esta funcion se encarga de obtener la huella de las reglas: cantidad de filas y ultima modificacion de cada tabla.
+# Cambia al crear, modificar o eliminar una regla, por lo que indica si un archivo de datos pre-procesados esta desactualizado.
+def get_rules_fingerprint():
+    fingerprint = []
+    for model in (Category, Merchant, Keyword):
+        values = model.objects.aggregate(count=Count('pk'), updated_at=Max('updated_at'))
+        fingerprint.append((values['count'], format_datetime(values['updated_at'])))
+    return tuple(fingerprint)
+
+# Esta funcion se encarga de guardar los datos pre-procesados en un archivo, junto a la huella de las reglas con que se construyeron.
+# Se escribe un archivo temporal que luego reemplaza al anterior, para que un worker nunca lea un archivo a medio escribir.
+# Retorna el tamaño del archivo en bytes.
+def write_snapshot_file(path, snapshot, fingerprint):
+    fingerprint_blob = marshal.dumps(fingerprint)
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    temporary_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temporary_path, 'wb') as snapshot_file:
+            snapshot_file.write(SNAPSHOT_FILE_HEADER.pack(SNAPSHOT_FILE_MAGIC, SNAPSHOT_FILE_FORMAT_VERSION, len(fingerprint_blob)))
+            snapshot_file.write(fingerprint_blob)
+            snapshot_file.write(snapshot.serialize())
+        os.replace(temporary_path, path)
+    except BaseException:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
+    return os.path.getsize(path)
+
+# Esta funcion se encarga de mapear en memoria (mmap) un archivo de solo lectura. Sus paginas las comparte el sistema operativo
+# entre todos los procesos que mapean el mismo archivo. Retorna None si el archivo no existe o esta vacio.
+def map_file(path):
+    try:
+        mapped_file = open(path, 'rb')
+    except OSError:
+        return None
+    with mapped_file:
+        try:
+            return mmap.mmap(mapped_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            # Un archivo vacio no se puede mapear.
+            return None
+
+# Esta funcion se encarga de leer los datos pre-procesados desde un archivo, mapeandolo en memoria para decodificarlos
+# directamente desde las paginas del archivo, sin leerlo antes a un bloque propio del proceso.
+# Retorna None si el archivo no existe, no es valido, o su huella es distinta a la entregada (las reglas cambiaron).
+def read_snapshot_file(path, fingerprint=None):
+    mapping = map_file(path)
+    if mapping is None:
+        return None
+    try:
+        with memoryview(mapping) as view:
+            if len(view) < SNAPSHOT_FILE_HEADER.size:
+                return None
+            magic, format_version, fingerprint_size = SNAPSHOT_FILE_HEADER.unpack_from(view)
+            if magic != SNAPSHOT_FILE_MAGIC or format_version != SNAPSHOT_FILE_FORMAT_VERSION:
+                return None
+            offset = SNAPSHOT_FILE_HEADER.size + fingerprint_size
+            try:
+                file_fingerprint = marshal.loads(view[SNAPSHOT_FILE_HEADER.size:offset])
+            except (EOFError, ValueError, TypeError):
+                return None
+            if fingerprint is not None and file_fingerprint != fingerprint:
+                return None
+            return EnrichmentSnapshot.deserialize(view[offset:])
+    finally:
+        mapping.close()
+
+# Esta funcion se encarga de cargar los datos pre-procesados desde el archivo configurado, si corresponde a las reglas actuales.
+# Los datos del archivo se consideran recien construidos, ya que su huella coincide con la base de datos. Retorna None si no se cargaron.
+def load_snapshot_file(fingerprint):
+    path = get_snapshot_file_path()
+    if not path:
+        return None
+    snapshot = read_snapshot_file(path, fingerprint)
+    metrics_registry.inc('enrichment_snapshot_file_loads_total', labels=(('result', 'miss' if snapshot is None else 'hit'),))
+    if snapshot is not None:
+        snapshot.built_at = time.time()
+    return snapshot
+
+# Esta funcion se encarga de actualizar el archivo configurado con datos recien construidos desde la base de datos.
+# Un error al escribirlo no debe impedir servir los datos, que igualmente quedan en cache.
+def save_snapshot_file(snapshot, fingerprint):
+    path = get_snapshot_file_path()
+    if not path or fingerprint is None:
+        return
+    try:
+        write_snapshot_file(path, snapshot, fingerprint)
+    except OSError:
+        logger.exception("No fue posible guardar el archivo de datos pre-procesados del enriquecimiento")
+
+# Esta funcion se encarga de obtener el directorio de los datos pre-procesados compartidos, o None si no esta configurado.
+def get_shared_snapshot_dir():
+    return getattr(settings, 'ENRICHMENT_SHARED_SNAPSHOT_DIR', DEFAULT_SHARED_SNAPSHOT_DIR)
+
+# Esta funcion se encarga de obtener la ruta del archivo de los datos pre-procesados compartidos de una version.
+def get_shared_snapshot_path(directory, version):
+    return os.path.join(directory, f"{SHARED_SNAPSHOT_FILE_PREFIX}{version}{SHARED_SNAPSHOT_FILE_SUFFIX}")
+
+# Esta funcion se encarga de abrir los datos pre-procesados compartidos de una version, mapeando su archivo en memoria.
+# Retorna None si la version aun no se publica (o ya se reemplazo) o si el archivo no es valido.
+def open_shared_snapshot(version):
+    mapping = map_file(get_shared_snapshot_path(get_shared_snapshot_dir(), version))
+    if mapping is None:
+        return None
+    shared_snapshot = SharedEnrichmentSnapshot.from_buffer(mapping)
+    if shared_snapshot is None or shared_snapshot.version != version:
+        return None
+    return shared_snapshot
+
+# Esta funcion se encarga de publicar los datos pre-procesados en el directorio compartido, en un archivo por version.
+# El archivo se escribe con otro nombre y luego se renombra, por lo que los procesos solo ven archivos completos, y los archivos
+# de versiones anteriores se eliminan: los procesos que aun los tienen mapeados los siguen leyendo hasta cambiar de version.
+# Retorna los datos publicados, ya mapeados en memoria.
+def publish_shared_snapshot(snapshot):
+    directory = get_shared_snapshot_dir()
+    os.makedirs(directory, exist_ok=True)
+    path = get_shared_snapshot_path(directory, snapshot.version)
+    temporary_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temporary_path, 'wb') as shared_file:
+            shared_file.write(snapshot.to_shared_layout())
+        os.replace(temporary_path, path)
+    except BaseException:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
+
+    for previous_path in glob.glob(os.path.join(directory, f"{SHARED_SNAPSHOT_FILE_PREFIX}*{SHARED_SNAPSHOT_FILE_SUFFIX}")):
+        previous_version = os.path.basename(previous_path)[len(SHARED_SNAPSHOT_FILE_PREFIX):-len(SHARED_SNAPSHOT_FILE_SUFFIX)]
+        # Solo se eliminan las versiones anteriores, ya que otro proceso pudo haber publicado una version mas nueva.
+        if previous_version.isdigit() and int(previous_version) < snapshot.version:
+            try:
+                os.remove(previous_path)
+            except OSError:
+                pass
+    return open_shared_snapshot(snapshot.version)
+
+# Esta funcion se encarga de guardar en cache los datos pre-procesados reconstruidos, incrementando la version.
+# Si hubo una actualizacion incremental durante la reconstruccion, los datos pueden no incluirla, por lo que no se guardan.
+def store_processed_enrichment_data(snapshot, start_version):
+    if not acquire_cache_lock(CACHE_UPDATE_LOCK_KEY, UPDATE_LOCK_TIMEOUT, UPDATE_LOCK_WAIT):
+        return False
+    try:
+        if get_enrichment_data_version() != start_version:
+            return False
+        snapshot.version = bump_enrichment_data_version()
+        set_cached_snapshot(snapshot)
+        return True
+    finally:
+        cache.delete(CACHE_UPDATE_LOCK_KEY)
+
+# Esta funcion se encarga de reconstruir los datos pre-procesados desde la base de datos y guardarlos en cache.
+# Se reintenta si una actualizacion incremental ocurrio durante la reconstruccion. Si no se logran guardar, se entregan sin version
+# (ver UNSTORED_VERSION), ya que pueden no incluir un cambio cuya version si se publico.
+# Si hay un archivo de datos pre-procesados configurado, con use_file se cargan desde el archivo cuando corresponde a las reglas
+# actuales, y en caso contrario (o sin use_file) se construyen desde la base de datos y se actualiza el archivo.
+# La huella se obtiene antes de construir los datos, para que un cambio durante la construccion deje el archivo desactualizado.
+def rebuild_processed_enrichment_data(use_file=False):
+    for _ in range(REBUILD_ATTEMPTS):
+        start_version = get_enrichment_data_version()
+        fingerprint = get_rules_fingerprint() if get_snapshot_file_path() else None
+        snapshot = load_snapshot_file(fingerprint) if use_file and fingerprint is not None else None
+        if snapshot is None:
+            snapshot = EnrichmentSnapshot.build()
+            save_snapshot_file(snapshot, fingerprint)
+        if store_processed_enrichment_data(snapshot, start_version):
+            return snapshot
+    snapshot.version = UNSTORED_VERSION
+    return snapshot
+
+# Esta funcion se encarga de ejecutar una funcion en un hilo de fondo, cerrando sus conexiones a la base de datos al terminar.
+def start_background_thread(target):
+    def run():
+        try:
+            target()
+        finally:
+            connections.close_all()
+    threading.Thread(target=run, name='enrichment-data-refresh', daemon=True).start()
+
+# Esta funcion se encarga de reconstruir los datos pre-procesados en segundo plano, mientras se siguen sirviendo los actuales.
+# Solo el worker que obtiene el lock de reconstruccion la ejecuta. Retorna True si se inicio la reconstruccion.
+def schedule_background_refresh():
+    if not acquire_cache_lock(CACHE_REBUILD_LOCK_KEY, REBUILD_LOCK_TIMEOUT):
+        return False
+
+    def refresh():
+        try:
+            rebuild_processed_enrichment_data()
+        except Exception:
+            logger.exception("Error al reconstruir los datos pre-procesados del enriquecimiento")
+        finally:
+            cache.delete(CACHE_REBUILD_LOCK_KEY)
+
+    start_background_thread(refresh)
+    return True
+
+# Esta funcion se encarga de construir los datos pre-procesados cuando no existen en cache.
+# Solo un worker los reconstruye (desde el archivo de datos pre-procesados, si esta actualizado); el resto espera a que
+# aparezcan en cache en lugar de consultar la base de datos al mismo tiempo.
+def load_processed_enrichment_data():
+    if acquire_cache_lock(CACHE_REBUILD_LOCK_KEY, REBUILD_LOCK_TIMEOUT):
+        try:
+            return rebuild_processed_enrichment_data(use_file=True)
+        finally:
+            cache.delete(CACHE_REBUILD_LOCK_KEY)
+
+    deadline = time.monotonic() + REBUILD_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        snapshot = get_cached_snapshot()
+        if snapshot is not None:
+            return snapshot
+
+    # El worker que reconstruye no termino a tiempo, por lo que se construyen los datos sin guardarlos (y sin version).
+    snapshot = EnrichmentSnapshot.build()
+    snapshot.version = UNSTORED_VERSION
+    return snapshot
+
+# Capa local de cada proceso, que mantiene los datos pre-procesados ya decodificados.
+# En cada solicitud solo se consulta la version en la cache compartida; los datos se vuelven a cargar solo si la version cambio.
+class LocalSnapshotCache:
+    def __init__(self):
+        self.snapshot = None
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+    # Esta funcion se encarga de obtener los contadores de la capa local.
+    def get_stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'reloads': self.reloads,
+            'version': self.snapshot.version if self.snapshot is not None else None,
+        }
+
+    # Esta funcion se encarga de descartar los datos locales y reiniciar los contadores.
+    def clear(self):
+        with self.lock:
+            self.snapshot = None
+            self.hits = self.misses = self.reloads = 0
+
+local_snapshot_cache = LocalSnapshotCache()
+
+# Esta funcion se encarga de entregar los contadores de la capa local al registro de metricas (/metrics).
+def collect_local_snapshot_metrics():
+    return [
+        ('counter', 'enrichment_local_snapshot_requests_total', (('result', 'hit'),), local_snapshot_cache.hits),
+        ('counter', 'enrichment_local_snapshot_requests_total', (('result', 'miss'),), local_snapshot_cache.misses),
+        ('counter', 'enrichment_local_snapshot_reloads_total', (), local_snapshot_cache.reloads),
+    ]
+
+metrics_registry.register_collector(collect_local_snapshot_metrics)
+
+# Esta funcion se encarga de obtener los datos pre-procesados desde la cache compartida o desde la base de datos.
+# Los datos se consideran frescos durante CACHE_TIMEOUT segundos, pero se mantienen en cache CACHE_STALE_TIMEOUT segundos mas.
+def load_shared_enrichment_data():
+    snapshot = get_cached_snapshot()
+    if snapshot is None:
+        return load_processed_enrichment_data()
+    return snapshot
+
+# Esta funcion se encarga de obtener los datos pre-procesados para la capa local del proceso. Con un directorio compartido
+# configurado, se mapea el archivo de la version actual (publicado por el primer proceso que la carga), y en caso contrario
+# se decodifican (o construyen) los datos en el proceso. Si no es posible publicar los datos, se utiliza la copia del proceso.
+def load_local_enrichment_data(version):
+    if not get_shared_snapshot_dir():
+        return load_shared_enrichment_data()
+    shared_snapshot = open_shared_snapshot(version) if version is not None else None
+    metrics_registry.inc('enrichment_shared_snapshot_loads_total', labels=(('result', 'miss' if shared_snapshot is None else 'hit'),))
+    if shared_snapshot is not None:
+        return shared_snapshot
+
+    snapshot = load_shared_enrichment_data()
+    if snapshot.version == UNSTORED_VERSION:
+        return snapshot
+    try:
+        shared_snapshot = publish_shared_snapshot(snapshot)
+    except OSError:
+        logger.exception("No fue posible publicar los datos pre-procesados compartidos del enriquecimiento")
+    return shared_snapshot if shared_snapshot is not None else snapshot
+
+# Esta funcion se encarga de obtener los datos pre-procesados, desde la capa local del proceso, la cache compartida o la base de datos.
+# Antes de que expiren se reconstruyen en segundo plano, sirviendo mientras tanto los datos anteriores.
+# Si se entrega un timer (StageTimer), se registra la duracion de la consulta de la version y de la carga de los datos (si se cargaron).
+def get_processed_enrichment_data(timer=None):
+    if timer is not None: start_time = time.perf_counter()
+    version = cache.get(CACHE_VERSION_KEY)
+    if timer is not None: start_time = timer.lap('snapshot_version', start_time)
+    snapshot = local_snapshot_cache.snapshot
+
+    if snapshot is None or version is None or snapshot.version != version:
+        with local_snapshot_cache.lock:
+            # Otro hilo del proceso pudo haber cargado la version mientras se esperaba el lock.
+            snapshot = local_snapshot_cache.snapshot
+            if snapshot is None or version is None or snapshot.version != version:
+                local_snapshot_cache.misses += 1
+                if snapshot is not None:
+                    local_snapshot_cache.reloads += 1
+                snapshot = load_local_enrichment_data(version)
+                # Si la llave de version fue eliminada de la cache, se vuelve a crear con la version de los datos cargados.
+                if version is None and snapshot.version != UNSTORED_VERSION:
+                    cache.add(CACHE_VERSION_KEY, snapshot.version, timeout=None)
+                local_snapshot_cache.snapshot = snapshot
+                if timer is not None: timer.lap('snapshot_load', start_time)
+            else:
+                local_snapshot_cache.hits += 1
+    else:
+        local_snapshot_cache.hits += 1
+
+    if time.time() - snapshot.built_at >= CACHE_TIMEOUT - CACHE_REFRESH_AHEAD:
+        schedule_background_refresh()
+    return snapshot
+
+# Lecturas de la version en curso de cada event loop. Las solicitudes async concurrentes comparten una sola lectura de la cache.
+pending_version_reads = {}
+
+# Esta funcion se encarga de obtener la version actual de los datos pre-procesados desde la cache con su api async.
+# Si otra solicitud del mismo event loop ya esta leyendo la version, se espera esa lectura en lugar de iniciar otra.
+async def aget_enrichment_data_version():
+    loop = asyncio.get_running_loop()
+    task = pending_version_reads.get(loop)
+    if task is None:
+        task = pending_version_reads[loop] = loop.create_task(cache.aget(CACHE_VERSION_KEY))
+        task.add_done_callback(lambda _: pending_version_reads.pop(loop, None))
+    # La cancelacion de una solicitud no debe cancelar la lectura que comparten las demas.
+    return await asyncio.shield(task)
+
+# Esta funcion se encarga de obtener los datos pre-procesados desde una vista async. Si la version no cambio, se entregan
+# los datos de la capa local del proceso sin salir del event loop; en caso contrario se cargan con get_processed_enrichment_data
+# (cache compartida, archivo o base de datos) en un hilo, igual que cualquier codigo sincrono llamado desde una vista async.
+async def aget_processed_enrichment_data():
+    version = await aget_enrichment_data_version()
+    snapshot = local_snapshot_cache.snapshot
+    if snapshot is None or version is None or snapshot.version != version:
+        return await sync_to_async(get_processed_enrichment_data)()
+
+    local_snapshot_cache.hits += 1
+    if time.time() - snapshot.built_at >= CACHE_TIMEOUT - CACHE_REFRESH_AHEAD:
+        await sync_to_async(schedule_background_refresh)()
+    return snapshot
+
+# Esta funcion se encarga de precargar los datos pre-procesados, para que las solicitudes no tengan que construirlos.
+def warm_up_enrichment_data(force=False):
+    if force:
+        return rebuild_processed_enrichment_data()
+    return get_processed_enrichment_data()
+
+# Esta funcion se encarga de precargar los datos pre-procesados al iniciar un worker (wsgi/asgi), si esta habilitado en settings.
+# Un error de base de datos (ej: migraciones pendientes) no debe impedir que el worker inicie.
+def warm_up_on_startup():
+    if not getattr(settings, 'ENRICHMENT_WARMUP_ON_STARTUP', False):
+        return
+    try:
+        warm_up_enrichment_data()
+    except DatabaseError:
+        logger.exception("No fue posible precargar los datos pre-procesados del enriquecimiento")
+    finally:
+        connections.close_all()
+
+# Esta funcion se encarga de aplicar incrementalmente uno o varios cambios, como tuplas (objeto, eliminado), sobre los datos
+# pre-procesados en cache. Los datos se leen y se guardan una sola vez para todos los cambios (ej: los de una transaccion).
+# Si los datos no estan en cache no hay nada que actualizar, ya que la siguiente solicitud los construira desde la base de datos.
+# Si no se logra obtener el lock de actualizacion, se elimina la cache para no perder los cambios.
+def update_processed_enrichment_data_changes(changes):
+    if not changes:
+        return
+    if not acquire_cache_lock(CACHE_UPDATE_LOCK_KEY, UPDATE_LOCK_TIMEOUT, UPDATE_LOCK_WAIT):
+        cache.delete(CACHE_KEY)
+        bump_enrichment_data_version()
+        return
+
+    try:
+        snapshot = get_cached_snapshot()
+        version = bump_enrichment_data_version()
+        if snapshot is None:
+            return
+        for instance, deleted in changes:
+            snapshot.apply_instance_change(instance, deleted)
+        snapshot.version = version
+        set_cached_snapshot(snapshot)
+    finally:
+        cache.delete(CACHE_UPDATE_LOCK_KEY)
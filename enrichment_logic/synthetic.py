@@ -0,0 +1,107 @@
+from .models import Category, Merchant, Keyword, fill_category_columns
+import datetime
+import decimal
+
+# Constantes
+# Silabas con las que se forman las palabras sinteticas de comercios y keywords (cada numero corresponde a una palabra distinta).
+SYLLABLES = (
+    'ba', 'be', 'bi', 'bo', 'ca', 'ce', 'co', 'cu', 'da', 'de', 'di', 'do', 'fa', 'fe', 'fi', 'fo', 'ga', 'go', 'la', 'le',
+    'li', 'lo', 'ma', 'me', 'mi', 'mo', 'na', 'ne', 'ni', 'no', 'pa', 'pe', 'pi', 'po', 'ra', 're', 'ri', 'ro', 'sa', 'se',
+    'si', 'so', 'ta', 'te', 'ti', 'to', 'va', 've', 'vi', 'za',
+)
+# Palabras de relleno de las descripciones (no forman parte de ningun keyword, comercio ni categoria sintetica).
+FILLER_WORDS = ('compra', 'pago', 'transferencia', 'tarjeta', 'cuota', 'santiago', 'online', 'sucursal', 'ref', 'pos')
+# Palabras de los nombres de categorias, comercios y keywords sinteticos.
+CATEGORY_WORDS = (
+    'alimentacion', 'transporte', 'salud', 'educacion', 'hogar', 'entretenimiento', 'viajes', 'servicios', 'vestuario',
+    'tecnologia', 'mascotas', 'seguros', 'inversiones', 'sueldos', 'arriendos', 'donaciones', 'impuestos', 'deportes',
+)
+MERCHANT_SUFFIXES = ('spa', 'store', 'express', 'market', 'chile', 'online', 'group', 'center')
+KEYWORD_PREFIXES = ('www', 'app', 'pos', 'web', 'mp', 'pay')
+
+
+# Esta funcion se encarga de obtener la palabra sintetica de un numero, distinta para cada numero.
+def get_synthetic_word(number):
+    syllables = []
+    while True:
+        number, remainder = divmod(number, len(SYLLABLES))
+        syllables.append(SYLLABLES[remainder])
+        if number == 0:
+            break
+        number -= 1
+    return ''.join(syllables) + 'x'
+
+# Esta funcion se encarga de crear (sin guardar) un catalogo sintetico de categorias, comercios y keywords.
+# Las categorias alternan entre ingresos y gastos; los comercios tienen nombres de una a tres palabras, y los keywords
+# son variantes de la marca del comercio (prefijos, sufijos y codigos), con distinta cantidad de palabras.
+# Retorna una tupla (categorias, comercios, keywords).
+def generate_catalog(rng, keyword_count, merchant_count=None, category_count=50):
+    merchant_count = merchant_count or max(1, keyword_count // 2)
+    categories = [
+        Category(name=f"{CATEGORY_WORDS[number % len(CATEGORY_WORDS)]} {get_synthetic_word(number)}", type=('expense', 'income')[number % 2])
+        for number in range(category_count)
+    ]
+
+    merchants = []
+    for number in range(merchant_count):
+        brand = get_synthetic_word(category_count + number)
+        words = [brand] + rng.sample(MERCHANT_SUFFIXES, rng.choice((0, 0, 1, 2)))
+        merchants.append(Merchant(merchant_name=' '.join(words), category=rng.choice(categories) if categories else None))
+
+    keywords = []
+    for number in range(keyword_count):
+        merchant = merchants[number % merchant_count]
+        brand = merchant.merchant_name.split()[0]
+        variant = rng.randrange(4)
+        if variant == 0:
+            keyword = f"{brand} {get_synthetic_word(category_count + merchant_count + number)}"
+        elif variant == 1:
+            keyword = f"{rng.choice(KEYWORD_PREFIXES)} {brand} {get_synthetic_word(category_count + merchant_count + number)}"
+        elif variant == 2:
+            keyword = f"{brand}*{get_synthetic_word(category_count + merchant_count + number)}"
+        else:
+            keyword = get_synthetic_word(category_count + merchant_count + number)
+        keywords.append(Keyword(keyword=keyword, merchant=merchant))
+    return categories, merchants, keywords
+
+# Esta funcion se encarga de guardar un catalogo sintetico en la base de datos, en lotes.
+def save_catalog(categories, merchants, keywords, batch_size=1000):
+    Category.objects.bulk_create(categories, batch_size=batch_size)
+    fill_category_columns(merchants, batch_size)
+    Merchant.objects.bulk_create(merchants, batch_size=batch_size)
+    fill_category_columns(keywords, batch_size)
+    Keyword.objects.bulk_create(keywords, batch_size=batch_size)
+
+# Esta funcion se encarga de obtener los patrones del catalogo (keywords y nombres de comercios) junto al tipo de movimiento
+# con el que coinciden, que es el de la categoria de su comercio.
+def get_catalog_patterns(merchants, keywords):
+    patterns = [(merchant.merchant_name, merchant.category.type) for merchant in merchants if merchant.category is not None]
+    patterns += [(keyword.keyword, keyword.merchant.category.type) for keyword in keywords if keyword.merchant.category is not None]
+    return patterns
+
+# Esta funcion se encarga de generar un lote de transacciones sinteticas (ya validadas).
+# Una proporcion match_ratio de las descripciones contiene un keyword o nombre de comercio del catalogo, con un monto del
+# tipo de movimiento de su categoria, y el resto solo contiene palabras de relleno y codigos que no coinciden con nada.
+# unique_ratio es la proporcion de descripciones distintas del lote.
+def generate_transactions(rng, patterns, size, match_ratio=0.7, unique_ratio=0.5):
+    unique_count = max(1, int(size * unique_ratio))
+    descriptions = []
+    for number in range(unique_count):
+        if patterns and rng.random() < match_ratio:
+            pattern, category_type = rng.choice(patterns)
+            description = f"{rng.choice(FILLER_WORDS)} {pattern.upper()} {rng.choice(FILLER_WORDS)} {number}"
+        else:
+            description, category_type = f"{rng.choice(FILLER_WORDS)} {rng.choice(FILLER_WORDS)} {number}", rng.choice(('income', 'expense'))
+        descriptions.append((description, category_type))
+
+    date = datetime.date(2025, 1, 1)
+    transactions = []
+    for _ in range(size):
+        description, category_type = rng.choice(descriptions)
+        amount = decimal.Decimal(rng.randint(1, 10000000)).scaleb(-2)
+        transactions.append({
+            'description': description,
+            'amount': amount if category_type == 'income' else -amount,
+            'date': date + datetime.timedelta(days=rng.randrange(365)),
+        })
+    return transactions
@@ -1,10 +1,58 @@
-from django.test import TestCase
+from django.test import TestCase, SimpleTestCase, TransactionTestCase, override_settings
 from django.core.cache import cache
-from .models import Category, Merchant, Keyword
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.management import call_command
+from django.db import connection, transaction, DatabaseError
+from django.test.utils import CaptureQueriesContext
+from django.core.management.base import CommandError
+from unittest import mock, skipUnless
+from io import StringIO
+from .models import Category, Merchant, Keyword, Transaction, TransactionToken, EnrichmentJob, EnrichmentJobChunk
+from . import jobs
+from . import parallel
+from . import files
+from .persistence import TransactionWriteBehindBuffer, persist_transactions, transaction_write_buffer
+from .reenrichment import ReenrichmentScope, ReenrichmentExecutor, get_text_tokens, reenrich_transactions
+from . import reenrichment
+from .timing import StageTimer
+from .metrics import MetricsRegistry, metrics_registry, render_metrics
+from .synthetic import generate_catalog, save_catalog, get_catalog_patterns, generate_transactions
+from .management.commands.enrich_file import Command as EnrichFileCommand
+from .serializer import CategorySerializer, MerchantSerializer, EnrichedMerchantSerializer, InputTransactionSerializer
+from .renderers import EnrichmentJSONRenderer
+from .enrichment import TransactionEnricher
+from .validators import BulkInputTransactionValidator
+from .result_cache import MatchResultCache, match_result_cache
+from .checks import check_shared_cache
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from drf_spectacular.generators import SchemaGenerator
+from .matcher import PatternMatcher, CategoryIndex, get_word_positions
+from .snapshot import normalize_text, get_pattern, STOP_WORDS, CACHE_KEY, CACHE_REBUILD_LOCK_KEY, CACHE_TIMEOUT, EnrichmentSnapshot, get_cached_snapshot, get_processed_enrichment_data
+from . import snapshot
+from . import views
 import json
+import datetime
+import decimal
 import uuid
 import random
 import time
+import tempfile
+import os
+import csv
+import io
+import asyncio
+import marshal
+from concurrent.futures import ThreadPoolExecutor
+import re
+import threading
+import base64
+from urllib.parse import parse_qs, unquote, urlparse
+
+# Esta funcion se encarga de obtener el contenido de un bloque de datos pre-procesados serializados. Se comparan los contenidos
+# y no los bloques, ya que marshal codifica distinto los objetos compartidos segun sus referencias.
+def get_snapshot_content(blob):
+    return marshal.loads(blob[snapshot.SNAPSHOT_HEADER.size:])
 
 class CategoryViewSetTestCase(TestCase):
     @classmethod
@@ -22,7 +70,7 @@ class CategoryViewSetTestCase(TestCase):
         response = self.client.get(self.list_url)
         self.assertEqual(response.status_code, 200)
         data = response.json()
-        results = data
+        results = data['results']
         self.assertIsInstance(results, list)
         self.assertEqual(len(results), 2)
         self.assertTrue(any(item['name'] == self.category1.name for item in results))
@@ -119,7 +167,7 @@ class MerchantViewSetTestCase(TestCase):
         response = self.client.get(self.list_url)
         self.assertEqual(response.status_code, 200)
         data = response.json()
-        results = data
+        results = data['results']
         self.assertIsInstance(results, list)
         self.assertEqual(len(results), 2)
         self.assertTrue(any(item['merchant_name'] == self.merchant1.merchant_name for item in results))
@@ -226,7 +274,7 @@ class KeywordViewSetTestCase(TestCase):
         response = self.client.get(self.list_url)
         self.assertEqual(response.status_code, 200)
         data = response.json()
-        results = data
+        results = data['results']
         self.assertIsInstance(results, list)
         self.assertEqual(len(results), 2)
         self.assertTrue(any(item['keyword'] == self.keyword1.keyword for item in results))
@@ -566,4 +614,2142 @@ class EnrichTransactionsAPIViewTestCase(TestCase):
         self.assertEqual(len(data['transactions']), num_records)
     
         max_duration = 8.0
-        self.assertLess(duration, max_duration, f"Processing {num_records} records took {duration:.4f}s, exceeding the limit of {max_duration}s.")
\ No newline at end of file
+        self.assertLess(duration, max_duration, f"Processing {num_records} records took {duration:.4f}s, exceeding the limit of {max_duration}s.")
+
+
+class PatternMatcherTestCase(SimpleTestCase):
+    # Metodo para construir un matcher a partir de una lista de textos, junto a los patrones Regex originales.
+    def build_matcher(self, texts):
+        matcher = PatternMatcher()
+        regex_entries = []
+        for text in texts:
+            words = normalize_text(text).split()
+            pattern = get_pattern(words, text)
+            matcher.add(text, words, len(text), text, pattern)
+            regex_entries.append((text, pattern))
+        regex_entries.sort(key=lambda entry: len(entry[0]), reverse=True)
+        return matcher, regex_entries
+
+    # Metodo que replica la busqueda original, recorriendo todos los patrones Regex ordenados por largo.
+    def regex_search(self, regex_entries, description_normalized):
+        for text, pattern in regex_entries:
+            if pattern.search(description_normalized):
+                return text
+        return None
+
+    # Test para probar que un patron Regex invalido se registra en el log (y no con print), retornando None.
+    def test_invalid_pattern_is_logged(self):
+        with mock.patch('enrichment_logic.snapshot.re.compile', side_effect=re.error('invalido')):
+            with self.assertLogs('enrichment_logic.snapshot', level='WARNING') as logs:
+                self.assertIsNone(get_pattern(['uber'], 'Uber'))
+        self.assertIn('Uber', logs.output[0])
+
+    # Test para probar que gana el patron mas largo cuando varios coinciden.
+    def test_longest_pattern_wins(self):
+        matcher, _ = self.build_matcher(['Uber', 'Uber Eats'])
+        description = normalize_text('Pago UBER EATS Santiago')
+        self.assertEqual(matcher.search(description, get_word_positions(description)), 'Uber Eats')
+
+    # Test para probar que las palabras de un patron deben aparecer en orden, aunque no sean contiguas.
+    def test_multi_word_ordered_match(self):
+        matcher, _ = self.build_matcher(['Sueldo Empresa X'])
+        matching = normalize_text('Abono Sueldo mensual Empresa X Ltda')
+        not_matching = normalize_text('Empresa X Sueldo')
+        self.assertEqual(matcher.search(matching, get_word_positions(matching)), 'Sueldo Empresa X')
+        self.assertIsNone(matcher.search(not_matching, get_word_positions(not_matching)))
+
+    # Test para probar que los patrones con simbolos mantienen la semantica Regex.
+    def test_symbol_pattern_fallback(self):
+        matcher, _ = self.build_matcher(['H&M'])
+        description = normalize_text('Compra H&M Costanera')
+        self.assertEqual(matcher.search(description, get_word_positions(description)), 'H&M')
+
+    # Test para probar que eliminar un patron lo quita de la busqueda.
+    def test_remove_pattern(self):
+        matcher, _ = self.build_matcher(['Uber', 'Uber Eats'])
+        matcher.remove('Uber Eats')
+        description = normalize_text('uber eats')
+        self.assertEqual(matcher.search(description, get_word_positions(description)), 'Uber')
+
+    # Test para comparar el matcher con la busqueda Regex original sobre datos aleatorios.
+    def test_equivalence_with_regex_scan(self):
+        rng = random.Random(42)
+        vocabulary = ['uber', 'eats', 'pago', 'lider', 'enel', 'luz', 'sky', 'jumbo', 'x', 'h&m', 'cafe', 'copec', 'tag:1']
+        texts = set()
+        while len(texts) < 60:
+            texts.add(' '.join(rng.choice(vocabulary) for _ in range(rng.randint(1, 3))))
+        matcher, regex_entries = self.build_matcher(sorted(texts))
+        for _ in range(500):
+            description = normalize_text(' '.join(rng.choice(vocabulary) for _ in range(rng.randint(1, 8))))
+            expected = self.regex_search(regex_entries, description)
+            self.assertEqual(matcher.search(description, get_word_positions(description)), expected, description)
+
+
+class CategoryIndexTestCase(SimpleTestCase):
+    # Metodo que replica la busqueda original, recorriendo todas las categorias y quedandose con el primer mejor puntaje.
+    def scan_search(self, categories, description_words_set):
+        best_score = 0
+        matched_category = None
+        for name, category_words_set in categories:
+            score = len(description_words_set.intersection(category_words_set))
+            if score > best_score:
+                best_score = score
+                matched_category = name
+        return matched_category
+
+    # Test para probar que en empate gana la primera categoria agregada.
+    def test_tie_keeps_first_category(self):
+        index = CategoryIndex()
+        index.add('b', {'comida', 'rapida'}, 'Comida Rapida')
+        index.add('a', {'comida', 'sana'}, 'Comida Sana')
+        self.assertEqual(index.search({'comida'}), 'Comida Rapida')
+        self.assertEqual(index.search({'comida', 'sana'}), 'Comida Sana')
+        self.assertIsNone(index.search({'viaje'}))
+
+    # Test para comparar el indice invertido con el recorrido original sobre datos aleatorios.
+    def test_equivalence_with_category_scan(self):
+        rng = random.Random(7)
+        vocabulary = ['gastos', 'comida', 'transporte', 'servicios', 'basicos', 'sueldo', 'otros', 'hogar', 'salud']
+        categories = []
+        index = CategoryIndex()
+        for position in range(25):
+            name = ' '.join(rng.choice(vocabulary) for _ in range(rng.randint(1, 3)))
+            category_words_set = {word for word in name.split() if word not in STOP_WORDS}
+            categories.append((f'{position} {name}', category_words_set))
+            index.add(position, category_words_set, f'{position} {name}')
+        for _ in range(300):
+            description_words_set = {rng.choice(vocabulary) for _ in range(rng.randint(1, 4))}
+            self.assertEqual(index.search(description_words_set), self.scan_search(categories, description_words_set))
+
+
+class EnrichmentDataIncrementalUpdateTestCase(TestCase):
+    @classmethod
+    # Metodo de creacion de datos de prueba.
+    def setUpTestData(cls):
+        cls.cat_transporte = Category.objects.create(name='Transporte Inc', type='expense')
+        cls.cat_comida = Category.objects.create(name='Comida Inc', type='expense')
+        cls.cat_sueldo = Category.objects.create(name='Sueldo Inc', type='income')
+        cls.merch_uber = Merchant.objects.create(merchant_name='Uber Inc', category=cls.cat_transporte)
+        cls.merch_rappi = Merchant.objects.create(merchant_name='Rappi Inc', category=cls.cat_comida)
+        cls.keyword_uber = Keyword.objects.create(keyword='Uber', merchant=cls.merch_uber)
+        cls.descriptions = ['Viaje Uber', 'Uber Eats pedido', 'Rappi almuerzo', 'comida casa', 'Sueldo mes', 'pedido eats', 'nada']
+        print("\nIncremental Update Test")
+
+    def setUp(self):
+        cache.clear()
+
+    # Metodo que resuelve el id del comercio y de la categoria de cada descripcion con los datos pre-procesados entregados.
+    def enrich(self, processed_data, category_type='expense'):
+        results = []
+        for description in self.descriptions:
+            merchant_index, category_index = processed_data.match(normalize_text(description), category_type)
+            results.append((
+                processed_data.merchants[merchant_index][0] if merchant_index is not None else None,
+                processed_data.categories[category_index][0] if category_index is not None else None,
+            ))
+        return results
+
+    # Metodo que verifica que los datos en cache coincidan con una reconstruccion completa desde la base de datos.
+    def assertMatchesFullRebuild(self):
+        cached_data = get_cached_snapshot()
+        self.assertIsNotNone(cached_data, "Snapshot should be updated in place, not dropped")
+        rebuilt_data = EnrichmentSnapshot.build()
+        for category_type in ['income', 'expense']:
+            self.assertEqual(self.enrich(cached_data, category_type), self.enrich(rebuilt_data, category_type))
+
+    # Test para probar que crear un keyword actualiza los datos en cache y su version.
+    def test_keyword_create_updates_snapshot(self):
+        version = get_processed_enrichment_data().version
+        with self.captureOnCommitCallbacks(execute=True):
+            Keyword.objects.create(keyword='Uber Eats', merchant=self.merch_rappi)
+        cached_data = get_cached_snapshot()
+        self.assertGreater(cached_data.version, version)
+        self.assertEqual(self.enrich(cached_data)[1][0], str(self.merch_rappi.pk))
+        self.assertMatchesFullRebuild()
+
+    # Test para probar que cambiar el tipo de una categoria mueve sus comercios y keywords.
+    def test_category_type_change_moves_entries(self):
+        get_processed_enrichment_data()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cat_transporte.type = 'income'
+            self.cat_transporte.save()
+        self.assertMatchesFullRebuild()
+        self.assertEqual(self.enrich(get_cached_snapshot(), 'income')[0][0], str(self.merch_uber.pk))
+
+    # Test para probar que renombrar y eliminar comercios actualiza los datos en cache.
+    def test_merchant_rename_and_delete(self):
+        get_processed_enrichment_data()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.merch_rappi.merchant_name = 'Pedido Rappi'
+            self.merch_rappi.save()
+        self.assertMatchesFullRebuild()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.merch_uber.delete()
+        self.assertMatchesFullRebuild()
+        self.assertNotIn(str(self.keyword_uber.pk), [row[0] for row in get_cached_snapshot().keywords if row is not None])
+
+    # Test para probar que los cambios de una transaccion (ej: un comercio eliminado con sus keywords en cascada) se aplican juntos:
+    # los datos en cache se leen y se guardan una sola vez, y los cambios de un savepoint revertido se descartan.
+    def test_transaction_changes_are_applied_together(self):
+        Keyword.objects.create(keyword='Uber Viaje', merchant=self.merch_uber)
+        Keyword.objects.create(keyword='Uber Pedido', merchant=self.merch_uber)
+        get_processed_enrichment_data()
+        with mock.patch('enrichment_logic.snapshot.set_cached_snapshot', wraps=snapshot.set_cached_snapshot) as set_mock:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.merch_uber.delete()
+        self.assertEqual(set_mock.call_count, 1)
+        self.assertMatchesFullRebuild()
+
+        with mock.patch('enrichment_logic.snapshot.set_cached_snapshot', wraps=snapshot.set_cached_snapshot) as set_mock:
+            with self.captureOnCommitCallbacks(execute=True):
+                with transaction.atomic():
+                    Keyword.objects.create(keyword='Rappi', merchant=self.merch_rappi)
+                    Keyword.objects.create(keyword='Rappi Pedido', merchant=self.merch_rappi)
+                try:
+                    with transaction.atomic():
+                        Keyword.objects.create(keyword='Comida Casa', merchant=self.merch_rappi)
+                        raise DatabaseError
+                except DatabaseError:
+                    pass
+        self.assertEqual(set_mock.call_count, 1)
+        self.assertMatchesFullRebuild()
+        self.assertEqual(get_cached_snapshot().get_counts()['keywords'], 2)
+
+    # Test para probar que la copia para aplicar un cambio (copy_for_change) entrega los mismos resultados que una copia completa,
+    # sin modificar los datos originales y compartiendo con ellos los matchers que el cambio no modifica.
+    def test_copy_for_change_matches_full_copy(self):
+        original = EnrichmentSnapshot.build()
+        blob = original.serialize()
+        self.merch_uber.merchant_name = 'Uber Viajes'
+        self.cat_comida.type = 'income'
+        for instance in [Keyword(keyword='Eats', merchant=self.merch_rappi), self.merch_uber, self.cat_comida]:
+            copy = original.copy_for_change(instance)
+            copy.apply_instance_change(instance)
+            full_copy = EnrichmentSnapshot.deserialize(blob)
+            full_copy.apply_instance_change(instance)
+            for category_type in ['income', 'expense']:
+                self.assertEqual(self.enrich(copy, category_type), self.enrich(full_copy, category_type))
+            self.assertEqual(get_snapshot_content(original.serialize()), get_snapshot_content(blob))
+        copy = original.copy_for_change(Keyword(keyword='Eats', merchant=self.merch_rappi))
+        self.assertIsNot(copy.keyword_matchers['expense'], original.keyword_matchers['expense'])
+        self.assertIs(copy.merchant_matchers['expense'], original.merchant_matchers['expense'])
+        self.assertIs(copy.category_indexes['expense'], original.category_indexes['expense'])
+
+    # Test para probar que los cambios de un comercio o categoria solo sincronizan las filas que los referencian (indices inversos),
+    # y que los indices inversos se mantienen al serializar y al modificar las filas.
+    def test_changes_only_sync_referencing_rows(self):
+        Keyword.objects.create(keyword='Rappi', merchant=self.merch_rappi)
+        processed_data = EnrichmentSnapshot.deserialize(EnrichmentSnapshot.build().serialize())
+        uber_keywords = processed_data.get_referencing_rows('keywords', str(self.merch_uber.pk))
+        self.assertEqual([processed_data.keywords[index][0] for index in uber_keywords], [str(self.keyword_uber.pk)])
+        with mock.patch.object(EnrichmentSnapshot, 'sync_keyword', autospec=True, side_effect=EnrichmentSnapshot.sync_keyword) as sync_keyword:
+            self.merch_uber.merchant_name = 'Uber Viajes'
+            processed_data.apply_instance_change(self.merch_uber)
+        self.assertEqual([call.args[1] for call in sync_keyword.call_args_list], uber_keywords)
+        with mock.patch.object(EnrichmentSnapshot, 'sync_merchant', autospec=True, side_effect=EnrichmentSnapshot.sync_merchant) as sync_merchant:
+            processed_data.apply_instance_change(self.cat_comida)
+        self.assertEqual([call.args[1] for call in sync_merchant.call_args_list], processed_data.get_referencing_rows('merchants', str(self.cat_comida.pk)))
+        self.assertEqual(len(sync_merchant.call_args_list), 1)
+
+        # Al mover un comercio de categoria y eliminar un keyword, los indices inversos coinciden con los calculados desde las filas.
+        self.merch_rappi.category = self.cat_transporte
+        processed_data.apply_instance_change(self.merch_rappi)
+        processed_data.apply_instance_change(self.keyword_uber, deleted=True)
+        maintained = processed_data.get_reference_indexes()
+        processed_data._reference_indexes = None
+        self.assertEqual(maintained, processed_data.get_reference_indexes())
+        self.assertEqual(len(processed_data.get_referencing_rows('merchants', str(self.cat_transporte.pk))), 2)
+        self.assertEqual(processed_data.get_referencing_rows('keywords', str(self.merch_uber.pk)), [])
+
+    # Test para probar que, con una cache compartida entre procesos (FileBasedCache), el cambio de una regla queda disponible para
+    # otro proceso: una conexion independiente a la cache y la capa local vacia de otro proceso obtienen la nueva version.
+    def test_update_is_visible_through_shared_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            shared_cache = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory}}
+            with override_settings(CACHES=shared_cache):
+                get_processed_enrichment_data()
+                with self.captureOnCommitCallbacks(execute=True):
+                    Keyword.objects.create(keyword='Uber Eats', merchant=self.merch_rappi)
+
+                other_process_cache = FileBasedCache(directory, {})
+                version = other_process_cache.get(snapshot.CACHE_VERSION_KEY)
+                other_process_data = EnrichmentSnapshot.deserialize(other_process_cache.get(CACHE_KEY))
+                self.assertEqual(other_process_data.version, version)
+                self.assertEqual(self.enrich(other_process_data)[1][0], str(self.merch_rappi.pk))
+                snapshot.local_snapshot_cache.clear()
+                self.assertEqual(get_processed_enrichment_data().version, version)
+
+    # Test para probar que check --deploy advierte cuando la cache por defecto es local a cada proceso.
+    def test_local_cache_check(self):
+        self.assertEqual([warning.id for warning in check_shared_cache(None)], ['enrichment_logic.W001'])
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory}}):
+                self.assertEqual(check_shared_cache(None), [])
+
+    # Test para probar que las escrituras a traves de la API actualizan la respuesta del enriquecimiento.
+    def test_api_write_is_visible_to_enrichment(self):
+        payload = [{"description": "Pedido Rappi", "amount": -4500, "date": "2025-04-28"}]
+        self.client.post('/api/v1/transactions/enrich/', json.dumps(payload), content_type='application/json')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/v1/keyword/', json.dumps({'keyword': 'Pedido', 'merchant': str(self.merch_uber.id)}), content_type='application/json')
+        response = self.client.post('/api/v1/transactions/enrich/', json.dumps(payload), content_type='application/json')
+        self.assertEqual(response.json()['transactions'][0]['enriched_merchant']['id'], str(self.merch_uber.id))
+
+
+class EnrichmentDataRebuildTestCase(TestCase):
+    @classmethod
+    # Metodo de creacion de datos de prueba.
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Transporte Reb', type='expense')
+        cls.merchant = Merchant.objects.create(merchant_name='Uber Reb', category=cls.category)
+        Keyword.objects.create(keyword='Uber', merchant=cls.merchant)
+        print("\nRebuild Test")
+
+    def setUp(self):
+        cache.clear()
+
+    # Test para probar que los datos por expirar se siguen sirviendo mientras se reconstruyen en segundo plano.
+    def test_stale_data_is_served_while_refreshing(self):
+        stale_data = get_processed_enrichment_data()
+        stale_data.built_at -= CACHE_TIMEOUT
+        cache.set(CACHE_KEY, stale_data.serialize())
+        snapshot.local_snapshot_cache.clear()
+        with mock.patch.object(snapshot, 'start_background_thread', side_effect=lambda target: None) as start_thread:
+            self.assertEqual(get_processed_enrichment_data().built_at, stale_data.built_at)
+            # Mientras el lock de reconstruccion este tomado, no se inicia otra reconstruccion.
+            get_processed_enrichment_data()
+        self.assertEqual(start_thread.call_count, 1)
+        start_thread.call_args[0][0]()
+        self.assertGreater(get_cached_snapshot().built_at, stale_data.built_at)
+        self.assertIsNone(cache.get(CACHE_REBUILD_LOCK_KEY))
+
+    # Test para probar que, sin datos en cache, un worker espera la reconstruccion de otro en lugar de consultar la base de datos.
+    def test_cold_path_waits_for_rebuilding_worker(self):
+        rebuilt_data = EnrichmentSnapshot.build()
+        cache.add(CACHE_REBUILD_LOCK_KEY, True)
+        with mock.patch.object(snapshot.time, 'sleep', side_effect=lambda _: cache.set(CACHE_KEY, rebuilt_data.serialize())):
+            with self.assertNumQueries(0):
+                processed_data = get_processed_enrichment_data()
+        self.assertEqual(processed_data.keywords, rebuilt_data.keywords)
+
+    # Test para probar que, si la reconstruccion no logra guardar los datos, se entregan sin version: la capa local los vuelve
+    # a cargar en la siguiente solicitud en lugar de servirlos como la version actual.
+    def test_unstored_rebuild_has_no_version(self):
+        with mock.patch.object(snapshot, 'store_processed_enrichment_data', return_value=False) as store_mock:
+            unstored_data = get_processed_enrichment_data()
+        self.assertEqual(store_mock.call_count, snapshot.REBUILD_ATTEMPTS)
+        self.assertIsNone(unstored_data.version)
+        self.assertIsNone(cache.get(snapshot.CACHE_VERSION_KEY))
+        processed_data = get_processed_enrichment_data()
+        self.assertIsNot(processed_data, unstored_data)
+        self.assertEqual(processed_data.version, cache.get(snapshot.CACHE_VERSION_KEY))
+
+    # Test para probar que los datos construidos cuando el worker que reconstruye no termina a tiempo no tienen version,
+    # y que sus resultados no se guardan en la cache de resultados.
+    def test_wait_timeout_builds_unstored_data(self):
+        cache.add(CACHE_REBUILD_LOCK_KEY, True)
+        with mock.patch.object(snapshot, 'REBUILD_WAIT', 0):
+            processed_data = get_processed_enrichment_data()
+        self.assertIsNone(processed_data.version)
+        self.assertIsNone(get_cached_snapshot())
+        result_cache = MatchResultCache(10)
+        result_cache.set(processed_data.version, 'viaje uber', 'expense', processed_data.match_with_stage('viaje uber', 'expense'))
+        self.assertIsNone(result_cache.get(processed_data.version, 'viaje uber', 'expense'))
+
+    # Test para probar que las filas se construyen ordenadas por fecha de creacion e id, por lo que sus indices no dependen
+    # del orden en que la base de datos entregue las filas.
+    def test_build_orders_rows(self):
+        Keyword.objects.create(keyword='Uber Eats', merchant=self.merchant)
+        Keyword.objects.create(keyword='Uber Viaje', merchant=self.merchant)
+        built = EnrichmentSnapshot.build()
+        keyword_ids = [row[0] for row in built.keywords]
+        self.assertEqual(keyword_ids, [str(pk) for pk in Keyword.objects.order_by('created_at', 'id').values_list('id', flat=True)])
+        with CaptureQueriesContext(connection) as queries:
+            EnrichmentSnapshot.build()
+        self.assertTrue(all('ORDER BY' in query['sql'] for query in queries if 'enrichment_logic_' in query['sql']))
+
+    # Test para probar que el comando de precarga deja los datos pre-procesados en cache.
+    def test_warm_command_populates_cache(self):
+        out = StringIO()
+        call_command('warm_enrichment_cache', stdout=out)
+        self.assertIsNotNone(cache.get(CACHE_KEY))
+        self.assertIn('1 keywords', out.getvalue())
+        with self.assertNumQueries(0):
+            get_processed_enrichment_data()
+
+
+class EnrichmentSnapshotTestCase(TestCase):
+    @classmethod
+    # Metodo de creacion de datos de prueba.
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Transporte Snap', type='expense')
+        cls.merchant = Merchant.objects.create(merchant_name='Uber Snap', merchant_logo='https://logo.test/uber.png', category=cls.category)
+        Keyword.objects.create(keyword='Uber', merchant=cls.merchant)
+        Keyword.objects.create(keyword='H&M', merchant=cls.merchant)
+        print("\nSnapshot Test")
+
+    def setUp(self):
+        cache.clear()
+
+    # Test para probar que la cache almacena un bloque binario y que se reconstruye con los mismos resultados.
+    def test_serialize_roundtrip(self):
+        built = get_processed_enrichment_data()
+        blob = cache.get(CACHE_KEY)
+        self.assertIsInstance(blob, bytes)
+        loaded = EnrichmentSnapshot.deserialize(blob)
+        self.assertEqual(loaded.version, built.version)
+        self.assertEqual(loaded.merchants, built.merchants)
+        for description in ['viaje uber', 'compra h&m', 'transporte publico', 'nada']:
+            self.assertEqual(loaded.match(description, 'expense'), built.match(description, 'expense'))
+
+    # Test para probar que un bloque invalido o de otra version del formato se descarta.
+    def test_invalid_blob_is_ignored(self):
+        blob = EnrichmentSnapshot.build().serialize()
+        self.assertIsNone(EnrichmentSnapshot.deserialize(b'XXXX' + blob[4:]))
+        self.assertIsNone(EnrichmentSnapshot.deserialize(blob[:-3]))
+        self.assertIsNone(EnrichmentSnapshot.deserialize(None))
+
+    # Test para probar que la representacion de comercios y categorias es igual a la de sus serializers.
+    def test_representations_match_model_serializers(self):
+        built = EnrichmentSnapshot.build()
+        merchant_index, category_index = built.match('viaje uber', 'expense')
+        merchant_data = EnrichedMerchantSerializer(built.get_merchant(merchant_index)).data
+        self.assertEqual(json.dumps(merchant_data), json.dumps(MerchantSerializer(self.merchant).data, default=str))
+        category_data = CategorySerializer(built.get_category(category_index)).data
+        self.assertEqual(json.dumps(category_data), json.dumps(CategorySerializer(self.category).data, default=str))
+
+
+class LocalSnapshotCacheTestCase(TestCase):
+    @classmethod
+    # Metodo de creacion de datos de prueba.
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Transporte Local', type='expense')
+        cls.merchant = Merchant.objects.create(merchant_name='Uber Local', category=cls.category)
+        print("\nLocal Snapshot Cache Test")
+
+    def setUp(self):
+        cache.clear()
+        snapshot.local_snapshot_cache.clear()
+
+    # Test para probar que, si la version no cambia, los datos se entregan desde la memoria del proceso sin decodificarlos.
+    def test_hit_does_not_decode_snapshot(self):
+        first = get_processed_enrichment_data()
+        with mock.patch.object(EnrichmentSnapshot, 'deserialize') as deserialize:
+            with self.assertNumQueries(0):
+                second = get_processed_enrichment_data()
+        self.assertIs(second, first)
+        deserialize.assert_not_called()
+        stats = snapshot.local_snapshot_cache.get_stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['reloads']), (1, 1, 0))
+
+    # Test para probar que un cambio de version provoca la recarga de los datos locales.
+    def test_version_change_reloads_snapshot(self):
+        first = get_processed_enrichment_data()
+        with self.captureOnCommitCallbacks(execute=True):
+            Keyword.objects.create(keyword='Uber', merchant=self.merchant)
+        second = get_processed_enrichment_data()
+        self.assertIsNot(second, first)
+        self.assertEqual(second.version, cache.get(snapshot.CACHE_VERSION_KEY))
+        self.assertEqual(second.get_counts()['keywords'], 1)
+        self.assertEqual(snapshot.local_snapshot_cache.get_stats()['reloads'], 1)
+
+
+class EnrichmentSnapshotFileTestCase(TestCase):
+    @classmethod
+    # Metodo de creacion de datos de prueba.
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Transporte File', type='expense')
+        cls.merchant = Merchant.objects.create(merchant_name='Uber File', category=cls.category)
+        Keyword.objects.create(keyword='Uber', merchant=cls.merchant)
+        print("\nSnapshot File Test")
+
+    def setUp(self):
+        cache.clear()
+        snapshot.local_snapshot_cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'enrichment_snapshot.bin')
+        settings_override = override_settings(ENRICHMENT_SNAPSHOT_FILE=self.path)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    # Test para probar que, sin datos en cache, se cargan desde el archivo del comando sin construirlos desde la base de datos.
+    def test_cold_cache_loads_built_file(self):
+        out = StringIO()
+        call_command('build_enrichment_snapshot', stdout=out)
+        self.assertIn('1 keywords', out.getvalue())
+        built = EnrichmentSnapshot.build()
+        with mock.patch.object(EnrichmentSnapshot, 'build', side_effect=AssertionError('build')):
+            loaded = get_processed_enrichment_data()
+        self.assertEqual(loaded.keywords, built.keywords)
+        self.assertEqual(loaded.match('viaje uber', 'expense'), built.match('viaje uber', 'expense'))
+        self.assertEqual(loaded.version, cache.get(snapshot.CACHE_VERSION_KEY))
+        self.assertIsNotNone(get_cached_snapshot())
+
+    # Test para probar que un archivo desactualizado se descarta, y que se reemplaza con los datos construidos desde la base de datos.
+    def test_outdated_file_falls_back_to_database(self):
+        call_command('build_enrichment_snapshot', stdout=StringIO())
+        Keyword.objects.create(keyword='Cabify', merchant=self.merchant)
+        self.assertIsNone(snapshot.read_snapshot_file(self.path, snapshot.get_rules_fingerprint()))
+        with self.assertRaises(CommandError):
+            call_command('build_enrichment_snapshot', '--check', stdout=StringIO())
+
+        loaded = get_processed_enrichment_data()
+        self.assertEqual(loaded.get_counts()['keywords'], 2)
+        updated = snapshot.read_snapshot_file(self.path, snapshot.get_rules_fingerprint())
+        self.assertEqual(updated.keywords, loaded.keywords)
+
+    # Test para probar que un archivo inexistente, vacio, truncado o de otro formato se descarta.
+    def test_invalid_file_is_ignored(self):
+        fingerprint = snapshot.get_rules_fingerprint()
+        self.assertIsNone(snapshot.read_snapshot_file(self.path, fingerprint))
+        snapshot.write_snapshot_file(self.path, EnrichmentSnapshot.build(), fingerprint)
+        with open(self.path, 'rb') as snapshot_file:
+            content = snapshot_file.read()
+        self.assertIsNotNone(snapshot.read_snapshot_file(self.path, fingerprint))
+        for invalid_content in (b'', content[:-3], b'XXXX' + content[4:]):
+            with open(self.path, 'wb') as snapshot_file:
+                snapshot_file.write(invalid_content)
+            self.assertIsNone(snapshot.read_snapshot_file(self.path, fingerprint))
+
+
+class SharedEnrichmentSnapshotTestCase(TestCase):
+    @classmethod
+    # Metodo de creacion de datos de prueba.
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Transporte Shared', type='expense')
+        cls.income_category = Category.objects.create(name='Sueldo Shared', type='income')
+        cls.merchant = Merchant.objects.create(merchant_name='Uber Shared', category=cls.category)
+        cls.other_merchant = Merchant.objects.create(merchant_name='Tienda H&M', category=cls.category)
+        Keyword.objects.create(keyword='Uber', merchant=cls.merchant)
+        Keyword.objects.create(keyword='Uber Eats Pedido', merchant=cls.other_merchant)
+        Keyword.objects.create(keyword='H&M', merchant=cls.other_merchant)
+        print("\nShared Snapshot Test")
+
+    def setUp(self):
+        cache.clear()
+        match_result_cache.clear()
+        snapshot.local_snapshot_cache.clear()
+        self.addCleanup(snapshot.local_snapshot_cache.clear)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    # Test para probar que el formato plano entrega los mismos resultados, filas y representaciones que los datos originales.
+    def test_layout_matches_like_snapshot(self):
+        built = EnrichmentSnapshot.build()
+        shared = snapshot.SharedEnrichmentSnapshot.from_buffer(built.to_shared_layout())
+        descriptions = ['viaje uber', 'uber eats pedido centro', 'compra h&m', 'uber shared', 'pago sueldo shared', 'transporte', 'nada']
+        for description in descriptions:
+            for category_type in ('income', 'expense'):
+                self.assertEqual(shared.match_with_stage(description, category_type), built.match_with_stage(description, category_type))
+        merchant_index, category_index = built.match('compra h&m', 'expense')
+        self.assertEqual(shared.get_merchant(merchant_index), built.get_merchant(merchant_index))
+        self.assertEqual(shared.get_merchant(merchant_index).fragment, built.get_merchant(merchant_index).fragment)
+        self.assertEqual(shared.categories[category_index], built.categories[category_index])
+        self.assertEqual(shared.get_counts(), built.get_counts())
+        self.assertEqual(EnrichmentSnapshot.deserialize(shared.serialize()).keywords, built.keywords)
+        self.assertIsNone(snapshot.SharedEnrichmentSnapshot.from_buffer(b'XXXX' + built.to_shared_layout()[4:]))
+        self.assertIsNone(snapshot.SharedEnrichmentSnapshot.from_buffer(built.to_shared_layout()[:100]))
+
+    # Test para probar que el primer proceso publica la version en el directorio compartido y el resto solo mapea el archivo,
+    # y que una nueva version reemplaza al archivo anterior sin afectar a quien aun tiene mapeados los datos anteriores.
+    def test_processes_share_published_version(self):
+        with override_settings(ENRICHMENT_SHARED_SNAPSHOT_DIR=self.directory):
+            first = get_processed_enrichment_data()
+            self.assertIsInstance(first, snapshot.SharedEnrichmentSnapshot)
+            first_path = snapshot.get_shared_snapshot_path(self.directory, first.version)
+            self.assertTrue(os.path.exists(first_path))
+
+            snapshot.local_snapshot_cache.clear()
+            with mock.patch.object(EnrichmentSnapshot, 'deserialize', side_effect=AssertionError('deserialize')):
+                second = get_processed_enrichment_data()
+            self.assertEqual(second.version, first.version)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                Keyword.objects.create(keyword='Cabify', merchant=self.merchant)
+            updated = get_processed_enrichment_data()
+            self.assertGreater(updated.version, first.version)
+            self.assertEqual(updated.match('viaje cabify', 'expense')[0], updated.match('viaje uber', 'expense')[0])
+            self.assertFalse(os.path.exists(first_path))
+            self.assertEqual(first.match('viaje cabify', 'expense'), (None, None))
+            self.assertEqual(os.listdir(self.directory), [os.path.basename(snapshot.get_shared_snapshot_path(self.directory, updated.version))])
+
+            response = self.client.post(
+                '/api/v1/transactions/enrich/',
+                json.dumps([{"description": "Viaje en Cabify", "amount": -4500, "date": "2025-04-28"}]),
+                content_type='application/json',
+            )
+            self.assertEqual(response.json()['transactions'][0]['enriched_merchant']['id'], str(self.merchant.id))
+
+
+class EnrichmentResponseRenderingTestCase(TestCase):
+    @classmethod
+    # Metodo de creacion de datos de prueba.
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Café "Rico" Render', type='expense')
+        cls.merchant = Merchant.objects.create(merchant_name='Starbucks Render', merchant_logo='https://logo.test/sb.png', category=cls.category)
+        Keyword.objects.create(keyword='Starbucks', merchant=cls.merchant)
+        print("\nResponse Rendering Test")
+
+    def setUp(self):
+        cache.clear()
+        match_result_cache.clear()
+
+    # Test para probar que la respuesta es identica, byte a byte, a la generada con los serializers de los modelos.
+    def test_response_bytes_match_model_serializers(self):
+        payload = [
+            {"description": "Starbucks Ñuñoa \u2028 \"centro\"", "amount": "-4500.5", "date": "2025-04-28"},
+            {"description": "Café rico", "amount": -10, "date": "2025-04-29"},
+            {"description": "Nada", "amount": 1000, "date": "2025-04-30"},
+        ]
+        response = self.client.post('/api/v1/transactions/enrich/', json.dumps(payload), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+        category_data = CategorySerializer(self.category).data
+        merchant_data = MerchantSerializer(self.merchant).data
+        amount_field = serializers.DecimalField(max_digits=10, decimal_places=2)
+        expected = {
+            "transactions": [
+                {"description": payload[0]["description"], "amount": amount_field.to_representation(amount_field.to_internal_value("-4500.5")), "date": "2025-04-28", "enriched_category": category_data, "enriched_merchant": merchant_data},
+                {"description": "Café rico", "amount": "-10.00", "date": "2025-04-29", "enriched_category": category_data, "enriched_merchant": None},
+                {"description": "Nada", "amount": "1000.00", "date": "2025-04-30", "enriched_category": None, "enriched_merchant": None},
+            ],
+            "metrics": {"total_transactions": 3, "categorization_rate": 66.67, "merchant_identification_rate": 33.33},
+        }
+        self.assertEqual(response.content, JSONRenderer().render(expected))
+
+    # Test para probar que las respuestas sin transacciones o con indentacion utilizan el renderizado estandar.
+    def test_fallback_rendering(self):
+        errors = [{'description': ['This field may not be blank.']}]
+        self.assertEqual(EnrichmentJSONRenderer().render(errors), JSONRenderer().render(errors))
+        data = {"transactions": [{"description": "x", "enriched_category": None}], "metrics": {}}
+        self.assertEqual(
+            EnrichmentJSONRenderer().render(data, 'application/json; indent=4'),
+            JSONRenderer().render(data, 'application/json; indent=4'),
+        )
+
+    # Test para probar que las descripciones repetidas se buscan una sola vez, sin cambiar la respuesta.
+    def test_repeated_descriptions_are_matched_once(self):
+        payload = [
+            {"description": "Starbucks Ñuñoa \u2028 \"centro\"", "amount": -100, "date": "2025-04-28"},
+            {"description": "STARBUCKS ñuñoa \u2028 \"centro\"", "amount": -200, "date": "2025-04-28"},
+            {"description": "Starbucks Ñuñoa \u2028 \"centro\"", "amount": 300, "date": "2025-04-29"},
+            {"description": "Café rico", "amount": -10, "date": "2025-04-29"},
+            {"description": "Starbucks Ñuñoa \u2028 \"centro\"", "amount": -400, "date": "2025-04-30"},
+        ]
+        get_processed_enrichment_data()
+        with mock.patch.object(EnrichmentSnapshot, 'match_with_stage', autospec=True, side_effect=EnrichmentSnapshot.match_with_stage) as match:
+            response = self.client.post('/api/v1/transactions/enrich/', json.dumps(payload), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(match.call_count, 3)
+
+        category_data = CategorySerializer(self.category).data
+        merchant_data = MerchantSerializer(self.merchant).data
+        expected_transactions = []
+        for transaction in payload:
+            is_expense = transaction["amount"] < 0
+            is_starbucks = "tarbucks" in transaction["description"].lower()
+            expected_transactions.append({
+                "description": transaction["description"], "amount": f'{transaction["amount"]}.00', "date": transaction["date"],
+                "enriched_category": category_data if is_expense else None,
+                "enriched_merchant": merchant_data if is_expense and is_starbucks else None,
+            })
+        expected = {
+            "transactions": expected_transactions,
+            "metrics": {"total_transactions": 5, "categorization_rate": 80.0, "merchant_identification_rate": 60.0},
+        }
+        self.assertEqual(response.content, JSONRenderer().render(expected))
+
+
+class BulkInputTransactionValidatorTestCase(TestCase):
+    @classmethod
+    # Metodo de creacion de datos de prueba.
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Comida Validacion', type='expense')
+        Merchant.objects.create(merchant_name='Starbucks Validacion', category=category)
+        print("\nBulk Input Validator Test")
+
+    def setUp(self):
+        cache.clear()
+
+    # Esta funcion se encarga de validar una entrada con el validador masivo y con el serializer, y comparar los resultados.
+    def assert_same_result(self, data):
+        validator = BulkInputTransactionValidator(data)
+        input_serializer = InputTransactionSerializer(data=data, many=True)
+        self.assertEqual(validator.is_valid(), input_serializer.is_valid(), data)
+        self.assertEqual(json.dumps(validator.errors), json.dumps(input_serializer.errors), data)
+        for error, expected_error in zip(validator.errors, input_serializer.errors):
+            if isinstance(expected_error, dict):
+                for field, messages in expected_error.items():
+                    self.assertEqual([message.code for message in error[field]], [message.code for message in messages])
+        if input_serializer.errors == []:
+            self.assertEqual(validator.validated_data, input_serializer.validated_data, data)
+            for item, expected_item in zip(validator.validated_data, input_serializer.validated_data):
+                self.assertEqual(str(item['amount']), str(expected_item['amount']))
+
+    # Test para probar que las entradas validas entregan los mismos datos validados que el serializer.
+    def test_valid_items_match_serializer(self):
+        self.assert_same_result([
+            {"description": "  Starbucks  ", "amount": "-4500.5", "date": "2025-04-28"},
+            {"description": "Sueldo", "amount": 1500000, "date": "2025-04-29", "extra": True},
+            {"description": "Café ñandú", "amount": -10.25, "date": "2025-04-30"},
+            {"description": "Limite", "amount": 99999999, "date": "2024-02-29"},
+        ])
+        self.assert_same_result([])
+
+    # Test para probar que las entradas invalidas entregan exactamente los mismos errores que el serializer.
+    def test_invalid_items_match_serializer(self):
+        invalid_items = [
+            {"description": "", "amount": 1, "date": "2025-04-28"},
+            {"description": "   ", "amount": 1, "date": "2025-04-28"},
+            {"description": "a\x00b", "amount": 1, "date": "2025-04-28"},
+            {"description": "a\ud800b", "amount": 1, "date": "2025-04-28"},
+            {"description": None, "amount": None, "date": None},
+            {"description": 123, "amount": True, "date": 20250428},
+            {"amount": "1.001", "date": "2025-02-30"},
+            {"description": "x", "amount": 100000000, "date": "28-04-2025"},
+            {"description": "x", "amount": "NaN", "date": "2025-04-28T10:00:00"},
+            {"description": ["x"], "amount": {"a": 1}, "date": ""},
+            {"description": "x", "amount": float('inf'), "date": "20250428"},
+            "no es un diccionario",
+            None,
+            [],
+        ]
+        for item in invalid_items:
+            self.assert_same_result([item])
+            self.assert_same_result([{"description": "ok", "amount": 1, "date": "2025-04-28"}, item])
+        self.assert_same_result(invalid_items)
+
+        rng = random.Random(8)
+        values = [None, "", " x ", "Starbucks", 0, -1, 12.5, "1e3", "abc", True, "2025-04-28", "2025-13-01", 10 ** 9]
+        for _ in range(200):
+            item = {field: rng.choice(values) for field in ('description', 'amount', 'date') if rng.random() < 0.9}
+            self.assert_same_result([item])
+
+    # Test para probar que las entradas que no son una lista entregan los mismos errores que el serializer.
+    def test_non_list_input_matches_serializer(self):
+        for data in ({"description": "x"}, "texto", None, 10):
+            self.assert_same_result(data)
+
+    # Test para probar que ambos modos de validacion del endpoint entregan la misma respuesta.
+    def test_endpoints_return_same_response(self):
+        payloads = [
+            [{"description": "Starbucks", "amount": -4500, "date": "2025-04-28"}],
+            [{"description": "", "amount": "x", "date": "2025-04-28"}, {"description": "Starbucks", "amount": 1, "date": "2025-04-28"}],
+            {"description": "Starbucks"},
+        ]
+        for payload in payloads:
+            response = self.client.post('/api/v1/transactions/enrich/', json.dumps(payload), content_type='application/json')
+            serializer_response = self.client.post('/api/v1/transactions/enrich/serializer-validation/', json.dumps(payload), content_type='application/json')
+            self.assertEqual(response.status_code, serializer_response.status_code)
+            self.assertEqual(response.content, serializer_response.content)
+
+
+class MatchResultCacheTestCase(TestCase):
+    @classmethod
+    # Metodo de creacion de datos de prueba.
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Transporte Resultados', type='expense')
+        cls.merchant = Merchant.objects.create(merchant_name='Uber Resultados', category=cls.category)
+        Keyword.objects.create(keyword='Uber Trip', merchant=cls.merchant)
+        print("\nMatch Result Cache Test")
+
+    def setUp(self):
+        cache.clear()
+        match_result_cache.clear()
+
+    # Test para probar que se eliminan los resultados usados hace mas tiempo al superar el tamaño maximo.
+    def test_lru_eviction(self):
+        result_cache = MatchResultCache(max_size=2)
+        result_cache.set(1, 'a', 'expense', (0, 0, 'keyword'))
+        result_cache.set(1, 'b', 'expense', (1, 0, 'keyword'))
+        self.assertEqual(result_cache.get(1, 'a', 'expense'), (0, 0, 'keyword'))
+        result_cache.set(1, 'c', 'expense', (None, None, None))
+        self.assertIsNone(result_cache.get(1, 'b', 'expense'))
+        self.assertEqual(result_cache.get(1, 'c', 'expense'), (None, None, None))
+        stats = result_cache.get_stats()
+        self.assertEqual((stats['size'], stats['hits'], stats['misses'], stats['evictions']), (2, 2, 1, 1))
+        self.assertEqual(stats['hit_ratio'], round(2 / 3, 4))
+
+    # Test para probar que los resultados de cada version de los datos se mantienen separados, sin vaciar la cache al cambiar
+    # de version, y que los de una version que ya no se consulta salen por el LRU.
+    def test_results_are_kept_per_version(self):
+        result_cache = MatchResultCache(max_size=2)
+        result_cache.set(1, 'a', 'expense', (0, 0, 'keyword'))
+        self.assertIsNone(result_cache.get(2, 'a', 'expense'))
+        result_cache.set(2, 'a', 'expense', (1, 0, 'keyword'))
+        self.assertEqual(result_cache.get(1, 'a', 'expense'), (0, 0, 'keyword'))
+        self.assertEqual(result_cache.get(2, 'a', 'expense'), (1, 0, 'keyword'))
+        result_cache.set(2, 'b', 'expense', (None, None, None))
+        self.assertIsNone(result_cache.get(1, 'a', 'expense'))
+        self.assertEqual(result_cache.get(2, 'a', 'expense'), (1, 0, 'keyword'))
+        self.assertEqual(result_cache.get_stats()['evictions'], 1)
+
+    # Test para probar que el endpoint reutiliza los resultados entre solicitudes, y que un cambio de reglas los invalida.
+    def test_results_are_reused_across_requests(self):
+        payload = [{"description": "COMPRA UBER TRIP", "amount": -100, "date": "2025-04-28"}]
+        first = self.client.post('/api/v1/transactions/enrich/', json.dumps(payload), content_type='application/json')
+        second = self.client.post('/api/v1/transactions/enrich/', json.dumps(payload), content_type='application/json')
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(second.json()['transactions'][0]['enriched_merchant']['merchant_name'], 'Uber Resultados')
+        stats = match_result_cache.get_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other_merchant = Merchant.objects.create(merchant_name='Compra Uber Trip Eats', category=self.category)
+            Keyword.objects.create(keyword='Compra Uber Trip', merchant=other_merchant)
+        third = self.client.post('/api/v1/transactions/enrich/', json.dumps(payload), content_type='application/json')
+        self.assertEqual(third.json()['transactions'][0]['enriched_merchant']['merchant_name'], 'Compra Uber Trip Eats')
+        self.assertEqual(match_result_cache.get_stats()['misses'], 2)
+
+    # Test para probar la etapa de la busqueda en la que se encuentra cada resultado.
+    def test_match_stages(self):
+        processed_data = get_processed_enrichment_data()
+        self.assertEqual(processed_data.match_with_stage('compra uber trip', 'expense')[2], snapshot.MATCH_STAGE_KEYWORD)
+        self.assertEqual(processed_data.match_with_stage('uber resultados', 'expense')[2], snapshot.MATCH_STAGE_MERCHANT)
+        self.assertEqual(processed_data.match_with_stage('pago transporte', 'expense')[2], snapshot.MATCH_STAGE_CATEGORY)
+        self.assertEqual(processed_data.match_with_stage('nada', 'expense'), (None, None, None))
+
+
+class EnrichTransactionsStreamTestCase(TestCase):
+    @classmethod
+    # Metodo de creacion de datos de prueba.
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Transporte Stream', type='expense')
+        cls.merchant = Merchant.objects.create(merchant_name='Uber Stream', category=cls.category)
+        Keyword.objects.create(keyword='Uber Trip', merchant=cls.merchant)
+        cls.stream_url = '/api/v1/transactions/enrich/stream/'
+        print("\nEnrich Stream Test")
+
+    def setUp(self):
+        cache.clear()
+        match_result_cache.clear()
+
+    # Metodo que envia las lineas NDJSON al endpoint y retorna los registros de la respuesta.
+    def post_lines(self, lines):
+        response = self.client.post(self.stream_url, '\n'.join(lines) + '\n', content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        content = b''.join(response.streaming_content)
+        return content, [json.loads(line) for line in content.decode().splitlines()]
+
+    # Test para probar que el stream entrega las mismas transacciones y metricas que el endpoint JSON.
+    @override_settings(ENRICHMENT_STREAM_CHUNK_SIZE=2)
+    def test_stream_matches_json_endpoint(self):
+        payload = [
+            {"description": "COMPRA UBER TRIP \u2028", "amount": -100, "date": "2025-04-28"},
+            {"description": "Pago transporte", "amount": "-20.5", "date": "2025-04-29"},
+            {"description": "Sueldo", "amount": 1000, "date": "2025-04-30"},
+            {"description": "COMPRA UBER TRIP \u2028", "amount": -300, "date": "2025-05-01"},
+            {"description": "Nada", "amount": -1, "date": "2025-05-02"},
+        ]
+        json_response = self.client.post('/api/v1/transactions/enrich/', json.dumps(payload), content_type='application/json')
+        content, records = self.post_lines([json.dumps(transaction) for transaction in payload])
+
+        expected = json_response.json()
+        self.assertEqual(records[:-1], expected['transactions'])
+        self.assertEqual(records[-1], {'metrics': dict(expected['metrics'], invalid_lines=0)})
+        self.assertNotIn('\u2028'.encode(), content)
+        # Cada linea es identica a la transaccion renderizada por el endpoint JSON.
+        self.assertIn(content.split(b'\n')[0], json_response.content)
+
+    # Test para probar que las lineas invalidas entregan sus errores sin detener el stream.
+    def test_invalid_lines_are_reported(self):
+        lines = [
+            json.dumps({"description": "COMPRA UBER TRIP", "amount": -100, "date": "2025-04-28"}),
+            '',
+            '{"description": ',
+            json.dumps({"description": "", "amount": -100, "date": "2025-04-28"}),
+            json.dumps(["no es un objeto"]),
+        ]
+        _, records = self.post_lines(lines)
+        self.assertEqual(len(records), 5)
+        self.assertEqual(records[0]['enriched_merchant']['merchant_name'], 'Uber Stream')
+        self.assertEqual(records[1]['line'], 3)
+        self.assertIn('non_field_errors', records[1]['errors'])
+        self.assertEqual(records[2], {'line': 4, 'errors': {'description': ['This field may not be blank.']}})
+        self.assertEqual(records[3], {'line': 5, 'errors': {'non_field_errors': ['Invalid data. Expected a dictionary, but got list.']}})
+        self.assertEqual(records[-1]['metrics'], {'total_transactions': 1, 'categorization_rate': 100.0, 'merchant_identification_rate': 100.0, 'invalid_lines': 3})
+
+    # Test para probar que una entrada vacia solo entrega las metricas.
+    def test_empty_stream(self):
+        response = self.client.post(self.stream_url, '', content_type='application/x-ndjson')
+        records = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(records, [{'metrics': {'total_transactions': 0, 'categorization_rate': 0, 'merchant_identification_rate': 0, 'invalid_lines': 0}}])
+
+
+@override_settings(ENRICHMENT_JOB_CHUNK_SIZE=2)
+class EnrichmentJobTestCase(TestCase):
+    @classmethod
+    # Metodo de creacion de datos de prueba.
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Transporte Trabajos', type='expense')
+        cls.merchant = Merchant.objects.create(merchant_name='Uber Trabajos', category=cls.category)
+        Keyword.objects.create(keyword='Uber Trip', merchant=cls.merchant)
+        cls.jobs_url = '/api/v1/transactions/enrich/jobs/'
+        cls.payload = [
+            {"description": "COMPRA UBER TRIP", "amount": -100, "date": "2025-04-28"},
+            {"description": "Pago transporte", "amount": "-20.5", "date": "2025-04-29"},
+            {"description": "Sueldo", "amount": 1000, "date": "2025-04-30"},
+            {"description": "Nada", "amount": -1, "date": "2025-05-02"},
+            {"description": "Uber trip", "amount": -300, "date": "2025-05-01"},
+        ]
+        print("\nEnrichment Job Test")
+
+    def setUp(self):
+        cache.clear()
+
+    # Test para probar el flujo completo: crear el trabajo, procesarlo con un worker y descargar los resultados por pagina.
+    def test_job_results_match_enrich_endpoint(self):
+        response = self.client.post(self.jobs_url, json.dumps(self.payload), content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        job_data = response.json()
+        self.assertEqual((job_data['status'], job_data['total_transactions'], job_data['total_chunks'], job_data['progress']), ('pending', 5, 3, 0.0))
+        self.assertTrue(response['Location'].endswith(f"{self.jobs_url}{job_data['id']}/"))
+
+        results_url = f"{self.jobs_url}{job_data['id']}/results/"
+        self.assertEqual(self.client.get(results_url).status_code, 409)
+
+        self.assertEqual(jobs.run_worker(worker_name='test-worker', once=True), 3)
+        job_data = self.client.get(f"{self.jobs_url}{job_data['id']}/").json()
+        expected = self.client.post('/api/v1/transactions/enrich/', json.dumps(self.payload), content_type='application/json').json()
+        self.assertEqual(job_data['status'], 'completed')
+        self.assertEqual(job_data['progress'], 100.0)
+        self.assertEqual(job_data['metrics'], expected['metrics'])
+
+        transactions = []
+        url = results_url
+        while url:
+            page = self.client.get(url).json()
+            transactions.extend(page['transactions'])
+            url = page['next']
+        self.assertEqual(page['total_pages'], 3)
+        self.assertEqual(transactions, expected['transactions'])
+        self.assertEqual(self.client.get(results_url + '?page=4').status_code, 404)
+
+    # Test para probar que la creacion del trabajo entrega los mismos errores de validacion que el endpoint de enriquecimiento.
+    def test_invalid_batch_is_rejected(self):
+        payload = [{"description": "", "amount": "x", "date": "2025-04-28"}]
+        response = self.client.post(self.jobs_url, json.dumps(payload), content_type='application/json')
+        expected = self.client.post('/api/v1/transactions/enrich/', json.dumps(payload), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), expected.json())
+        self.assertFalse(EnrichmentJob.objects.exists())
+
+    # Test para probar que un bloque no se puede tomar dos veces, y que los bloques de un worker caido vuelven a la cola.
+    def test_chunk_claiming(self):
+        job = jobs.create_enrichment_job([
+            {"description": "a", "amount": decimal.Decimal('1'), "date": datetime.date(2025, 4, 28)},
+        ])
+        chunk = jobs.claim_next_chunk('worker-1')
+        self.assertEqual((chunk.job_id, chunk.worker, chunk.attempts), (job.pk, 'worker-1', 1))
+        self.assertIsNone(jobs.claim_next_chunk('worker-2'))
+
+        EnrichmentJobChunk.objects.filter(pk=chunk.pk).update(locked_at=chunk.locked_at - datetime.timedelta(hours=1))
+        self.assertEqual(jobs.requeue_stale_chunks(), 1)
+        self.assertEqual(jobs.claim_next_chunk('worker-2').worker, 'worker-2')
+        # El worker original ya no puede guardar los resultados del bloque.
+        self.assertFalse(jobs.process_chunk(chunk))
+
+    # Test para probar que un bloque que falla se reintenta y luego marca el trabajo como fallido.
+    @override_settings(ENRICHMENT_JOB_MAX_ATTEMPTS=2)
+    def test_failed_chunk_fails_job(self):
+        job = jobs.create_enrichment_job([
+            {"description": "a", "amount": decimal.Decimal('1'), "date": datetime.date(2025, 4, 28)},
+        ])
+        with mock.patch.object(jobs, 'get_processed_enrichment_data', side_effect=RuntimeError('sin datos')):
+            with self.assertLogs('enrichment_logic.jobs', level='ERROR'):
+                self.assertEqual(jobs.run_worker(worker_name='test-worker', once=True), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('sin datos', job.error)
+        self.assertEqual(job.chunks.get().attempts, 2)
+
+    # Test para probar el comando de los workers en el proceso actual.
+    def test_run_workers_command(self):
+        job = jobs.create_enrichment_job([
+            {"description": "Uber trip", "amount": decimal.Decimal('-1'), "date": datetime.date(2025, 4, 28)},
+        ])
+        out = StringIO()
+        call_command('run_enrichment_workers', processes=1, once=True, stdout=out)
+        self.assertIn('1 bloques procesados', out.getvalue())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.merchant_count), ('completed', 1))
+
+
+class ParallelMatchingTestCase(TestCase):
+    @classmethod
+    # Metodo de creacion de datos de prueba.
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Transporte Paralelo', type='expense')
+        cls.merchant = Merchant.objects.create(merchant_name='Uber Paralelo', category=cls.category)
+        Keyword.objects.create(keyword='Uber Trip', merchant=cls.merchant)
+        Category.objects.create(name='Sueldo Paralelo', type='income')
+        cls.payload = [
+            {"description": f"{description} {number % 7}", "amount": amount, "date": "2025-04-28"}
+            for number, (description, amount) in enumerate([("COMPRA UBER TRIP", -100), ("Pago transporte", -20), ("Sueldo mensual", 1000), ("Nada", -1)] * 15)
+        ]
+        print("\nParallel Matching Test")
+
+    def setUp(self):
+        cache.clear()
+        match_result_cache.clear()
+
+    def tearDown(self):
+        with parallel.matching_process_pool.lock:
+            parallel.matching_process_pool.shutdown()
+
+    # Test para probar que la busqueda en paralelo entrega exactamente la misma respuesta que la busqueda en el proceso actual.
+    def test_parallel_response_matches_serial(self):
+        serial = self.client.post('/api/v1/transactions/enrich/', json.dumps(self.payload), content_type='application/json')
+        match_result_cache.clear()
+        with override_settings(ENRICHMENT_PARALLEL_THRESHOLD=10, ENRICHMENT_PARALLEL_WORKERS=2, ENRICHMENT_PARALLEL_CHUNK_SIZE=3):
+            parallel.start_matching_pool_on_startup()
+            with mock.patch('enrichment_logic.views.prefetch_matches_in_parallel', wraps=parallel.prefetch_matches_in_parallel) as prefetch:
+                response = self.client.post('/api/v1/transactions/enrich/', json.dumps(self.payload), content_type='application/json')
+        self.assertEqual(prefetch.call_count, 1)
+        self.assertEqual(parallel.matching_process_pool.workers, 2)
+        self.assertEqual(response.content, serial.content)
+
+    # Test para probar que las solicitudes no crean el pool: sin el pool creado al iniciar, se busca en el proceso actual.
+    def test_requests_do_not_start_pool(self):
+        with override_settings(ENRICHMENT_PARALLEL_THRESHOLD=10, ENRICHMENT_PARALLEL_WORKERS=2):
+            response = self.client.post('/api/v1/transactions/enrich/', json.dumps(self.payload), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(parallel.matching_process_pool.executor)
+        with override_settings(ENRICHMENT_PARALLEL_THRESHOLD=0):
+            self.assertIsNone(parallel.start_matching_pool_on_startup())
+
+    # Test para probar que antes de crear los procesos del pool se cierran las conexiones a la base de datos y a la cache,
+    # para que los procesos no hereden sus sockets.
+    def test_pool_start_closes_inherited_connections(self):
+        calls = []
+        with mock.patch.object(parallel.connections, 'close_all', side_effect=lambda: calls.append('database')), \
+                mock.patch.object(parallel.caches, 'close_all', side_effect=lambda: calls.append('cache')), \
+                mock.patch.object(parallel, 'ProcessPoolExecutor', side_effect=lambda **kwargs: calls.append('fork') or ThreadPoolExecutor(1)):
+            parallel.matching_process_pool.start(None, 1)
+        self.assertEqual(calls, ['database', 'cache', 'fork'])
+
+    # Test para probar que, al cambiar la version de los datos, los procesos del pool cargan la nueva version desde la cache
+    # compartida sin crear otro pool, y que si no pueden obtener la version pedida la busqueda se realiza en el proceso actual.
+    def test_pool_loads_new_versions(self):
+        with tempfile.TemporaryDirectory() as directory:
+            shared_cache = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory}}
+            with override_settings(CACHES=shared_cache):
+                processed_data = get_processed_enrichment_data()
+                executor = parallel.matching_process_pool.start(processed_data, 2)
+                self.assertEqual(executor.submit(parallel.get_worker_version).result(), processed_data.version)
+                with self.captureOnCommitCallbacks(execute=True):
+                    Keyword.objects.create(keyword='Sueldo', merchant=self.merchant)
+                new_data = get_processed_enrichment_data()
+                self.assertGreater(new_data.version, processed_data.version)
+
+                match_keys = [('sueldo mensual', 'expense'), ('compra uber trip', 'expense')]
+                results = executor.submit(parallel.match_chunk, new_data.version, match_keys).result()
+                self.assertEqual(results, [new_data.match_with_stage(*match_key) for match_key in match_keys])
+                self.assertIs(parallel.matching_process_pool.executor, executor)
+                with self.assertRaises(RuntimeError):
+                    executor.submit(parallel.match_chunk, new_data.version + 1, match_keys).result()
+
+                # Ningun proceso del pool puede obtener una version que no esta en la cache.
+                processed_data.version = new_data.version + 1
+                enricher = TransactionEnricher(processed_data)
+                transactions = BulkInputTransactionValidator(self.payload)
+                self.assertTrue(transactions.is_valid())
+                with self.assertLogs('enrichment_logic.parallel', level='WARNING'):
+                    self.assertEqual(parallel.prefetch_matches_in_parallel(enricher, transactions.validated_data), 0)
+                self.assertIs(parallel.matching_process_pool.executor, executor)
+
+    # Test para probar el umbral del modo en paralelo.
+    def test_threshold(self):
+        with override_settings(ENRICHMENT_PARALLEL_THRESHOLD=0):
+            self.assertFalse(parallel.should_match_in_parallel(10 ** 6))
+        with override_settings(ENRICHMENT_PARALLEL_THRESHOLD=100):
+            self.assertFalse(parallel.should_match_in_parallel(99))
+            self.assertTrue(parallel.should_match_in_parallel(100))
+
+
+class EnrichFileCommandTestCase(TestCase):
+    @classmethod
+    # Metodo de creacion de datos de prueba.
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Transporte Archivo', type='expense')
+        cls.merchant = Merchant.objects.create(merchant_name='Uber Archivo', category=cls.category)
+        Keyword.objects.create(keyword='Uber Trip', merchant=cls.merchant)
+        cls.transactions = [
+            {"description": "COMPRA UBER TRIP", "amount": "-100", "date": "2025-04-28"},
+            {"description": "Pago transporte \u2028", "amount": "-20.5", "date": "2025-04-29"},
+            {"description": "", "amount": "1", "date": "2025-04-29"},
+            {"description": "Sueldo", "amount": "1000", "date": "2025-04-30"},
+            {"description": "Uber trip", "amount": "-300", "date": "2025-05-01"},
+        ]
+        print("\nEnrich File Command Test")
+
+    def setUp(self):
+        cache.clear()
+        match_result_cache.clear()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    # Metodo que escribe las transacciones de prueba en un archivo JSONL y retorna su ruta.
+    def write_jsonl(self):
+        path = os.path.join(self.directory.name, 'input.jsonl')
+        with open(path, 'w', encoding='utf-8') as input_file:
+            for transaction in self.transactions:
+                input_file.write(json.dumps(transaction) + '\n')
+        return path
+
+    # Metodo que ejecuta el comando y retorna las metricas escritas.
+    def enrich_file(self, input_path, output_path, **options):
+        metrics_path = os.path.join(self.directory.name, 'metrics.json')
+        call_command('enrich_file', input_path, output_path, metrics_file=metrics_path, stdout=StringIO(), **options)
+        with open(metrics_path, encoding='utf-8') as metrics_file:
+            return json.load(metrics_file)
+
+    # Test para probar que la salida JSONL es identica a la del endpoint NDJSON.
+    def test_jsonl_output_matches_stream_endpoint(self):
+        output_path = os.path.join(self.directory.name, 'output.jsonl')
+        metrics = self.enrich_file(self.write_jsonl(), output_path, chunk_size=2)
+
+        lines = [json.dumps(transaction) for transaction in self.transactions]
+        response = self.client.post('/api/v1/transactions/enrich/stream/', '\n'.join(lines), content_type='application/x-ndjson')
+        expected_lines = b''.join(response.streaming_content).decode().splitlines()
+        with open(output_path, encoding='utf-8') as output_file:
+            output_lines = output_file.read().splitlines()
+        self.assertEqual(output_lines[:2] + output_lines[3:], expected_lines[:2] + expected_lines[3:-1])
+        self.assertEqual(json.loads(output_lines[2]), {'row': 3, 'errors': {'description': ['This field may not be blank.']}})
+        expected_metrics = json.loads(expected_lines[-1])['metrics']
+        self.assertEqual(metrics, {**{key: expected_metrics[key] for key in ('total_transactions', 'categorization_rate', 'merchant_identification_rate')}, 'invalid_rows': 1})
+
+    # Test para probar la entrada y salida en CSV.
+    def test_csv_input_and_output(self):
+        input_path = os.path.join(self.directory.name, 'input.csv')
+        with open(input_path, 'w', newline='', encoding='utf-8') as input_file:
+            writer = csv.DictWriter(input_file, fieldnames=['date', 'description', 'amount'])
+            writer.writeheader()
+            writer.writerows(self.transactions)
+        output_path = os.path.join(self.directory.name, 'output.csv')
+        metrics = self.enrich_file(input_path, output_path)
+
+        with open(output_path, newline='', encoding='utf-8') as output_file:
+            rows = list(csv.DictReader(output_file))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual((rows[0]['amount'], rows[0]['enriched_merchant_name'], rows[0]['enriched_category_id']), ('-100.00', 'Uber Archivo', str(self.category.id)))
+        self.assertEqual((rows[1]['enriched_merchant_id'], rows[1]['enriched_category_name']), ('', 'Transporte Archivo'))
+        self.assertIn('description', json.loads(rows[2]['errors']))
+        self.assertEqual((metrics['total_transactions'], metrics['invalid_rows']), (4, 1))
+
+    # Test para probar que una ejecucion interrumpida continua desde su checkpoint con el mismo resultado,
+    # sin repetir el encabezado en los formatos que lo tienen (CSV).
+    def test_resume_after_interruption(self):
+        input_path = self.write_jsonl()
+        for output_format in ['jsonl', 'csv']:
+            with self.subTest(output_format=output_format):
+                expected_path = os.path.join(self.directory.name, f'expected.{output_format}')
+                expected_metrics = self.enrich_file(input_path, expected_path, chunk_size=2)
+
+                output_path = os.path.join(self.directory.name, f'output.{output_format}')
+                process_chunk = EnrichFileCommand.process_chunk
+                calls = []
+
+                # Se interrumpe la ejecucion en el segundo bloque, despues de escribir parte de sus resultados.
+                def interrupted_process_chunk(chunk, enricher, validator, writer, workers):
+                    calls.append(chunk)
+                    if len(calls) == 2:
+                        writer.write([(chunk[0][0], None, {'parcial': ['x']})])
+                        raise KeyboardInterrupt
+                    return process_chunk(chunk, enricher, validator, writer, workers)
+
+                with mock.patch.object(EnrichFileCommand, 'process_chunk', staticmethod(interrupted_process_chunk)):
+                    with self.assertRaises(KeyboardInterrupt):
+                        self.enrich_file(input_path, output_path, chunk_size=2)
+                self.assertTrue(os.path.exists(output_path + '.checkpoint'))
+
+                metrics = self.enrich_file(input_path, output_path, chunk_size=2, resume=True)
+                self.assertFalse(os.path.exists(output_path + '.checkpoint'))
+                self.assertEqual(metrics, expected_metrics)
+                with open(output_path, encoding='utf-8') as output_file, open(expected_path, encoding='utf-8') as expected_file:
+                    self.assertEqual(output_file.read(), expected_file.read())
+
+    # Test para probar que se puede omitir una cantidad de filas iniciales.
+    def test_offset(self):
+        output_path = os.path.join(self.directory.name, 'output.jsonl')
+        metrics = self.enrich_file(self.write_jsonl(), output_path, offset=3)
+        self.assertEqual((metrics['total_transactions'], metrics['invalid_rows']), (2, 0))
+
+    # Test para probar la lectura de archivos Parquet (dependencia opcional).
+    @skipUnless(files.pq is not None, 'pyarrow no esta instalado')
+    def test_parquet_input(self):
+        import pyarrow
+        input_path = os.path.join(self.directory.name, 'input.parquet')
+        table = pyarrow.table({
+            'description': [transaction['description'] for transaction in self.transactions],
+            'amount': [decimal.Decimal(transaction['amount']) for transaction in self.transactions],
+            'date': [datetime.date.fromisoformat(transaction['date']) for transaction in self.transactions],
+        })
+        files.pq.write_table(table, input_path)
+        metrics = self.enrich_file(input_path, os.path.join(self.directory.name, 'output.jsonl'))
+        self.assertEqual((metrics['total_transactions'], metrics['merchant_identification_rate']), (4, 50.0))
+
+
+class TransactionPersistenceTestCase(TestCase):
+    @classmethod
+    # Metodo de creacion de datos de prueba.
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Transporte Persistencia', type='expense')
+        cls.merchant = Merchant.objects.create(merchant_name='Uber Persistencia', category=cls.category)
+        Keyword.objects.create(keyword='Uber Trip', merchant=cls.merchant)
+        cls.url = '/api/v1/transactions/enrich/'
+        cls.payload = [
+            {"description": "COMPRA UBER TRIP", "amount": "-100.5", "date": "2025-04-28"},
+            {"description": "Pago transporte", "amount": -20, "date": "2025-04-29"},
+            {"description": "Sueldo", "amount": 1000, "date": "2025-04-30"},
+        ]
+        print("\nTransaction Persistence Test")
+
+    def setUp(self):
+        cache.clear()
+        match_result_cache.clear()
+
+    # Test para probar que las transacciones no se guardan si no se solicita.
+    def test_persist_is_opt_in(self):
+        response = self.client.post(self.url, json.dumps(self.payload), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Transaction.objects.exists())
+
+    # Test para probar que el modo sync guarda las transacciones enriquecidas sin cambiar la respuesta.
+    def test_sync_persist(self):
+        expected = self.client.post(self.url, json.dumps(self.payload), content_type='application/json')
+        response = self.client.post(self.url + '?persist=sync', json.dumps(self.payload), content_type='application/json')
+        self.assertEqual(response.content, expected.content)
+
+        transactions = {transaction.description: transaction for transaction in Transaction.objects.all()}
+        self.assertEqual(len(transactions), 3)
+        self.assertEqual(transactions['COMPRA UBER TRIP'].amount, decimal.Decimal('-100.50'))
+        self.assertEqual(transactions['COMPRA UBER TRIP'].date, datetime.date(2025, 4, 28))
+        self.assertEqual(transactions['COMPRA UBER TRIP'].enriched_merchant, self.merchant)
+        self.assertEqual(transactions['COMPRA UBER TRIP'].enriched_category, self.category)
+        self.assertEqual((transactions['Pago transporte'].enriched_merchant, transactions['Pago transporte'].enriched_category), (None, self.category))
+        self.assertEqual((transactions['Sueldo'].enriched_merchant, transactions['Sueldo'].enriched_category), (None, None))
+
+    # Test para probar que las filas se guardan por lotes (un INSERT por lote) dentro de una transaccion.
+    def test_bulk_insert_batches(self):
+        rows = [Transaction(description=f'Transaccion {number}', amount=number, date=datetime.date(2025, 1, 1)) for number in range(25)]
+        # SAVEPOINT y RELEASE de la transaccion, tres INSERT de hasta 10 filas y cinco INSERT de sus 50 palabras (indice).
+        with self.assertNumQueries(10):
+            self.assertEqual(persist_transactions(rows, batch_size=10), 25)
+        self.assertEqual(Transaction.objects.count(), 25)
+
+    # Test para probar el modo por defecto y los modos invalidos.
+    def test_persist_modes(self):
+        with override_settings(ENRICHMENT_PERSIST_DEFAULT_MODE='sync'):
+            self.client.post(self.url + '?persist=true', json.dumps(self.payload), content_type='application/json')
+        self.assertEqual(Transaction.objects.count(), 3)
+        response = self.client.post(self.url + '?persist=later', json.dumps(self.payload), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('persist', response.json())
+
+    # Test para probar que con el buffer lleno las filas se guardan en la misma solicitud.
+    @override_settings(ENRICHMENT_WRITE_BEHIND_MAX_ROWS=2)
+    def test_full_buffer_writes_synchronously(self):
+        write_buffer = TransactionWriteBehindBuffer()
+        rows = [Transaction(description='Transaccion', amount=1, date=datetime.date(2025, 1, 1)) for _ in range(3)]
+        self.assertFalse(write_buffer.add(rows))
+        self.assertEqual(write_buffer.get_stats()['sync_fallbacks'], 1)
+        self.assertIsNone(write_buffer.thread)
+        self.assertEqual(Transaction.objects.count(), 3)
+
+
+# Las escrituras del buffer asincrono se realizan en otro hilo (y otra conexion), por lo que se prueban fuera de una transaccion.
+class TransactionWriteBehindTestCase(TransactionTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        print("\nTransaction Write Behind Test")
+
+    def setUp(self):
+        cache.clear()
+        match_result_cache.clear()
+        self.category = Category.objects.create(name='Transporte Buffer', type='expense')
+
+    # Test para probar que el modo async guarda las transacciones en segundo plano.
+    @override_settings(ENRICHMENT_WRITE_BEHIND_FLUSH_INTERVAL=30)
+    def test_async_persist(self):
+        payload = [{"description": f"Pago transporte {number}", "amount": -number - 1, "date": "2025-04-28"} for number in range(5)]
+        response = self.client.post('/api/v1/transactions/enrich/?persist=async', json.dumps(payload), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        written_rows = transaction_write_buffer.get_stats()['written_rows']
+        self.assertTrue(transaction_write_buffer.flush(timeout=10))
+        self.assertEqual(transaction_write_buffer.get_stats()['written_rows'], written_rows + 5)
+        self.assertEqual(Transaction.objects.filter(enriched_category=self.category).count(), 5)
+
+
+@override_settings(ENRICHMENT_REENRICH_ON_RULE_CHANGE='sync')
+class TransactionReenrichmentTestCase(TestCase):
+    @classmethod
+    # Metodo de creacion de datos de prueba.
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Transporte Reenriquecimiento', type='expense')
+        cls.other_category = Category.objects.create(name='Comida Reenriquecimiento', type='expense')
+        cls.merchant = Merchant.objects.create(merchant_name='Uber Reenriquecimiento', category=cls.category)
+        cls.other_merchant = Merchant.objects.create(merchant_name='Rappi Tienda', category=cls.other_category)
+        print("\nTransaction Reenrichment Test")
+
+    def setUp(self):
+        cache.clear()
+        match_result_cache.clear()
+        payload = [
+            {"description": "COMPRA UBER TRIP", "amount": -100, "date": "2025-04-28"},
+            {"description": "UBER EATS PEDIDO", "amount": -50, "date": "2025-04-28"},
+            {"description": "Pago Rappi Tienda", "amount": -30, "date": "2025-04-29"},
+            {"description": "Sueldo", "amount": 1000, "date": "2025-04-30"},
+        ]
+        response = self.client.post('/api/v1/transactions/enrich/?persist=sync', json.dumps(payload), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.transactions = {transaction.description: transaction for transaction in Transaction.objects.all()}
+
+    # Esta funcion se encarga de obtener el comercio y la categoria guardados de una transaccion.
+    def get_enrichment(self, description):
+        transaction = Transaction.objects.get(pk=self.transactions[description].pk)
+        return transaction.enriched_merchant, transaction.enriched_category
+
+    # Test para probar que las transacciones guardadas se indexan por las palabras de su descripcion normalizada.
+    def test_token_index(self):
+        self.assertEqual(get_text_tokens('COMPRA UBER*TRIP'), {'compra', 'uber', 'trip'})
+        tokens = set(TransactionToken.objects.filter(transaction=self.transactions['COMPRA UBER TRIP']).values_list('token', flat=True))
+        self.assertEqual(tokens, {'compra', 'uber', 'trip'})
+        transaction = Transaction.objects.create(description='Pago Netflix', amount=-10)
+        self.assertEqual(set(transaction.tokens.values_list('token', flat=True)), {'pago', 'netflix'})
+
+    # Test para probar que las candidatas son las que contienen todas las palabras del keyword, o alguna de la categoria.
+    def test_candidates_from_token_index(self):
+        scope = ReenrichmentScope()
+        scope.add_pattern('Uber Trip')
+        self.assertEqual(scope.get_candidate_ids(), {self.transactions['COMPRA UBER TRIP'].pk})
+        scope = ReenrichmentScope()
+        scope.add_category_name('Pedido de Sueldo')
+        self.assertEqual(scope.get_candidate_ids(), {self.transactions['UBER EATS PEDIDO'].pk, self.transactions['Sueldo'].pk})
+        scope = ReenrichmentScope()
+        scope.add_pattern('+++')
+        self.assertIsNone(scope.get_candidate_ids())
+
+    # Test para probar que con muchos grupos de palabras (lectura del indice por bloques) se obtienen las mismas candidatas.
+    def test_candidates_from_many_token_groups(self):
+        scope = ReenrichmentScope()
+        for pattern in ('Uber Trip', 'Uber Pedido', 'Rappi Tienda', 'Eats Sueldo'):
+            scope.add_pattern(pattern)
+        expected = {self.transactions[description].pk for description in ('COMPRA UBER TRIP', 'UBER EATS PEDIDO', 'Pago Rappi Tienda')}
+        self.assertEqual(scope.get_candidate_ids(), expected)
+        with mock.patch('enrichment_logic.reenrichment.TOKEN_GROUP_QUERY_LIMIT', 0), self.assertNumQueries(1):
+            self.assertEqual(scope.get_candidate_ids(), expected)
+
+    # Test para probar que un keyword nuevo re-enriquece solo las transacciones que lo contienen.
+    def test_new_keyword_reenriches_affected_transactions(self):
+        self.assertEqual(self.get_enrichment('COMPRA UBER TRIP'), (None, None))
+        with mock.patch('enrichment_logic.reenrichment.reenrich_transactions', wraps=reenrich_transactions) as reenrich_mock:
+            with self.captureOnCommitCallbacks(execute=True):
+                Keyword.objects.create(keyword='Uber Trip', merchant=self.merchant)
+        reenrich_mock.assert_called_once_with({self.transactions['COMPRA UBER TRIP'].pk})
+        self.assertEqual(self.get_enrichment('COMPRA UBER TRIP'), (self.merchant, self.category))
+        self.assertEqual(self.get_enrichment('UBER EATS PEDIDO'), (None, None))
+
+    # Test para probar el cambio de nombre de un comercio: pierde las transacciones del nombre anterior y gana las del nuevo.
+    def test_merchant_rename(self):
+        self.assertEqual(self.get_enrichment('Pago Rappi Tienda'), (self.other_merchant, self.other_category))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other_merchant.merchant_name = 'Uber Eats'
+            self.other_merchant.save()
+        self.assertEqual(self.get_enrichment('Pago Rappi Tienda'), (None, None))
+        self.assertEqual(self.get_enrichment('UBER EATS PEDIDO'), (self.other_merchant, self.other_category))
+
+    # Test para probar el cambio de categoria de un comercio y su eliminacion.
+    def test_merchant_category_change_and_delete(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other_merchant.category = self.category
+            self.other_merchant.save()
+        self.assertEqual(self.get_enrichment('Pago Rappi Tienda'), (self.other_merchant, self.category))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other_merchant.delete()
+        self.assertEqual(self.get_enrichment('Pago Rappi Tienda'), (None, None))
+
+    # Test para probar el cambio de tipo de una categoria, que deja de aplicar a los gastos.
+    def test_category_type_change(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other_category.type = 'income'
+            self.other_category.save()
+        self.assertEqual(self.get_enrichment('Pago Rappi Tienda'), (None, None))
+
+    # Test para probar que guardar una regla sin cambios, o con el re-enriquecimiento deshabilitado, no revisa transacciones.
+    def test_no_reenrichment_without_changes(self):
+        with mock.patch('enrichment_logic.reenrichment.reenrich_transactions') as reenrich_mock:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.merchant.save()
+            with override_settings(ENRICHMENT_REENRICH_ON_RULE_CHANGE='off'), self.captureOnCommitCallbacks(execute=True):
+                Keyword.objects.create(keyword='Uber Trip', merchant=self.merchant)
+        reenrich_mock.assert_not_called()
+        self.assertEqual(self.get_enrichment('COMPRA UBER TRIP'), (None, None))
+
+    # Test para probar que en modo async las candidatas no se buscan al confirmar el cambio, sino en la tarea encolada en el
+    # executor del re-enriquecimiento (una por transaccion, con todos sus cambios, sin crear hilos).
+    def test_async_mode_selects_candidates_in_executor(self):
+        queued = []
+        with override_settings(ENRICHMENT_REENRICH_ON_RULE_CHANGE='async'):
+            with mock.patch.object(reenrichment.reenrichment_executor, 'submit', side_effect=queued.append), \
+                    mock.patch.object(ReenrichmentScope, 'get_candidate_ids', autospec=True, side_effect=ReenrichmentScope.get_candidate_ids) as get_candidate_ids:
+                with self.captureOnCommitCallbacks(execute=True):
+                    Keyword.objects.create(keyword='Uber Trip', merchant=self.merchant)
+                    Keyword.objects.create(keyword='Tienda', merchant=self.other_merchant)
+                self.assertEqual(len(queued), 1)
+                get_candidate_ids.assert_not_called()
+                self.assertEqual(self.get_enrichment('COMPRA UBER TRIP'), (None, None))
+                results = [run() for run in queued]
+            self.assertEqual(get_candidate_ids.call_count, 1)
+        self.assertEqual(results[0], {'candidates': 2, 'updated': 1})
+        self.assertEqual(self.get_enrichment('COMPRA UBER TRIP'), (self.merchant, self.category))
+
+    # Test para probar que el executor del re-enriquecimiento utiliza la cantidad de hilos de settings para todas las tareas.
+    def test_reenrichment_executor_is_bounded(self):
+        executor = ReenrichmentExecutor()
+        with override_settings(ENRICHMENT_REENRICH_WORKERS=2):
+            futures = [executor.submit(lambda number=number: number) for number in range(5)]
+            self.assertEqual([future.result() for future in futures], list(range(5)))
+            self.assertEqual(executor.executor._max_workers, 2)
+        executor.shutdown(wait=True)
+        self.assertIsNone(executor.executor)
+
+    # Test para probar el re-enriquecimiento completo con bulk_update, y el comando con la reconstruccion del indice.
+    def test_reenrich_all_and_command(self):
+        with override_settings(ENRICHMENT_REENRICH_ON_RULE_CHANGE='off'), self.captureOnCommitCallbacks(execute=True):
+            Keyword.objects.create(keyword='Uber', merchant=self.merchant)
+        self.assertEqual(reenrich_transactions(batch_size=3), {'candidates': 4, 'updated': 2})
+        self.assertEqual(self.get_enrichment('UBER EATS PEDIDO'), (self.merchant, self.category))
+        self.assertEqual(reenrich_transactions(), {'candidates': 4, 'updated': 0})
+
+        TransactionToken.objects.all().delete()
+        output = StringIO()
+        call_command('reenrich_transactions', '--reindex', stdout=output)
+        self.assertIn('4 transacciones revisadas, 0 actualizadas', output.getvalue())
+        self.assertEqual(TransactionToken.objects.filter(transaction=self.transactions['Sueldo']).count(), 1)
+
+    # Test para probar la evaluacion de un keyword nuevo, que captura transacciones sin comercio y le quita otras a otro comercio.
+    def test_keyword_dry_run(self):
+        response = self.client.post('/api/v1/keyword/dry-run/', json.dumps({'keyword': 'Uber', 'merchant': str(self.merchant.pk)}), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data['candidates'], data['affected'], data['captured'], data['stolen'], data['released']), (2, 2, 2, 0, 0))
+        sample = {transaction['description']: transaction for transaction in data['sample']}
+        self.assertEqual(sample['COMPRA UBER TRIP']['current'], {'merchant': None, 'category': None})
+        self.assertEqual(sample['COMPRA UBER TRIP']['proposed']['merchant'], {'id': str(self.merchant.pk), 'merchant_name': self.merchant.merchant_name})
+
+        response = self.client.post('/api/v1/keyword/dry-run/?sample=0', json.dumps({'keyword': 'Rappi', 'merchant': str(self.merchant.pk)}), content_type='application/json')
+        data = response.json()
+        self.assertEqual((data['affected'], data['captured'], data['stolen'], data['sample']), (1, 0, 1, []))
+        # La evaluacion no guarda la regla ni modifica las transacciones.
+        self.assertFalse(Keyword.objects.exists())
+        self.assertEqual(self.get_enrichment('Pago Rappi Tienda'), (self.other_merchant, self.other_category))
+
+    # Test para probar que la evaluacion cuenta las candidatas en la base de datos (con la misma seleccion que el indice de palabras),
+    # y que solo vuelve a buscar las primeras ENRICHMENT_DRY_RUN_MAX_CANDIDATES.
+    def test_dry_run_counts_candidates_in_database(self):
+        scope = ReenrichmentScope()
+        scope.add_pattern('Uber Trip')
+        scope.add_pattern('Rappi')
+        scope.add_category_name('Sueldo')
+        self.assertEqual(set(scope.get_candidate_queryset().values_list('pk', flat=True)), scope.get_candidate_ids())
+        with self.assertNumQueries(1):
+            self.assertEqual(scope.get_candidate_queryset().count(), 3)
+
+        payload = json.dumps({'keyword': 'Uber', 'merchant': str(self.merchant.pk)})
+        with override_settings(ENRICHMENT_DRY_RUN_MAX_CANDIDATES=1):
+            data = self.client.post('/api/v1/keyword/dry-run/', payload, content_type='application/json').json()
+        self.assertEqual((data['candidates'], data['evaluated'], data['complete'], data['affected']), (2, 1, False, 1))
+        data = self.client.post('/api/v1/keyword/dry-run/', payload, content_type='application/json').json()
+        self.assertEqual((data['candidates'], data['evaluated'], data['complete'], data['affected']), (2, 2, True, 2))
+
+    # Test para probar la evaluacion de la modificacion de un comercio y de una categoria existentes, y los datos invalidos.
+    def test_existing_rule_dry_run(self):
+        response = self.client.post(f'/api/v1/merchant/{self.other_merchant.pk}/dry-run/', json.dumps({'merchant_name': 'Uber Eats'}), content_type='application/json')
+        data = response.json()
+        self.assertEqual((data['affected'], data['captured'], data['released']), (2, 1, 1))
+        self.assertEqual(Merchant.objects.get(pk=self.other_merchant.pk).merchant_name, 'Rappi Tienda')
+
+        response = self.client.post(f'/api/v1/categories/{self.category.pk}/dry-run/', json.dumps({'name': 'Sueldo', 'type': 'income'}), content_type='application/json')
+        data = response.json()
+        self.assertEqual((data['candidates'], data['captured']), (1, 1))
+
+        response = self.client.post('/api/v1/categories/dry-run/', json.dumps({'name': 'Nueva', 'type': 'otro'}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/v1/keyword/dry-run/?sample=x', json.dumps({'keyword': 'Uber'}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    # Test para probar que la evaluacion no decodifica una copia completa de los datos pre-procesados ni los modifica.
+    def test_dry_run_copies_only_changed_matchers(self):
+        current_snapshot = get_processed_enrichment_data()
+        blob = current_snapshot.serialize()
+        with mock.patch.object(EnrichmentSnapshot, 'deserialize', side_effect=AssertionError('deserialize')):
+            response = self.client.post('/api/v1/keyword/dry-run/', json.dumps({'keyword': 'Uber Trip', 'merchant': str(self.merchant.pk)}), content_type='application/json')
+        self.assertEqual(response.json()['captured'], 1)
+        self.assertIs(get_processed_enrichment_data(), current_snapshot)
+        self.assertEqual(get_snapshot_content(current_snapshot.serialize()), get_snapshot_content(blob))
+
+    # Test para probar que las acciones dry-run de cada regla tienen ids de operacion propios en la documentacion.
+    def test_dry_run_operation_ids(self):
+        schema = SchemaGenerator().get_schema(request=None, public=True)
+        operation_ids = [operation['operationId'] for operations in schema['paths'].values() for operation in operations.values()]
+        self.assertEqual(len(operation_ids), len(set(operation_ids)))
+        for rule_name in ['categories', 'merchant', 'keyword']:
+            self.assertIn(f'{rule_name}_dry_run', operation_ids)
+            self.assertIn(f'{rule_name}_dry_run_update', operation_ids)
+
+
+class SyntheticDataTestCase(TestCase):
+    @classmethod
+    # Metodo de creacion de datos de prueba.
+    def setUpTestData(cls):
+        print("\nSynthetic Data Test")
+
+    def setUp(self):
+        cache.clear()
+        match_result_cache.clear()
+
+    # Test para probar que el catalogo sintetico es valido y que las transacciones respetan la proporcion de coincidencias.
+    def test_generated_catalog_and_transactions(self):
+        rng = random.Random(1)
+        categories, merchants, keywords = generate_catalog(rng, 200, 50, 10)
+        self.assertEqual((len(categories), len(merchants), len(keywords)), (10, 50, 200))
+        self.assertEqual({category.type for category in categories}, {'income', 'expense'})
+        self.assertTrue(any(len(merchant.merchant_name.split()) > 1 for merchant in merchants))
+        save_catalog(categories, merchants, keywords)
+
+        transactions = generate_transactions(rng, get_catalog_patterns(merchants, keywords), 1000, match_ratio=0.5, unique_ratio=1)
+        validator = BulkInputTransactionValidator([
+            {'description': item['description'], 'amount': str(item['amount']), 'date': item['date'].isoformat()} for item in transactions
+        ])
+        self.assertTrue(validator.is_valid())
+        snapshot = get_processed_enrichment_data()
+        matched = sum(
+            snapshot.match(normalize_text(item['description']), 'income' if item['amount'] >= 0 else 'expense')[0] is not None
+            for item in transactions
+        )
+        self.assertTrue(400 <= matched <= 600, matched)
+
+    # Test para probar el comando de benchmark, sus resultados en JSON y que no guarda el catalogo sintetico.
+    def test_benchmark_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output_path = os.path.join(directory, 'benchmark.json')
+            call_command('benchmark_enrichment', keywords='30', sizes='20', repeat=1, output=output_path, stdout=StringIO())
+            with open(output_path, encoding='utf-8') as output_file:
+                report = json.load(output_file)
+            output = StringIO()
+            call_command('benchmark_enrichment', keywords='30', sizes='20', repeat=1, compare=output_path, stdout=output)
+        results = {result['name']: result for result in report['results']}
+        self.assertEqual(set(results), {'snapshot_build', 'snapshot_shared_cache', 'snapshot_local_cache', 'enrich_endpoint'})
+        self.assertEqual((results['enrich_endpoint']['size'], results['enrich_endpoint']['keywords']), (20, 30))
+        for field in ('p50_ms', 'p99_ms', 'throughput_tps', 'peak_memory_bytes'):
+            self.assertIn(field, results['enrich_endpoint'])
+        self.assertIn('enrich_endpoint', output.getvalue())
+        self.assertFalse(Keyword.objects.exists())
+
+    # Test para probar el comando que guarda un catalogo sintetico y genera un archivo de transacciones.
+    def test_generate_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output_path = os.path.join(directory, 'transacciones.csv')
+            call_command('generate_enrichment_data', keywords=40, categories=4, transactions_file=output_path, rows=25, stdout=StringIO())
+            with open(output_path, newline='', encoding='utf-8') as output_file:
+                rows = list(csv.DictReader(output_file))
+        self.assertEqual((Keyword.objects.count(), Merchant.objects.count(), Category.objects.count()), (40, 20, 4))
+        self.assertEqual(len(rows), 25)
+        self.assertEqual(set(rows[0]), {'description', 'amount', 'date'})
+        self.assertEqual(get_processed_enrichment_data().get_counts()['keywords'], 40)
+
+
+class EnrichmentStageTimingTestCase(TestCase):
+    @classmethod
+    # Metodo de creacion de datos de prueba.
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Transporte Tiempos', type='expense')
+        cls.merchant = Merchant.objects.create(merchant_name='Uber Tiempos', category=cls.category)
+        Keyword.objects.create(keyword='Uber Trip', merchant=cls.merchant)
+        cls.url = '/api/v1/transactions/enrich/'
+        cls.payload = [
+            {"description": "COMPRA UBER TRIP", "amount": -100, "date": "2025-04-28"},
+            {"description": "Pago Uber Tiempos", "amount": -20, "date": "2025-04-29"},
+            {"description": "Pago transporte", "amount": -20, "date": "2025-04-29"},
+        ]
+        print("\nEnrichment Stage Timing Test")
+
+    def setUp(self):
+        cache.clear()
+        match_result_cache.clear()
+
+    # Test para probar que sin solicitarlos no se miden los tiempos, y la respuesta no cambia.
+    def test_timing_disabled_by_default(self):
+        with mock.patch('enrichment_logic.views.StageTimer') as timer_mock:
+            response = self.client.post(self.url, json.dumps(self.payload), content_type='application/json')
+        timer_mock.assert_not_called()
+        self.assertNotIn('Server-Timing', response)
+        self.assertNotIn('debug', response.json()['metrics'])
+
+    # Test para probar el detalle de tiempos en las metricas, el header Server-Timing y el log estructurado.
+    def test_timing_requested(self):
+        with self.assertLogs('enrichment_logic.views', level='INFO') as logs:
+            response = self.client.post(self.url + '?timing=true', json.dumps(self.payload), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        stages = response.json()['metrics']['debug']['stages']
+        for stage in ('validation', 'snapshot_version', 'snapshot_load', 'enrichment', 'keyword_match', 'merchant_match', 'category_match'):
+            self.assertIn(stage, stages)
+        # Una busqueda por descripcion: la del keyword termina en la primera etapa, y la de la categoria pasa por las tres.
+        self.assertEqual((stages['keyword_match']['count'], stages['merchant_match']['count'], stages['category_match']['count']), (3, 2, 1))
+
+        server_timing = response['Server-Timing']
+        self.assertIn('serialization;dur=', server_timing)
+        self.assertRegex(server_timing, r'^validation;dur=[0-9.]+, .*total;dur=[0-9.]+$')
+        self.assertEqual(logs.records[0].enrichment_timings['total_transactions'], 3)
+        self.assertIn('serialization', logs.records[0].enrichment_timings['stages'])
+
+    # Test para probar que con ENRICHMENT_STAGE_TIMING se envia el header en todas las solicitudes, sin el detalle en las metricas.
+    @override_settings(ENRICHMENT_STAGE_TIMING=True)
+    def test_timing_enabled_in_settings(self):
+        expected = self.client.post(self.url, json.dumps(self.payload), content_type='application/json')
+        self.assertIn('Server-Timing', expected)
+        self.assertNotIn('debug', expected.json()['metrics'])
+        response = self.client.post(self.url, json.dumps([{"description": "x"}]), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('validation;dur=', response['Server-Timing'])
+
+    # Test para probar la acumulacion de tiempos del timer.
+    def test_stage_timer(self):
+        timer = StageTimer()
+        timer.add('keyword_match', 0.002)
+        timer.add('keyword_match', 0.001)
+        with timer.measure('validation'):
+            pass
+        self.assertEqual(timer.as_dict()['keyword_match'], {'duration_ms': 3.0, 'count': 2})
+        self.assertEqual(list(timer.as_dict()), ['keyword_match', 'validation'])
+
+class AsyncEnrichmentViewTestCase(TestCase):
+    @classmethod
+    # Metodo de creacion de datos de prueba.
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Transporte Async', type='expense')
+        cls.merchant = Merchant.objects.create(merchant_name='Uber Async', category=cls.category)
+        Keyword.objects.create(keyword='Uber', merchant=cls.merchant)
+        cls.async_url = '/api/v1/transactions/enrich/async/'
+        cls.enrich_url = '/api/v1/transactions/enrich/'
+        print("\nAsync Enrichment Test")
+
+    def setUp(self):
+        cache.clear()
+        match_result_cache.clear()
+        snapshot.local_snapshot_cache.clear()
+
+    # Test para probar que el endpoint async entrega la misma respuesta que el endpoint sincrono, en el event loop y en el executor.
+    async def test_same_response_as_sync_view(self):
+        payload = json.dumps([
+            {"description": "Viaje en Uber", "amount": -4500, "date": "2025-04-28"},
+            {"description": "Transporte publico", "amount": "-800.5", "date": "2025-04-28"},
+            {"description": "Nada", "amount": 100, "date": "2025-04-28"},
+        ])
+        expected = await self.async_client.post(self.enrich_url, payload, content_type='application/json')
+        response = await self.async_client.post(self.async_url, payload, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), expected.json())
+        self.assertEqual(response.json()['transactions'][0]['enriched_merchant']['id'], str(self.merchant.id))
+        with override_settings(ENRICHMENT_ASYNC_INLINE_MAX_BYTES=0):
+            with mock.patch('enrichment_logic.views.async_enrichment_executor.run', wraps=views.async_enrichment_executor.run) as run:
+                response = await self.async_client.post(self.async_url, payload, content_type='application/json')
+        run.assert_called_once()
+        self.assertEqual(response.json(), expected.json())
+
+    # Test para probar que los errores de la entrada son los mismos que los del endpoint sincrono.
+    async def test_invalid_input(self):
+        for payload, content_type in [('{"description": ', 'application/json'), (json.dumps([{"description": "", "amount": "x"}]), 'application/json')]:
+            expected = await self.async_client.post(self.enrich_url, payload, content_type=content_type)
+            response = await self.async_client.post(self.async_url, payload, content_type=content_type)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json(), expected.json())
+        response = await self.async_client.post(self.async_url, 'x', content_type='text/plain')
+        self.assertEqual(response.status_code, 415)
+        response = await self.async_client.post(f'{self.async_url}?persist=never', '[]', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        response = await self.async_client.get(self.async_url)
+        self.assertEqual(response.status_code, 405)
+
+    # Test para probar que, con la version ya cargada, los datos se obtienen de la capa local sin codigo sincrono (hilos),
+    # y que las solicitudes concurrentes comparten una sola lectura de la version en la cache.
+    async def test_loaded_version_stays_in_event_loop(self):
+        loaded = await snapshot.aget_processed_enrichment_data()
+        with mock.patch.object(snapshot, 'get_processed_enrichment_data', side_effect=AssertionError('sync load')):
+            with mock.patch.object(snapshot.cache, 'aget', wraps=snapshot.cache.aget) as aget:
+                results = await asyncio.gather(*[snapshot.aget_processed_enrichment_data() for _ in range(10)])
+        self.assertTrue(all(result is loaded for result in results))
+        self.assertEqual(aget.call_count, 1)
+
+    # Test para probar que ?persist=sync guarda las transacciones enriquecidas desde el endpoint async.
+    async def test_persist_sync(self):
+        payload = json.dumps([{"description": "Viaje en Uber", "amount": -4500, "date": "2025-04-28"}])
+        response = await self.async_client.post(f'{self.async_url}?persist=sync', payload, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        saved = await Transaction.objects.aget(description="Viaje en Uber")
+        self.assertEqual(saved.enriched_merchant_id, self.merchant.id)
+
+    # Test para probar que el endpoint async escribe el archivo de metricas en el executor (no en el event loop), y solo
+    # cuando paso el intervalo desde la ultima escritura.
+    async def test_metrics_flush_off_event_loop(self):
+        payload = json.dumps([{"description": "Viaje en Uber", "amount": -4500, "date": "2025-04-28"}])
+        flush_threads = []
+        original_flush = metrics_registry.flush
+        def flush(*args, **kwargs):
+            flush_threads.append(threading.current_thread().name)
+            return original_flush(*args, **kwargs)
+        with tempfile.TemporaryDirectory() as directory, override_settings(ENRICHMENT_METRICS_DIR=directory, ENRICHMENT_METRICS_FLUSH_INTERVAL=60):
+            metrics_registry.last_flush = 0.0
+            with mock.patch.object(metrics_registry, 'flush', side_effect=flush):
+                for _ in range(2):
+                    response = await self.async_client.post(self.async_url, payload, content_type='application/json')
+                    self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(flush_threads), 1)
+            self.assertTrue(flush_threads[0].startswith('enrichment-async'))
+            self.assertTrue(os.path.exists(os.path.join(directory, f"{os.getpid()}.json")))
+            metrics_registry.reset()
+
+    # Test para probar que el endpoint async no cambia la documentacion: las operaciones de trabajos mantienen su tag.
+    def test_jobs_schema_tags(self):
+        schema = SchemaGenerator().get_schema(request=None, public=True)
+        job_operations = [
+            operation for path, operations in schema['paths'].items() if path.startswith('/api/v1/transactions/enrich/jobs/')
+            for operation in operations.values()
+        ]
+        self.assertTrue(job_operations)
+        for operation in job_operations:
+            self.assertEqual(operation['tags'], ['Enrichment Jobs'])
+
+
+class EnrichmentMetricsTestCase(TestCase):
+    @classmethod
+    # Metodo de creacion de datos de prueba.
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Transporte Metricas', type='expense')
+        cls.merchant = Merchant.objects.create(merchant_name='Uber Metricas', category=cls.category)
+        Keyword.objects.create(keyword='Uber Trip', merchant=cls.merchant)
+        cls.url = '/api/v1/transactions/enrich/'
+        cls.payload = [
+            {"description": "COMPRA UBER TRIP", "amount": -100, "date": "2025-04-28"},
+            {"description": "COMPRA UBER TRIP", "amount": -10, "date": "2025-04-28"},
+            {"description": "Pago Uber Metricas", "amount": -20, "date": "2025-04-29"},
+            {"description": "Pago transporte", "amount": -20, "date": "2025-04-29"},
+            {"description": "Pago desconocido", "amount": -20, "date": "2025-04-29"},
+        ]
+        print("\nEnrichment Metrics Test")
+
+    def setUp(self):
+        cache.clear()
+        match_result_cache.clear()
+        snapshot.local_snapshot_cache.clear()
+        metrics_registry.reset()
+
+    # Test para probar las metricas del endpoint de enriquecimiento, de los datos pre-procesados y de las caches en /metrics.
+    def test_metrics_endpoint(self):
+        self.client.post(self.url, json.dumps(self.payload), content_type='application/json')
+        self.client.post(self.url, json.dumps(self.payload[:1]), content_type='application/json')
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        lines = response.content.decode().splitlines()
+        for line in (
+            'enrichment_transactions_total 6',
+            'enrichment_matches_total{stage="keyword"} 3',
+            'enrichment_matches_total{stage="merchant"} 1',
+            'enrichment_matches_total{stage="category"} 1',
+            'enrichment_matches_total{stage="none"} 1',
+            'enrichment_request_transactions_bucket{le="1"} 1',
+            'enrichment_request_transactions_bucket{le="10"} 2',
+            'enrichment_request_transactions_sum 6.0',
+            'enrichment_request_transactions_count 2',
+            'enrichment_request_duration_seconds_count 2',
+            'enrichment_snapshot_builds_total 1',
+            'enrichment_snapshot_build_duration_seconds_count 1',
+            'enrichment_snapshot_cache_requests_total{result="miss"} 1',
+            'enrichment_local_snapshot_requests_total{result="hit"} 1',
+            'enrichment_result_cache_requests_total{result="hit"} 1',
+            '# TYPE enrichment_request_duration_seconds histogram',
+        ):
+            self.assertIn(line, lines)
+        size_line = next(line for line in lines if line.startswith('enrichment_snapshot_size_bytes '))
+        self.assertEqual(int(size_line.split()[1]), len(cache.get(CACHE_KEY)))
+        self.assertEqual(self.client.post('/metrics').status_code, 405)
+
+    # Test para probar que los histogramas entregan los buckets acumulados, con el limite +Inf.
+    def test_histogram_buckets(self):
+        registry = MetricsRegistry()
+        for value in (0.5, 3, 10, 2000000):
+            registry.observe('enrichment_request_transactions', value)
+        histograms = registry.get_state()['histograms']
+        self.assertEqual(histograms, [['enrichment_request_transactions', [], [1, 2, 0, 0, 0, 0, 0, 1], 2000013.5, 4]])
+
+    # Test para probar la suma de las metricas de varios procesos desde el directorio compartido: solo se suman los procesos
+    # vivos, y los archivos de los procesos terminados se eliminan.
+    def test_multiprocess_aggregation(self):
+        metrics_registry.inc('enrichment_transactions_total', 5)
+        metrics_registry.set_gauge('enrichment_snapshot_size_bytes', 100)
+        other_states = {
+            111111: {'counters': [['enrichment_transactions_total', [], 7]], 'gauges': [['enrichment_snapshot_size_bytes', [], 300]]},
+            222222: {'counters': [['enrichment_transactions_total', [], 11]], 'gauges': [['enrichment_snapshot_size_bytes', [], 900]]},
+        }
+        with tempfile.TemporaryDirectory() as directory:
+            for pid, state in other_states.items():
+                with open(os.path.join(directory, f"{pid}.json"), 'w') as metrics_file:
+                    json.dump(dict(state, pid=pid, histograms=[['enrichment_request_transactions', [], [1, 0, 0, 0, 0, 0, 0, 0], 1.0, 1]]), metrics_file)
+            with override_settings(ENRICHMENT_METRICS_DIR=directory), \
+                    mock.patch('enrichment_logic.metrics.is_process_alive', side_effect=lambda pid: pid == 111111):
+                lines = render_metrics().splitlines()
+            self.assertTrue(os.path.exists(os.path.join(directory, f"{os.getpid()}.json")))
+            self.assertEqual(sorted(os.listdir(directory)), sorted([f"{os.getpid()}.json", '111111.json']))
+        self.assertIn('enrichment_transactions_total 12', lines)
+        self.assertIn('enrichment_snapshot_size_bytes 300', lines)
+        self.assertIn('enrichment_request_transactions_count 1', lines)
+
+    # Test para probar que al iniciar (o reiniciar) el registro de un proceso se elimina el archivo de un proceso anterior
+    # con el mismo pid, para que sus metricas no se sumen a las del proceso nuevo.
+    def test_reset_removes_previous_process_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, f"{os.getpid()}.json")
+            with open(path, 'w') as metrics_file:
+                json.dump({'pid': os.getpid(), 'counters': [['enrichment_transactions_total', [], 50]], 'gauges': [], 'histograms': []}, metrics_file)
+            with override_settings(ENRICHMENT_METRICS_DIR=directory):
+                MetricsRegistry()
+                self.assertFalse(os.path.exists(path))
+                lines = render_metrics().splitlines()
+        self.assertFalse([line for line in lines if line.startswith('enrichment_transactions_total ')])
+
+class RuleListPaginationTestCase(TestCase):
+    @classmethod
+    # Metodo de creacion de datos de prueba.
+    def setUpTestData(cls):
+        cls.expense = Category.objects.create(name='Gasto Listado', type='expense')
+        cls.income = Category.objects.create(name='Ingreso Listado', type='income')
+        cls.merchants = [
+            Merchant.objects.create(merchant_name=f'Comercio Listado {number}', category=cls.expense if number % 2 else cls.income)
+            for number in range(5)
+        ]
+        cls.keywords = [Keyword.objects.create(keyword=f'Keyword Listado {number}', merchant=cls.merchants[number % 2]) for number in range(7)]
+        print("\nRule List Pagination Test")
+
+    def setUp(self):
+        cache.clear()
+        match_result_cache.clear()
+
+    # Esta funcion se encarga de recorrer todas las paginas de un listado, retornando los resultados y la cantidad de paginas.
+    def get_all_pages(self, url):
+        results, pages = [], 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            results.extend(data['results'])
+            url = data['next']
+            pages += 1
+        return results, pages
+
+    # Test para probar el recorrido por cursor de un listado, en orden de creacion y sin repetir elementos.
+    def test_cursor_pagination(self):
+        results, pages = self.get_all_pages('/api/v1/keyword/?page_size=3')
+        self.assertEqual(pages, 3)
+        self.assertEqual([item['id'] for item in results], [str(keyword.pk) for keyword in self.keywords])
+        response = self.client.get('/api/v1/keyword/')
+        self.assertEqual(len(response.json()['results']), 7)
+        self.assertIsNone(response.json()['next'])
+
+    # Test para probar el tamaño de pagina por defecto y maximo configurados en settings.
+    @override_settings(ENRICHMENT_RULES_PAGE_SIZE=2, ENRICHMENT_RULES_MAX_PAGE_SIZE=4)
+    def test_page_size_settings(self):
+        self.assertEqual(len(self.client.get('/api/v1/keyword/').json()['results']), 2)
+        self.assertEqual(len(self.client.get('/api/v1/keyword/?page_size=100').json()['results']), 4)
+
+    # Test para probar los filtros de los listados de categorias, comercios y keywords.
+    def test_list_filters(self):
+        results, _ = self.get_all_pages('/api/v1/categories/?type=income')
+        self.assertEqual([item['id'] for item in results], [str(self.income.pk)])
+        results, _ = self.get_all_pages(f'/api/v1/merchant/?category={self.expense.pk}&page_size=1')
+        self.assertEqual([item['id'] for item in results], [str(merchant.pk) for merchant in self.merchants[1::2]])
+        results, _ = self.get_all_pages(f'/api/v1/keyword/?merchant={self.merchants[1].pk}&page_size=2')
+        self.assertEqual([item['id'] for item in results], [str(keyword.pk) for keyword in self.keywords[1::2]])
+        results, _ = self.get_all_pages('/api/v1/keyword/?type=income')
+        self.assertEqual([item['id'] for item in results], [str(keyword.pk) for keyword in self.keywords[0::2]])
+        results, _ = self.get_all_pages(f'/api/v1/keyword/?category={self.expense.pk}')
+        self.assertEqual(len(results), 3)
+
+    # Test para probar los errores de filtros invalidos.
+    def test_invalid_filters(self):
+        response = self.client.get('/api/v1/merchant/?category=no-es-uuid')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('category', response.json())
+        response = self.client.get('/api/v1/keyword/?type=otro')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('type', response.json())
+
+    # Test para probar que cada pagina se obtiene con una sola consulta, sin importar su posicion.
+    def test_page_query_count(self):
+        next_url = self.client.get('/api/v1/keyword/?page_size=2').json()['next']
+        next_url = self.client.get(next_url).json()['next']
+        with self.assertNumQueries(1):
+            response = self.client.get(next_url)
+        self.assertEqual(len(response.json()['results']), 2)
+
+    # Test para probar que las paginas filtradas por categoria o tipo se obtienen con una sola consulta, sin JOIN, y que
+    # SQLite las resuelve con el indice compuesto del filtro (sin ordenar en una tabla temporal).
+    @skipUnless(connection.vendor == 'sqlite', 'El plan de consulta se revisa con EXPLAIN QUERY PLAN de SQLite.')
+    def test_filtered_page_uses_index(self):
+        pages = [
+            ('/api/v1/merchant/?type=expense&page_size=1', 'merchant_type_created_idx'),
+            (f'/api/v1/merchant/?category={self.expense.pk}&page_size=1', 'merchant_category_created_idx'),
+            (f'/api/v1/keyword/?category={self.expense.pk}&page_size=2', 'keyword_category_created_idx'),
+            ('/api/v1/keyword/?type=income&page_size=2', 'keyword_type_created_idx'),
+        ]
+        for url, index_name in pages:
+            with self.subTest(url=url):
+                next_url = self.client.get(url).json()['next']
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(next_url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(queries), 1)
+                sql = queries[0]['sql']
+                self.assertNotIn('JOIN', sql)
+                with connection.cursor() as cursor:
+                    cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                    plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+                self.assertIn(index_name, plan)
+                self.assertNotIn('TEMP B-TREE', plan)
+
+    # Test para probar que las columnas copiadas de la categoria se mantienen al modificar categorias y comercios,
+    # uno a uno y con operaciones masivas.
+    @override_settings(ENRICHMENT_REENRICH_ON_RULE_CHANGE='sync')
+    def test_category_columns_follow_changes(self):
+        def get_ids(url):
+            results, _ = self.get_all_pages(url)
+            return {item['id'] for item in results}
+        expense_keywords = {str(keyword.pk) for keyword in self.keywords[1::2]}
+        self.assertEqual(get_ids('/api/v1/keyword/?type=expense'), expense_keywords)
+        # Cambio del tipo de una categoria.
+        self.expense.type = 'income'
+        self.expense.save()
+        self.assertEqual(get_ids('/api/v1/keyword/?type=expense'), set())
+        self.assertEqual(len(get_ids('/api/v1/merchant/?type=income')), 5)
+        # Cambio de la categoria de un comercio.
+        merchant = self.merchants[1]
+        merchant.category = self.income
+        merchant.save()
+        self.assertEqual(get_ids(f'/api/v1/keyword/?category={self.income.pk}'), {str(keyword.pk) for keyword in self.keywords})
+        # Operaciones masivas: tipo de una categoria, categoria de un comercio y comercio de un keyword.
+        payload = [{"id": str(self.income.pk), "type": "expense"}]
+        self.assertEqual(self.client.patch('/api/v1/categories/bulk/', json.dumps(payload), content_type='application/json').status_code, 200)
+        self.assertEqual(get_ids('/api/v1/keyword/?type=expense'), {str(keyword.pk) for keyword in self.keywords})
+        payload = [{"id": str(merchant.pk), "category": str(self.expense.pk)}]
+        self.assertEqual(self.client.patch('/api/v1/merchant/bulk/', json.dumps(payload), content_type='application/json').status_code, 200)
+        self.assertEqual(get_ids(f'/api/v1/keyword/?category={self.expense.pk}'), expense_keywords)
+        self.assertEqual(get_ids('/api/v1/merchant/?type=income'), {str(item.pk) for item in self.merchants[1::2]})
+        payload = [{"id": str(self.keywords[0].pk), "merchant": str(merchant.pk)}]
+        self.assertEqual(self.client.patch('/api/v1/keyword/bulk/', json.dumps(payload), content_type='application/json').status_code, 200)
+        self.assertIn(str(self.keywords[0].pk), get_ids(f'/api/v1/keyword/?category={self.expense.pk}'))
+        payload = [{"keyword": "Keyword Listado Masivo", "merchant": str(merchant.pk)}]
+        response = self.client.post('/api/v1/keyword/bulk/', json.dumps(payload), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Keyword.objects.get(keyword='Keyword Listado Masivo').category_type, 'income')
+
+    # Test para probar que guardar un comercio o keyword sin cambiar su categoria o comercio no consulta ni escribe las
+    # columnas copiadas de la categoria, y que no pisa una copia actualizada con el valor en memoria.
+    @override_settings(ENRICHMENT_REENRICH_ON_RULE_CHANGE='off')
+    def test_category_columns_only_change_with_reference(self):
+        merchant = Merchant.objects.get(pk=self.merchants[1].pk)
+        keyword = Keyword.objects.get(pk=self.keywords[1].pk)
+        Merchant.objects.filter(pk=merchant.pk).update(category_type='income')
+        Keyword.objects.filter(pk=keyword.pk).update(category_type='income')
+        merchant.merchant_logo = 'https://example.com/logo.png'
+        keyword.keyword = 'Keyword Listado Renombrado'
+        with CaptureQueriesContext(connection) as queries:
+            merchant.save()
+            keyword.save()
+        self.assertEqual(len(queries), 2)
+        self.assertFalse([query for query in queries if 'category_type' in query['sql']])
+        self.assertEqual(Merchant.objects.get(pk=merchant.pk).category_type, 'income')
+        self.assertEqual(Keyword.objects.get(pk=keyword.pk).category_type, 'income')
+        category = Category.objects.get(pk=self.expense.pk)
+        category.name = 'Gasto Listado Renombrado'
+        with self.assertNumQueries(1):
+            category.save()
+        # Al cambiar la referencia se copia la categoria, desde el objeto ya cargado si lo esta.
+        merchant.category = self.income
+        with self.assertNumQueries(2):
+            merchant.save()
+        keyword.merchant = self.merchants[0]
+        with self.assertNumQueries(1):
+            keyword.save()
+        self.assertEqual(Keyword.objects.filter(merchant=merchant, category=self.income, category_type='income').count(), 2)
+        self.assertEqual((keyword.category_id, keyword.category_type), (self.income.pk, 'income'))
+
+    # Test para probar que el cursor es la posicion compuesta (created_at, id), sin offset para los elementos con la misma
+    # fecha de creacion, y que un cursor invalido retorna 404.
+    def test_cursor_with_equal_created_at(self):
+        Keyword.objects.update(created_at=self.keywords[0].created_at)
+        keywords = sorted(self.keywords, key=lambda keyword: keyword.pk.hex)
+        response = self.client.get('/api/v1/keyword/?page_size=3')
+        self.assertEqual([item['id'] for item in response.json()['results']], [str(keyword.pk) for keyword in keywords[:3]])
+        next_url = response.json()['next']
+        cursor = base64.b64decode(parse_qs(urlparse(next_url).query)['cursor'][0]).decode()
+        self.assertNotIn('o=', cursor)
+        self.assertIn(str(keywords[2].pk), unquote(cursor))
+        results, pages = self.get_all_pages('/api/v1/keyword/?page_size=3')
+        self.assertEqual([item['id'] for item in results], [str(keyword.pk) for keyword in keywords])
+        previous_url = self.client.get(self.client.get(next_url).json()['next']).json()['previous']
+        response = self.client.get(previous_url)
+        self.assertEqual([item['id'] for item in response.json()['results']], [str(keyword.pk) for keyword in keywords[3:6]])
+        invalid_cursor = base64.b64encode(b'p=no-es-fecha').decode()
+        self.assertEqual(self.client.get(f'/api/v1/keyword/?cursor={invalid_cursor}').status_code, 404)
+
+@override_settings(ENRICHMENT_REENRICH_ON_RULE_CHANGE='sync')
+class RuleBulkOperationsTestCase(TestCase):
+    @classmethod
+    # Metodo de creacion de datos de prueba.
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Transporte Masivo', type='expense')
+        cls.other_category = Category.objects.create(name='Comida Masiva', type='expense')
+        cls.merchant = Merchant.objects.create(merchant_name='Uber Masivo', category=cls.category)
+        cls.other_merchant = Merchant.objects.create(merchant_name='Rappi Masivo', category=cls.other_category)
+        cls.keyword = Keyword.objects.create(keyword='Uber Trip', merchant=cls.merchant)
+        print("\nRule Bulk Operations Test")
+
+    def setUp(self):
+        cache.clear()
+        match_result_cache.clear()
+
+    # Esta funcion se encarga de enviar una operacion masiva, ejecutando las acciones posteriores a la transaccion.
+    def send_bulk(self, method, url, data, content_type='application/json'):
+        body = json.dumps(data) if content_type == 'application/json' else data
+        with mock.patch('enrichment_logic.signals.update_processed_enrichment_data_changes') as update_mock, \
+                mock.patch('enrichment_logic.bulk.rebuild_processed_enrichment_data', wraps=snapshot.rebuild_processed_enrichment_data) as rebuild_mock, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = getattr(self.client, method)(url, body, content_type=content_type)
+        # Sin actualizaciones por regla: los datos pre-procesados se reconstruyen una sola vez (si la operacion se aplico).
+        update_mock.assert_not_called()
+        self.assertEqual(rebuild_mock.call_count, 1 if response.status_code in (200, 201) else 0)
+        return response
+
+    # Esta funcion se encarga de enriquecer una descripcion de gasto, retornando el comercio encontrado (o None).
+    def enrich_merchant(self, description):
+        payload = [{"description": description, "amount": -10, "date": "2025-04-28"}]
+        merchant = self.client.post('/api/v1/transactions/enrich/', json.dumps(payload), content_type='application/json').json()['transactions'][0]['enriched_merchant']
+        return merchant['merchant_name'] if merchant else None
+
+    # Test para probar la creacion masiva de keywords, con una sola reconstruccion de los datos pre-procesados.
+    def test_bulk_create_keywords(self):
+        get_processed_enrichment_data()
+        payload = [
+            {"keyword": "Uber Eats", "merchant": str(self.merchant.pk)},
+            {"keyword": "Rappi Pedido", "merchant": str(self.other_merchant.pk)},
+            {"keyword": "Sin Comercio"},
+        ]
+        response = self.send_bulk('post', '/api/v1/keyword/bulk/', payload)
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertEqual((data['operation'], data['total_rows'], len(data['ids'])), ('create', 3, 3))
+        for field in ('validation_ms', 'write_ms', 'snapshot_refresh_ms', 'duration_ms', 'rows_per_second'):
+            self.assertIn(field, data['metrics'])
+        self.assertEqual(Keyword.objects.get(keyword='Rappi Pedido').merchant, self.other_merchant)
+        self.assertIsNone(Keyword.objects.get(keyword='Sin Comercio').merchant)
+        self.assertEqual(self.enrich_merchant('RAPPI PEDIDO 123'), 'Rappi Masivo')
+
+    # Test para probar la creacion masiva de comercios desde un cuerpo CSV y desde un archivo CSV (multipart).
+    def test_bulk_create_merchants_csv(self):
+        csv_body = f"merchant_name,merchant_logo,category\nCabify Masivo,,{self.category.pk}\nDidi Masivo,https://example.com/didi.png,\n"
+        response = self.send_bulk('post', '/api/v1/merchant/bulk/', csv_body, content_type='text/csv')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Merchant.objects.get(merchant_name='Cabify Masivo').category, self.category)
+        self.assertIsNone(Merchant.objects.get(merchant_name='Didi Masivo').category)
+
+        upload = io.BytesIO(f"\ufeffmerchant_name,category\nBeat Masivo,{self.category.pk}\n".encode('utf-8'))
+        upload.name = 'comercios.csv'
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/v1/merchant/bulk/', {'file': upload})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.enrich_merchant('VIAJE BEAT MASIVO'), 'Beat Masivo')
+
+    # Test para probar los errores de validacion por fila, sin guardar ninguna fila del lote.
+    def test_bulk_validation_errors(self):
+        payload = [
+            {"keyword": "Nuevo Masivo", "merchant": str(self.merchant.pk)},
+            {"keyword": "Uber Trip", "merchant": str(self.merchant.pk)},
+            {"keyword": "Nuevo Masivo"},
+            {"keyword": "Otro Masivo", "merchant": str(uuid.uuid4())},
+            {"keyword": ""},
+            "texto",
+        ]
+        response = self.send_bulk('post', '/api/v1/keyword/bulk/', payload)
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()
+        self.assertEqual(errors[0], {})
+        self.assertIn('keyword', errors[1])
+        self.assertIn('keyword', errors[2])
+        self.assertIn('merchant', errors[3])
+        self.assertIn('keyword', errors[4])
+        self.assertIn('non_field_errors', errors[5])
+        self.assertFalse(Keyword.objects.filter(keyword='Nuevo Masivo').exists())
+
+        response = self.client.post('/api/v1/keyword/bulk/', json.dumps({"keyword": "x"}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        with override_settings(ENRICHMENT_BULK_MAX_ROWS=1):
+            response = self.client.post('/api/v1/keyword/bulk/', json.dumps(payload[:2]), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    # Test para probar la modificacion masiva (parcial) y el re-enriquecimiento de las transacciones guardadas afectadas.
+    def test_bulk_update(self):
+        persisted = [{"description": "Pago Rappi Masivo", "amount": -30, "date": "2025-04-29"}]
+        self.client.post('/api/v1/transactions/enrich/?persist=sync', json.dumps(persisted), content_type='application/json')
+        self.assertEqual(Transaction.objects.get().enriched_merchant, self.other_merchant)
+        payload = [
+            {"id": str(self.other_merchant.pk), "merchant_name": "Glovo Masivo", "category": str(self.category.pk)},
+            {"id": str(self.keyword.pk), "merchant": str(self.other_merchant.pk)},
+        ]
+        response = self.send_bulk('patch', '/api/v1/merchant/bulk/', payload[:1])
+        self.assertEqual(response.status_code, 200)
+        response = self.send_bulk('patch', '/api/v1/keyword/bulk/', payload[1:])
+        self.assertEqual(response.status_code, 200)
+        self.other_merchant.refresh_from_db()
+        self.assertEqual((self.other_merchant.merchant_name, self.other_merchant.category), ('Glovo Masivo', self.category))
+        self.assertGreater(self.other_merchant.updated_at, self.other_merchant.created_at)
+        self.assertEqual(Keyword.objects.get(pk=self.keyword.pk).merchant, self.other_merchant)
+        self.assertIsNone(Transaction.objects.get().enriched_merchant)
+        self.assertEqual(self.enrich_merchant('COMPRA UBER TRIP'), 'Glovo Masivo')
+
+        # Un valor unico de otra regla, un id repetido y una fila sin id.
+        payload = [
+            {"id": str(self.merchant.pk), "merchant_name": "Glovo Masivo"},
+            {"id": str(self.merchant.pk), "merchant_name": "Otro Masivo"},
+            {"merchant_name": "x"},
+        ]
+        response = self.send_bulk('patch', '/api/v1/merchant/bulk/', payload)
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()
+        self.assertIn('merchant_name', errors[0])
+        self.assertIn('id', errors[1])
+        self.assertIn('id', errors[2])
+
+    # Test para probar la eliminacion masiva de comercios (con sus keywords en cascada), y el error al eliminar
+    # categorias con comercios asociados.
+    def test_bulk_delete(self):
+        persisted = [{"description": "COMPRA UBER TRIP", "amount": -100, "date": "2025-04-28"}]
+        self.client.post('/api/v1/transactions/enrich/?persist=sync', json.dumps(persisted), content_type='application/json')
+        self.assertEqual(Transaction.objects.get().enriched_merchant, self.merchant)
+
+        response = self.send_bulk('delete', '/api/v1/merchant/bulk/', [str(self.merchant.pk)])
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Keyword.objects.filter(pk=self.keyword.pk).exists())
+        self.assertIsNone(self.enrich_merchant('COMPRA UBER TRIP'))
+        self.assertIsNone(Transaction.objects.get().enriched_merchant)
+
+        response = self.client.delete('/api/v1/categories/bulk/', json.dumps([{"id": str(self.other_category.pk)}]), content_type='application/json')
+        self.assertEqual(response.status_code, 409)
+        self.assertTrue(Category.objects.filter(pk=self.other_category.pk).exists())
+        response = self.client.delete('/api/v1/categories/bulk/', json.dumps([str(uuid.uuid4()), "x"]), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
@@ -0,0 +1,53 @@
+from contextlib import contextmanager, nullcontext
+import time
+
+
+# Timer de las etapas de una solicitud de enriquecimiento (validacion, carga de datos, busquedas, serializacion, etc).
+# Acumula la duracion y la cantidad de veces de cada etapa, en el orden en que se registran por primera vez.
+# Cuando el timer esta deshabilitado no se crea, y el codigo instrumentado solo compara el timer con None.
+class StageTimer:
+    __slots__ = ('started_at', 'durations', 'counts')
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.durations = {}
+        self.counts = {}
+
+    # Esta funcion se encarga de sumar una duracion (en segundos) a una etapa.
+    def add(self, stage, duration):
+        self.durations[stage] = self.durations.get(stage, 0.0) + duration
+        self.counts[stage] = self.counts.get(stage, 0) + 1
+
+    # Esta funcion se encarga de registrar la duracion de una etapa que comenzo en start_time, retornando el momento actual
+    # (para medir etapas consecutivas sin volver a consultar el reloj).
+    def lap(self, stage, start_time):
+        now = time.perf_counter()
+        self.add(stage, now - start_time)
+        return now
+
+    # Esta funcion se encarga de medir la duracion de un bloque de codigo como una etapa.
+    @contextmanager
+    def measure(self, stage):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start_time)
+
+    # Esta funcion se encarga de obtener la duracion total desde que se creo el timer, en milisegundos.
+    def get_total_ms(self):
+        return (time.perf_counter() - self.started_at) * 1000
+
+    # Esta funcion se encarga de obtener la duracion (en milisegundos) y cantidad de cada etapa.
+    def as_dict(self):
+        return {stage: {'duration_ms': round(duration * 1000, 3), 'count': self.counts[stage]} for stage, duration in self.durations.items()}
+
+    # Esta funcion se encarga de obtener el valor del header Server-Timing, con cada etapa y el total.
+    def get_server_timing(self):
+        entries = [f"{stage};dur={duration * 1000:.3f}" for stage, duration in self.durations.items()]
+        entries.append(f"total;dur={self.get_total_ms():.3f}")
+        return ', '.join(entries)
+
+# Esta funcion se encarga de medir una etapa con el timer entregado, o de no hacer nada si el timer es None.
+def measure_stage(timer, stage):
+    return timer.measure(stage) if timer is not None else nullcontext()
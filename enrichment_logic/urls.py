@@ -6,8 +6,12 @@ router = routers.DefaultRouter()
 router.register(r'categories', views.CategoryViewSet)
 router.register(r'merchant', views.MerchantViewSet)
 router.register(r'keyword', views.KeywordViewSet)
+router.register(r'transactions/enrich/jobs', views.EnrichmentJobViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
     path('transactions/enrich/', views.EnrichTransactionsAPIView.as_view(), name='enrich-transactions'),
+    path('transactions/enrich/async/', views.enrich_transactions_async_view, name='enrich-transactions-async'),
+    path('transactions/enrich/stream/', views.EnrichTransactionsStreamAPIView.as_view(), name='enrich-transactions-stream'),
+    path('transactions/enrich/serializer-validation/', views.EnrichTransactionsAPIView.as_view(input_validation='serializer'), name='enrich-transactions-serializer-validation'),
 ]
\ No newline at end of file
@@ -0,0 +1,115 @@
+import datetime
+import decimal
+import re
+from rest_framework import serializers
+from .serializer import InputTransactionSerializer
+
+# Expresion para las fechas en formato ISO 8601 (AAAA-MM-DD), el formato que entrega normalmente la entrada del enriquecimiento.
+DATE_REGEX = re.compile(r'\d{4}-\d{2}-\d{2}', re.ASCII)
+# Expresion para los montos en texto con a lo mas 8 digitos enteros y 2 decimales (max_digits=10, decimal_places=2).
+AMOUNT_REGEX = re.compile(r'-?\d{1,8}(?:\.\d{0,2})?', re.ASCII)
+# Expresion para detectar caracteres "surrogate", que DRF rechaza en los CharField.
+SURROGATE_REGEX = re.compile('[\ud800-\udfff]')
+
+
+# Validador masivo para la entrada de la api de enriquecimiento (lista de description, amount y date).
+# Expone la misma interfaz que InputTransactionSerializer(data=..., many=True): is_valid(), errors y validated_data.
+# Las transacciones con tipos simples (texto, numero y fecha ISO) se validan directamente, sin el pipeline de campos de DRF.
+# Cualquier otra transaccion se valida con InputTransactionSerializer, por lo que los datos validados y los errores
+# (por indice y por campo) son exactamente los mismos que entrega el serializer.
+class BulkInputTransactionValidator:
+    def __init__(self, data):
+        self.initial_data = data
+        self.child = InputTransactionSerializer()
+        fields = self.child.fields
+        self.amount_field = fields['amount']
+        self.max_whole_amount = 10 ** (self.amount_field.max_digits - self.amount_field.decimal_places)
+
+    # Esta funcion se encarga de validar la lista de transacciones. Retorna True si todas las transacciones son validas.
+    def is_valid(self):
+        data = self.initial_data
+        # Para una entrada que no es una lista (ej: formulario o diccionario) se utiliza directamente el serializer.
+        if type(data) is not list:
+            serializer = InputTransactionSerializer(data=data, many=True)
+            valid = serializer.is_valid()
+            self._validated_data = serializer.validated_data if valid else []
+            self._errors = serializer.errors if not valid else []
+            return valid
+
+        validated_data = []
+        errors = []
+        has_errors = False
+        for item in data:
+            try:
+                validated_item = self.run_item_validation(item)
+            except serializers.ValidationError as exc:
+                errors.append(exc.detail)
+                has_errors = True
+                continue
+            validated_data.append(validated_item)
+            errors.append({})
+
+        if has_errors:
+            self._validated_data = []
+            self._errors = errors
+            return False
+        self._validated_data = validated_data
+        self._errors = []
+        return True
+
+    # Esta funcion se encarga de validar una transaccion, retornando la transaccion validada.
+    # Si la transaccion no es valida se lanza ValidationError, con el mismo detalle que entrega el serializer.
+    def run_item_validation(self, item):
+        validated_item = self.validate_item(item)
+        if validated_item is None:
+            # Se valida con el serializer para obtener exactamente el mismo resultado (o error) que DRF.
+            validated_item = self.child.run_validation(item)
+        return validated_item
+
+    # Esta funcion se encarga de validar una transaccion con tipos simples.
+    # Retorna la transaccion validada, o None si la transaccion se debe validar con el serializer.
+    def validate_item(self, item):
+        if type(item) is not dict:
+            return None
+
+        description = item.get('description')
+        if type(description) is not str:
+            return None
+        description = description.strip()
+        if not description or '\x00' in description:
+            return None
+        if not description.isascii() and SURROGATE_REGEX.search(description):
+            return None
+
+        amount = item.get('amount')
+        if type(amount) is int:
+            if not -self.max_whole_amount < amount < self.max_whole_amount:
+                return None
+            amount = self.amount_field.quantize(decimal.Decimal(amount))
+        elif type(amount) is str and AMOUNT_REGEX.fullmatch(amount):
+            amount = self.amount_field.quantize(decimal.Decimal(amount))
+        elif type(amount) in (str, float):
+            try:
+                amount = self.amount_field.run_validation(amount)
+            except serializers.ValidationError:
+                return None
+        else:
+            return None
+
+        date = item.get('date')
+        if type(date) is not str or not DATE_REGEX.fullmatch(date):
+            return None
+        try:
+            date = datetime.date.fromisoformat(date)
+        except ValueError:
+            return None
+
+        return {'description': description, 'amount': amount, 'date': date}
+
+    @property
+    def validated_data(self):
+        return self._validated_data
+
+    @property
+    def errors(self):
+        return self._errors
@@ -1,250 +1,526 @@
-from django.core.cache import cache
+import json
+import logging
+import time
+import uuid
+from django.conf import settings
+from django.db import IntegrityError
+from django.http import StreamingHttpResponse, HttpResponse
+from django.views.decorators.http import require_GET, require_POST
+from django.views.decorators.csrf import csrf_exempt
+from asgiref.sync import sync_to_async
 from rest_framework import viewsets
+from rest_framework.decorators import action
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
+from rest_framework.parsers import JSONParser, MultiPartParser
 from rest_framework import status
-from drf_spectacular.utils import extend_schema
-from .serializer import CategorySerializer, MerchantSerializer, KeywordSerializer,InputTransactionSerializer, OutputTransactionSerializer, EnrichmentResponseSerializer
-from .models import Category, Merchant, Keyword
-import re
+from rest_framework import serializers
+from rest_framework.settings import api_settings
+from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter
+from .serializer import CategorySerializer, MerchantSerializer, KeywordSerializer,InputTransactionSerializer, OutputTransactionSerializer, EnrichmentResponseSerializer, EnrichmentJobSerializer, EnrichmentJobResultsSerializer, RuleDryRunSerializer, RuleBulkSerializer
+from .models import Category, Merchant, Keyword, EnrichmentJob, EnrichmentJobChunk
+from .snapshot import get_processed_enrichment_data, aget_processed_enrichment_data, detach_instance, MOVEMENT_TYPES
+from .renderers import EnrichmentJSONRenderer
+from .validators import BulkInputTransactionValidator
+from .enrichment import TransactionEnricher
+from .jobs import create_enrichment_job
+from .parallel import should_match_in_parallel, prefetch_matches_in_parallel
+from .async_executor import async_enrichment_executor, DEFAULT_ASYNC_INLINE_MAX_BYTES
+from .persistence import PERSIST_MODES, build_transaction_rows, persist_transactions, transaction_write_buffer
+from .timing import StageTimer, measure_stage
+from .pagination import RuleCursorPagination
+from .parsers import CSVParser, parse_csv_file
+from .bulk import BulkRuleValidator, apply_bulk_rule_operation
+from .metrics import metrics_registry, render_metrics, METRICS_CONTENT_TYPE
+from .reenrichment import evaluate_rule_change, get_instance_rule_values, DEFAULT_DRY_RUN_SAMPLE_SIZE, MAX_DRY_RUN_SAMPLE_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Acciones para evaluar (dry-run) una regla propuesta sobre las transacciones guardadas, sin guardarla:
+# POST {regla}/dry-run/ evalua una regla nueva, y POST {regla}/{id}/dry-run/ la modificacion de una existente (parcial).
+# El cuerpo es el mismo que al crear o modificar la regla, y se valida con el mismo serializer.
+class RuleDryRunMixin:
+    sample_parameter = OpenApiParameter(
+        'sample', int, required=False,
+        description=f'Cantidad de transacciones afectadas de muestra (por defecto {DEFAULT_DRY_RUN_SAMPLE_SIZE}, maximo {MAX_DRY_RUN_SAMPLE_SIZE}).',
+    )
+
+    @extend_schema(parameters=[sample_parameter], responses={200: RuleDryRunSerializer})
+    @action(detail=False, methods=['post'], url_path='dry-run')
+    def dry_run(self, request, *args, **kwargs):
+        return self.evaluate_proposed_rule(request)
+
+    @extend_schema(parameters=[sample_parameter], responses={200: RuleDryRunSerializer})
+    @action(detail=True, methods=['post'], url_path='dry-run')
+    def dry_run_update(self, request, *args, **kwargs):
+        return self.evaluate_proposed_rule(request, self.get_object())
+
+    # Esta funcion se encarga de validar la regla propuesta y evaluarla, sin guardarla.
+    def evaluate_proposed_rule(self, request, instance=None):
+        try:
+            sample_size = int(request.query_params.get('sample', DEFAULT_DRY_RUN_SAMPLE_SIZE))
+        except ValueError:
+            return Response({"sample": ["A valid integer is required."]}, status=status.HTTP_400_BAD_REQUEST)
+        sample_size = min(max(sample_size, 0), MAX_DRY_RUN_SAMPLE_SIZE)
+
+        serializer = self.get_serializer(instance, data=request.data, partial=instance is not None)
+        serializer.is_valid(raise_exception=True)
+        if instance is None:
+            proposed_instance, previous_values = self.get_queryset().model(**serializer.validated_data), None
+        else:
+            proposed_instance, previous_values = detach_instance(instance), get_instance_rule_values(instance)
+            for field, value in serializer.validated_data.items():
+                setattr(proposed_instance, field, value)
+        return Response(evaluate_rule_change(proposed_instance, previous_values, sample_size))
+
+# Operaciones masivas de reglas en /{regla}/bulk/: POST crea, PATCH modifica (parcial, cada fila con su id) y DELETE elimina
+# (lista de ids). El cuerpo es un arreglo JSON, un CSV (text/csv) o un archivo CSV en multipart (campo file).
+# Las filas se validan juntas y se escriben en una sola transaccion; al terminar, los datos pre-procesados se reconstruyen
+# una sola vez (en lugar de una actualizacion por regla) y se re-enriquecen las transacciones afectadas por todos los cambios.
+class RuleBulkMixin:
+    bulk_methods = {'POST': 'create', 'PATCH': 'update', 'DELETE': 'delete'}
 
-# Constantes
-STOP_WORDS = frozenset({'y','and','the', 'e', 'o', 'u', 'de', 'del', 'la', 'lo', 'las', 'los', 'en', 'el', 'para', 'por', 'con', 'a', '&'})
-CACHE_KEY = 'enrichment_data_processed_v1'
+    @extend_schema(
+        request={'application/json': {'type': 'array', 'items': {'type': 'object'}}, 'text/csv': {'type': 'string'}},
+        responses={200: RuleBulkSerializer, 201: RuleBulkSerializer},
+    )
+    @action(detail=False, methods=['post', 'patch', 'delete'], url_path='bulk', parser_classes=[JSONParser, CSVParser, MultiPartParser])
+    def bulk(self, request, *args, **kwargs):
+        start_time = time.perf_counter()
+        operation = self.bulk_methods[request.method]
+        upload = request.FILES.get('file')
+        data = parse_csv_file(upload) if upload is not None else request.data
+
+        validator = BulkRuleValidator(self.get_serializer_class(), data, operation)
+        if not validator.is_valid():
+            return Response(validator.errors, status=status.HTTP_400_BAD_REQUEST)
+        validation_ms = round((time.perf_counter() - start_time) * 1000, 3)
+
+        model = self.get_queryset().model
+        try:
+            instances, timings = apply_bulk_rule_operation(model, operation, validator.validated_data)
+        except IntegrityError as exc:
+            # Ej: categorias con comercios asociados, o un valor unico tomado por otra solicitud al mismo tiempo.
+            return Response({"detail": str(exc.args[0]) if exc.args else str(exc)}, status=status.HTTP_409_CONFLICT)
+
+        duration = time.perf_counter() - start_time
+        response_data = {
+            "operation": operation,
+            "total_rows": len(instances),
+            "ids": [str(instance.pk) for instance in instances],
+            "metrics": {
+                "validation_ms": validation_ms,
+                "write_ms": timings['write_ms'],
+                "snapshot_refresh_ms": timings['snapshot_refresh_ms'],
+                "duration_ms": round(duration * 1000, 3),
+                "rows_per_second": round(len(instances) / duration, 1) if duration > 0 else 0,
+            },
+        }
+        return Response(response_data, status=status.HTTP_201_CREATED if operation == 'create' else status.HTTP_200_OK)
+
+# Listado paginado (por cursor) y filtrado de las reglas. Los filtros son parametros de la consulta (ver list_filters),
+# y cada filtro utiliza un indice compuesto (filtro, created_at, id) del modelo, con el orden de la paginacion. Los filtros por
+# categoria o tipo de comercios y keywords usan las columnas copiadas de la categoria (ver CATEGORY_COLUMNS), sin JOIN.
+class RuleListMixin:
+    pagination_class = RuleCursorPagination
+    # Filtros del listado: parametro -> (campo del filtro, tipo del valor: 'uuid' o 'type').
+    list_filters = {}
+
+    # Esta funcion se encarga de aplicar los filtros solicitados al listado.
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action != 'list':
+            return queryset
+        filters = {}
+        for parameter, (lookup, value_type) in self.list_filters.items():
+            value = self.request.query_params.get(parameter)
+            if value is not None:
+                filters[lookup] = self.get_filter_value(parameter, value, value_type)
+        return queryset.filter(**filters)
+
+    # Esta funcion se encarga de validar el valor de un filtro, con un error 400 si no es valido.
+    @staticmethod
+    def get_filter_value(parameter, value, value_type):
+        if value_type == 'type':
+            if value not in MOVEMENT_TYPES:
+                raise serializers.ValidationError({parameter: [f"Invalid type. Expected one of: {', '.join(MOVEMENT_TYPES)}."]})
+            return value
+        try:
+            return uuid.UUID(value)
+        except ValueError:
+            raise serializers.ValidationError({parameter: ["Must be a valid UUID."]})
+
+# Esta funcion se encarga de obtener la documentacion de los filtros del listado de una regla.
+def get_list_filter_parameters(descriptions):
+    return extend_schema_view(list=extend_schema(parameters=[
+        OpenApiParameter(parameter, str, required=False, description=description) for parameter, description in descriptions.items()
+    ]))
+
+# Esta funcion se encarga de asignar los ids de operacion de las acciones dry-run de una regla. Ambas acciones se registran en la
+# misma ruta ({regla}/dry-run/, con y sin id), por lo que los ids generados por defecto serian iguales.
+def get_dry_run_operation_ids(rule_name):
+    return extend_schema_view(
+        dry_run=extend_schema(operation_id=f'{rule_name}_dry_run'),
+        dry_run_update=extend_schema(operation_id=f'{rule_name}_dry_run_update'),
+    )
 
 @extend_schema(tags=['Category'])
-class CategoryViewSet(viewsets.ModelViewSet):
+@get_list_filter_parameters({'type': 'Tipo de movimiento de la categoria (income o expense).'})
+@get_dry_run_operation_ids('categories')
+class CategoryViewSet(RuleListMixin, RuleBulkMixin, RuleDryRunMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    list_filters = {'type': ('type', 'type')}
 
 @extend_schema(tags=['Merchant'])
-class MerchantViewSet(viewsets.ModelViewSet):
+@get_list_filter_parameters({
+    'category': 'Id de la categoria del comercio.',
+    'type': 'Tipo de movimiento de la categoria del comercio (income o expense).',
+})
+@get_dry_run_operation_ids('merchant')
+class MerchantViewSet(RuleListMixin, RuleBulkMixin, RuleDryRunMixin, viewsets.ModelViewSet):
     queryset = Merchant.objects.all()
     serializer_class = MerchantSerializer
+    list_filters = {'category': ('category_id', 'uuid'), 'type': ('category_type', 'type')}
 
 @extend_schema(tags=['Keywords'])
-class KeywordViewSet(viewsets.ModelViewSet):
+@get_list_filter_parameters({
+    'merchant': 'Id del comercio del keyword.',
+    'category': 'Id de la categoria del comercio del keyword.',
+    'type': 'Tipo de movimiento de la categoria del comercio del keyword (income o expense).',
+})
+@get_dry_run_operation_ids('keyword')
+class KeywordViewSet(RuleListMixin, RuleBulkMixin, RuleDryRunMixin, viewsets.ModelViewSet):
     queryset = Keyword.objects.all()
     serializer_class = KeywordSerializer
-
-# Esta funcion se encarga de normalizar el texto.
-def normalize_text(text):
-    if not text: return ""
-    text = str(text).lower()
-    # Reemplazar simbolos comunes con espacio.
-    text = re.sub(r'[*/\-.,\'#\[\]|()!?¿¡]', ' ', text)
-    # Quitar espacios adicionales.
-    text = re.sub(r'\s+', ' ', text).strip()
-    return text
-
-# Esta funcion se encarga de crear el patron de busqueda Regex para las keywords.
-def get_pattern(keyword_words, keyword_original):
-    pattern = None
-    try:
-        # Crear el patron de busqueda Regex, tanto para el caso de una sola palabra como para el caso que esta se componga por varias palabras.
-        if len(keyword_words) == 1:
-            pattern = re.compile(rf"\b{re.escape(keyword_words[0])}\b", re.IGNORECASE)
-        else:
-            pattern_parts = [rf"\b{re.escape(word)}\b" for word in keyword_words]
-            pattern = re.compile(r".*?".join(pattern_parts), re.IGNORECASE)
-
-    except re.error:
-        print(f"Error regex para el keyword: {keyword_original}")
-    return pattern
-
-# Esta funcion se encarga de obtener los datos pre-procesados desde la base de datos o desde la cache.
-def get_processed_enrichment_data():
-    
-    # Intentar obtener datos pre-procesados desde la cache.
-    cached_data = cache.get(CACHE_KEY)
-    if cached_data:
-        return cached_data
-
-    # Se obtienen todos los objetos de la base de datos.
-    keywords = Keyword.objects.select_related('merchant', 'merchant__category').all()
-    merchants = Merchant.objects.select_related('category').all()
-    categories = Category.objects.all()
-
-    # Se almacenan los datos pre-procesados en un diccionario, en donde cada clave es un tipo de dato (keywords, comercio, categoria).
-    # Cada clave tiene un valor que es otro diccionario, donde las claves 'income' y 'expense' diferencian los tipos de movimiento asociados a cada dato.
-    # Observacion: Se asume que todos los comercios tienen una categoria asociada, y que todas las categorias tienen necesariamente un tipo de movimiento.
-    processed_data = {
-        'keywords': {'income': [], 'expense': []},
-        'merchants': {'income': [], 'expense': []},
-        'categories': {'income': [], 'expense': []}
+    list_filters = {
+        'merchant': ('merchant_id', 'uuid'),
+        'category': ('category_id', 'uuid'),
+        'type': ('category_type', 'type'),
     }
 
-    # Pre-procesar Keywords
-    for keyword in keywords:
-        # Se valida que el comercio y la categoria no sean nulos.
-        if not keyword.merchant or not keyword.merchant.category: continue
-        # Se valida que la categoria tenga un tipo de movimiento valido.
-        category_type = keyword.merchant.category.type
-        if category_type not in ['income', 'expense']: continue
-        # Se valida que el keyword no sea nulo para luego normalizarlo.
-        keyword_original = keyword.keyword
-        keyword_normalized = normalize_text(keyword_original)
-        if not keyword_normalized: continue
-
-        keyword_words = keyword_normalized.split()
-        if not keyword_words: continue
-        
-        pattern = get_pattern(keyword_words, keyword_original)
-        
-        if pattern:
-            processed_data['keywords'][category_type].append((keyword, pattern, len(keyword_original)))
-
-    # Pre-procesar Merchants
-    for merchant in merchants:
-        # Se valida la categoria no sea nulo.
-        if not merchant.category: continue
-        # Se valida que la categoria tenga un tipo de movimiento valido.
-        category_type = merchant.category.type
-        if category_type not in ['income', 'expense']: continue
-        # Se valida que el nombre del comercio no sea nulo para luego normalizarlo.
-        merchant_original = merchant.merchant_name
-        merchant_normalized = normalize_text(merchant_original)
-        if not merchant_normalized: continue
-
-        merchant_words = merchant_normalized.split()
-        if not merchant_words: continue
-
-        pattern = get_pattern(merchant_words, merchant_original)
-
-        if pattern:
-            processed_data['merchants'][category_type].append((merchant, pattern, len(merchant_original)))
-
-    # Pre-procesar Categories
-    for category in categories:
-        category_type = category.type
-        # Se valida que la categoria tenga un tipo de movimiento valido.
-        if category_type not in ['income', 'expense']: continue
-        category_normalized = normalize_text(category.name)
-        
-        # Crear el set de palabras de la categoria (excluyendo stop words)
-        category_words_set = {word for word in category_normalized.split() if word and word not in STOP_WORDS}
-        if not category_words_set: continue
-
-        # Guardar objeto y set de palabras precalculado
-        processed_data['categories'][category_type].append((category, category_words_set))
-
-    # Ordenar keywords y merchants por longitud, con la finalidad de encontrar primero el mas largo.
-    for type in ['income', 'expense']:
-        processed_data['keywords'][type].sort(key=lambda x: x[2], reverse=True)
-        processed_data['merchants'][type].sort(key=lambda x: x[2], reverse=True)
-
-    # Guardar en cache los datos pre-procesados
-    cache.set(CACHE_KEY, processed_data, timeout=3600)
-    return processed_data
-
+# Esta funcion se encarga de obtener el modo de persistencia solicitado (?persist=...), o None si no se solicito guardar las transacciones.
+# Con ?persist=true se utiliza el modo por defecto de settings (ENRICHMENT_PERSIST_DEFAULT_MODE).
+def get_persist_mode(query_params):
+    persist = query_params.get('persist', '').strip().lower()
+    if persist in ('', '0', 'false', 'no'):
+        return None
+    if persist in ('1', 'true', 'yes'):
+        return getattr(settings, 'ENRICHMENT_PERSIST_DEFAULT_MODE', 'sync')
+    return persist
 
 class EnrichTransactionsAPIView(APIView):
+    # La respuesta se arma con el JSON pre-renderizado de cada categoria y comercio.
+    renderer_classes = [EnrichmentJSONRenderer, BrowsableAPIRenderer]
+    # Validacion de la entrada: 'bulk' utiliza BulkInputTransactionValidator, y 'serializer' utiliza InputTransactionSerializer.
+    # Ambos entregan los mismos datos y errores; se puede elegir por endpoint con as_view(input_validation=...).
+    input_validation = 'bulk'
+    # Timer de las etapas de la solicitud (None si no se miden) y cantidad de transacciones, para el log de tiempos.
+    stage_timer = None
+    total_transactions = 0
+
+    # Esta funcion se encarga de obtener el validador de la entrada, segun el modo de validacion del endpoint.
+    def get_input_validator(self, data):
+        if self.input_validation == 'serializer':
+            return InputTransactionSerializer(data=data, many=True)
+        return BulkInputTransactionValidator(data)
+
+    # Esta funcion se encarga de indicar si se solicito el detalle de tiempos por etapa en las metricas (?timing=true).
+    def is_timing_requested(self, request):
+        return request.query_params.get('timing', '').strip().lower() in ('1', 'true', 'yes')
+
+    # Esta funcion se encarga de agregar a la respuesta los tiempos por etapa, una vez renderizada: el header Server-Timing
+    # y un log estructurado. La serializacion se mide desde que termina la vista hasta que termina el renderizado.
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        timer = self.stage_timer
+        if timer is None:
+            return response
+        render_start_time = time.perf_counter()
+
+        def add_timings(rendered_response):
+            timer.lap('serialization', render_start_time)
+            rendered_response['Server-Timing'] = timer.get_server_timing()
+            timings = {
+                'status': rendered_response.status_code,
+                'total_transactions': self.total_transactions,
+                'total_ms': round(timer.get_total_ms(), 3),
+                'stages': timer.as_dict(),
+            }
+            logger.info("Tiempos del enriquecimiento: %s", json.dumps(timings), extra={'enrichment_timings': timings})
+
+        if hasattr(response, 'add_post_render_callback'):
+            response.add_post_render_callback(add_timings)
+        return response
+
+    # Esta funcion se encarga de obtener el modo de persistencia solicitado, o None si no se solicito guardar las transacciones.
+    def get_persist_mode(self, request):
+        return get_persist_mode(request.query_params)
+
     @extend_schema(
         request=InputTransactionSerializer(many=True),
+        parameters=[
+            OpenApiParameter(
+                'persist', str, required=False,
+                description='Guarda las transacciones enriquecidas: sync (en la solicitud), async (buffer de escritura) o true (modo por defecto).',
+            ),
+            OpenApiParameter(
+                'timing', bool, required=False,
+                description='Agrega a las metricas el detalle de tiempos por etapa (debug), y el header Server-Timing.',
+            ),
+        ],
         responses={
             200: EnrichmentResponseSerializer,
         },
         tags=['Enrichment']
     )
     def post(self, request, *args, **kwargs):
+        start_time = time.perf_counter()
+        # Tiempos por etapa: se miden si estan habilitados en settings (ENRICHMENT_STAGE_TIMING) o si se solicitan con ?timing=true.
+        # Deshabilitados, no se crea el timer y las etapas solo comparan el timer con None.
+        timing_requested = self.is_timing_requested(request)
+        timer = self.stage_timer = StageTimer() if timing_requested or getattr(settings, 'ENRICHMENT_STAGE_TIMING', False) else None
+
+        # Modo de persistencia solicitado (?persist=sync|async|true); por defecto las transacciones no se guardan.
+        persist_mode = self.get_persist_mode(request)
+        if persist_mode not in (None,) + PERSIST_MODES:
+            return Response({"persist": [f"Invalid persist mode. Expected one of: {', '.join(PERSIST_MODES)}."]}, status=status.HTTP_400_BAD_REQUEST)
+
         # Validación de entrada
-        input_serializer = InputTransactionSerializer(data=request.data, many=True)
-        if not input_serializer.is_valid():
+        with measure_stage(timer, 'validation'):
+            input_serializer = self.get_input_validator(request.data)
+            is_valid = input_serializer.is_valid()
+        if not is_valid:
             return Response(input_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
         transactions = input_serializer.validated_data
-        total_transactions = len(transactions)
+        total_transactions = self.total_transactions = len(transactions)
         if total_transactions == 0:
              return Response({"transactions": [], "metrics": {"total_transactions": 0, "categorization_rate": 0, "merchant_identification_rate": 0}}, status=status.HTTP_200_OK)
 
         # Obtener datos pre-procesados
-        processed_data = get_processed_enrichment_data()
-
-        results = []
-        categorized_match_count = 0
-        merchant_match_count = 0
-
-        for transaction in transactions:
-            # Se procesan los datos de la transaccion.
-            description_original = transaction['description']
-            description_normalized = normalize_text(description_original)
-            amount = transaction['amount']
-            target_category_type = 'income' if amount >= 0 else 'expense'
-
-            # Se inicializan las variables para almacenar los resultados de la busqueda.
-            found_merchant = None
-            found_category = None
-            match_found = False
-
-            # Para todas las busquedas se filtra primero por el tipo de movimiento (ingreso o gasto) de la transaccion.
-            
-            # Se utiliza regex para buscar la exixtencia del patron de los keywords en la descripcion de la transaccion.
-            for keyword, pattern, _ in processed_data['keywords'][target_category_type]:
-                if pattern.search(description_normalized):
-                    found_merchant = keyword.merchant
-                    found_category = found_merchant.category
-                    match_found = True
-                    break
-
-            # Se utiliza regex para buscar la existencia del patron de los nombres del comercios en la descripcion de la transaccion.
-            if not match_found:
-                for merchant, pattern, _ in processed_data['merchants'][target_category_type]:
-                    if pattern.search(description_normalized):
-                        found_merchant = merchant
-                        found_category = merchant.category
-                        match_found = True
-                        break
-
-            # Se comprueba si alguna de las palabras que forman el nombre de una categoria existen dentro de la descripcion de la transaccion.
-            if not match_found:
-                best_category_match_score = 0
-                matched_category = None
-                # Se obtiene el set de palabras de la descripcion de la transaccion (excluyendo stop words)
-                description_words_set = {word for word in description_normalized.split() if word and word not in STOP_WORDS}
-                
-                if description_words_set:
-                    for category, category_words_set in processed_data['categories'][target_category_type]:
-                        # Se verifica si la categoria tiene palabras que coincidan con las de la descripcion de la transaccion.
-                        common_words = description_words_set.intersection(category_words_set)
-                        # Se calcula un puntaje basado en la cantidad de palabras coincidentes.
-                        score = len(common_words)
-                        # Se verifica si el puntaje es mayor al mejor puntaje encontrado hasta ahora.
-                        if score > best_category_match_score:
-                            best_category_match_score = score
-                            matched_category = category
-
-                if matched_category:
-                    found_category = matched_category
-                    found_merchant = None
-                    match_found = True
-
-            if found_category: categorized_match_count += 1
-            if found_merchant: merchant_match_count += 1
-            # Se conforma el diccionario de salida con los datos encontrados para la trasanccion.
-            output_trans_dict = {
-                'description': description_original,
-                'amount': amount,
-                'date': transaction['date'],
-                'enriched_category': found_category,
-                'enriched_merchant': found_merchant
-            }
-            results.append(output_trans_dict)
+        enricher = TransactionEnricher(get_processed_enrichment_data(timer), timer)
+        # Para lotes muy grandes, las busquedas se realizan en paralelo en un pool de procesos.
+        if should_match_in_parallel(total_transactions):
+            with measure_stage(timer, 'parallel_match'):
+                prefetch_matches_in_parallel(enricher, transactions)
+        # La etapa de enriquecimiento incluye las busquedas (keyword_match, merchant_match y category_match).
+        with measure_stage(timer, 'enrichment'):
+            results = [enricher.enrich(transaction) for transaction in transactions]
 
         # Calculo de Metricas
-        categorization_rate = (categorized_match_count / total_transactions * 100) if total_transactions > 0 else 0
-        merchant_identification_rate = (merchant_match_count / total_transactions * 100) if total_transactions > 0 else 0
+        metrics = enricher.get_metrics()
 
-        metrics = {
-            "total_transactions": total_transactions,
-            "categorization_rate": round(categorization_rate, 2),
-            "merchant_identification_rate": round(merchant_identification_rate, 2),
-        }
+        # Persistencia opcional de las transacciones enriquecidas (en la solicitud o en el buffer de escritura asincrona).
+        if persist_mode is not None:
+            with measure_stage(timer, 'persist'):
+                rows = build_transaction_rows(transactions, results)
+                if persist_mode == 'sync':
+                    persist_transactions(rows)
+                else:
+                    transaction_write_buffer.add(rows)
+
+        # Registro de la solicitud en las metricas del proceso (/metrics).
+        enricher.record_metrics(time.perf_counter() - start_time)
 
-        output_serializer = OutputTransactionSerializer(results, many=True)
+        # Detalle de tiempos de las etapas anteriores a la serializacion (que se informa en el header Server-Timing).
+        if timing_requested:
+            metrics['debug'] = {'stages': timer.as_dict(), 'elapsed_ms': round(timer.get_total_ms(), 3)}
 
         response_data = {
-            "transactions": output_serializer.data,
+            "transactions": results,
             "metrics": metrics
         }
 
-        return Response(response_data, status=status.HTTP_200_OK)
\ No newline at end of file
+        return Response(response_data, status=status.HTTP_200_OK)
+
+class EnrichTransactionsStreamAPIView(APIView):
+    # Cantidad de lineas por defecto que se validan y enriquecen en cada bloque (se puede configurar con ENRICHMENT_STREAM_CHUNK_SIZE).
+    chunk_size = 1000
+
+    @extend_schema(
+        request={'application/x-ndjson': InputTransactionSerializer},
+        responses={(200, 'application/x-ndjson'): OutputTransactionSerializer},
+        description=(
+            "Enriquece transacciones en formato NDJSON (una transaccion JSON por linea). "
+            "La respuesta entrega una linea por transaccion enriquecida, en el mismo orden de la entrada; "
+            "las lineas invalidas se reemplazan por {\"line\": n, \"errors\": {...}}, y la ultima linea contiene las metricas."
+        ),
+        tags=['Enrichment']
+    )
+    def post(self, request, *args, **kwargs):
+        # Los datos pre-procesados se obtienen antes de comenzar la respuesta, para utilizar la misma version en todo el stream.
+        enricher = TransactionEnricher(get_processed_enrichment_data())
+        response = StreamingHttpResponse(self.stream_enriched_lines(request.stream, enricher), content_type='application/x-ndjson')
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    # Esta funcion se encarga de leer la entrada por bloques de lineas, de modo que la memoria utilizada sea constante.
+    # Cada bloque se valida, se enriquece y se entrega como lineas NDJSON, y al final se entrega una linea con las metricas.
+    def stream_enriched_lines(self, stream, enricher):
+        start_time = time.perf_counter()
+        chunk_size = getattr(settings, 'ENRICHMENT_STREAM_CHUNK_SIZE', self.chunk_size)
+        validator = BulkInputTransactionValidator(None)
+        renderer = EnrichmentJSONRenderer()
+        invalid_lines = 0
+        lines = []
+        chunk = []
+
+        for line_number, line in enumerate(stream if stream is not None else (), start=1):
+            line = line.strip()
+            if not line:
+                continue
+            # Se valida la linea (JSON y campos de la transaccion), con los mismos errores que el endpoint JSON.
+            try:
+                item = json.loads(line)
+            except ValueError as exc:
+                invalid_lines += 1
+                chunk.append({'line': line_number, 'errors': {api_settings.NON_FIELD_ERRORS_KEY: [f'JSON parse error - {exc}']}})
+            else:
+                try:
+                    transaction = validator.run_item_validation(item)
+                except serializers.ValidationError as exc:
+                    invalid_lines += 1
+                    chunk.append({'line': line_number, 'errors': exc.detail})
+                else:
+                    chunk.append(enricher.enrich(transaction))
+            if len(chunk) >= chunk_size:
+                yield self.render_chunk(renderer, chunk)
+                chunk = []
+                enricher.reset_batch()
+
+        if chunk:
+            yield self.render_chunk(renderer, chunk)
+        metrics = enricher.get_metrics()
+        metrics['invalid_lines'] = invalid_lines
+        enricher.record_metrics(time.perf_counter() - start_time)
+        yield self.render_chunk(renderer, [{'metrics': metrics}])
+
+    # Esta funcion se encarga de renderizar un bloque de registros como lineas NDJSON.
+    @staticmethod
+    def render_chunk(renderer, records):
+        return renderer.escape_line_separators(''.join(renderer.render_transaction(record) + '\n' for record in records)).encode()
+
+# Esta funcion se encarga de validar, enriquecer y renderizar el cuerpo JSON de una solicitud de la vista async, con los datos
+# pre-procesados entregados. No utiliza la base de datos ni el event loop, por lo que se puede ejecutar en el executor async.
+# Retorna una tupla (status, JSON renderizado, enriquecedor, filas a persistir); el enriquecedor es None si no se enriquecio.
+def enrich_request_body(body, snapshot, persist_mode):
+    try:
+        data = json.loads(body)
+    except ValueError as exc:
+        return status.HTTP_400_BAD_REQUEST, JSONRenderer().render({'detail': f'JSON parse error - {exc}'}), None, None
+    validator = BulkInputTransactionValidator(data)
+    if not validator.is_valid():
+        return status.HTTP_400_BAD_REQUEST, JSONRenderer().render(validator.errors), None, None
+    transactions = validator.validated_data
+    if not transactions:
+        empty_response = {"transactions": [], "metrics": {"total_transactions": 0, "categorization_rate": 0, "merchant_identification_rate": 0}}
+        return status.HTTP_200_OK, JSONRenderer().render(empty_response), None, None
+
+    enricher = TransactionEnricher(snapshot)
+    if should_match_in_parallel(len(transactions)):
+        prefetch_matches_in_parallel(enricher, transactions)
+    results = [enricher.enrich(transaction) for transaction in transactions]
+    rows = build_transaction_rows(transactions, results) if persist_mode is not None else None
+    content = EnrichmentJSONRenderer().render({"transactions": results, "metrics": enricher.get_metrics()})
+    return status.HTTP_200_OK, content, enricher, rows
+
+# Endpoint async del enriquecimiento, con la misma entrada y respuesta JSON que EnrichTransactionsAPIView (incluido ?persist=),
+# para servidores ASGI con muchas solicitudes pequeñas y concurrentes (ej: autorizaciones en tiempo real).
+# No ocupa un hilo por solicitud: la version de los datos pre-procesados se consulta con la api async de la cache (compartiendo
+# la lectura entre solicitudes concurrentes), y las solicitudes pequeñas (hasta ENRICHMENT_ASYNC_INLINE_MAX_BYTES) se enriquecen
+# directamente en el event loop, donde la busqueda (y la cache de resultados) toma menos que el cambio a otro hilo.
+# Las solicitudes mas grandes se validan, enriquecen y renderizan en el executor acotado (ENRICHMENT_ASYNC_WORKERS hilos),
+# donde tambien se escribe el archivo de metricas, por lo que el event loop no realiza escrituras de archivos.
+# Es una vista de Django, ya que las vistas de DRF son sincronas; no incluye la api navegable ni el detalle de tiempos (?timing).
+@csrf_exempt
+@require_POST
+async def enrich_transactions_async_view(request):
+    start_time = time.perf_counter()
+    if request.content_type != 'application/json':
+        content = JSONRenderer().render({'detail': f'Unsupported media type "{request.content_type}" in request.'})
+        return HttpResponse(content, status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, content_type='application/json')
+    persist_mode = get_persist_mode(request.GET)
+    if persist_mode not in (None,) + PERSIST_MODES:
+        content = JSONRenderer().render({"persist": [f"Invalid persist mode. Expected one of: {', '.join(PERSIST_MODES)}."]})
+        return HttpResponse(content, status=status.HTTP_400_BAD_REQUEST, content_type='application/json')
+
+    snapshot = await aget_processed_enrichment_data()
+    body = request.body
+    if len(body) <= getattr(settings, 'ENRICHMENT_ASYNC_INLINE_MAX_BYTES', DEFAULT_ASYNC_INLINE_MAX_BYTES):
+        status_code, content, enricher, rows = enrich_request_body(body, snapshot, persist_mode)
+    else:
+        status_code, content, enricher, rows = await async_enrichment_executor.run(enrich_request_body, body, snapshot, persist_mode)
+
+    # La persistencia utiliza la base de datos (o puede escribir si el buffer esta lleno), por lo que se realiza en un hilo.
+    if rows is not None:
+        await sync_to_async(persist_transactions if persist_mode == 'sync' else transaction_write_buffer.add)(rows)
+    # Las metricas se registran en memoria, y el archivo de metricas (cuando corresponde) se escribe en el executor.
+    if enricher is not None:
+        enricher.record_metrics(time.perf_counter() - start_time, flush=False)
+        if metrics_registry.flush_due():
+            await async_enrichment_executor.run(metrics_registry.flush)
+    return HttpResponse(content, status=status_code, content_type='application/json')
+
+# Api de trabajos de enriquecimiento asincronos: se envia un lote de transacciones y se obtiene el id del trabajo,
+# luego se consulta su estado y avance, y se descargan los resultados por paginas (una pagina por bloque del trabajo).
+# Los trabajos los procesan los workers del comando run_enrichment_workers.
+@extend_schema(tags=['Enrichment Jobs'])
+class EnrichmentJobViewSet(viewsets.GenericViewSet):
+    queryset = EnrichmentJob.objects.all()
+    serializer_class = EnrichmentJobSerializer
+
+    @extend_schema(request=InputTransactionSerializer(many=True), responses={202: EnrichmentJobSerializer})
+    def create(self, request, *args, **kwargs):
+        # Validación de entrada, con los mismos errores que el endpoint de enriquecimiento.
+        input_serializer = BulkInputTransactionValidator(request.data)
+        if not input_serializer.is_valid():
+            return Response(input_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        job = create_enrichment_job(input_serializer.validated_data)
+        serializer = self.get_serializer(job)
+        headers = {'Location': request.build_absolute_uri(f"{job.pk}/")}
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED, headers=headers)
+
+    def retrieve(self, request, *args, **kwargs):
+        return Response(self.get_serializer(self.get_object()).data)
+
+    @extend_schema(
+        parameters=[OpenApiParameter('page', int, description='Pagina de resultados (desde 1).')],
+        responses={200: EnrichmentJobResultsSerializer},
+    )
+    @action(detail=True, methods=['get'], renderer_classes=[EnrichmentJSONRenderer, BrowsableAPIRenderer])
+    def results(self, request, *args, **kwargs):
+        job = self.get_object()
+        try:
+            page = int(request.query_params.get('page', 1))
+        except ValueError:
+            page = 0
+        if page < 1 or page > max(job.total_chunks, 1):
+            return Response({"detail": "Invalid page."}, status=status.HTTP_404_NOT_FOUND)
+
+        next_url = None
+        if page < job.total_chunks:
+            next_url = request.build_absolute_uri(f"?page={page + 1}")
+        response_data = {
+            "job": str(job.pk),
+            "page": page,
+            "total_pages": job.total_chunks,
+            "next": next_url,
+            "transactions": [],
+        }
+        if job.total_chunks == 0:
+            return Response(response_data)
+
+        chunk = EnrichmentJobChunk.objects.filter(job=job, index=page - 1).only('status', 'results').first()
+        if chunk is None or chunk.status != 'completed':
+            return Response({"detail": "The results of this page are not ready yet.", "status": job.status}, status=status.HTTP_409_CONFLICT)
+        response_data["transactions"] = chunk.results
+        return Response(response_data)
+
+# Endpoint de metricas en el formato de texto de Prometheus, con las metricas de todos los procesos del servidor
+# (ver enrichment_logic/metrics.py). Es una vista de Django, ya que la respuesta no utiliza los renderers de la api.
+@require_GET
+def metrics_view(request):
+    return HttpResponse(render_metrics(), content_type=METRICS_CONTENT_TYPE)
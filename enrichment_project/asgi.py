@@ -5,3 +5,12 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'enrichment_project.settings')
 
 application = get_asgi_application()
+
+
+# Precargar los datos pre-procesados del enriquecimiento antes de que el worker reciba solicitudes.
+from enrichment_logic.snapshot import warm_up_on_startup  # noqa: E402
+warm_up_on_startup()
+
+# Crear el pool de procesos de la busqueda en paralelo (si esta habilitada) con los datos ya precargados, antes de recibir solicitudes.
+from enrichment_logic.parallel import start_matching_pool_on_startup  # noqa: E402
+start_matching_pool_on_startup()
@@ -69,6 +69,18 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/ref/settings/#caches
+# La cache guarda los datos pre-procesados del enriquecimiento, su version y los locks de actualizacion, y es la que comparten
+# los workers para ver los cambios de las reglas. LocMemCache es local a cada proceso, por lo que solo sirve con un proceso
+# (ej: runserver): con varios workers se debe utilizar un backend compartido (Redis o Memcached, o FileBasedCache en un solo
+# servidor), lo que se verifica con python manage.py check --deploy.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -113,4 +125,78 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
-}
\ No newline at end of file
+}
+
+# Enrichment
+# Precargar los datos pre-procesados del enriquecimiento al iniciar cada worker (wsgi/asgi).
+ENRICHMENT_WARMUP_ON_STARTUP = True
+
+# Cantidad maxima de resultados (descripcion normalizada y tipo de movimiento) en la cache LRU de cada proceso.
+ENRICHMENT_RESULT_CACHE_SIZE = 10000
+
+# Cantidad de lineas que se validan y enriquecen en cada bloque del endpoint NDJSON (stream).
+ENRICHMENT_STREAM_CHUNK_SIZE = 1000
+
+# Trabajos de enriquecimiento asincronos: transacciones por bloque (y por pagina de resultados),
+# segundos tras los que un bloque tomado por un worker vuelve a la cola, e intentos de cada bloque.
+ENRICHMENT_JOB_CHUNK_SIZE = 1000
+ENRICHMENT_JOB_LOCK_TIMEOUT = 300
+ENRICHMENT_JOB_MAX_ATTEMPTS = 3
+
+# Busqueda en paralelo (pool de procesos) para solicitudes de enriquecimiento con muchas transacciones:
+# cantidad minima de transacciones (0 lo deshabilita), procesos del pool (None usa la cantidad de nucleos)
+# y descripciones por tarea. Se puede medir donde conviene con el comando benchmark_parallel_matching.
+# El pool se crea al iniciar cada worker (wsgi/asgi), y sus procesos cargan las nuevas versiones de los datos desde la cache
+# (o ENRICHMENT_SHARED_SNAPSHOT_DIR), por lo que requiere una cache compartida entre procesos (ver CACHES).
+ENRICHMENT_PARALLEL_THRESHOLD = 0
+ENRICHMENT_PARALLEL_WORKERS = None
+ENRICHMENT_PARALLEL_CHUNK_SIZE = 2000
+
+# Persistencia opcional de las transacciones enriquecidas (?persist=...): modo por defecto ('sync' o 'async'),
+# filas por INSERT, filas maximas pendientes en el buffer asincrono y segundos para juntar un lote en el buffer.
+ENRICHMENT_PERSIST_DEFAULT_MODE = 'sync'
+ENRICHMENT_PERSIST_BATCH_SIZE = 1000
+ENRICHMENT_WRITE_BEHIND_MAX_ROWS = 100000
+ENRICHMENT_WRITE_BEHIND_FLUSH_INTERVAL = 1.0
+
+# Re-enriquecimiento de las transacciones guardadas al cambiar keywords, comercios o categorias:
+# 'async' (en segundo plano), 'sync' (al confirmar el cambio) u 'off', y transacciones por lote.
+ENRICHMENT_REENRICH_ON_RULE_CHANGE = 'async'
+ENRICHMENT_REENRICH_BATCH_SIZE = 1000
+# Hilos que re-enriquecen en segundo plano (modo 'async'); los cambios de reglas esperan su turno en la cola del pool.
+ENRICHMENT_REENRICH_WORKERS = 1
+# Candidatas maximas que se vuelven a buscar al evaluar (dry-run) una regla propuesta; el total de candidatas siempre se cuenta.
+ENRICHMENT_DRY_RUN_MAX_CANDIDATES = 10000
+
+# Tiempos por etapa del endpoint de enriquecimiento (header Server-Timing y log estructurado) en todas las solicitudes.
+# Con ?timing=true se miden en una solicitud, agregando ademas el detalle a las metricas.
+ENRICHMENT_STAGE_TIMING = False
+
+# Metricas en formato Prometheus (/metrics): directorio compartido donde cada proceso guarda sus metricas, para sumar
+# las de todos los workers (None solo entrega las del proceso que responde), y segundos minimos entre escrituras.
+# Con varios workers (ej: gunicorn) se debe indicar un directorio; los archivos de los procesos terminados se eliminan al leerlos.
+ENRICHMENT_METRICS_DIR = None
+ENRICHMENT_METRICS_FLUSH_INTERVAL = 1.0
+
+# Listados de categorias, comercios y keywords (paginados por cursor): tamaño de pagina por defecto y maximo (?page_size=).
+ENRICHMENT_RULES_PAGE_SIZE = 100
+ENRICHMENT_RULES_MAX_PAGE_SIZE = 1000
+
+# Operaciones masivas de reglas (/{regla}/bulk/): filas maximas por solicitud, y filas por consulta (INSERT, UPDATE y DELETE).
+ENRICHMENT_BULK_MAX_ROWS = 50000
+ENRICHMENT_BULK_BATCH_SIZE = 1000
+
+# Archivo de datos pre-procesados del enriquecimiento (python manage.py build_enrichment_snapshot). Si no estan en cache,
+# los workers los cargan desde el archivo (mapeado en memoria) mientras corresponda a las reglas actuales, y en caso contrario
+# los construyen desde la base de datos y actualizan el archivo. None deshabilita el archivo (ej: BASE_DIR / 'enrichment_snapshot.bin').
+ENRICHMENT_SNAPSHOT_FILE = None
+
+# Datos pre-procesados compartidos entre los procesos: directorio (idealmente en memoria, ej: '/dev/shm/enrichment') donde el primer
+# proceso que carga una version la publica en un formato de solo lectura, que el resto mapea en memoria sin copiarlo.
+# None mantiene una copia decodificada de los datos en cada proceso (busquedas mas rapidas, pero memoria proporcional a los workers).
+ENRICHMENT_SHARED_SNAPSHOT_DIR = None
+
+# Endpoint async del enriquecimiento (/api/v1/transactions/enrich/async/, para servidores ASGI): hilos del executor donde se
+# procesan las solicitudes grandes (y se escribe el archivo de metricas), y tamaño maximo (bytes) del cuerpo de las solicitudes que se enriquecen en el event loop.
+ENRICHMENT_ASYNC_WORKERS = 4
+ENRICHMENT_ASYNC_INLINE_MAX_BYTES = 16384
@@ -2,12 +2,14 @@ from django.contrib import admin
 from django.urls import path, include
 from django.views.generic.base import RedirectView
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
+from enrichment_logic.views import metrics_view
 
 
 urlpatterns = [
     path('', RedirectView.as_view(url='/api/schema/swagger/', permanent=False)),
     path('admin/', admin.site.urls),
     path('api/v1/', include('enrichment_logic.urls')),
+    path('metrics', metrics_view, name='metrics'),
     path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
     path('api/schema/swagger/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger'),
 ]